@@ -45,6 +45,9 @@ from .tools.lists import ListGenerator
 from .tools.pyocd import PyOCDCommander
 from .flash.eraser import FlashEraser
 from .flash.file_programmer import FileProgrammer
+from .flash.batch import (BatchFlashProgrammer, BatchProgressReport)
+from .flash.profiler import FlashProfiler
+from .flash.plan import FlashPlan
 from .core import options
 from .utility.cmdline import split_command_line
 
@@ -203,18 +206,38 @@ class PyOCDTool(object):
         # Create *flash* subcommand parser.
         flashParser = subparsers.add_parser('flash', parents=[commonOptions, connectOptions],
             help="Program an image to device flash.")
-        flashParser.add_argument("-e", "--erase", choices=ERASE_OPTIONS, default='sector',
-            help="Choose flash erase method. Default is sector.")
+        flashParser.add_argument("-e", "--erase", choices=ERASE_OPTIONS,
+            help="Choose flash erase method. Default is sector, or the method recorded in a flash "
+            "plan.")
         flashParser.add_argument("-a", "--base-address", metavar="ADDR", type=int_base_0,
             help="Base address used for the address where to flash a binary. Defaults to start of flash.")
         flashParser.add_argument("--trust-crc", action="store_true",
             help="Use only the CRC of each page to determine if it already has the same data.")
+        flashParser.add_argument("--verify", action="store_true", default=None,
+            help="Verify flash contents after programming.")
+        flashParser.add_argument("--profile", action="store_true",
+            help="Print the number and duration of each flash algorithm operation after programming.")
         flashParser.add_argument("--format", choices=("bin", "hex", "elf"),
             help="File format. Default is to use the file's extension.")
         flashParser.add_argument("--skip", metavar="BYTES", default=0, type=int_base_0,
             help="Skip programming the first N bytes. This can only be used with binary files.")
-        flashParser.add_argument("file", metavar="PATH",
-            help="File to program into flash.")
+        flashParser.add_argument("--baseline", metavar="PATH",
+            help="Image file already programmed on the target. Only sectors that differ from the "
+            "baseline are erased and programmed.")
+        flashParser.add_argument("--plan", metavar="PATH",
+            help="Flash plan file. If an image file is also given, a plan for the image and target "
+            "is compiled, saved to PATH, and programmed. Otherwise the saved plan is programmed "
+            "without parsing the image again.")
+        flashParser.add_argument("--all", dest="all_probes", action="store_true",
+            help="Program all connected probes concurrently. Combine with --uid to select probes "
+            "whose unique ID contains a substring.")
+        flashParser.add_argument("--jobs", metavar="N", type=int,
+            help="Maximum number of boards programmed at once with --all. Default is all boards.")
+        flashParser.add_argument("--report", metavar="PATH",
+            help="Write a JSON report of the results for each board to a file when used with --all. "
+            "Use '-' for stdout.")
+        flashParser.add_argument("file", metavar="PATH", nargs='?',
+            help="File to program into flash. May be omitted if --plan is used.")
         
         # Create *gdbserver* subcommand parser.
         gdbserverOptions = argparse.ArgumentParser(description='gdbserver', add_help=False)
@@ -458,6 +481,22 @@ class PyOCDTool(object):
         """! @brief Handle 'flash' subcommand."""
         self._increase_logging(["pyocd.flash.loader"])
         
+        if self._args.file is None and self._args.plan is None:
+            LOG.error("No file to program was provided")
+            sys.exit(1)
+        if self._args.plan is not None and (self._args.baseline is not None or self._args.all_probes):
+            LOG.error("--plan cannot be used with --baseline or --all")
+            sys.exit(1)
+        
+        if self._args.all_probes:
+            self._flash_all()
+            return
+        
+        # Load the plan before connecting, so an invalid plan file is reported right away.
+        plan = None
+        if self._args.plan is not None and self._args.file is None:
+            plan = FlashPlan.load(self._args.plan)
+        
         session = ConnectHelper.session_with_chosen_probe(
                             project_dir=self._args.project_dir,
                             config_file=self._args.config,
@@ -471,14 +510,93 @@ class PyOCDTool(object):
                             options=convert_session_options(self._args.options))
         if session is None:
             sys.exit(1)
+        profiler = FlashProfiler() if self._args.profile else None
         with session:
-            programmer = FileProgrammer(session,
+            if self._args.plan is not None:
+                if plan is None:
+                    plan = FlashPlan.compile(session, self._args.file,
+                                    file_format=self._args.format,
+                                    chip_erase=self._args.erase,
+                                    base_address=self._args.base_address,
+                                    skip=self._args.skip)
+                    plan.save(self._args.plan)
+                    LOG.info("Saved flash plan to %s", self._args.plan)
+                perf_list = plan.program(session,
+                                chip_erase=self._args.erase,
+                                trust_crc=self._args.trust_crc,
+                                verify=self._args.verify,
+                                profiler=profiler)
+            else:
+                programmer = FileProgrammer(session,
+                                chip_erase=self._args.erase,
+                                trust_crc=self._args.trust_crc,
+                                verify=self._args.verify,
+                                profiler=profiler)
+                perf_list = programmer.program(self._args.file,
+                                base_address=self._args.base_address,
+                                skip=self._args.skip,
+                                file_format=self._args.format,
+                                baseline=self._args.baseline)
+        if profiler is not None:
+            total_time = sum(perf.program_time + (perf.verify_time or 0) for perf in perf_list)
+            print(profiler.format_report(total_time))
+    
+    def _flash_all(self):
+        """! @brief Program all connected probes for the 'flash --all' subcommand."""
+        self._increase_logging(["pyocd.flash.batch"])
+        sessionOptions = convert_session_options(self._args.options)
+        
+        progress = None
+        if not sessionOptions.get('hide_programming_progress', False):
+            progress = BatchProgressReport()
+        
+        # Progress for each board is reported by the batch report, so hide the per-session
+        # progress bars.
+        sessionOptions['hide_programming_progress'] = True
+        
+        profiler = FlashProfiler() if self._args.profile else None
+        programmer = BatchFlashProgrammer.for_all_probes(
+                            unique_id=self._args.unique_id,
+                            jobs=self._args.jobs,
+                            progress=progress,
                             chip_erase=self._args.erase,
-                            trust_crc=self._args.trust_crc)
-            programmer.program(self._args.file,
-                            base_address=self._args.base_address,
-                            skip=self._args.skip,
-                            file_format=self._args.format)
+                            trust_crc=self._args.trust_crc,
+                            verify=self._args.verify,
+                            profiler=profiler,
+                            project_dir=self._args.project_dir,
+                            config_file=self._args.config,
+                            user_script=self._args.script,
+                            no_config=self._args.no_config,
+                            pack=self._args.pack,
+                            target_override=self._args.target_override,
+                            frequency=self._args.frequency,
+                            options=sessionOptions)
+        if not programmer.probes:
+            LOG.error("No connected debug probes")
+            sys.exit(1)
+        
+        result = programmer.program(self._args.file,
+                        base_address=self._args.base_address,
+                        skip=self._args.skip,
+                        file_format=self._args.format,
+                        baseline=self._args.baseline)
+        
+        if self._args.report:
+            report = json.dumps(result.to_dict(), indent=4)
+            if self._args.report == '-':
+                print(report)
+            else:
+                with open(self._args.report, 'w') as f:
+                    f.write(report)
+        
+        # Boards are programmed concurrently, so host overhead can't be separated from the total.
+        if profiler is not None:
+            print(profiler.format_report())
+        
+        for board in result.failed_boards:
+            LOG.error("Failed to program %s: %s", board.unique_id, board.error)
+        if not result.success:
+            sys.exit(1)
     
     def do_erase(self):
         """! @brief Handle 'erase' subcommand."""
@@ -29,6 +29,7 @@ from ..utility.notification import Notification
 from ..utility.sequencer import CallSequence
 from ..target.pack.flash_algo import PackFlashAlgo
 import logging
+import os
 
 # inspect.getargspec is deprecated in Python 3.
 try:
@@ -85,10 +86,23 @@ class CoreSightTarget(Target, GraphNode):
         if filename is None:
             self._elf = None
         else:
-            self._elf = ELFBinaryFile(filename, self.memory_map)
+            self._elf = ELFBinaryFile(filename, self.memory_map, self._get_cache_dir('dwarf_index_dir'))
             self.cores[0].elf = self._elf
             self.cores[0].set_target_context(ElfReaderContext(self.cores[0].get_target_context(), self._elf))
 
+    def _get_cache_dir(self, option_name):
+        """! @brief Return the absolute path set by a cache directory option, or None if not set.
+
+        Relative paths are relative to the session's project directory.
+        """
+        cache_dir = self.session.options.get(option_name)
+        if not cache_dir:
+            return None
+        cache_dir = os.path.expanduser(cache_dir)
+        if not os.path.isabs(cache_dir):
+            cache_dir = os.path.join(self.session.project_dir, cache_dir)
+        return cache_dir
+
     def select_core(self, num):
         """! @note Deprecated."""
         self.selected_core = num
@@ -119,7 +133,8 @@ class CoreSightTarget(Target, GraphNode):
 #             LOG.debug("Started loading SVD")
 
             # Spawn thread to load SVD in background.
-            self._svd_load_thread = SVDLoader(self._svd_location, svd_load_completed_cb)
+            self._svd_load_thread = SVDLoader(self._svd_location, svd_load_completed_cb,
+                                                self._get_cache_dir('svd_cache_dir'))
             self._svd_load_thread.load()
 
     def add_core(self, core):
@@ -232,11 +247,8 @@ class CoreSightTarget(Target, GraphNode):
                     packAlgo = PackFlashAlgo(flmPath)
                     if self.session.options.get("debug.log_flm_info"):
                         LOG.debug("Flash algo info: %s", packAlgo.flash_info)
-                    page_size = packAlgo.page_size
-                    if page_size <= 32:
-                        page_size = min(s[1] for s in packAlgo.sector_sizes)
                     algo = packAlgo.get_pyocd_flash_algo(
-                            page_size,
+                            packAlgo.preferred_page_size,
                             self.memory_map.get_default_region_of_type(MemoryType.RAM))
                 
                     # If we got a valid algo from the FLM, set it on the region. This will then
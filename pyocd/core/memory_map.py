@@ -392,6 +392,8 @@ class FlashRegion(MemoryRegion):
         @retval False At least one byte in d did not match the erased byte value.
         """
         erasedByte = self.erased_byte_value
+        if isinstance(d, (bytearray, memoryview)):
+            return bytearray(d).count(erasedByte) == len(d)
         for b in d:
             if b != erasedByte:
                 return False
@@ -472,6 +474,7 @@ class MemoryMap(object):
         @param more_regions Zero or more MemoryRegion objects passed as separate parameters.
         """
         self._regions = []
+        self._generation = 0
         self.add_regions(*more_regions)
 
     @property
@@ -482,6 +485,15 @@ class MemoryMap(object):
         """
         return self._regions
 
+    @property
+    def generation(self):
+        """! @brief Modification count of the memory map.
+        
+        The generation is incremented every time a region is added to or removed from the map. It
+        can be used to check whether data derived from the memory map is out of date.
+        """
+        return self._generation
+
     @property
     def region_count(self):
         """! @brief Number of memory regions in the map."""
@@ -529,6 +541,7 @@ class MemoryMap(object):
         new_region.map = self
         self._regions.append(new_region)
         self._regions.sort()
+        self._generation += 1
     
     def remove_region(self, region):
         """! @brief Removes a memory region from the map.
@@ -539,6 +552,7 @@ class MemoryMap(object):
         for i, r in enumerate(self._regions):
             if r is region:
                 del self._regions[i]
+                self._generation += 1
 
     def get_boot_memory(self):
         """! @brief Returns the first region marked as boot memory.
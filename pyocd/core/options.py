@@ -41,11 +41,28 @@ OPTIONS_INFO = {
         "Log details of loaded .FLM flash algos."),
     'debug.traceback': OptionInfo('debug.traceback', bool, True,
         "Print tracebacks for exceptions."),
+    'dwarf_index_dir': OptionInfo('dwarf_index_dir', str, None,
+        "Directory in which to save indexes of the DWARF debug info of ELF files, so that source "
+        "lines and functions can be looked up without parsing the debug info again."),
     'enable_multicore_debug': OptionInfo('enable_multicore', bool, False,
         "Whether to put pyOCD into multicore debug mode."),
     'fast_program': OptionInfo('fast_program', bool, False,
         "Setting this option to True will use CRC checks of existing flash sector contents to "
         "determine whether pages need to be programmed."),
+    'flash_baseline_samples': OptionInfo('flash_baseline_samples', int, 4,
+        "Number of flash pages of a baseline image that are verified on the target before the "
+        "baseline is used to decide which pages to program."),
+    'flash_cache_dir': OptionInfo('flash_cache_dir', str, None,
+        "Directory in which to record hashes of the flash pages programmed to each device. Pages "
+        "recorded as unchanged are not analyzed when the same data is programmed again."),
+    'flash_cache_sentinels': OptionInfo('flash_cache_sentinels', int, 4,
+        "Number of flash pages recorded in the flash cache that are checked on the target before "
+        "the cache is used."),
+    'flash_verify': OptionInfo('flash_verify', bool, False,
+        "Verify flash contents after programming. The CRC32 analyzer is used if available, so only "
+        "pages that fail the CRC check are read back."),
+    'flash_verify_chunk_size': OptionInfo('flash_verify_chunk_size', int, 0x10000,
+        "Maximum number of bytes covered by each CRC computed on the target while verifying."),
     'frequency': OptionInfo('frequency', int, 1000000,
         "SWD/JTAG frequency in Hertz."),
     'hide_programming_progress': OptionInfo('hide_programming_progress', bool, False,
@@ -90,10 +107,17 @@ OPTIONS_INFO = {
         "swv_clock option."),
     'gdbserver_port': OptionInfo('gdbserver_port', int, 3333,
         "Base TCP port for the gdbserver."),
+    'gdbserver_transcript': OptionInfo('gdbserver_transcript', str, None,
+        "Path of a file to which all packets received from and sent to gdb are recorded with "
+        "timestamps."),
     'persist': OptionInfo('persist', bool, False,
         "If True, the GDB server will not exit after GDB disconnects."),
     'report_core_number': OptionInfo('report_core_number', bool, False,
         "Whether gdb server should report core number as part of the per-thread information."),
+    'rtos_snapshot_size': OptionInfo('rtos_snapshot_size', int, 0,
+        "Maximum size in bytes of the RAM region holding the RTOS kernel variables that is read in "
+        "a single transfer each time the thread list is built. Thread list reads within the "
+        "region are then served from the snapshot. 0 disables snapshots. Default is 0."),
     'semihost_console_type': OptionInfo('semihost_console_type', str, 'telnet',
         "If set to \"telnet\" then the semihosting telnet server will be started, otherwise "
         "semihosting will print to the console."),
@@ -104,6 +128,9 @@ OPTIONS_INFO = {
         "localhost."),
     'step_into_interrupt': OptionInfo('step_into_interrupt', bool, False,
         "Enable interrupts when performing step operations."),
+    'svd_cache_dir': OptionInfo('svd_cache_dir', str, None,
+        "Directory in which to cache devices parsed from SVD files, so later sessions don't parse "
+        "the same SVD file again."),
     'swv_clock': OptionInfo('swv_clock', int, 1000000,
         "Frequency in Hertz of the SWO baud rate. Default is 1 MHz."),
     'swv_system_clock': OptionInfo('swv_system_clock', int, None,
@@ -25,6 +25,7 @@ from ..utility.notification import Notification
 from .component import CoreSightCoreComponent
 from .fpb import FPB
 from .dwt import DWT
+from .range_step import (RangeStepCache, get_it_count)
 from .core_ids import CORE_TYPE_NAME
 from ..debug.breakpoints.manager import BreakpointManager
 from ..debug.breakpoints.software import SoftwareBreakpointProvider
@@ -425,6 +426,9 @@ class CortexM(Target, CoreSightCoreComponent):
         self.sw_bp = SoftwareBreakpointProvider(self)
         self.bp_manager = BreakpointManager(self)
         self.bp_manager.add_provider(self.sw_bp)
+        
+        # Cache of analyzed code ranges for range stepping.
+        self._range_step_cache = RangeStepCache(self)
 
     def add_child(self, cmp):
         """! @brief Connect related CoreSight components."""
@@ -629,6 +633,7 @@ class CortexM(Target, CoreSightCoreComponent):
         """! @brief Write a single memory location.
         
         By default the transfer size is a word."""
+        self._range_step_cache.invalidate_range(addr, transfer_size // 8)
         self.ap.write_memory(addr, value, transfer_size)
 
     def read_memory(self, addr, transfer_size=32, now=True):
@@ -655,10 +660,13 @@ class CortexM(Target, CoreSightCoreComponent):
 
     def write_memory_block8(self, addr, data):
         """! @brief Write a block of unaligned bytes in memory."""
+        self._range_step_cache.invalidate_range(addr, len(data), data)
         self.ap.write_memory_block8(addr, data)
 
     def write_memory_block32(self, addr, data):
         """! @brief Write an aligned block of 32-bit words."""
+        self._range_step_cache.invalidate_range(addr, len(data) * 4,
+                conversion.u32le_list_to_byte_list(data))
         self.ap.write_memory_block32(addr, data)
 
     def read_memory_block32(self, addr, size):
@@ -679,6 +687,12 @@ class CortexM(Target, CoreSightCoreComponent):
     def step(self, disable_interrupts=True, start=0, end=0):
         """! @brief Perform an instruction level step.
         
+        If a non-empty [start, end) address range is provided, the core is stepped until the PC
+        leaves the range, or another debug event occurs. When interrupts are disabled for the step,
+        the code in the range is analyzed to find every address at which execution can leave the
+        range, and the core is run with breakpoints at those addresses instead of being single
+        stepped through the range.
+        
         This function preserves the previous interrupt mask state.
         """
         # Was 'if self.get_state() != TARGET_HALTED:'
@@ -702,28 +716,21 @@ class CortexM(Target, CoreSightCoreComponent):
             self.write_memory(CortexM.DHCSR, CortexM.DBGKEY | CortexM.C_DEBUGEN | CortexM.C_HALT | CortexM.C_MASKINTS)
 
         # Single step using current C_MASKINTS setting
-        while True:
-            if disable_interrupts or interrupts_masked:
-                self.write_memory(CortexM.DHCSR, CortexM.DBGKEY | CortexM.C_DEBUGEN | CortexM.C_MASKINTS | CortexM.C_STEP)
-            else:
-                self.write_memory(CortexM.DHCSR, CortexM.DBGKEY | CortexM.C_DEBUGEN | CortexM.C_STEP)
+        maskints = disable_interrupts or interrupts_masked
+        if maskints:
+            dhcsr_step = CortexM.DBGKEY | CortexM.C_DEBUGEN | CortexM.C_MASKINTS | CortexM.C_STEP
+        else:
+            dhcsr_step = CortexM.DBGKEY | CortexM.C_DEBUGEN | CortexM.C_STEP
+
+        if start == end:
+            # Range is empty, 'range step' will degenerate to 'step'
+            self.write_memory(CortexM.DHCSR, dhcsr_step)
 
             # Wait for halt to auto set (This should be done before the first read)
             while not self.read_memory(CortexM.DHCSR) & CortexM.C_HALT:
                 pass
-
-            # Range is empty, 'range step' will degenerate to 'step'
-            if start == end:
-                break
-
-            # Read program counter and compare to [start, end)
-            program_counter = self.read_core_register(CORE_REGISTER['pc'])
-            if program_counter < start or end <= program_counter:
-                break
-
-            # Check other stop reasons
-            if self.read_memory(CortexM.DFSR) & (CortexM.DFSR_DWTTRAP | CortexM.DFSR_BKPT):
-                break
+        else:
+            self._range_step(start, end, dhcsr_step, maskints)
 	
         # Restore interrupt mask state
         if not interrupts_masked and disable_interrupts:
@@ -736,6 +743,118 @@ class CortexM(Target, CoreSightCoreComponent):
 
         self.session.notify(Target.Event.POST_RUN, self, Target.RunType.STEP)
 
+    def _pipelined_step(self, dhcsr_step):
+        """! @brief Single step and read the resulting PC and DFSR in one batch of transfers.
+        
+        The core completes a single step long before the following transfers reach it, so the PC
+        read is queued directly behind the step. DHCSR is read back to confirm that the core halted
+        and the register read completed; if not, the values are read again the slow way.
+        
+        @return Bi-tuple of (PC, DFSR).
+        """
+        self.write_memory(CortexM.DHCSR, dhcsr_step)
+        self.write_memory(CortexM.DCRSR, CORE_REGISTER['pc'])
+        dhcsr_cb = self.read_memory(CortexM.DHCSR, now=False)
+        pc_cb = self.read_memory(CortexM.DCRDR, now=False)
+        dfsr_cb = self.read_memory(CortexM.DFSR, now=False)
+        dhcsr = dhcsr_cb()
+        pc = pc_cb()
+        dfsr = dfsr_cb()
+        if (dhcsr & (CortexM.S_HALT | CortexM.S_REGRDY)) != (CortexM.S_HALT | CortexM.S_REGRDY):
+            while not self.read_memory(CortexM.DHCSR) & CortexM.C_HALT:
+                pass
+            pc = self.read_core_register('pc')
+            dfsr = self.read_memory(CortexM.DFSR)
+        return pc, dfsr
+
+    def _range_step(self, start, end, dhcsr_step, maskints):
+        """! @brief Step the core until the PC leaves [start, end).
+        
+        At least one instruction is always stepped. Runs through the range are only possible with
+        interrupts masked; otherwise an interrupt handler could execute without reaching any of the
+        exit breakpoints. Instructions whose successor cannot be determined, and any part of the
+        range for which there are not enough breakpoints to cover the exits, are single stepped.
+        """
+        pc, dfsr = self._pipelined_step(dhcsr_step)
+        while True:
+            if (pc < start) or (end <= pc):
+                return
+            if dfsr & (CortexM.DFSR_DWTTRAP | CortexM.DFSR_BKPT):
+                return
+
+            plan = None
+            if maskints:
+                it_count = get_it_count(self.read_core_register('xpsr'))
+                plan = self._range_step_cache.get_analyzer(start, end).get_plan(pc, it_count)
+                if pc in plan.stops:
+                    plan = None
+            if plan is None or not self._run_to_range_exit(plan, dhcsr_step):
+                pc, dfsr = self._pipelined_step(dhcsr_step)
+                continue
+
+            pc = self.read_core_register('pc')
+            dfsr = self.read_memory(CortexM.DFSR)
+            if dfsr & (CortexM.DFSR_DWTTRAP | CortexM.DFSR_VCATCH | CortexM.DFSR_EXTERNAL
+                        | CortexM.DFSR_HALTED):
+                return
+            if (pc in plan.stops) and (self.bp_manager.find_breakpoint(pc) is None):
+                # Halted on an instruction we could not analyze. Step over it and continue.
+                self.clear_debug_cause_bits()
+                pc, dfsr = self._pipelined_step(dhcsr_step)
+            elif dfsr & CortexM.DFSR_BKPT and pc not in plan.exits:
+                # Some other breakpoint.
+                return
+
+    def _run_to_range_exit(self, plan, dhcsr_step):
+        """! @brief Run the core with temporary breakpoints on all addresses of a range step plan.
+        
+        Fault exceptions are caught with vector catch while running, so that a fault within the range
+        halts the core the same as when single stepping into the handler.
+        
+        @retval True The core ran and is halted again.
+        @retval False Breakpoints could not be set on every address; the core was not run.
+        """
+        # Set temporary breakpoints on every address without an existing breakpoint. Whatever
+        # happens while the core runs, the breakpoints and DEMCR are restored afterwards.
+        temp_bps = []
+        demcr = None
+        try:
+            success = True
+            for addr in plan.addresses:
+                if self.bp_manager.find_breakpoint(addr) is not None:
+                    continue
+                if not self.bp_manager.set_breakpoint(addr):
+                    success = False
+                    break
+                temp_bps.append(addr)
+            if success:
+                self.bp_manager.flush(is_step=True)
+                success = all(self.bp_manager.find_breakpoint(addr) is not None for addr in temp_bps)
+
+            if success:
+                demcr = self.read_memory(CortexM.DEMCR)
+                self.write_memory(CortexM.DEMCR, demcr | CortexM.DEMCR_VC_HARDERR | CortexM.DEMCR_VC_INTERR
+                        | CortexM.DEMCR_VC_BUSERR | CortexM.DEMCR_VC_STATERR | CortexM.DEMCR_VC_CHKERR
+                        | CortexM.DEMCR_VC_NOCPERR | CortexM.DEMCR_VC_MMERR)
+                self.clear_debug_cause_bits()
+                self.write_memory(CortexM.DHCSR, dhcsr_step & ~CortexM.C_STEP)
+                while True:
+                    dhcsr = self.read_memory(CortexM.DHCSR)
+                    if dhcsr & CortexM.S_HALT:
+                        break
+                    if dhcsr & CortexM.S_LOCKUP:
+                        self.write_memory(CortexM.DHCSR, dhcsr_step & ~CortexM.C_STEP | CortexM.C_HALT)
+        finally:
+            if demcr is not None:
+                self.write_memory(CortexM.DEMCR, demcr)
+
+            # Remove the temporary breakpoints.
+            for addr in temp_bps:
+                self.bp_manager.remove_breakpoint(addr)
+            if temp_bps:
+                self.bp_manager.flush(is_step=True)
+        return success
+
     def clear_debug_cause_bits(self):
         self.write_memory(CortexM.DFSR, CortexM.DFSR_VCATCH | CortexM.DFSR_DWTTRAP | CortexM.DFSR_BKPT | CortexM.DFSR_HALTED)
     
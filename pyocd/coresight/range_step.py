@@ -0,0 +1,357 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+
+from ..core.target import Target
+
+LOG = logging.getLogger(__name__)
+
+def _sign_extend(value, bits):
+    sign = 1 << (bits - 1)
+    return (value & (sign - 1)) - (value & sign)
+
+def _it_mask_count(mask):
+    """! @brief Number of instructions covered by a 4-bit IT mask, or 0 if the mask is 0."""
+    if mask == 0:
+        return 0
+    return 4 - ((mask & -mask).bit_length() - 1)
+
+def get_it_count(xpsr):
+    """! @brief Number of instructions left in the IT block the core is executing.
+
+    @param xpsr Value of the xPSR register.
+    @return The number of instructions, including the next one to execute, that are still
+        conditional on the current IT block. 0 if the core is not within an IT block.
+    """
+    # IT[3:0] is held in EPSR[11:10] and EPSR[26:25].
+    return _it_mask_count((((xpsr >> 10) & 0x3) << 2) | ((xpsr >> 25) & 0x3))
+
+class ThumbInstruction(object):
+    """! @brief Control flow summary of a single decoded Thumb instruction.
+
+    Only the properties required to determine where execution can go after the instruction
+    are decoded.
+    """
+
+    ## The instruction only falls through to the next instruction.
+    NORMAL = 0
+    ## Direct branch with a known target. Execution continues at the target.
+    BRANCH = 1
+    ## Conditional direct branch. Execution continues at either the target or the next instruction.
+    CONDITIONAL_BRANCH = 2
+    ## Direct call. Execution leaves for the target.
+    CALL = 3
+    ## Execution continues at a location that cannot be determined statically, or the instruction
+    # raises an exception.
+    UNKNOWN = 4
+
+    def __init__(self, addr, size, kind, target=None, it_count=0):
+        self.addr = addr
+        self.size = size
+        self.kind = kind
+        self.target = target
+        ## For an IT instruction, the number of following instructions that it makes conditional.
+        self.it_count = it_count
+
+    @property
+    def next_addr(self):
+        return self.addr + self.size
+
+    def __repr__(self):
+        return "<%s@0x%x addr=0x%08x size=%d kind=%d target=%s>" % (self.__class__.__name__,
+            id(self), self.addr, self.size, self.kind,
+            ("0x%08x" % self.target) if (self.target is not None) else None)
+
+def _is_32bit(hw1):
+    return (hw1 & 0xf800) in (0xe800, 0xf000, 0xf800)
+
+def decode_thumb_instruction(addr, hw1, hw2=None):
+    """! @brief Decode the control flow effects of a Thumb instruction.
+
+    @param addr Address of the instruction.
+    @param hw1 First halfword of the instruction.
+    @param hw2 Second halfword of the instruction. Required if the first halfword is the start of a
+        32-bit instruction.
+    @return ThumbInstruction object.
+    """
+    pc = addr + 4
+
+    # 16-bit instructions.
+    if not _is_32bit(hw1):
+        op = hw1 & 0xff00
+        # B<c> (T1), UDF, SVC
+        if (hw1 & 0xf000) == 0xd000:
+            if op in (0xde00, 0xdf00):
+                return ThumbInstruction(addr, 2, ThumbInstruction.UNKNOWN)
+            target = pc + _sign_extend((hw1 & 0xff) << 1, 9)
+            return ThumbInstruction(addr, 2, ThumbInstruction.CONDITIONAL_BRANCH, target)
+        # B (T2)
+        elif (hw1 & 0xf800) == 0xe000:
+            target = pc + _sign_extend((hw1 & 0x7ff) << 1, 12)
+            return ThumbInstruction(addr, 2, ThumbInstruction.BRANCH, target)
+        # CBZ, CBNZ
+        elif (hw1 & 0xf500) == 0xb100:
+            target = pc + ((((hw1 >> 9) & 1) << 6) | (((hw1 >> 3) & 0x1f) << 1))
+            return ThumbInstruction(addr, 2, ThumbInstruction.CONDITIONAL_BRANCH, target)
+        # BX, BLX, BXNS, BLXNS (register), POP with PC, BKPT
+        elif op in (0x4700, 0xbd00, 0xbe00):
+            return ThumbInstruction(addr, 2, ThumbInstruction.UNKNOWN)
+        # ADD, MOV (high register) with PC as the destination.
+        elif op in (0x4400, 0x4600) and ((((hw1 >> 4) & 0x8) | (hw1 & 0x7)) == 15):
+            return ThumbInstruction(addr, 2, ThumbInstruction.UNKNOWN)
+        # IT. Hints share the encoding with a zero mask.
+        elif op == 0xbf00 and (hw1 & 0xf):
+            return ThumbInstruction(addr, 2, ThumbInstruction.NORMAL, it_count=_it_mask_count(hw1 & 0xf))
+        else:
+            return ThumbInstruction(addr, 2, ThumbInstruction.NORMAL)
+
+    assert hw2 is not None
+
+    # Branches and miscellaneous control.
+    if (hw1 & 0xf800) == 0xf000 and (hw2 & 0x8000):
+        s = (hw1 >> 10) & 1
+        j1 = (hw2 >> 13) & 1
+        j2 = (hw2 >> 11) & 1
+        op1 = hw2 & 0x5000
+        if op1 == 0x0000:
+            # B<c> (T3), unless the condition field encodes miscellaneous control instructions.
+            if (hw1 & 0x0380) != 0x0380:
+                offset = (s << 20) | (j2 << 19) | (j1 << 18) | ((hw1 & 0x3f) << 12) | ((hw2 & 0x7ff) << 1)
+                target = pc + _sign_extend(offset, 21)
+                return ThumbInstruction(addr, 4, ThumbInstruction.CONDITIONAL_BRANCH, target)
+            # UDF.W
+            elif (hw1 & 0xfff0) == 0xf7f0 and (hw2 & 0xf000) == 0xa000:
+                return ThumbInstruction(addr, 4, ThumbInstruction.UNKNOWN)
+            # MSR, MRS, hints, barriers.
+            else:
+                return ThumbInstruction(addr, 4, ThumbInstruction.NORMAL)
+        elif op1 in (0x1000, 0x5000):
+            # B (T4), BL
+            i1 = 1 ^ (j1 ^ s)
+            i2 = 1 ^ (j2 ^ s)
+            offset = (s << 24) | (i1 << 23) | (i2 << 22) | ((hw1 & 0x3ff) << 12) | ((hw2 & 0x7ff) << 1)
+            target = pc + _sign_extend(offset, 25)
+            kind = ThumbInstruction.CALL if (op1 == 0x5000) else ThumbInstruction.BRANCH
+            return ThumbInstruction(addr, 4, kind, target)
+        else:
+            # BLX (immediate) is undefined on M-profile, and v8.1-M loop instructions are not
+            # analyzed.
+            return ThumbInstruction(addr, 4, ThumbInstruction.UNKNOWN)
+    # TBB, TBH
+    elif (hw1 & 0xfff0) == 0xe8d0 and (hw2 & 0xffe0) == 0xf000:
+        return ThumbInstruction(addr, 4, ThumbInstruction.UNKNOWN)
+    # LDM, LDMDB (including POP.W) with PC in the register list.
+    elif (hw1 & 0xffd0) in (0xe890, 0xe910) and (hw2 & 0x8000):
+        return ThumbInstruction(addr, 4, ThumbInstruction.UNKNOWN)
+    # LDR (immediate, literal, register) with PC as the destination.
+    elif (hw1 & 0xff70) == 0xf850 and (hw2 & 0xf000) == 0xf000:
+        return ThumbInstruction(addr, 4, ThumbInstruction.UNKNOWN)
+    else:
+        return ThumbInstruction(addr, 4, ThumbInstruction.NORMAL)
+
+class RangeStepPlan(object):
+    """! @brief Set of addresses at which to halt while running through an address range.
+
+    @a exits contains the addresses outside of the range that execution can reach directly from
+    code within the range. @a stops contains the addresses of instructions within the range whose
+    successor cannot be determined; these instructions must be single stepped.
+    """
+
+    def __init__(self, exits, stops):
+        self.exits = exits
+        self.stops = stops
+
+    @property
+    def addresses(self):
+        return self.exits | self.stops
+
+    def __repr__(self):
+        return "<%s@0x%x exits=[%s] stops=[%s]>" % (self.__class__.__name__, id(self),
+            ", ".join("0x%08x" % a for a in sorted(self.exits)),
+            ", ".join("0x%08x" % a for a in sorted(self.stops)))
+
+class RangeStepAnalyzer(object):
+    """! @brief Determines the exit points of a range of Thumb code.
+
+    The code in the range is read once with a single block read. Instructions are decoded
+    on demand by following every path reachable from an entry address, so literal pools and
+    other data embedded in the range are never decoded as instructions.
+    """
+
+    def __init__(self, start, end, code):
+        self._start = start
+        self._end = end
+        self._code = code
+        self._instructions = {}
+        self._plans = {}
+
+    @property
+    def start(self):
+        return self._start
+
+    @property
+    def end(self):
+        return self._end
+
+    def contains(self, addr):
+        return self._start <= addr < self._end
+
+    def matches(self, addr, data):
+        """! @brief Whether data at an address equals the analyzed code wherever the two overlap."""
+        start = max(addr, self._start)
+        end = min(addr + len(data), self._end)
+        return (bytearray(data[start - addr:end - addr])
+                == bytearray(self._code[start - self._start:end - self._start]))
+
+    def _halfword(self, addr):
+        offset = addr - self._start
+        return self._code[offset] | (self._code[offset + 1] << 8)
+
+    def get_instruction(self, addr):
+        """! @brief Return the decoded instruction at an address within the range.
+
+        None is returned if the instruction extends past the end of the range.
+        """
+        try:
+            return self._instructions[addr]
+        except KeyError:
+            pass
+        if addr + 2 > self._end:
+            instr = None
+        else:
+            hw1 = self._halfword(addr)
+            if not _is_32bit(hw1):
+                instr = decode_thumb_instruction(addr, hw1)
+            elif addr + 4 > self._end:
+                instr = None
+            else:
+                instr = decode_thumb_instruction(addr, hw1, self._halfword(addr + 2))
+        self._instructions[addr] = instr
+        return instr
+
+    def get_plan(self, entry, it_count=0):
+        """! @brief Compute the range step plan for execution starting at @a entry.
+
+        Instructions within an IT block are conditional, so an unconditional branch or call that
+        ends an IT block may also fall through to the next instruction. The IT state is tracked
+        while following paths from IT instructions within the range.
+
+        @param self
+        @param entry Address at which execution starts.
+        @param it_count Number of instructions starting with @a entry that are within an IT block,
+            as returned by get_it_count().
+        """
+        key = (entry, it_count)
+        try:
+            return self._plans[key]
+        except KeyError:
+            pass
+
+        exits = set()
+        stops = set()
+        visited = set()
+        pending = [key]
+        while pending:
+            item = pending.pop()
+            if item in visited:
+                continue
+            visited.add(item)
+            addr, itCount = item
+            if not self.contains(addr):
+                exits.add(addr)
+                continue
+
+            instr = self.get_instruction(addr)
+            if instr is None or instr.kind == ThumbInstruction.UNKNOWN:
+                stops.add(addr)
+                continue
+
+            kind = instr.kind
+            if itCount:
+                nextItCount = itCount - 1
+                if kind in (ThumbInstruction.BRANCH, ThumbInstruction.CALL):
+                    kind = ThumbInstruction.CONDITIONAL_BRANCH
+            else:
+                nextItCount = instr.it_count
+
+            if kind in (ThumbInstruction.BRANCH, ThumbInstruction.CONDITIONAL_BRANCH,
+                                ThumbInstruction.CALL):
+                pending.append((instr.target, 0))
+            if kind in (ThumbInstruction.NORMAL, ThumbInstruction.CONDITIONAL_BRANCH):
+                pending.append((instr.next_addr, nextItCount))
+            # A call returns to the next instruction, but execution is outside of the range
+            # until then, so the return address does not need to be covered.
+
+        plan = RangeStepPlan(exits, stops)
+        LOG.debug("range step plan for [0x%08x, 0x%08x) from 0x%08x: %s", self._start, self._end,
+            entry, plan)
+        self._plans[key] = plan
+        return plan
+
+class RangeStepCache(object):
+    """! @brief Caches range step analyzers for a core.
+
+    Cached code is discarded when a write through the core changes a cached range, and on
+    any reset or flash programming operation. Code modified by the target itself is not detected.
+    """
+
+    ## Maximum number of ranges to keep.
+    MAX_RANGES = 32
+
+    def __init__(self, core):
+        self._core = core
+        self._analyzers = {}
+
+        core.session.subscribe(self._invalidate_handler, Target.Event.POST_RESET)
+        core.session.subscribe(self._invalidate_handler, Target.Event.POST_FLASH_PROGRAM)
+
+    def get_analyzer(self, start, end):
+        """! @brief Return the analyzer for the range [start, end), reading its code if needed."""
+        key = (start, end)
+        try:
+            return self._analyzers[key]
+        except KeyError:
+            pass
+        if len(self._analyzers) >= self.MAX_RANGES:
+            self._analyzers.clear()
+        code = self._core.read_memory_block8(start, end - start)
+        analyzer = RangeStepAnalyzer(start, end, code)
+        self._analyzers[key] = analyzer
+        return analyzer
+
+    def invalidate_range(self, addr, length, data=None):
+        """! @brief Discard cached ranges that overlap [addr, addr+length).
+
+        If the written bytes are provided, ranges whose code they leave unchanged are kept. The
+        bytes are passed through the core's breakpoint filter first, so the software breakpoint
+        provider inserting or removing BKPT instructions does not discard the range being stepped.
+        """
+        if not self._analyzers:
+            return
+        end = addr + length
+        keys = [k for k in self._analyzers if (k[0] < end) and (addr < k[1])]
+        if keys and data is not None:
+            data = self._core.bp_manager.filter_memory_unaligned_8(addr, length, list(data))
+            keys = [k for k in keys if not self._analyzers[k].matches(addr, data)]
+        for key in keys:
+            del self._analyzers[key]
+
+    def invalidate(self):
+        self._analyzers.clear()
+
+    def _invalidate_handler(self, notification):
+        self.invalidate()
@@ -39,6 +39,10 @@ class BreakpointManager(object):
     add/remove request is recorded for later. Then, before the target is stepped or resumed, the
     manager flushes breakpoint changes to the target. It is at this point when it decides which
     provider to use for each new breakpoint.
+
+    Pending additions and removals are tracked as they are requested, so a flush with no changes
+    does nothing. Breakpoints are passed to providers in batches, which lets the software
+    breakpoint provider combine the memory accesses for breakpoints that are close together.
     """
 
     ## Number of hardware breakpoints to try to keep available.
@@ -47,6 +51,8 @@ class BreakpointManager(object):
     def __init__(self, core):
         self._breakpoints = {}
         self._updated_breakpoints = {}
+        self._added = {}
+        self._removed = {}
         self._session = core.session
         self._core = core
         self._fpb = None
@@ -75,7 +81,7 @@ class BreakpointManager(object):
         @retval True Breakpoint was set.
         @retval False Breakpoint could not be set.
         """
-        LOG.debug("set bkpt type %d at 0x%x", type, addr)
+        LOG.debug("set bkpt type %s at 0x%x", type, addr)
 
         # Clear Thumb bit in case it is set.
         addr = addr & ~1
@@ -88,6 +94,7 @@ class BreakpointManager(object):
         # Reuse breakpoint objects from the live list.
         if addr in self._breakpoints:
             bp = self._breakpoints[addr]
+            self._removed.pop(addr, None)
         else:
             # Create temp bp object. This will be replaced with the real object once
             # breakpoints are flushed and the provider sets the bp.
@@ -98,6 +105,7 @@ class BreakpointManager(object):
             # Check whether this breakpoint can be added when we flush.
             if not self._check_added_breakpoint(bp):
                 return False
+            self._added[addr] = bp
 
         self._updated_breakpoints[addr] = bp
         return True
@@ -141,29 +149,17 @@ class BreakpointManager(object):
             addr = addr & ~1
 
             # Remove bp from dict.
-            del self._updated_breakpoints[addr]
+            bp = self._updated_breakpoints.pop(addr)
+            if self._added.pop(addr, None) is None:
+                self._removed[addr] = bp
         except KeyError:
             LOG.debug("Tried to remove breakpoint 0x%08x that wasn't set" % addr)
 
     def _get_updated_breakpoints(self):
-        """! @brief Compute added and removed breakpoints since last flush.
+        """! @brief Return added and removed breakpoints since last flush.
         @return Bi-tuple of (added breakpoint list, removed breakpoint list).
         """
-        added = []
-        removed = []
-
-        # Get added breakpoints.
-        for bp in self._updated_breakpoints.values():
-            if not bp.addr in self._breakpoints:
-                added.append(bp)
-
-        # Get removed breakpoints.
-        for bp in self._breakpoints.values():
-            if not bp.addr in self._updated_breakpoints:
-                removed.append(bp)
-
-        # Return the list of pages to update.
-        return added, removed
+        return list(self._added.values()), list(self._removed.values())
 
     def _select_breakpoint_type(self, bp, allow_all_hw_bps):
         type = bp.type
@@ -199,7 +195,7 @@ class BreakpointManager(object):
             else:
                 type = Target.BreakpointType.HW
 
-            LOG.debug("using type %d for auto bp", type)
+            LOG.debug("using type %s for auto bp", type)
 
         # Revert to sw bp if out of hardware breakpoint range.
         if (type == Target.BreakpointType.HW) and not in_hw_bkpt_range:
@@ -219,43 +215,55 @@ class BreakpointManager(object):
                 LOG.debug("could not fallback to hardware breakpoint")
                 return None
 
-        LOG.debug("selected bkpt type %d for addr 0x%x", type, bp.addr)
+        LOG.debug("selected bkpt type %s for addr 0x%x", type, bp.addr)
         return type
 
     def flush(self, is_step=False):
+        if not (self._added or self._removed):
+            return
+
         try:
             # Ignore any notifications while we modify breakpoints.
             self._ignore_notifications = True
 
             added, removed = self._get_updated_breakpoints()
             LOG.debug("added=%s removed=%s", added, removed)
+            self._added = {}
+            self._removed = {}
 
             # Handle removed breakpoints first by asking the providers to remove them.
+            removed_by_provider = {}
             for bp in removed:
                 assert bp.provider is not None
-                bp.provider.remove_breakpoint(bp)
+                removed_by_provider.setdefault(bp.provider, []).append(bp)
                 del self._breakpoints[bp.addr]
+            for provider, bps in removed_by_provider.items():
+                provider.remove_breakpoints(bps)
 
             # Only allow use of all hardware breakpoints if we're not stepping and there is
             # only a single added breakpoint.
             allow_all_hw_bps = not is_step and len(added) == 1
 
-            # Now handle added breakpoints.
+            # Now handle added breakpoints. Hardware breakpoints are set immediately because the
+            # type selected for following breakpoints depends on how many remain available. Other
+            # types are gathered and set in one batch per provider.
+            added_by_provider = {}
             for bp in added:
                 type = self._select_breakpoint_type(bp, allow_all_hw_bps)
                 if type is None:
                     continue
 
-                # Set the bp.
                 try:
                     provider = self._providers[type]
-                    bp = provider.set_breakpoint(bp.addr)
                 except KeyError:
-                    raise ValueError("Unknown breakpoint type %d" % type)
+                    raise ValueError("Unknown breakpoint type %s" % type)
 
-                # Save the bp.
-                if bp is not None:
-                    self._breakpoints[bp.addr] = bp
+                if type == Target.BreakpointType.HW:
+                    self._save_breakpoints([provider.set_breakpoint(bp.addr)])
+                else:
+                    added_by_provider.setdefault(provider, []).append(bp.addr)
+            for provider, addrs in added_by_provider.items():
+                self._save_breakpoints(provider.set_breakpoints(addrs))
 
             # Update breakpoint lists.
             LOG.debug("bps after flush=%s", self._breakpoints)
@@ -266,6 +274,11 @@ class BreakpointManager(object):
         finally:
             self._ignore_notifications = False
 
+    def _save_breakpoints(self, bps):
+        for bp in bps:
+            if bp is not None:
+                self._breakpoints[bp.addr] = bp
+
     def get_breakpoint_type(self, addr):
         bp = self.find_breakpoint(addr)
         return bp.type if (bp is not None) else None
@@ -277,23 +290,28 @@ class BreakpointManager(object):
 
     def filter_memory_unaligned_8(self, addr, size, data):
         for provider in [p for p in self._providers.values() if p.do_filter_memory]:
-            for i, d in enumerate(data):
-                data[i] = provider.filter_memory(addr + i, 8, d)
+            data = provider.filter_memory_unaligned_8(addr, size, data)
         return data
 
     def filter_memory_aligned_32(self, addr, size, data):
         for provider in [p for p in self._providers.values() if p.do_filter_memory]:
-            for i, d in enumerate(data):
-                data[i] = provider.filter_memory(addr + i, 32, d)
+            data = provider.filter_memory_aligned_32(addr, size, data)
         return data
 
     def remove_all_breakpoints(self):
         """! @brief Remove all breakpoints immediately."""
+        removed_by_provider = {}
         for bp in self._breakpoints.values():
-            bp.provider.remove_breakpoint(bp)
+            removed_by_provider.setdefault(bp.provider, []).append(bp)
+        for provider, bps in removed_by_provider.items():
+            provider.remove_breakpoints(bps)
         self._breakpoints = {}
         self._flush_all()
 
+        # Breakpoints that have been requested are installed again on the next flush.
+        self._added = copy(self._updated_breakpoints)
+        self._removed = {}
+
     def _flush_all(self):
         # Flush all providers.
         for provider in self._providers.values():
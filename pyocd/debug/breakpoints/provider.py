@@ -25,7 +25,7 @@ class Breakpoint(object):
         self.provider = provider
 
     def __repr__(self):
-        return "<%s@0x%08x type=%d addr=0x%08x>" % (self.__class__.__name__, id(self), self.type, self.addr)
+        return "<%s@0x%08x type=%s addr=0x%08x>" % (self.__class__.__name__, id(self), self.type, self.addr)
 
 class BreakpointProvider(object):
     """! @brief Abstract base class for breakpoint providers."""
@@ -52,9 +52,38 @@ class BreakpointProvider(object):
     def remove_breakpoint(self, bp):
         raise NotImplementedError()
 
+    def set_breakpoints(self, addrs):
+        """! @brief Set multiple breakpoints.
+
+        Providers that can combine the target accesses for several breakpoints override this
+        method. The default implementation sets each breakpoint individually.
+
+        @return List of breakpoint objects in the same order as @a addrs. An entry is None if the
+            corresponding breakpoint could not be set.
+        """
+        return [self.set_breakpoint(addr) for addr in addrs]
+
+    def remove_breakpoints(self, bps):
+        """! @brief Remove multiple breakpoints.
+
+        The default implementation removes each breakpoint individually.
+        """
+        for bp in bps:
+            self.remove_breakpoint(bp)
+
     def filter_memory(self, addr, size, data):
         return data
 
+    def filter_memory_unaligned_8(self, addr, size, data):
+        for i, d in enumerate(data):
+            data[i] = self.filter_memory(addr + i, 8, d)
+        return data
+
+    def filter_memory_aligned_32(self, addr, size, data):
+        for i, d in enumerate(data):
+            data[i] = self.filter_memory(addr + i * 4, 32, d)
+        return data
+
     def flush(self):
         pass
 
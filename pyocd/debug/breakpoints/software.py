@@ -17,6 +17,7 @@
 from .provider import (Breakpoint, BreakpointProvider)
 from ...core import exceptions
 from ...core.target import Target
+import bisect
 import logging
 
 LOG = logging.getLogger(__name__)
@@ -27,13 +28,24 @@ class SoftwareBreakpoint(Breakpoint):
         self.type = Target.BreakpointType.SW
 
 class SoftwareBreakpointProvider(BreakpointProvider):
+    """! @brief Breakpoint provider that inserts BKPT instructions into RAM.
+
+    Breakpoints that are close to each other in the same memory region are set and removed with
+    a single block read and write of the memory spanning them. A sorted list of breakpoint
+    addresses is kept alongside the breakpoint dict so memory reads can be filtered by bisection.
+    """
+
     ## BKPT #0 instruction.
     BKPT_INSTR = 0xbe00
 
+    ## Maximum number of bytes between two breakpoints for them to be updated with one transfer.
+    MAX_GAP = 64
+
     def __init__(self, core):
         super(SoftwareBreakpointProvider, self).__init__()
         self._core = core
         self._breakpoints = {}
+        self._sorted_addrs = []
 
     def init(self):
         pass
@@ -54,58 +66,140 @@ class SoftwareBreakpointProvider(BreakpointProvider):
         return self._breakpoints.get(addr, None)
 
     def set_breakpoint(self, addr):
-        assert self._core.memory_map.get_region_for_address(addr).is_ram
-        assert (addr & 1) == 0
-
-        try:
-            # Read original instruction.
-            instr = self._core.read16(addr)
-
-            # Insert BKPT #0 instruction.
-            self._core.write16(addr, self.BKPT_INSTR)
-
-            # Create bp object.
-            bp = SoftwareBreakpoint(self)
-            bp.enabled = True
-            bp.addr = addr
-            bp.original_instr = instr
-
-            # Save this breakpoint.
-            self._breakpoints[addr] = bp
-            return bp
-        except exceptions.TransferError:
-            LOG.debug("Failed to set sw bp at 0x%x" % addr)
-            return None
+        return self.set_breakpoints([addr])[0]
 
     def remove_breakpoint(self, bp):
         assert bp is not None and isinstance(bp, Breakpoint)
-
-        try:
-            # Restore original instruction.
-            self._core.write16(bp.addr, bp.original_instr)
-
-            # Remove from our list.
-            del self._breakpoints[bp.addr]
-        except exceptions.TransferError:
-            LOG.debug("Failed to remove sw bp at 0x%x" % bp.addr)
+        self.remove_breakpoints([bp])
+
+    def set_breakpoints(self, addrs):
+        results = {}
+        for start, end, span_addrs in self._get_spans(addrs):
+            try:
+                # Read original instructions. Existing breakpoints are filtered out by the read.
+                data = self._core.read_memory_block8(start, end - start)
+
+                for addr in span_addrs:
+                    offset = addr - start
+                    bp = SoftwareBreakpoint(self)
+                    bp.enabled = True
+                    bp.addr = addr
+                    bp.original_instr = data[offset] | (data[offset + 1] << 8)
+                    self._add(bp)
+                    results[addr] = bp
+
+                # Insert BKPT #0 instructions.
+                self._write_span(start, data)
+            except exceptions.TransferError:
+                LOG.debug("Failed to set sw bps in range 0x%x-0x%x", start, end - 1)
+                for addr in span_addrs:
+                    self._remove(addr)
+                    results[addr] = None
+        return [results.get(addr, None) for addr in addrs]
+
+    def remove_breakpoints(self, bps):
+        for start, end, span_addrs in self._get_spans(bp.addr for bp in bps):
+            try:
+                # Read memory with original instructions in place of all breakpoints.
+                data = self._core.read_memory_block8(start, end - start)
+
+                # Restore original instructions, keeping any other breakpoints in the range.
+                for addr in span_addrs:
+                    self._remove(addr)
+                self._write_span(start, data)
+            except exceptions.TransferError:
+                LOG.debug("Failed to remove sw bps in range 0x%x-0x%x", start, end - 1)
+
+    def _add(self, bp):
+        self._breakpoints[bp.addr] = bp
+        bisect.insort(self._sorted_addrs, bp.addr)
+
+    def _remove(self, addr):
+        if self._breakpoints.pop(addr, None) is not None:
+            del self._sorted_addrs[bisect.bisect_left(self._sorted_addrs, addr)]
+
+    def _get_spans(self, addrs):
+        """! @brief Group breakpoint addresses into ranges to update with one transfer each.
+        @return List of (start, end, addr list) tuples, where end is exclusive.
+        """
+        spans = []
+        last_region = None
+        for addr in sorted(addrs):
+            region = self._core.memory_map.get_region_for_address(addr)
+            assert region.is_ram
+            assert (addr & 1) == 0
+            if spans and (region is last_region) and (addr - spans[-1][1] <= self.MAX_GAP):
+                spans[-1][1] = addr + 2
+                spans[-1][2].append(addr)
+            else:
+                spans.append([addr, addr + 2, [addr]])
+            last_region = region
+        return [tuple(s) for s in spans]
+
+    def _write_span(self, start, data):
+        """! @brief Write a range of memory with BKPT instructions at all current breakpoints."""
+        end = start + len(data)
+        addrs = self._sorted_addrs
+        i = bisect.bisect_left(addrs, start)
+        while i < len(addrs) and addrs[i] < end:
+            offset = addrs[i] - start
+            data[offset] = self.BKPT_INSTR & 0xff
+            data[offset + 1] = self.BKPT_INSTR >> 8
+            i += 1
+        self._core.write_memory_block8(start, data)
 
     def filter_memory(self, addr, size, data):
-        for bp in self._breakpoints.values():
-            if size == 8:
-                if bp.addr == addr:
-                    data = bp.original_instr & 0xff
-                elif bp.addr + 1 == addr:
+        bps = self._breakpoints
+        if not bps:
+            return data
+        if size == 8:
+            bp = bps.get(addr)
+            if bp is not None:
+                data = bp.original_instr & 0xff
+            else:
+                bp = bps.get(addr - 1)
+                if bp is not None:
                     data = bp.original_instr >> 8
-            elif size == 16:
-                if bp.addr == addr:
-                    data = bp.original_instr
-            elif size == 32:
-                if bp.addr == addr:
-                    data = (data & 0xffff0000) | bp.original_instr
-                elif bp.addr == addr + 2:
-                    data = (data & 0xffff) | (bp.original_instr << 16)
-
+        elif size == 16:
+            bp = bps.get(addr)
+            if bp is not None:
+                data = bp.original_instr
+        elif size == 32:
+            bp = bps.get(addr)
+            if bp is not None:
+                data = (data & 0xffff0000) | bp.original_instr
+            bp = bps.get(addr + 2)
+            if bp is not None:
+                data = (data & 0xffff) | (bp.original_instr << 16)
         return data
 
+    def filter_memory_unaligned_8(self, addr, size, data):
+        addrs = self._sorted_addrs
+        end = addr + size
+        # Start one byte early to catch a breakpoint whose upper byte is the first byte read.
+        i = bisect.bisect_left(addrs, addr - 1)
+        while i < len(addrs) and addrs[i] < end:
+            instr = self._breakpoints[addrs[i]].original_instr
+            offset = addrs[i] - addr
+            if offset >= 0:
+                data[offset] = instr & 0xff
+            if offset + 1 < size:
+                data[offset + 1] = instr >> 8
+            i += 1
+        return data
 
+    def filter_memory_aligned_32(self, addr, size, data):
+        addrs = self._sorted_addrs
+        end = addr + size * 4
+        i = bisect.bisect_left(addrs, addr)
+        while i < len(addrs) and addrs[i] < end:
+            instr = self._breakpoints[addrs[i]].original_instr
+            offset = addrs[i] - addr
+            index = offset >> 2
+            if offset & 2:
+                data[index] = (data[index] & 0xffff) | (instr << 16)
+            else:
+                data[index] = (data[index] & 0xffff0000) | instr
+            i += 1
+        return data
 
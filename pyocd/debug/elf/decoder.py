@@ -14,13 +14,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import bisect
+import errno
+import hashlib
+import struct
 import sys
 import os
 from elftools.elf.elffile import ELFFile
 from elftools.dwarf.constants import DW_LNE_set_address
-from intervaltree import IntervalTree
 from collections import namedtuple
-from itertools import islice
+from .dwarf_index import (DwarfIndex, DwarfIndexBuilder)
 import logging
 
 LOG = logging.getLogger(__name__)
@@ -30,27 +33,52 @@ LineInfo = namedtuple('LineInfo', 'cu filename dirname line')
 SymbolInfo = namedtuple('SymbolInfo', 'name address size type')
 
 class ElfSymbolDecoder(object):
+    """! @brief Looks up function and object symbols of an ELF file by name or address.
+
+    Nothing is read from the symbol table until the first lookup. Name lookups are served from a
+    dict built in a single pass over the raw `.symtab` entries, which avoids parsing each symbol
+    with pyelftools. Address lookups use lists sorted by symbol address that are built from the
+    same symbols on first use.
+    """
+
+    ## Values of the symbol type field of st_info for the symbol types that are kept.
+    _SYMBOL_TYPES = {1: 'STT_OBJECT', 2: 'STT_FUNC'}
+
     def __init__(self, elf):
         assert isinstance(elf, ELFFile)
         self.elffile = elf
 
         self.symtab = self.elffile.get_section_by_name('.symtab')
         self.symcount = self.symtab.num_symbols()
-        self.symbol_dict = {}
-        self.symbol_tree = None
+        self._symbol_dict = None
 
-        # Build indices.
-        self._build_symbol_search_tree()
-        self._process_arm_type_symbols()
+        # Address index, built on first use. The symbol lists are sorted by start address. The max
+        # end list holds the largest end address of each symbol and all symbols preceding it.
+        self._starts = None
+        self._max_ends = None
+        self._sorted_symbols = None
 
     def get_elf(self):
         return self.elffile
 
+    @property
+    def symbol_dict(self):
+        """! @brief Dict of symbol name to SymbolInfo for all function and object symbols."""
+        if self._symbol_dict is None:
+            self._symbol_dict = {syminfo.name: syminfo for syminfo in self._iter_symbols()}
+        return self._symbol_dict
+
     def get_symbol_for_address(self, addr):
-        try:
-            return sorted(self.symbol_tree[addr])[0].data
-        except IndexError:
-            return None
+        if self._starts is None:
+            self._build_address_index()
+        index = bisect.bisect_right(self._starts, addr) - 1
+        found = None
+        while index >= 0 and self._max_ends[index] > addr:
+            syminfo = self._sorted_symbols[index]
+            if syminfo.address + max(syminfo.size, 1) > addr:
+                found = syminfo
+            index -= 1
+        return found
     
     def get_symbol_for_name(self, name):
         try:
@@ -58,86 +86,193 @@ class ElfSymbolDecoder(object):
         except KeyError:
             return None
 
-    def _build_symbol_search_tree(self):
-        self.symbol_tree = IntervalTree()
-        symbols = self.symtab.iter_symbols()
-        for symbol in symbols:
+    def _iter_symbols(self):
+        """! @brief Generator yielding a SymbolInfo for each function and object symbol."""
+        strtab = self.elffile.get_section(self.symtab['sh_link']).data()
+        data = self.symtab.data()
+        endian = "<" if self.elffile.little_endian else ">"
+        if self.elffile.elfclass == 32:
+            entry = struct.Struct(endian + "IIIBBH")
+        else:
+            entry = struct.Struct(endian + "IBBHQQ")
+        entsize = self.symtab['sh_entsize'] or entry.size
+
+        for offset in range(0, self.symcount * entsize, entsize):
+            if self.elffile.elfclass == 32:
+                st_name, st_value, st_size, st_info, _, _ = entry.unpack_from(data, offset)
+            else:
+                st_name, st_info, _, _, st_value, st_size = entry.unpack_from(data, offset)
+
             # Only look for functions and objects.
-            sym_type = symbol.entry['st_info']['type']
-            if sym_type not in ['STT_FUNC', 'STT_OBJECT']:
+            sym_type = self._SYMBOL_TYPES.get(st_info & 0xf)
+            if sym_type is None:
                 continue
 
-            sym_value = symbol.entry['st_value']
-            sym_size = symbol.entry['st_size']
-
-            # Cannot put an empty interval into the tree, so ensure symbols have
-            # at least a size of 1.
-            real_sym_size = sym_size
-            if sym_size == 0:
-                sym_size = 1
-
-            syminfo = SymbolInfo(name=symbol.name, address=sym_value, size=real_sym_size, type=sym_type)
-
-            # Add to symbol dict.
-            self.symbol_dict[symbol.name] = syminfo
-            
-            # Add to symbol tree.
-            self.symbol_tree.addi(sym_value, sym_value+sym_size, syminfo)
-
-    def _process_arm_type_symbols(self):
-        type_symbols = self._get_arm_type_symbol_iter()
-#         map(print, imap(lambda x:"%s : 0x%x" % (x.name, x['st_value']), type_symbols))
-
-    def _get_arm_type_symbol_iter(self):
-        # Scan until we find $m symbol.
-        i = 1
-        while i < self.symcount:
-            symbol = self.symtab.get_symbol(i)
-            if symbol.name == '$m':
-                break
-            i += 1
-        if i >= self.symcount:
-            return
-        n = symbol['st_value']
-        return islice(self.symtab.iter_symbols(), i, n)
-
+            name_end = strtab.find(b"\0", st_name)
+            name = strtab[st_name:name_end if name_end >= 0 else len(strtab)].decode('utf-8')
+            yield SymbolInfo(name=name, address=st_value, size=st_size, type=sym_type)
+
+    def _build_address_index(self):
+        # Symbols are ordered by start, then end. Symbols with a size of 0 are treated as having a
+        # size of 1 so they can still be found.
+        symbols = sorted(self._iter_symbols(),
+                    key=lambda s: (s.address, s.address + max(s.size, 1), s.name))
+        self._starts = [s.address for s in symbols]
+        self._max_ends = []
+        max_end = 0
+        for s in symbols:
+            max_end = max(max_end, s.address + max(s.size, 1))
+            self._max_ends.append(max_end)
+        self._sorted_symbols = symbols
 
 class DwarfAddressDecoder(object):
-    def __init__(self, elf):
+    """! @brief Looks up the function and source line for an address using DWARF debug info.
+
+    Lookups use a DwarfIndex. If an index directory is provided, the index covers the whole file and
+    is saved in the directory, keyed by the ELF file's GNU build ID or else its path, size, and
+    modification time. Later decoders for the same file load the saved index without parsing any
+    debug info.
+
+    Without an index directory, an index is built for each compile unit the first time one of its
+    addresses is looked up, using the .debug_aranges section to find the compile unit. If the file
+    has no address ranges table, or an address is not covered by it, an index of the whole file is
+    built instead.
+    """
+
+    def __init__(self, elf, index_dir=None):
+        """! @brief Constructor.
+        @param self
+        @param elf ELFFile instance.
+        @param index_dir Optional directory in which to keep index files.
+        """
         assert isinstance(elf, ELFFile)
         self.elffile = elf
         self.dwarfinfo = None
+        self._index_dir = index_dir
+        self._subprograms = None
 
-        self.subprograms = []
-        self.function_tree = IntervalTree()
-        self.line_tree = IntervalTree()
+        ## Index of all compile units.
+        self._index = None
+        ## Dict of compile unit offset to index for that compile unit.
+        self._cu_indexes = {}
+        self._aranges = None
+        self._loaded = False
 
         if self.elffile.has_dwarf_info():
             self.dwarfinfo = self.elffile.get_dwarf_info()
 
-            # Build indices.
-            self._get_subprograms()
-            self._build_function_search_tree()
-            self._build_line_search_tree()
-
     def get_function_for_address(self, addr):
-        try:
-            return sorted(self.function_tree[addr])[0].data
-        except IndexError:
+        index = self._get_index_for_address(addr)
+        result = index.get_function_for_address(addr) if index is not None else None
+        if result is None:
             return None
+        name, low_pc, high_pc, die_offset, cu_offset = result
+        subprogram = self.dwarfinfo.get_DIE_from_refaddr(die_offset, self.dwarfinfo.get_CU_at(cu_offset))
+        return FunctionInfo(name=name, subprogram=subprogram, low_pc=low_pc, high_pc=high_pc)
 
     def get_line_for_address(self, addr):
-        try:
-            return sorted(self.line_tree[addr])[0].data
-        except IndexError:
+        index = self._get_index_for_address(addr)
+        result = index.get_line_for_address(addr) if index is not None else None
+        if result is None:
             return None
+        filename, dirname, line, cu_offset = result
+        return LineInfo(cu=self.dwarfinfo.get_CU_at(cu_offset), filename=filename, dirname=dirname,
+                        line=line)
+
+    @property
+    def subprograms(self):
+        """! @brief List of the DW_TAG_subprogram DIEs of all compile units."""
+        if self._subprograms is None:
+            self._subprograms = []
+            if self.dwarfinfo is not None:
+                for CU in self.dwarfinfo.iter_CUs():
+                    self._subprograms.extend([d for d in CU.iter_DIEs() if d.tag == 'DW_TAG_subprogram'])
+        return self._subprograms
+
+    def _get_index_for_address(self, addr):
+        if self.dwarfinfo is None:
+            return None
+        if not self._loaded:
+            self._loaded = True
+            if self._index_dir is not None:
+                self._index = self._load_saved_index()
+            elif self.dwarfinfo.has_debug_info:
+                self._aranges = self.dwarfinfo.get_aranges()
+        if self._index is not None:
+            return self._index
+
+        cu_offset = self._aranges.cu_offset_at_addr(addr) if self._aranges is not None else None
+        if cu_offset is None:
+            # Unable to tell which compile unit, if any, contains the address.
+            self._index = self._build_index()
+            return self._index
+        try:
+            return self._cu_indexes[cu_offset]
+        except KeyError:
+            builder = DwarfIndexBuilder()
+            self._add_cu(builder, self.dwarfinfo.get_CU_at(cu_offset))
+            index = self._cu_indexes[cu_offset] = builder.build()
+            return index
+
+    def _get_index_key(self):
+        """! @brief Return a string identifying the ELF file, or None if it can't be identified."""
+        for section in self.elffile.iter_sections():
+            if section['sh_type'] != 'SHT_NOTE':
+                continue
+            for note in section.iter_notes():
+                if note['n_type'] == 'NT_GNU_BUILD_ID':
+                    return "build-id:%s" % note['n_desc']
 
-    def _get_subprograms(self):
-        for CU in self.dwarfinfo.iter_CUs():
-            self.subprograms.extend([d for d in CU.iter_DIEs() if d.tag == 'DW_TAG_subprogram'])
-
-    def _build_function_search_tree(self):
-        for prog in self.subprograms:
+        stream = self.elffile.stream
+        try:
+            stat = os.fstat(stream.fileno())
+        except (AttributeError, ValueError, OSError, IOError):
+            return None
+        return "%s:%d:%d" % (os.path.abspath(stream.name), stat.st_size, int(stat.st_mtime))
+
+    def _load_saved_index(self):
+        key = self._get_index_key()
+        if key is None:
+            return self._build_index()
+        path = os.path.join(self._index_dir,
+                            hashlib.sha1(key.encode('utf-8')).hexdigest()[:16] + ".dwi")
+        try:
+            index = DwarfIndex.load(path)
+            if index.key == key:
+                LOG.debug("Loaded DWARF index %s", path)
+                return index
+            LOG.debug("Ignoring DWARF index %s with mismatched key", path)
+        except IOError as err:
+            if err.errno != errno.ENOENT:
+                LOG.warning("Unable to read DWARF index %s: %s", path, err)
+        except ValueError as err:
+            LOG.warning("Ignoring invalid DWARF index %s: %s", path, err)
+
+        index = self._build_index(key)
+        try:
+            index.save(path)
+        except (IOError, OSError) as err:
+            LOG.warning("Unable to write DWARF index %s: %s", path, err)
+        return index
+
+    def _build_index(self, key=""):
+        builder = DwarfIndexBuilder()
+        if self.dwarfinfo.has_debug_info:
+            for cu in self.dwarfinfo.iter_CUs():
+                self._add_cu(builder, cu)
+        index = builder.build(key)
+        LOG.debug("Built DWARF index with %d functions and %d lines", index.function_count,
+                    index.line_count)
+        return index
+
+    def _add_cu(self, builder, cu):
+        self._add_functions(builder, cu)
+        self._add_lines(builder, cu)
+
+    def _add_functions(self, builder, cu):
+        for prog in cu.iter_DIEs():
+            if prog.tag != 'DW_TAG_subprogram':
+                continue
             try:
                 name = prog.attributes['DW_AT_name'].value
                 low_pc = prog.attributes['DW_AT_low_pc'].value
@@ -152,61 +287,54 @@ class DwarfAddressDecoder(object):
                 if prog.attributes['DW_AT_high_pc'].form != 'DW_FORM_addr':
                     high_pc = low_pc + high_pc
 
-                fninfo = FunctionInfo(name=name, subprogram=prog, low_pc=low_pc, high_pc=high_pc)
-
-                self.function_tree.addi(low_pc, high_pc, fninfo)
+                builder.add_function(name, low_pc, high_pc, prog.offset, cu.cu_offset)
             except KeyError:
                 pass
 
-    def _build_line_search_tree(self):
-        for cu in self.dwarfinfo.iter_CUs():
-            lineprog = self.dwarfinfo.line_program_for_CU(cu)
-            prevstate = None
-            skipThisSequence = False
-            for entry in lineprog.get_entries():
-                # Look for a DW_LNE_set_address command with a 0 address. This indicates
-                # code that is not actually included in the link.
-                #
-                # TODO: find a better way to determine the code is really not present and
-                #       doesn't have a real address of 0
-                if entry.is_extended and entry.command == DW_LNE_set_address \
-                        and len(entry.args) == 1 and entry.args[0] == 0:
-                    skipThisSequence = True
-
-                # We're interested in those entries where a new state is assigned
-                if entry.state is None:
-                    continue
+    def _add_lines(self, builder, cu):
+        lineprog = self.dwarfinfo.line_program_for_CU(cu)
+        if lineprog is None:
+            return
+        prevstate = None
+        skipThisSequence = False
+        for entry in lineprog.get_entries():
+            # Look for a DW_LNE_set_address command with a 0 address. This indicates
+            # code that is not actually included in the link.
+            #
+            # TODO: find a better way to determine the code is really not present and
+            #       doesn't have a real address of 0
+            if entry.is_extended and entry.command == DW_LNE_set_address \
+                    and len(entry.args) == 1 and entry.args[0] == 0:
+                skipThisSequence = True
+
+            # We're interested in those entries where a new state is assigned
+            if entry.state is None:
+                continue
 
-                # Looking for a range of addresses in two consecutive states.
-                if prevstate and not skipThisSequence:
+            # Looking for a range of addresses in two consecutive states.
+            if prevstate and not skipThisSequence:
+                try:
+                    fileinfo = lineprog['file_entry'][prevstate.file - 1]
+                    filename = fileinfo.name
                     try:
-                        fileinfo = lineprog['file_entry'][prevstate.file - 1]
-                        filename = fileinfo.name
-                        try:
-                            dirname = lineprog['include_directory'][fileinfo.dir_index - 1]
-                        except IndexError:
-                            dirname = ""
+                        dirname = lineprog['include_directory'][fileinfo.dir_index - 1]
                     except IndexError:
-                        filename = ""
-                        dirname = ""
-                    info = LineInfo(cu=cu, filename=filename, dirname=dirname, line=prevstate.line)
-                    fromAddr = prevstate.address
-                    toAddr = entry.state.address
-                    try:
-                        if fromAddr != 0 and toAddr != 0:
-                            if fromAddr == toAddr:
-                                toAddr += 1
-                            self.line_tree.addi(fromAddr, toAddr, info)
-                    except:
-                        LOG.debug("Problematic lineprog:")
-                        self._dump_lineprog(lineprog)
-                        raise
-
-                if entry.state.end_sequence:
-                    prevstate = None
-                    skipThisSequence = False
-                else:
-                    prevstate = entry.state
+                        dirname = b""
+                except IndexError:
+                    filename = b""
+                    dirname = b""
+                fromAddr = prevstate.address
+                toAddr = entry.state.address
+                if fromAddr != 0 and toAddr != 0:
+                    if fromAddr == toAddr:
+                        toAddr += 1
+                    builder.add_line(filename, dirname, prevstate.line, fromAddr, toAddr, cu.cu_offset)
+
+            if entry.state.end_sequence:
+                prevstate = None
+                skipThisSequence = False
+            else:
+                prevstate = entry.state
 
     def _dump_lineprog(self, lineprog):
         for i, e in enumerate(lineprog.get_entries()):
@@ -0,0 +1,230 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import bisect
+import logging
+import mmap
+import os
+import struct
+
+from ...utility.compatibility import PY3
+from ...utility.mask import align_up
+
+LOG = logging.getLogger(__name__)
+
+class _Column(object):
+    """! @brief Read-only sequence of one field of the records of a DwarfIndex table.
+
+    Used to bisect the start addresses of a table without unpacking all records.
+    """
+
+    def __init__(self, buffer, offset, count, record, field):
+        self._buffer = buffer
+        self._offset = offset + field * 4
+        self._count = count
+        self._size = record.size
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        return struct.unpack_from("<I", self._buffer, self._offset + index * self._size)[0]
+
+class DwarfIndex(object):
+    """! @brief Address ranges of functions and source lines stored in flat sorted tables.
+
+    An index is a single buffer holding a header, a table of function records, a table of line
+    records, and a string table. Records are sorted by start address, and each also holds the
+    largest end address of itself and all preceding records. An address is looked up by bisecting
+    the start addresses and then stepping back only while that running maximum shows that an
+    earlier range may still contain the address.
+
+    Strings and records are unpacked only when a lookup returns them, so an index file can be memory
+    mapped and queried without being parsed.
+    """
+
+    MAGIC = b"PYOCDDWI"
+    VERSION = 1
+
+    ## Magic, version, key length, function count, line count.
+    _HEADER = struct.Struct("<8sIIII")
+
+    ## Start, end, max end, name, DIE offset, CU offset.
+    FUNCTION = struct.Struct("<6I")
+
+    ## Start, end, max end, filename, dirname, line, CU offset.
+    LINE = struct.Struct("<7I")
+
+    def __init__(self, buffer):
+        """! @brief Constructor.
+        @param self
+        @param buffer Buffer with the index contents, as produced by DwarfIndexBuilder.
+        @exception ValueError The buffer is not a valid index.
+        """
+        if len(buffer) < self._HEADER.size:
+            raise ValueError("invalid DWARF index")
+        magic, version, key_length, function_count, line_count = self._HEADER.unpack_from(buffer, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError("invalid DWARF index")
+        self._buffer = buffer
+        self.key = bytes(buffer[self._HEADER.size:self._HEADER.size + key_length]).decode('utf-8')
+        self._function_offset = align_up(self._HEADER.size + key_length, 4)
+        self._line_offset = self._function_offset + function_count * self.FUNCTION.size
+        self._string_offset = self._line_offset + line_count * self.LINE.size
+        if len(buffer) < self._string_offset:
+            raise ValueError("truncated DWARF index")
+        self._function_count = function_count
+        self._line_count = line_count
+
+    @classmethod
+    def load(cls, path):
+        """! @brief Load an index file.
+
+        On Python 3 the file is memory mapped.
+
+        @exception IOError The file can't be read.
+        @exception ValueError The file is not a valid index.
+        """
+        with open(path, 'rb') as f:
+            if PY3:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buffer = bytearray(f.read())
+        return cls(buffer)
+
+    def save(self, path):
+        """! @brief Write the index to a file.
+
+        The file is written under a temporary name and then renamed, so a concurrent reader never
+        sees a partially written index.
+        """
+        index_dir = os.path.dirname(path)
+        if index_dir and not os.path.isdir(index_dir):
+            os.makedirs(index_dir)
+        temp_path = path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(self._buffer)
+        if PY3:
+            os.replace(temp_path, path)
+        else:
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(temp_path, path)
+
+    @property
+    def function_count(self):
+        return self._function_count
+
+    @property
+    def line_count(self):
+        return self._line_count
+
+    def _get_string(self, offset):
+        offset += self._string_offset
+        length, = struct.unpack_from("<I", self._buffer, offset)
+        return bytes(self._buffer[offset + 4:offset + 4 + length])
+
+    def _find(self, table_offset, count, record, addr):
+        """! @brief Return the record with the lowest start address whose range contains addr."""
+        starts = _Column(self._buffer, table_offset, count, record, 0)
+        index = bisect.bisect_right(starts, addr) - 1
+        found = None
+        while index >= 0:
+            _, end, max_end = struct.unpack_from("<3I", self._buffer, table_offset + index * record.size)
+            if max_end <= addr:
+                break
+            if end > addr:
+                found = index
+            index -= 1
+        if found is None:
+            return None
+        return record.unpack_from(self._buffer, table_offset + found * record.size)
+
+    def get_function_for_address(self, addr):
+        """! @brief Look up the function containing an address.
+        @return Tuple of (name, low_pc, high_pc, DIE offset, CU offset), or None.
+        """
+        record = self._find(self._function_offset, self._function_count, self.FUNCTION, addr)
+        if record is None:
+            return None
+        start, end, _, name, die_offset, cu_offset = record
+        return self._get_string(name), start, end, die_offset, cu_offset
+
+    def get_line_for_address(self, addr):
+        """! @brief Look up the source line containing an address.
+        @return Tuple of (filename, dirname, line, CU offset), or None.
+        """
+        record = self._find(self._line_offset, self._line_count, self.LINE, addr)
+        if record is None:
+            return None
+        _, _, _, filename, dirname, line, cu_offset = record
+        return self._get_string(filename), self._get_string(dirname), line, cu_offset
+
+class DwarfIndexBuilder(object):
+    """! @brief Collects function and line address ranges and produces a DwarfIndex."""
+
+    def __init__(self):
+        self._functions = []
+        self._lines = []
+        self._strings = {}
+        self._string_data = bytearray()
+
+    def _add_string(self, value):
+        if not isinstance(value, bytes):
+            value = value.encode('utf-8')
+        try:
+            return self._strings[value]
+        except KeyError:
+            offset = len(self._string_data)
+            self._string_data += struct.pack("<I", len(value)) + value
+            self._strings[value] = offset
+            return offset
+
+    def add_function(self, name, low_pc, high_pc, die_offset, cu_offset):
+        if high_pc <= low_pc:
+            return
+        self._functions.append((low_pc, high_pc, self._add_string(name), die_offset, cu_offset))
+
+    def add_line(self, filename, dirname, line, from_addr, to_addr, cu_offset):
+        if to_addr <= from_addr:
+            return
+        self._lines.append((from_addr, to_addr, self._add_string(filename), self._add_string(dirname),
+                            line, cu_offset))
+
+    @staticmethod
+    def _pack_table(records, record):
+        records.sort()
+        data = bytearray()
+        max_end = 0
+        for values in records:
+            max_end = max(max_end, values[1])
+            data += record.pack(values[0], values[1], max_end, *values[2:])
+        return data
+
+    def build(self, key=""):
+        """! @brief Create the index.
+        @param self
+        @param key String identifying the ELF file the index was built from.
+        """
+        key = key.encode('utf-8')
+        data = bytearray(DwarfIndex._HEADER.pack(DwarfIndex.MAGIC, DwarfIndex.VERSION, len(key),
+                            len(self._functions), len(self._lines)))
+        data += key
+        data += b"\0" * (align_up(len(data), 4) - len(data))
+        data += self._pack_table(self._functions, DwarfIndex.FUNCTION)
+        data += self._pack_table(self._lines, DwarfIndex.LINE)
+        data += self._string_data
+        return DwarfIndex(data)
@@ -101,9 +101,13 @@ class ELFBinaryFile(object):
     of memory not mapped with a section of the ELF file, those ranges will not be considered in
     the used/unused lists. Also, only ranges completely contained within a region of the memory
     map are considered.
+
+    If a DWARF index directory is given, the address decoder saves an index of the file's debug
+    info in it, so later sessions can look up addresses without parsing the debug info. See
+    DwarfAddressDecoder.
     """
     
-    def __init__(self, elf, memory_map=None):
+    def __init__(self, elf, memory_map=None, dwarf_index_dir=None):
         self._owns_file = False
         if isinstance(elf, six.string_types):
             self._file = open(elf, 'rb')
@@ -112,6 +116,7 @@ class ELFBinaryFile(object):
             self._file = elf
         self._elf = ELFFile(self._file)
         self._memory_map = memory_map or MemoryMap()
+        self._dwarf_index_dir = dwarf_index_dir
 
         self._symbol_decoder = None
         self._address_decoder = None
@@ -229,7 +234,7 @@ class ELFBinaryFile(object):
     @property
     def address_decoder(self):
         if self._address_decoder is None:
-            self._address_decoder = DwarfAddressDecoder(self._elf)
+            self._address_decoder = DwarfAddressDecoder(self._elf, self._dwarf_index_dir)
         return self._address_decoder
 
 
@@ -23,6 +23,7 @@ import datetime
 import six
 import pyocd
 from ..core import (exceptions, session)
+from ..utility.target_memory import read_c_string_data
 
 LOG = logging.getLogger(__name__)
 
@@ -475,27 +476,9 @@ class SemihostAgent(object):
             data = self.context.read_memory_block8(ptr, length)
             return str(bytearray(data))
 
-        target_str = ''
-        # TODO - use memory map to make sure we don't try to read off the end of memory
-        # Limit string size in case it isn't terminated.
-        while len(target_str) < MAX_STRING_LENGTH:
-            try:
-                # Read 32 bytes at a time for efficiency.
-                data = self.context.read_memory_block8(ptr, 32)
-                terminator = data.index(0)
-
-                # Found a null terminator, append data up to but not including the null
-                # and then exit the loop.
-                target_str += str(bytearray(data[:terminator]))
-                break
-            except exceptions.TransferError:
-                # Failed to read some or all of the string.
-                break
-            except ValueError:
-                # No null terminator was found. Append all of data.
-                target_str += str(bytearray(data))
-                ptr += 32
-        return target_str
+        # Limit string size in case it isn't terminated. Reading also stops at the end of the
+        # memory region, or if reading some of the string fails.
+        return str(read_c_string_data(self.context, ptr, MAX_STRING_LENGTH))
 
     def handle_sys_open(self, args):
         fnptr, mode, fnlen = self._get_args(args, 3)
@@ -0,0 +1,201 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import struct
+import zlib
+
+import six
+
+from .model import (
+    SVDElement,
+    SVDEnumeratedValue,
+    SVDField,
+    SVDRegister,
+    SVDRegisterArray,
+    SVDRegisterCluster,
+    SVDRegisterClusterArray,
+    SVDAddressBlock,
+    SVDInterrupt,
+    SVDPeripheral,
+    SVDCpu,
+    SVDDevice,
+    )
+from ...utility.compatibility import PY3
+
+LOG = logging.getLogger(__name__)
+
+## Element classes that can be encoded. The index of a class in this list identifies it in the cache.
+_ELEMENT_CLASSES = [
+    SVDEnumeratedValue,
+    SVDField,
+    SVDRegister,
+    SVDRegisterArray,
+    SVDRegisterCluster,
+    SVDRegisterClusterArray,
+    SVDAddressBlock,
+    SVDInterrupt,
+    SVDCpu,
+    ]
+_CLASS_IDS = {cls: index for index, cls in enumerate(_ELEMENT_CLASSES)}
+
+## Peripheral attributes that are stored in a separate block of the cache and decoded on first use.
+_PERIPHERAL_CONTENTS = ('registers', 'register_arrays', 'clusters')
+
+def _encode_args(element, skip=()):
+    """! @brief Return the constructor arguments of an element of the SVD model as a dict.
+
+    The arguments are the element's attributes, whose names match the constructor parameters once
+    the underscore that marks derivable attributes is removed.
+
+    @param element The element to encode.
+    @param skip Names of arguments to leave out.
+    """
+    args = {}
+    for key, item in six.iteritems(element.__dict__):
+        if key == 'parent' or key.lstrip('_') in skip:
+            continue
+        # SVDCpu stores a few of its flags in single element tuples.
+        if isinstance(element, SVDCpu) and isinstance(item, tuple):
+            item = item[0]
+        args[key.lstrip('_')] = _encode(item)
+    return args
+
+def _encode(value):
+    """! @brief Convert a value from the SVD model to JSON-compatible objects.
+
+    An element is encoded as a dict with the element's class ID and its constructor arguments.
+    """
+    if isinstance(value, SVDElement):
+        return {'c': _CLASS_IDS[type(value)], 'a': _encode_args(value)}
+    elif isinstance(value, (list, tuple, six.moves.range)):
+        return [_encode(item) for item in value]
+    else:
+        return value
+
+def _decode(value):
+    if isinstance(value, dict):
+        args = {str(key): _decode(item) for key, item in six.iteritems(value['a'])}
+        return _ELEMENT_CLASSES[value['c']](**args)
+    elif isinstance(value, list):
+        return [_decode(item) for item in value]
+    else:
+        return value
+
+def _pack(value):
+    return zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'))
+
+def _unpack(data):
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+def _load_peripheral_contents(data, offset, length):
+    return tuple(_decode(_unpack(data[offset:offset + length])))
+
+class SVDCache(object):
+    """! @brief Directory of parsed SVD devices, keyed by a hash of the SVD file contents.
+
+    Each cache file holds a compressed header describing the device and every peripheral other
+    than its registers, followed by a separately compressed block with the registers and clusters
+    of each peripheral. Loading a cached device decodes only the header; a peripheral's block is
+    decoded by its contents loader the first time its registers are accessed.
+    """
+
+    MAGIC = b"PYOCDSVD"
+    VERSION = 1
+
+    ## Magic, version, header length.
+    _HEADER = struct.Struct("<8sII")
+
+    def __init__(self, cache_dir):
+        self._cache_dir = cache_dir
+
+    def get_path(self, svd_data):
+        """! @brief Return the path of the cache file for the contents of an SVD file."""
+        return os.path.join(self._cache_dir, hashlib.sha1(svd_data).hexdigest() + ".svdc")
+
+    def load(self, svd_data):
+        """! @brief Load the cached device for an SVD file.
+        @return SVDDevice, or None if the device is not cached or the cache file is invalid.
+        """
+        path = self.get_path(svd_data)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except IOError:
+            return None
+        try:
+            magic, version, header_length = self._HEADER.unpack_from(data, 0)
+            if magic != self.MAGIC or version != self.VERSION:
+                raise ValueError("unsupported format")
+            offset = self._HEADER.size
+            header = _unpack(data[offset:offset + header_length])
+            offset += header_length
+
+            peripherals = []
+            for info, length in header['peripherals']:
+                args = {str(key): _decode(item) for key, item in six.iteritems(info)}
+                peripherals.append(SVDPeripheral(registers=None, register_arrays=None, clusters=None,
+                        contents_loader=functools.partial(_load_peripheral_contents, data, offset, length),
+                        **args))
+                offset += length
+            device_args = {str(key): _decode(item) for key, item in six.iteritems(header['device'])}
+            device = SVDDevice(peripherals=peripherals, **device_args)
+        except (ValueError, KeyError, TypeError, struct.error, zlib.error) as err:
+            LOG.warning("Ignoring invalid SVD cache %s: %s", path, err)
+            return None
+        LOG.debug("Loaded SVD device %s from cache %s", device.name, path)
+        return device
+
+    def save(self, svd_data, device):
+        """! @brief Write a device parsed from an SVD file to the cache.
+
+        The file is written under a temporary name and then renamed, so a concurrent reader never
+        sees a partially written file.
+        """
+        path = self.get_path(svd_data)
+        device_info = _encode_args(device, skip=('peripherals', 'peripherals_by_name'))
+
+        blocks = []
+        peripheral_infos = []
+        for peripheral in device.peripherals:
+            peripheral.load_contents()
+            info = _encode_args(peripheral, skip=_PERIPHERAL_CONTENTS + ('contents_loader',))
+            block = _pack([_encode(getattr(peripheral, "_" + name)) for name in _PERIPHERAL_CONTENTS])
+            blocks.append(block)
+            peripheral_infos.append([info, len(block)])
+        header = _pack({'device': device_info, 'peripherals': peripheral_infos})
+
+        temp_path = path + ".tmp"
+        try:
+            if not os.path.isdir(self._cache_dir):
+                os.makedirs(self._cache_dir)
+            with open(temp_path, 'wb') as f:
+                f.write(self._HEADER.pack(self.MAGIC, self.VERSION, len(header)))
+                f.write(header)
+                for block in blocks:
+                    f.write(block)
+            if PY3:
+                os.replace(temp_path, path)
+            else:
+                if os.path.exists(path):
+                    os.remove(path)
+                os.rename(temp_path, path)
+        except (IOError, OSError) as err:
+            LOG.warning("Unable to write SVD cache %s: %s", path, err)
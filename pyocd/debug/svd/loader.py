@@ -14,11 +14,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import io
 import threading
 import logging
 import pkg_resources
+import six
 from zipfile import ZipFile
 
+from .cache import SVDCache
 from .parser import SVDParser
 
 LOG = logging.getLogger(__name__)
@@ -27,6 +30,8 @@ LOG = logging.getLogger(__name__)
 BUILTIN_SVD_DATA_PATH = "debug/svd/svd_data.zip"
 
 class SVDFile(object):
+    """! @brief An SVD file, either a path or a file-like object, and the device it describes."""
+
     @classmethod
     def from_builtin(cls, svd_name):
         zip_stream = pkg_resources.resource_stream("pyocd", BUILTIN_SVD_DATA_PATH)
@@ -37,16 +42,37 @@ class SVDFile(object):
         self.filename = filename
         self.device = None
 
-    def load(self):
-        self.device = SVDParser.for_xml_file(self.filename).get_device()
+    def load(self, cache_dir=None):
+        """! @brief Parse the SVD file.
+
+        @param self
+        @param cache_dir Optional directory of an SVDCache. If the file's contents were parsed
+            before, the device is loaded from the cache instead of parsing it again. Otherwise the
+            parsed device is added to the cache.
+        """
+        if cache_dir is None:
+            self.device = SVDParser.for_xml_file(self.filename).get_device()
+            return
+
+        if isinstance(self.filename, six.string_types):
+            with open(self.filename, 'rb') as f:
+                data = f.read()
+        else:
+            data = self.filename.read()
+        cache = SVDCache(cache_dir)
+        self.device = cache.load(data)
+        if self.device is None:
+            self.device = SVDParser.for_xml_file(io.BytesIO(data)).get_device()
+            cache.save(data, self.device)
 
 class SVDLoader(threading.Thread):
     """! @brief Thread to read an SVD file in the background."""
 
-    def __init__(self, svdFile, completionCallback):
+    def __init__(self, svdFile, completionCallback, cache_dir=None):
         super(SVDLoader, self).__init__(name='load-svd')
         self.daemon = True
         self._svd_location = svdFile
+        self._cache_dir = cache_dir
         self._svd_device = None
         self._callback = completionCallback
 
@@ -62,7 +88,7 @@ class SVDLoader(threading.Thread):
 
     def run(self):
         try:
-            self._svd_location.load()
+            self._svd_location.load(self._cache_dir)
             self._svd_device = self._svd_location.device
             if self._callback:
                 self._callback(self._svd_device)
@@ -18,7 +18,7 @@ import six
 
 # Sentinel value for lookup where None might be a valid value
 NOT_PRESENT = object()
-TO_DICT_SKIP_KEYS = {"_register_arrays", "parent"}
+TO_DICT_SKIP_KEYS = {"_register_arrays", "parent", "_contents_loader", "_peripherals_by_name"}
 REGISTER_PROPERTY_KEYS = {"size", "access", "protection", "reset_value", "reset_mask"}
 LIST_TYPE_KEYS = {"register_arrays", "registers", "fields", "peripherals", "interrupts"}
 
@@ -463,7 +463,7 @@ class SVDPeripheral(SVDElement):
                  interrupts, registers, register_arrays, size, access,
                  protection, reset_value, reset_mask,
                  group_name, append_to_name, disable_condition,
-                 clusters):
+                 clusters, contents_loader=None):
         SVDElement.__init__(self)
 
         # items with underscore are potentially derived
@@ -487,6 +487,10 @@ class SVDPeripheral(SVDElement):
         self._disable_condition = disable_condition
         self._clusters = clusters
 
+        # Callable returning the registers, register arrays, and clusters of the peripheral. If
+        # provided, it is called the first time any of them is accessed.
+        self._contents_loader = contents_loader
+
         # make parent association for complex node types
         for i in _none_as_empty(self._interrupts):
             i.parent = self
@@ -496,6 +500,24 @@ class SVDPeripheral(SVDElement):
     def __getattr__(self, attr):
         return self._lookup_possibly_derived_attribute(attr)
 
+    def load_contents(self):
+        """! @brief Load the registers, register arrays, and clusters if not loaded yet."""
+        if self._contents_loader is None:
+            return
+        loader = self._contents_loader
+        self._contents_loader = None
+        self._registers, self._register_arrays, self._clusters = loader()
+        for r in _none_as_empty(self._registers):
+            r.parent = self
+
+    def _lookup_possibly_derived_attribute(self, attr):
+        if attr in ('registers', 'register_arrays', 'clusters'):
+            self.load_contents()
+            derived_from = self.get_derived_from()
+            if derived_from is not None:
+                derived_from.load_contents()
+        return SVDElement._lookup_possibly_derived_attribute(self, attr)
+
     @property
     def registers(self):
         regs = []
@@ -512,10 +534,7 @@ class SVDPeripheral(SVDElement):
             return None
 
         # find the peripheral with this name in the tree
-        try:
-            return [p for p in self.parent.peripherals if p.name == self._derived_from][0]
-        except IndexError:
-            return None
+        return self.parent.get_peripheral(self._derived_from)
 
 
 class SVDCpu(SVDElement):
@@ -568,3 +587,13 @@ class SVDDevice(SVDElement):
 
         for p in _none_as_empty(self.peripherals):
             p.parent = self
+
+        self._peripherals_by_name = None
+
+    def get_peripheral(self, name):
+        """! @brief Return the first peripheral with a given name, or None."""
+        if self._peripherals_by_name is None:
+            self._peripherals_by_name = {}
+            for p in _none_as_empty(self.peripherals):
+                self._peripherals_by_name.setdefault(p.name, p)
+        return self._peripherals_by_name.get(name)
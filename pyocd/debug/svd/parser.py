@@ -14,7 +14,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import functools
 from xml.etree import ElementTree as ET
+from xml.parsers import expat
 
 import six
 
@@ -72,12 +74,18 @@ class SVDParser(object):
 
     @classmethod
     def for_xml_file(cls, path, remove_reserved=False):
-        return cls(ET.parse(path), remove_reserved)
-
-    def __init__(self, tree, remove_reserved=False):
+        return cls(path, remove_reserved)
+
+    def __init__(self, source, remove_reserved=False):
+        """! @brief Constructor.
+        @param self
+        @param source Path or file-like object of the SVD file.
+        @param remove_reserved
+        """
         self.remove_reserved = remove_reserved
-        self._tree = tree
-        self._root = self._tree.getroot()
+        self._source = source
+        ## Encoding declared by the SVD file.
+        self._encoding = None
 
     def _parse_enumerated_value(self, enumerated_value_node):
         return SVDEnumeratedValue(
@@ -277,11 +285,24 @@ class SVDParser(object):
             description=_get_text(interrupt_node, 'description')
         )
 
-    def _parse_peripheral(self, peripheral_node):
-        # parse registers
-        registers = None if peripheral_node.find('registers') is None else []
-        register_arrays = None if peripheral_node.find('registers') is None else []
-        for register_node in peripheral_node.findall('./registers/register'):
+    def _parse_xml(self, data):
+        """! @brief Parse part of the SVD file using the file's encoding."""
+        parser = ET.XMLParser(encoding=self._encoding)
+        parser.feed(data)
+        return parser.close()
+
+    def _parse_peripheral_contents(self, data, registers_range):
+        """! @brief Parse the registers and clusters of a peripheral.
+        @return Tuple of the lists of registers, register arrays, and clusters.
+        """
+        if registers_range is None:
+            return None, None, []
+        start, end = registers_range
+        registers_node = self._parse_xml(data[start:end])
+
+        registers = []
+        register_arrays = []
+        for register_node in registers_node.findall('./register'):
             reg = self._parse_registers(register_node)
             if isinstance(reg, SVDRegisterArray):
                 register_arrays.append(reg)
@@ -289,9 +310,12 @@ class SVDParser(object):
                 registers.append(reg)
 
         clusters = []
-        for cluster_node in peripheral_node.findall('./registers/cluster'):
+        for cluster_node in registers_node.findall('./cluster'):
             reg = self._parse_cluster(cluster_node)
             clusters.append(reg)
+        return registers, register_arrays, clusters
+
+    def _parse_peripheral(self, peripheral_node, data, registers_range):
 
         # parse all interrupts for the peripheral
         interrupts = []
@@ -353,23 +377,20 @@ class SVDParser(object):
 
             # <registers>
             #     ...
+            #     <cluster>
+            #        ...
+            #     </cluster>
             # </registers>
-            register_arrays=register_arrays,
-            registers=registers,
-
-            # <cluster>
-            #    ...
-            # </cluster>
-            clusters=clusters,
+            register_arrays=None,
+            registers=None,
+            clusters=None,
+            contents_loader=functools.partial(self._parse_peripheral_contents, data, registers_range),
 
             # (not mentioned in docs -- applies to all registers)
             protection=_get_text(peripheral_node, 'protection'),
         )
 
-    def _parse_device(self, device_node):
-        peripherals = []
-        for peripheral_node in device_node.findall('.//peripheral'):
-            peripherals.append(self._parse_peripheral(peripheral_node))
+    def _parse_device(self, device_node, peripherals):
         cpu_node = device_node.find('./cpu')
         cpu = SVDCpu(
             name=_get_text(cpu_node, 'name'),
@@ -407,10 +428,71 @@ class SVDParser(object):
             reset_mask=_get_int(device_node, "resetMask")
         )
 
-    def get_device(self):
-        """! @brief Get the device described by this SVD"""
-        return self._parse_device(self._root)
+    def _scan(self, data):
+        """! @brief Find the peripherals of the SVD file without building an element tree.
+
+        The file is scanned with an expat parser that only records the byte offsets of elements of
+        interest, and the encoding declared by the file.
+
+        @return List of ((start, end), registers_range) tuples with the byte range of each peripheral
+            element. _registers_range_ is the byte range of the peripheral's registers element, or
+            None if it has none.
+        """
+        parser = expat.ParserCreate()
+        stack = []
+        peripherals = []
+        # Dict of peripheral start offset to the byte range of its registers element.
+        registers_ranges = {}
+
+        def element_end():
+            # The byte index is at the start of the end tag, or of the tag of an empty element.
+            return data.index(b">", parser.CurrentByteIndex) + 1
 
+        def xml_decl(version, encoding, standalone):
+            self._encoding = encoding
 
-def duplicate_array_of_registers(svdreg):  # expects a SVDRegister which is an array of registers
-    assert (svdreg.dim == len(svdreg.dim_index))
+        def start_element(name, attrs):
+            stack.append((name, parser.CurrentByteIndex))
+
+        def end_element(name):
+            _, start = stack.pop()
+            if name == 'peripheral':
+                peripherals.append(((start, element_end()), registers_ranges.pop(start, None)))
+            elif name == 'registers' and stack and stack[-1][0] == 'peripheral':
+                registers_ranges[stack[-1][1]] = (start, element_end())
+
+        parser.XmlDeclHandler = xml_decl
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        parser.Parse(data, True)
+        return peripherals
+
+    def get_device(self):
+        """! @brief Get the device described by this SVD
+
+        Only the offsets of peripheral and registers elements are recorded while reading the file.
+        Each peripheral is then parsed without its registers element, which is kept as raw bytes of
+        the file and parsed the first time the peripheral's registers are accessed. Register arrays
+        are expanded and derived peripherals are resolved when accessed as well.
+        """
+        if isinstance(self._source, six.string_types):
+            with open(self._source, 'rb') as f:
+                data = f.read()
+        else:
+            data = self._source.read()
+
+        peripherals = []
+        device_xml = []
+        offset = 0
+        for (start, end), registers_range in self._scan(data):
+            if registers_range is None:
+                peripheral_xml = data[start:end]
+            else:
+                peripheral_xml = data[start:registers_range[0]] + data[registers_range[1]:end]
+            peripheral_node = self._parse_xml(peripheral_xml)
+            peripherals.append(self._parse_peripheral(peripheral_node, data, registers_range))
+            device_xml.append(data[offset:start])
+            offset = end
+        device_xml.append(data[offset:])
+
+        return self._parse_device(self._parse_xml(b"".join(device_xml)), peripherals)
@@ -0,0 +1,114 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import namedtuple
+import logging
+
+from ...core import exceptions
+
+LOG = logging.getLogger(__name__)
+
+## @brief Value of a peripheral register.
+#
+# The value is None if the register was not read, in which case the note says why.
+RegisterValue = namedtuple("RegisterValue", "register address value note")
+
+## Register access types that can't be read.
+WRITE_ONLY_ACCESS = ('write-only', 'writeOnce')
+
+def has_read_side_effects(register):
+    """! @brief Whether reading a register or any of its fields changes the state of the peripheral."""
+    return (register.read_action is not None) or any(f.read_action is not None for f in register.fields)
+
+def read_peripheral_registers(target, peripheral, registers=None, read_side_effects=False):
+    """! @brief Read the values of a peripheral's registers with as few transfers as possible.
+
+    Runs of contiguous, word-aligned 32-bit registers are read with a single block read. All other
+    registers are read with their own access size, using deferred reads that are queued together.
+    Registers that share an address, such as alternate registers, are only read once.
+
+    Write-only registers are never read. Registers that the SVD flags as having a read action are
+    only read if _read_side_effects_ is True, and then always individually so a block read can't
+    touch them.
+
+    @param target The target or core used to read memory.
+    @param peripheral SVDPeripheral whose registers are read.
+    @param registers Sequence of the peripheral's registers to read. Defaults to all registers.
+    @param read_side_effects Whether to read registers with read side effects.
+    @return List of RegisterValue in the same order as _registers_.
+    """
+    if registers is None:
+        registers = peripheral.registers
+
+    # Work out which registers to read, keyed by (address, size, side effects).
+    values = {}
+    notes = {}
+    for index, reg in enumerate(registers):
+        addr = peripheral.base_address + reg.address_offset
+        if reg.access in WRITE_ONLY_ACCESS:
+            notes[index] = "write-only"
+        elif not read_side_effects and has_read_side_effects(reg):
+            notes[index] = "not read: read has side effects"
+        else:
+            values[(addr, reg.size or 32, has_read_side_effects(reg))] = None
+
+    # Split the reads into runs of contiguous words and single reads.
+    runs = []
+    singles = []
+    for key in sorted(values):
+        addr, size, side_effects = key
+        if size == 32 and not side_effects and (addr & 3) == 0:
+            if runs and runs[-1][-1][0] + 4 == addr:
+                runs[-1].append(key)
+                continue
+            runs.append([key])
+        else:
+            singles.append(key)
+    for run in [r for r in runs if len(r) == 1]:
+        singles.extend(run)
+    runs = [r for r in runs if len(r) > 1]
+
+    for run in runs:
+        try:
+            words = target.read_memory_block32(run[0][0], len(run))
+        except exceptions.TransferError:
+            LOG.debug("Block read of %s registers at %#010x failed", peripheral.name, run[0][0])
+            singles.extend(run)
+            continue
+        for key, word in zip(run, words):
+            values[key] = word
+
+    try:
+        results = [(key, target.read_memory(key[0], key[1], now=False)) for key in singles]
+        for key, result in results:
+            values[key] = result()
+    except exceptions.TransferError:
+        # Find which registers fault by reading them one at a time.
+        for key in singles:
+            try:
+                values[key] = target.read_memory(key[0], key[1])
+            except exceptions.TransferError:
+                values[key] = None
+
+    dump = []
+    for index, reg in enumerate(registers):
+        addr = peripheral.base_address + reg.address_offset
+        if index in notes:
+            dump.append(RegisterValue(reg, addr, None, notes[index]))
+            continue
+        value = values[(addr, reg.size or 32, has_read_side_effects(reg))]
+        dump.append(RegisterValue(reg, addr, value, None if (value is not None) else "read failed"))
+    return dump
@@ -0,0 +1,305 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import sys
+import threading
+from time import time
+
+from .file_programmer import FileProgrammer
+from .loader import FlashLoader
+from ..core.session import Session
+from ..probe.aggregator import DebugProbeAggregator
+
+LOG = logging.getLogger(__name__)
+
+class FlashImage(object):
+    """! @brief Data chunks extracted from an image file.
+
+    The image is parsed a single time and the same chunks are then added to the flash loader of
+    every board. Chunk data is never modified after being added, so it can be shared between
+    threads without copying.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    @classmethod
+    def from_file(cls, session, file_or_path, file_format=None, **kwargs):
+        """! @brief Parse an image file.
+
+        @param cls
+        @param session Session used to look up the boot memory if a binary file is loaded without
+            a `base_address`.
+        @param file_or_path Either a string that is a path to a file, or a file-like object.
+        @param file_format Optional file format name. See FileProgrammer.program().
+        @param kwargs Optional keyword arguments for format-specific parameters. See
+            FileProgrammer.program().
+        """
+        image = cls()
+        FileProgrammer(session).load(file_or_path, image, file_format, **kwargs)
+        return image
+
+    @property
+    def chunks(self):
+        """! @brief List of (address, bytearray) tuples."""
+        return self._chunks
+
+    @property
+    def byte_count(self):
+        return sum(len(data) for _, data in self._chunks)
+
+    def add_data(self, address, data):
+        self._chunks.append((address, bytearray(data)))
+
+    def add_to_loader(self, loader, as_baseline=False):
+        """! @brief Add all chunks of the image to a FlashLoader.
+        @param self
+        @param loader The FlashLoader instance.
+        @param as_baseline If True, the chunks are added as baseline data for delta programming.
+        """
+        add = loader.add_baseline_data if as_baseline else loader.add_data
+        for address, data in self._chunks:
+            add(address, data)
+
+class BoardResult(object):
+    """! @brief Outcome of programming one board."""
+
+    def __init__(self, unique_id, description):
+        self.unique_id = unique_id
+        self.description = description
+        self.target_type = None
+        self.success = False
+        self.error = None
+        self.connect_time = 0.0
+        self.program_time = 0.0
+        self.total_time = 0.0
+        self.byte_count = 0
+        self.program_byte_count = 0
+        self.skipped_byte_count = 0
+
+    def to_dict(self):
+        return {
+            'unique_id': self.unique_id,
+            'description': self.description,
+            'target_type': self.target_type,
+            'success': self.success,
+            'error': self.error,
+            'connect_time': self.connect_time,
+            'program_time': self.program_time,
+            'total_time': self.total_time,
+            'byte_count': self.byte_count,
+            'program_byte_count': self.program_byte_count,
+            'skipped_byte_count': self.skipped_byte_count,
+            }
+
+class BatchResult(object):
+    """! @brief Outcome of programming a batch of boards."""
+
+    def __init__(self):
+        ## List of BoardResult objects, in the order of the probes.
+        self.boards = []
+        self.image_byte_count = 0
+        self.total_time = 0.0
+
+    @property
+    def success(self):
+        return all(board.success for board in self.boards)
+
+    @property
+    def failed_boards(self):
+        return [board for board in self.boards if not board.success]
+
+    @property
+    def throughput(self):
+        """! @brief Aggregate programming throughput of all successful boards in bytes/second.
+
+        Computed from the wall clock time of the entire batch, so it reflects the benefit of
+        programming boards concurrently.
+        """
+        byte_count = sum(board.byte_count for board in self.boards if board.success)
+        return (byte_count / self.total_time) if self.total_time else 0.0
+
+    def to_dict(self):
+        return {
+            'success': self.success,
+            'board_count': len(self.boards),
+            'failed_count': len(self.failed_boards),
+            'image_byte_count': self.image_byte_count,
+            'total_time': self.total_time,
+            'throughput': self.throughput,
+            'boards': [board.to_dict() for board in self.boards],
+            }
+
+class BatchProgressReport(object):
+    """! @brief Per-board progress printer suitable for many boards programming concurrently.
+
+    Instead of a progress bar, a line is printed each time a board passes a multiple of the step
+    percentage.
+    """
+
+    def __init__(self, file=None, step=25):
+        self._file = file or sys.stdout
+        self._step = step
+        self._lock = threading.Lock()
+        self._last = {}
+
+    def __call__(self, unique_id, progress):
+        percent = int(min(progress, 1.0) * 100) // self._step * self._step
+        with self._lock:
+            if percent == self._last.get(unique_id, -1):
+                return
+            self._last[unique_id] = percent
+            self._file.write("[%s] %3d%%\n" % (unique_id, percent))
+            self._file.flush()
+
+class BatchFlashProgrammer(object):
+    """! @brief Program the same image to many boards concurrently.
+
+    A session is created for each debug probe. Each board is connected and programmed in its own
+    worker thread, with at most _jobs_ boards in progress at once. Nearly all of the time spent
+    programming is spent waiting on probe I/O, which releases the GIL, so threads scale well
+    and let every board share a single parsed copy of the image.
+
+    A failure on one board is recorded in its BoardResult and does not affect other boards.
+    """
+
+    def __init__(self, probes, jobs=None, progress=None, chip_erase=None, smart_flash=None,
+            trust_crc=None, keep_unwritten=None, verify=None, profiler=None, options=None, **kwargs):
+        """! @brief Constructor.
+
+        @param self
+        @param probes List of debug probe objects to program.
+        @param jobs Maximum number of boards programmed at once. The default of None programs all
+            boards at once.
+        @param progress Optional callable taking a probe unique ID and a progress fraction.
+        @param chip_erase See FlashLoader.
+        @param smart_flash See FlashLoader.
+        @param trust_crc See FlashLoader.
+        @param keep_unwritten See FlashLoader.
+        @param verify See FlashLoader.
+        @param profiler Optional FlashProfiler instance shared by all boards. See FlashLoader.
+        @param options Dictionary of user options applied to every session.
+        @param kwargs Additional keyword arguments passed to every Session constructor.
+        """
+        self._probes = probes
+        self._jobs = jobs or max(1, len(probes))
+        self._progress = progress
+        self._loader_args = dict(chip_erase=chip_erase, smart_flash=smart_flash,
+                                    trust_crc=trust_crc, keep_unwritten=keep_unwritten,
+                                    verify=verify, profiler=profiler)
+        self._options = options
+        self._session_args = kwargs
+        self._image = None
+        self._baseline = None
+        self._image_lock = threading.Lock()
+
+    @classmethod
+    def for_all_probes(cls, unique_id=None, **kwargs):
+        """! @brief Create a batch programmer for all connected probes.
+
+        @param cls
+        @param unique_id Optional string matched against probe unique IDs using a contains match.
+        @param kwargs Other parameters passed to the constructor.
+        """
+        probes = DebugProbeAggregator.get_all_connected_probes(unique_id=unique_id)
+        return cls(probes, **kwargs)
+
+    @property
+    def probes(self):
+        return self._probes
+
+    def program(self, file_or_path, file_format=None, baseline=None, baseline_format=None, **kwargs):
+        """! @brief Program a file to all boards.
+
+        The parameters are the same as for FileProgrammer.program(). Only a path may be passed
+        for _file_or_path_ if a binary file without a `base_address` is programmed, since the
+        file is then parsed once the first board is connected.
+
+        @return BatchResult object.
+        """
+        self._image = None
+        self._baseline = None
+        load_args = (file_or_path, file_format, baseline, baseline_format, kwargs)
+        result = BatchResult()
+        result.boards = [BoardResult(probe.unique_id, probe.description) for probe in self._probes]
+
+        semaphore = threading.BoundedSemaphore(self._jobs)
+        def worker(probe, board_result):
+            with semaphore:
+                self._program_board(probe, board_result, load_args)
+
+        start = time()
+        threads = []
+        for probe, board_result in zip(self._probes, result.boards):
+            thread = threading.Thread(target=worker, args=(probe, board_result),
+                                        name="flash " + probe.unique_id)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        result.total_time = time() - start
+
+        if self._image is not None:
+            result.image_byte_count = self._image.byte_count
+        LOG.info("Programmed %d of %d boards in %.3f s at %.02f kB/s",
+            len(result.boards) - len(result.failed_boards), len(result.boards),
+            result.total_time, result.throughput / 1024)
+        return result
+
+    def _get_images(self, session, load_args):
+        """! @brief Return the image and baseline image, parsing them on first use.
+
+        The baseline image is None if no baseline was provided.
+        """
+        with self._image_lock:
+            if self._image is None:
+                file_or_path, file_format, baseline, baseline_format, kwargs = load_args
+                if baseline is not None:
+                    self._baseline = FlashImage.from_file(session, baseline, baseline_format, **kwargs)
+                self._image = FlashImage.from_file(session, file_or_path, file_format, **kwargs)
+            return self._image, self._baseline
+
+    def _program_board(self, probe, board_result, load_args):
+        start = time()
+        try:
+            session = Session(probe, options=self._options, **self._session_args)
+            with session:
+                board_result.target_type = session.board.target_type
+                board_result.connect_time = time() - start
+
+                progress = None
+                if self._progress is not None:
+                    progress = lambda fraction: self._progress(probe.unique_id, fraction)
+                loader = FlashLoader(session, progress=progress, **self._loader_args)
+                image, baseline = self._get_images(session, load_args)
+                if baseline is not None:
+                    baseline.add_to_loader(loader, as_baseline=True)
+                image.add_to_loader(loader)
+                perf_list = loader.commit()
+
+                board_result.program_time = sum(perf.program_time for perf in perf_list)
+                board_result.byte_count = image.byte_count
+                board_result.program_byte_count = sum(perf.program_byte_count for perf in perf_list)
+                board_result.skipped_byte_count = sum(perf.skipped_byte_count for perf in perf_list)
+                board_result.success = True
+        except Exception as err:
+            LOG.error("Programming board %s failed: %s", probe.unique_id, err,
+                exc_info=Session.get_current().log_tracebacks)
+            board_result.error = str(err)
+        finally:
+            board_result.total_time = time() - start
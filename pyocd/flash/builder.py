@@ -15,10 +15,13 @@
 # limitations under the License.
 
 from ..core.target import Target
-from ..core.exceptions import (FlashFailure, FlashProgramFailure)
+from ..core.exceptions import (FlashFailure, FlashEraseFailure, FlashProgramFailure)
 from ..utility.notification import Notification
 from ..utility.mask import same
+from .cache import page_hash
 import logging
+from bisect import bisect_right
+from collections import deque
 from struct import unpack
 from time import time
 from binascii import crc32
@@ -56,6 +59,12 @@ class ProgrammingInfo(object):
         self.erase_sector_count = 0
         self.skipped_byte_count = 0
         self.skipped_page_count = 0
+        self.cached_page_count = 0              # Number of pages found unchanged using the content cache
+        self.baseline_page_count = 0            # Number of pages compared against the baseline image
+        self.verify_type = None                 # Type of verify performed - FLASH_ANALYSIS_CRC32 or FLASH_VERIFY_READ
+        self.verify_time = None                 # Time to verify programmed pages, not included in program_time
+        self.verify_byte_count = 0              # Number of bytes verified
+        self.verify_read_page_count = 0         # Number of pages read back during verify
 
 def _stub_progress(percent):
     pass
@@ -98,7 +107,7 @@ class _FlashPage(object):
     def __init__(self, page_info):
         self.addr = page_info.base_addr
         self.size = page_info.size
-        self.data = []
+        self.data = bytearray()
         self.program_weight = page_info.program_weight
         self.erased = None # Whether the data all matches the erased value.
         self.same = None
@@ -118,6 +127,69 @@ class _FlashPage(object):
         return "<_FlashPage@%x addr=%x size=%x datalen=%x wgt=%g erased=%s same=%s>" % (
             id(self), self.addr, self.size, len(self.data), self.program_weight, self.erased, self.same)
 
+def _select_samples(items, count):
+    """! @brief Select up to _count_ evenly spaced items, including the first and last."""
+    count = min(count, len(items))
+    if count <= 0:
+        return []
+    elif count == 1:
+        return [items[0]]
+    last = len(items) - 1
+    return [items[(i * last) // (count - 1)] for i in range(count)]
+
+class _PageBufferPipeline(object):
+    """! @brief Loads pages into the flash algo's page buffers ahead of programming them.
+
+    While a page is being programmed from one buffer, the following pages are transferred into
+    all of the other free buffers. Pages can also be loaded while other algo functions, such as a
+    sector erase, are running.
+    """
+    def __init__(self, flash, pages):
+        self._flash = flash
+        self._pages = iter(pages)
+        self._next_page = next(self._pages, None)
+        self._free_buffers = deque(range(flash.page_buffer_count))
+        self._loaded = deque()
+
+    def load(self, limit=None):
+        """! @brief Load pending pages into free page buffers.
+        @param self
+        @param limit Maximum number of pages to load. If None, all free buffers are filled.
+        """
+        count = 0
+        while self._free_buffers and (self._next_page is not None) and (limit is None or count < limit):
+            buffer_number = self._free_buffers.popleft()
+            page = self._next_page
+            self._flash.load_page_buffer(buffer_number, page.addr, page.data)
+            self._loaded.append((buffer_number, page))
+            self._next_page = next(self._pages, None)
+            count += 1
+
+    def program(self):
+        """! @brief Generator that programs all pages, yielding each page once it is programmed.
+
+        Must be called with the flash algo inited for programming.
+
+        @exception FlashProgramFailure
+        """
+        while True:
+            if not self._loaded:
+                self.load(1)
+                if not self._loaded:
+                    break
+            buffer_number, page = self._loaded.popleft()
+            self._flash.start_program_page_with_buffer(buffer_number, page.addr)
+
+            # Transfer following pages while this one is programmed.
+            self.load()
+
+            result = self._flash.wait_for_completion()
+            if result != 0:
+                raise FlashProgramFailure('program_page(0x%x) error: %i'
+                        % (page.addr, result), page.addr, result)
+            self._free_buffers.append(buffer_number)
+            yield page
+
 class _FlashOperation(object):
     """! @brief Holds requested data to be programmed at a given address."""
     def __init__(self, addr, data):
@@ -149,11 +221,20 @@ class FlashBuilder(object):
     # Type of flash analysis
     FLASH_ANALYSIS_CRC32 = "CRC32"
     FLASH_ANALYSIS_PARTIAL_PAGE_READ = "PAGE_READ"
+    
+    # Type of verify, in addition to FLASH_ANALYSIS_CRC32
+    FLASH_VERIFY_READ = "READ"
 
     def __init__(self, flash):
         self.flash = flash
         self.flash_start = flash.region.start
         self.flash_operation_list = []
+        self.baseline_operation_list = []
+        self.known_page_hashes = {}
+        self._known_sectors = []
+        self._known_sector_addrs = []
+        self._known_pages = []
+        self._known_page_addrs = []
         self.sector_list = []
         self.page_list = []
         self.perf = ProgrammingInfo()
@@ -179,7 +260,9 @@ class FlashBuilder(object):
         @param self
         @param addr Base address of the block of data passed to this method. The entire block of
             data must be contained within the flash memory region associated with this instance.
-        @param data Data to be programmed. Should be a list of byte values.
+        @param data Data to be programmed. May be any sequence of byte values, such as a list,
+            bytearray, or memoryview. The data is not copied until program() is called, so a
+            memoryview of a memory mapped file is only paged in as pages are built.
         
         @exception ValueError Attempt to add overlapping data, or address range of added data is
             outside the address range of the flash region associated with the builder.
@@ -193,23 +276,141 @@ class FlashBuilder(object):
             raise ValueError("Flash address range 0x%x-0x%x is not contained within region '%s'" %
                 (addr, addr + len(data) - 1, self.flash.region.name))
 
-        # Add operation to list
-        self.flash_operation_list.append(_FlashOperation(addr, data))
+        # Insert the operation in address order, verifying that it does not overlap its neighbours.
+        new_operation = _FlashOperation(addr, data)
+        index = bisect_right([operation.addr for operation in self.flash_operation_list], addr)
+        neighbours = self.flash_operation_list[max(0, index - 1):index + 1]
+        for first, second in ((neighbours[0], new_operation), (new_operation, neighbours[-1])) if neighbours else ():
+            if first is not second and first.addr <= second.addr and first.addr + len(first.data) > second.addr:
+                raise ValueError("Error adding data - Data at 0x%x..0x%x overlaps with 0x%x..0x%x"
+                        % (first.addr, first.addr + len(first.data),
+                           second.addr, second.addr + len(second.data)))
+        self.flash_operation_list.insert(index, new_operation)
         self.buffered_data_size += len(data)
+    
+    def add_baseline_data(self, addr, data):
+        """! @brief Add a block of data that is known to already be programmed.
+
+        If baseline data has been added, pages entirely covered by the baseline are compared with
+        the new data on the host instead of being analyzed on the target, provided that a sample
+        of the baseline pages is verified on the target first. The number of sample pages is set
+        by the 'flash_baseline_samples' session option.
 
-        # Keep list sorted
-        self.flash_operation_list = sorted(self.flash_operation_list, key=lambda operation: operation.addr)
+        @param self
+        @param addr Base address of the block of baseline data.
+        @param data The baseline data. Should be a list of byte values.
+
+        @exception ValueError Address range of the data is outside the flash region.
+        """
+        if len(data) == 0:
+            return
+        if not self.flash.region.contains_range(start=addr, length=len(data)):
+            raise ValueError("Flash address range 0x%x-0x%x is not contained within region '%s'" %
+                (addr, addr + len(data) - 1, self.flash.region.name))
+        self.baseline_operation_list.append(_FlashOperation(addr, data))
+        self.baseline_operation_list.sort(key=lambda operation: operation.addr)
+
+    def add_page_hashes(self, hashes):
+        """! @brief Provide precomputed hashes of full pages of the data added with add_data().
+        
+        @param self
+        @param hashes Dict of page address to the page_hash() of the page's data.
+        """
+        self.known_page_hashes.update(hashes)
+
+    def add_page_layout(self, sector_infos, page_infos):
+        """! @brief Provide precomputed info about the sectors and pages the added data covers.
+        
+        The info is used instead of asking the flash instance while pages are built. Sectors and
+        pages not in the provided lists are still looked up from the flash instance. See
+        get_page_layout().
+        
+        @param self
+        @param sector_infos List of SectorInfo objects.
+        @param page_infos List of PageInfo objects.
+        """
+        self._known_sectors = sorted(self._known_sectors + list(sector_infos), key=lambda i: i.base_addr)
+        self._known_sector_addrs = [info.base_addr for info in self._known_sectors]
+        self._known_pages = sorted(self._known_pages + list(page_infos), key=lambda i: i.base_addr)
+        self._known_page_addrs = [info.base_addr for info in self._known_pages]
+
+    def get_page_layout(self):
+        """! @brief Return info about every sector the added data covers and all pages within them.
         
-        # Verify this does not overlap
-        prev_flash_operation = None
+        Only the flash instance is consulted, so the target is not accessed.
+        
+        @return Tuple of lists of SectorInfo and PageInfo objects, in address order.
+        
+        @exception FlashFailure Could not get sector or page info for an address.
+        """
+        sector_infos = []
+        page_infos = []
         for operation in self.flash_operation_list:
-            if prev_flash_operation is not None:
-                if prev_flash_operation.addr + len(prev_flash_operation.data) > operation.addr:
-                    raise ValueError("Error adding data - Data at 0x%x..0x%x overlaps with 0x%x..0x%x"
-                            % (prev_flash_operation.addr, prev_flash_operation.addr + len(prev_flash_operation.data),
-                               operation.addr, operation.addr + len(operation.data)))
-            prev_flash_operation = operation
-    
+            addr = operation.addr
+            end = operation.addr + len(operation.data)
+            if sector_infos:
+                last_sector = sector_infos[-1]
+                addr = max(addr, last_sector.base_addr + last_sector.size)
+            while addr < end:
+                sector_info = self._require_info(self.flash.get_sector_info, addr)
+                sector_infos.append(sector_info)
+                page_addr = sector_info.base_addr
+                while page_addr < sector_info.base_addr + sector_info.size:
+                    page_info = self._require_info(self.flash.get_page_info, page_addr)
+                    page_infos.append(page_info)
+                    page_addr += page_info.size
+                addr = sector_info.base_addr + sector_info.size
+        return sector_infos, page_infos
+
+    def get_erase_method(self, chip_erase=None):
+        """! @brief Resolve the erase method as far as possible without accessing the target.
+        
+        The rules program() uses to choose between chip and sector erase that depend only on the
+        flash algo and the address of the added data are applied. Whether chip erase is faster
+        for "auto" otherwise depends on the current flash contents, so is left to program().
+        
+        @param self
+        @param chip_erase Requested erase method, one of "chip", "sector", "auto", or None.
+        @return One of "chip", "sector", or "auto".
+        """
+        assert len(self.flash_operation_list) > 0
+        page_info = self._require_info(self.flash.get_page_info, self.flash_operation_list[0].addr)
+        chip_erase = self._apply_static_erase_rules(self._convert_chip_erase(chip_erase),
+                        page_info.base_addr)
+        return {None: "auto", False: "sector", True: "chip"}[chip_erase]
+
+    def _require_info(self, getter, addr):
+        info = getter(addr)
+        if info is None:
+            raise FlashFailure("Attempt to program flash at invalid address 0x%08x" % addr)
+        return info
+
+    def _get_sector_info(self, addr):
+        """! @brief Return the SectorInfo for an address, using info from add_page_layout() if possible."""
+        index = bisect_right(self._known_sector_addrs, addr) - 1
+        if index >= 0:
+            info = self._known_sectors[index]
+            if addr < info.base_addr + info.size:
+                return info
+        return self.flash.get_sector_info(addr)
+
+    def _get_page_info(self, addr):
+        """! @brief Return the PageInfo for an address, using info from add_page_layout() if possible."""
+        index = bisect_right(self._known_page_addrs, addr) - 1
+        if index >= 0:
+            info = self._known_pages[index]
+            if addr < info.base_addr + info.size:
+                return info
+        return self.flash.get_page_info(addr)
+
+    def _get_page_hash(self, page):
+        """! @brief Return the page_hash() of a page's data, using a precomputed hash if possible."""
+        if len(page.data) == page.size:
+            crc = self.known_page_hashes.get(page.addr)
+            if crc is not None:
+                return crc
+        return page_hash(page.data)
+
     def _enable_read_access(self):
         """! @brief Ensure flash is accessible by initing the algo for verify.
         
@@ -236,11 +437,11 @@ class FlashBuilder(object):
         self.program_byte_count = 0
         
         flash_addr = self.flash_operation_list[0].addr
-        sector_info = self.flash.get_sector_info(flash_addr)
+        sector_info = self._get_sector_info(flash_addr)
         if sector_info is None:
             raise FlashFailure("Attempt to program flash at invalid address 0x%08x" % flash_addr)
         
-        page_info = self.flash.get_page_info(flash_addr)
+        page_info = self._get_page_info(flash_addr)
         if page_info is None:
             raise FlashFailure("Attempt to program flash at invalid address 0x%08x" % flash_addr)
 
@@ -270,7 +471,7 @@ class FlashBuilder(object):
                 
                 # Check if operation is in a different sector.
                 if flash_addr >= current_sector.addr + current_sector.size:
-                    sector_info = self.flash.get_sector_info(flash_addr)
+                    sector_info = self._get_sector_info(flash_addr)
                     if sector_info is None:
                         raise FlashFailure("Attempt to program flash at invalid address 0x%08x" % flash_addr)
                     current_sector = _FlashSector(sector_info)
@@ -282,7 +483,7 @@ class FlashBuilder(object):
                     fill_end_of_page_gap()
                     
                     # Create the new page.
-                    page_info = self.flash.get_page_info(flash_addr)
+                    page_info = self._get_page_info(flash_addr)
                     if page_info is None:
                         raise FlashFailure("Attempt to program flash at invalid address 0x%08x" % flash_addr)
                     current_page = _FlashPage(page_info)
@@ -325,12 +526,12 @@ class FlashBuilder(object):
             sector_page_addr = sector.addr
 
             def add_page_with_existing_data():
-                page_info = self.flash.get_page_info(sector_page_addr)
+                page_info = self._get_page_info(sector_page_addr)
                 if page_info is None:
                     raise FlashFailure("Attempt to program flash at invalid address 0x%08x" % sector_page_addr)
                 new_page = _FlashPage(page_info)
                 self._enable_read_access()
-                new_page.data = self.flash.target.read_memory_block8(new_page.addr, new_page.size)
+                new_page.data = bytearray(self.flash.target.read_memory_block8(new_page.addr, new_page.size))
                 new_page.same = True
                 sector.add_page(new_page)
                 self.page_list.append(new_page)
@@ -353,7 +554,8 @@ class FlashBuilder(object):
                 page = add_page_with_existing_data()
                 sector_page_addr += page.size
 
-    def program(self, chip_erase=None, progress_cb=None, smart_flash=True, fast_verify=False, keep_unwritten=True):
+    def program(self, chip_erase=None, progress_cb=None, smart_flash=True, fast_verify=False, keep_unwritten=True,
+            content_cache=None, verify=False, cleanup=True, reset=True):
         """! @brief Determine fastest method of flashing and then run flash programming.
 
         Data must have already been added with add_data().
@@ -378,6 +580,25 @@ class FlashBuilder(object):
             written, there may be ranges of flash that would be erased but not written with new
             data. This parameter sets whether the existing contents of those unwritten ranges will
             be read from memory and restored while programming.
+        @param content_cache Optional FlashContentCache instance. If smart_flash is enabled, pages
+            whose data matches the hash recorded in the cache are marked as the same without
+            analysis, after a few sentinel pages are verified on the target. The cache is updated
+            with the hashes of all pages once programming succeeds.
+        @param verify If True, every page that was erased or programmed is verified after
+            programming. The CRC32 analyzer is run over large blocks of flash, and only pages
+            within a mismatching block are checked individually and read back. Without the
+            analyzer, all pages are read back. The time taken is reported separately from the
+            programming time, in the verify_time attribute of the returned ProgrammingInfo.
+        
+        @param cleanup If False, the flash algo is uninited but left loaded with the target still
+            prepared to run it, so the caller can continue using it for another region with
+            Flash.take_over_target(). The target is not reset.
+        @param reset Whether to reset the target after cleaning up. Only applies if _cleanup_ is
+            True. Pass False if the target will be reset anyway, for instance by the next flash
+            algo init.
+        
+        @exception FlashProgramFailure Verify was enabled and the contents of a page differ from
+            the data that was programmed.
         """
 
         # Send notification that we're about to program flash.
@@ -403,15 +624,7 @@ class FlashBuilder(object):
             LOG.warning("No pages were programmed")
             return
         
-        # Convert chip_erase.
-        if (chip_erase is None) or (chip_erase == "auto"):
-            chip_erase = None
-        elif chip_erase == "sector":
-            chip_erase = False
-        elif chip_erase == "chip":
-            chip_erase = True
-        else:
-            raise ValueError("invalid chip_erase value '{}'".format(chip_erase))
+        chip_erase = self._convert_chip_erase(chip_erase)
 
         # Convert the list of flash operations into flash sectors and pages
         self._build_sectors_and_pages(keep_unwritten)
@@ -422,19 +635,14 @@ class FlashBuilder(object):
         # as requiring programming
         if not smart_flash:
             self._mark_all_pages_for_programming()
+        else:
+            if self.baseline_operation_list:
+                self._apply_baseline()
+            if content_cache is not None:
+                self._apply_content_cache(content_cache)
+        self.baseline_operation_list = []
         
-        # If the flash algo doesn't support erase all, disable chip erase.
-        if not self.flash.is_erase_all_supported:
-            chip_erase = False
-
-        # If the first page being programmed is not the first page
-        # in flash then don't use a chip erase unless explicitly directed to.
-        if self.page_list[0].addr > self.flash_start:
-            if chip_erase is None:
-                chip_erase = False
-            elif chip_erase is True:
-                LOG.warning('Chip erase used when flash address 0x%x is not the same as flash start 0x%x',
-                    self.page_list[0].addr, self.flash_start)
+        chip_erase = self._apply_static_erase_rules(chip_erase, self.page_list[0].addr)
 
         chip_erase_count, chip_erase_program_time = self._compute_chip_erase_pages_and_weight()
         sector_erase_min_program_time = self._compute_sector_erase_pages_weight_min()
@@ -454,6 +662,10 @@ class FlashBuilder(object):
             LOG.debug("Chip erase weight %f, sector erase weight %f" % (chip_erase_program_time, page_program_time))
             chip_erase = chip_erase_program_time < page_program_time
 
+        # Forget the region's recorded contents until programming has succeeded.
+        if content_cache is not None:
+            content_cache.begin_update(self.flash.region)
+
         if chip_erase:
             if self.flash.is_double_buffering_supported and self.enable_double_buffering:
                 LOG.debug("Using double buffer chip erase program")
@@ -467,12 +679,21 @@ class FlashBuilder(object):
             else:
                 flash_operation = self._sector_erase_program(progress_cb)
 
-        # Cleanup flash algo and reset target after programming.
-        self.flash.cleanup()
-        self.flash.target.reset_and_halt()
+        # Verify before cleanup, while the algo and analyzer are still loaded.
+        if verify:
+            self._verify_programmed_pages(chip_erase)
+
+        # Cleanup flash algo and reset target after programming, unless the caller will continue
+        # to use the algo or reset the target itself.
+        if cleanup:
+            self.flash.cleanup()
+            if reset:
+                self.flash.target.reset_and_halt()
+        else:
+            self.flash.uninit()
 
         program_finish = time()
-        self.perf.program_time = program_finish - program_start
+        self.perf.program_time = program_finish - program_start - (self.perf.verify_time or 0)
         self.perf.program_type = flash_operation
 
         erase_byte_count = 0
@@ -500,6 +721,15 @@ class FlashBuilder(object):
         self.perf.erase_sector_count = erase_sector_count
         self.perf.skipped_byte_count = skipped_byte_count
         self.perf.skipped_page_count = skipped_page_count
+
+        if content_cache is not None:
+            if chip_erase:
+                erased_ranges = [(self.flash.region.start, self.flash.region.end + 1)]
+            else:
+                erased_ranges = [(sector.addr, sector.addr + sector.size)
+                                    for sector in self.sector_list if sector.are_any_pages_not_same()]
+            content_cache.end_update(self.flash.region,
+                {page.addr: self._get_page_hash(page) for page in self.page_list}, erased_ranges)
         
         if self.log_performance:
             if chip_erase:
@@ -529,6 +759,34 @@ class FlashBuilder(object):
                 sector.erased = False
                 page.same = False
 
+    @staticmethod
+    def _convert_chip_erase(chip_erase):
+        """! @brief Convert a chip_erase argument to True for chip, False for sector, or None for auto."""
+        if (chip_erase is None) or (chip_erase == "auto"):
+            return None
+        elif chip_erase == "sector":
+            return False
+        elif chip_erase == "chip":
+            return True
+        else:
+            raise ValueError("invalid chip_erase value '{}'".format(chip_erase))
+
+    def _apply_static_erase_rules(self, chip_erase, first_page_addr):
+        """! @brief Apply the erase method rules that don't depend on flash contents."""
+        # If the flash algo doesn't support erase all, disable chip erase.
+        if not self.flash.is_erase_all_supported:
+            return False
+
+        # If the first page being programmed is not the first page
+        # in flash then don't use a chip erase unless explicitly directed to.
+        if first_page_addr > self.flash_start:
+            if chip_erase is None:
+                return False
+            elif chip_erase is True:
+                LOG.warning('Chip erase used when flash address 0x%x is not the same as flash start 0x%x',
+                    first_page_addr, self.flash_start)
+        return chip_erase
+
     def _compute_chip_erase_pages_and_weight(self):
         """! @brief Compute the number of erased pages.
 
@@ -548,7 +806,214 @@ class FlashBuilder(object):
         return chip_erase_count, chip_erase_weight
 
     def _compute_sector_erase_pages_weight_min(self):
-        return sum(page.get_verify_weight() for page in self.page_list)
+        return sum(page.get_verify_weight() for page in self.page_list if page.same is not True)
+
+    def _apply_content_cache(self, content_cache):
+        """! @brief Mark pages recorded in the content cache as the same.
+
+        Pages whose data hash matches the hash recorded when they were last programmed are
+        candidates. A few candidates, including the first and last, are verified on the target as
+        sentinels. If all sentinels match, every candidate is marked as the same, so it will not
+        be analyzed or programmed. Otherwise the region's recorded hashes are discarded.
+        """
+        recorded = content_cache.get_page_hashes(self.flash.region)
+        if not recorded:
+            return
+
+        candidates = []
+        for page in self.page_list:
+            if page.same is None:
+                page.crc = self._get_page_hash(page)
+                if recorded.get(page.addr) == page.crc:
+                    candidates.append(page)
+        if not candidates:
+            return
+
+        sentinels = _select_samples(candidates, content_cache.sentinel_count)
+        if not self._verify_contents([(page.addr, page.data) for page in sentinels]):
+            LOG.info("Flash contents differ from cache; discarding cached page hashes")
+            content_cache.invalidate(self.flash.region)
+            return
+
+        LOG.debug("%s unchanged according to the flash cache", get_page_count(len(candidates)))
+        for page in candidates:
+            page.same = True
+        self.perf.cached_page_count = len(candidates)
+
+    def _get_baseline_data(self, addr, size):
+        """! @brief Return the baseline data for an address range.
+        @return A bytearray, or None if the range is not entirely covered by baseline data.
+        """
+        operations = self.baseline_operation_list
+        i = bisect_right([operation.addr for operation in operations], addr) - 1
+        result = bytearray()
+        while len(result) < size:
+            if not (0 <= i < len(operations)):
+                return None
+            operation = operations[i]
+            offset = addr + len(result) - operation.addr
+            if not (0 <= offset < len(operation.data)):
+                return None
+            result += bytearray(operation.data[offset:offset + size - len(result)])
+            i += 1
+        return result
+
+    def _apply_baseline(self):
+        """! @brief Determine which pages changed by comparing with the baseline image.
+
+        A sample of the pages covered by the baseline, including the first and last, is verified
+        on the target. If the sample matches, every covered page is marked as the same or not by
+        comparing the baseline and new data on the host. Otherwise the baseline is ignored and the
+        pages are analyzed as usual.
+        """
+        known = []
+        for page in self.page_list:
+            if page.same is None:
+                data = self._get_baseline_data(page.addr, page.size)
+                if data is not None:
+                    known.append((page, data))
+        if not known:
+            return
+
+        samples = _select_samples(known, self.flash.target.session.options.get('flash_baseline_samples'))
+        if not self._verify_contents([(page.addr, data) for page, data in samples]):
+            LOG.warning("Flash contents do not match the baseline image; analyzing all pages")
+            return
+
+        for page, data in known:
+            page.same = same(data, page.data)
+        changed_count = sum(1 for page, _ in known if not page.same)
+        LOG.debug("%s changed from the baseline image", get_page_count(changed_count))
+        self.perf.baseline_page_count = len(known)
+
+    def _verify_contents(self, ranges):
+        """! @brief Check whether the target flash contains the expected data.
+
+        Uses the CRC32 analyzer if supported, otherwise reads back the data.
+
+        @param self
+        @param ranges List of (address, data) tuples. The length of each data must be a page size.
+        @return Boolean. False if the contents cannot be verified.
+        """
+        if not ranges:
+            return True
+        if self.flash.get_flash_info().crc_supported:
+            self._enable_read_access()
+            crc_list = self.flash.compute_crcs([(addr, len(data)) for addr, data in ranges])
+            return all(page_hash(data) == crc for (_, data), crc in zip(ranges, crc_list))
+        elif self.flash.region.is_readable:
+            self._enable_read_access()
+            return all(same(self.flash.target.read_memory_block8(addr, len(data)), data)
+                        for addr, data in ranges)
+        else:
+            return False
+
+    def _get_padded_page_data(self, page):
+        """! @brief Return the data of a page, padded to the page size with the erased byte value."""
+        pad_size = page.size - len(page.data)
+        if pad_size > 0:
+            return page.data + bytearray([self.flash.region.erased_byte_value]) * pad_size
+        return page.data
+
+    @staticmethod
+    def _get_verify_blocks(pages, max_size):
+        """! @brief Group pages into blocks that can be checked with a single CRC.
+
+        The CRC32 analyzer requires each range to have a power of two size and be aligned to its
+        size. Each block is the largest such range, up to _max_size_, that is exactly filled by
+        contiguous pages. A page that can't be combined with its neighbours forms its own block.
+
+        @return List of lists of pages.
+        """
+        max_size = 1 << (max(max_size, 1).bit_length() - 1)
+        blocks = []
+        i = 0
+        while i < len(pages):
+            addr = pages[i].addr
+            j = i + 1
+            size = max_size
+            while size > pages[i].size:
+                if addr % size == 0:
+                    end = addr
+                    k = i
+                    while k < len(pages) and pages[k].addr == end and end < addr + size:
+                        end += pages[k].size
+                        k += 1
+                    if end == addr + size:
+                        j = k
+                        break
+                size //= 2
+            blocks.append(pages[i:j])
+            i = j
+        return blocks
+
+    def _verify_programmed_pages(self, chip_erase):
+        """! @brief Verify every page that was erased or programmed.
+
+        With the CRC32 analyzer, CRCs are computed on the target for large blocks of pages, sized
+        by the 'flash_verify_chunk_size' option. The pages of mismatching blocks are then checked
+        with one CRC per page, and only pages whose CRC still mismatches are read back. Without the
+        analyzer, all pages are read back.
+
+        @exception FlashProgramFailure The contents of a page differ from its data.
+        """
+        verify_start = time()
+
+        # Chip erase reprograms every page, while sector erase leaves same pages untouched.
+        if chip_erase:
+            pages = self.page_list
+        else:
+            pages = [page for page in self.page_list if page.same is not True]
+        if not pages:
+            return
+
+        self.flash.init(self.flash.Operation.VERIFY)
+        if self.flash.get_flash_info().crc_supported:
+            self.perf.verify_type = FlashBuilder.FLASH_ANALYSIS_CRC32
+            chunk_size = self.flash.target.session.options.get('flash_verify_chunk_size')
+            blocks = self._get_verify_blocks(pages, chunk_size)
+            expected_crcs = []
+            for block in blocks:
+                crc = 0
+                for page in block:
+                    crc = crc32(self._get_padded_page_data(page), crc)
+                expected_crcs.append(crc & 0xFFFFFFFF)
+            crc_list = self.flash.compute_crcs([(block[0].addr, sum(page.size for page in block))
+                                                for block in blocks])
+            suspect_pages = []
+            for block, expected, crc in zip(blocks, expected_crcs, crc_list):
+                if expected != crc:
+                    suspect_pages.extend(block)
+
+            # Narrow mismatching blocks down to pages.
+            if any(len(block) > 1 for block in blocks) and suspect_pages:
+                crc_list = self.flash.compute_crcs([(page.addr, page.size) for page in suspect_pages])
+                suspect_pages = [page for page, crc in zip(suspect_pages, crc_list)
+                                if page_hash(self._get_padded_page_data(page)) != crc]
+        elif self.flash.region.is_readable:
+            self.perf.verify_type = FlashBuilder.FLASH_VERIFY_READ
+            suspect_pages = pages
+        else:
+            LOG.warning("Unable to verify flash region '%s' because it is not readable and the CRC "
+                        "analyzer is not supported", self.flash.region.name)
+            return
+
+        for page in suspect_pages:
+            if not self.flash.region.is_readable:
+                raise FlashProgramFailure("verify failed for page at 0x%08x" % page.addr, page.addr)
+            self.perf.verify_read_page_count += 1
+            data = self._get_padded_page_data(page)
+            actual = self.flash.target.read_memory_block8(page.addr, page.size)
+            if not same(actual, data):
+                offset = next(i for i in range(page.size) if actual[i] != data[i])
+                raise FlashProgramFailure("verify failed at 0x%08x: expected 0x%02x, read 0x%02x"
+                            % (page.addr + offset, data[offset], actual[offset]), page.addr + offset)
+
+        self.perf.verify_byte_count = sum(page.size for page in pages)
+        self.perf.verify_time = time() - verify_start
+        LOG.debug("Verified %d bytes (%s) in %.3f s, read back %s", self.perf.verify_byte_count,
+                    get_page_count(len(pages)), self.perf.verify_time,
+                    get_page_count(self.perf.verify_read_page_count))
 
     def _analyze_pages_with_partial_read(self):
         """! @brief Estimate how many pages are the same by reading data.
@@ -591,11 +1056,11 @@ class FlashBuilder(object):
                 sector_list.append((page.addr, page.size))
                 page_list.append(page)
                 # Compute CRC of data (Padded with 0xFF)
-                data = list(page.data)
                 pad_size = page.size - len(page.data)
                 if pad_size > 0:
-                    data.extend([0xFF] * pad_size)
-                page.crc = crc32(bytearray(data)) & 0xFFFFFFFF
+                    page.crc = crc32(page.data + bytearray([0xFF]) * pad_size) & 0xFFFFFFFF
+                else:
+                    page.crc = self._get_page_hash(page)
 
         # Analyze pages
         if len(page_list) > 0:
@@ -681,62 +1146,32 @@ class FlashBuilder(object):
         progress_cb(1.0)
         return FlashBuilder.FLASH_CHIP_ERASE
 
-    def _next_unerased_page(self, i):
-        if i >= len(self.page_list):
-            return None, i
-        page = self.page_list[i]
-        while page.erased:
-            i += 1
-            if i >= len(self.page_list):
-                return None, i
-            page = self.page_list[i]
-        return page, i + 1
-
     def _chip_erase_program_double_buffer(self, progress_cb=_stub_progress):
-        """! @brief Double-buffered program by first performing an erase all."""
+        """! @brief Double-buffered program by first performing an erase all.
+
+        Page buffers are loaded while the chip erase is running.
+        """
         LOG.debug("%i of %i pages have erased data", len(self.page_list) - self.chip_erase_count, len(self.page_list))
         progress_cb(0.0)
         progress = 0
 
+        pipeline = _PageBufferPipeline(self.flash, [page for page in self.page_list if not page.erased])
+
         self.flash.init(self.flash.Operation.ERASE)
-        self.flash.erase_all()
+        self.flash.start_erase_all()
+        pipeline.load()
+        result = self.flash.wait_for_completion()
+        if result != 0:
+            raise FlashEraseFailure('erase_all error: %i' % result, result_code=result)
         self.flash.uninit()
         
         progress += self.flash.get_flash_info().erase_weight
         progress_cb(float(progress) / float(self.chip_erase_weight))
 
-        # Set up page and buffer info.
-        current_buf = 0
-        next_buf = 1
-        page, i = self._next_unerased_page(0)
-        assert page is not None
-
-        # Load first page buffer
-        self.flash.load_page_buffer(current_buf, page.addr, page.data)
-
         self.flash.init(self.flash.Operation.PROGRAM)
-        while page is not None:
-            # Kick off this page program.
-            current_addr = page.addr
-            current_weight = page.get_program_weight()
-            self.flash.start_program_page_with_buffer(current_buf, current_addr)
-
-            # Get next page and load it.
-            page, i = self._next_unerased_page(i)
-            if page is not None:
-                self.flash.load_page_buffer(next_buf, page.addr, page.data)
-
-            # Wait for the program to complete.
-            result = self.flash.wait_for_completion()
-            if result != 0:
-                raise FlashProgramFailure('program_page(0x%x) error: %i'
-                        % (current_addr, result), current_addr, result)
-
-            # Swap buffers.
-            current_buf, next_buf = next_buf, current_buf
-
+        for page in pipeline.program():
             # Update progress.
-            progress += current_weight
+            progress += page.get_program_weight()
             progress_cb(float(progress) / float(self.chip_erase_weight))
         
         self.flash.uninit()
@@ -832,19 +1267,11 @@ class FlashBuilder(object):
         
         return progress
 
-    def _next_nonsame_page(self, i):
-        if i >= len(self.page_list):
-            return None, i
-        page = self.page_list[i]
-        while page.same:
-            i += 1
-            if i >= len(self.page_list):
-                return None, i
-            page = self.page_list[i]
-        return page, i + 1
-
     def _sector_erase_program_double_buffer(self, progress_cb=_stub_progress):
-        """! @brief Double-buffered program by performing sector erases."""
+        """! @brief Double-buffered program by performing sector erases.
+
+        Page buffers are loaded while the sectors are being erased.
+        """
         actual_sector_erase_count = 0
         actual_sector_erase_weight = 0
         progress = 0
@@ -855,12 +1282,20 @@ class FlashBuilder(object):
         # to read from flash while simultaneously programming it.
         progress = self._scan_pages_for_same(progress_cb)
 
+        pages = [page for page in self.page_list if not page.same]
+        pipeline = _PageBufferPipeline(self.flash, pages)
+
         # Erase all sectors up front.
         self.flash.init(self.flash.Operation.ERASE)
         for sector in self.sector_list:
             if sector.are_any_pages_not_same():
-                # Erase the sector
-                self.flash.erase_sector(sector.addr)
+                # Erase the sector, loading a page buffer while waiting.
+                self.flash.start_erase_sector(sector.addr)
+                pipeline.load(1)
+                result = self.flash.wait_for_completion()
+                if result != 0:
+                    raise FlashEraseFailure('erase_sector(0x%x) error: %i'
+                            % (sector.addr, result), sector.addr, result)
                 
                 # Update progress
                 progress += sector.erase_weight
@@ -868,49 +1303,18 @@ class FlashBuilder(object):
                     progress_cb(float(progress) / float(self.sector_erase_weight))
         self.flash.uninit()
 
-        # Set up page and buffer info.
-        current_buf = 0
-        next_buf = 1
-        page, i = self._next_nonsame_page(0)
-
-        # Make sure there are actually pages to program differently from current flash contents.
-        if page is not None:
+        # Program pages that differ from current flash contents.
+        if pages:
             self.flash.init(self.flash.Operation.PROGRAM)
-
-            # Load first page buffer
-            self.flash.load_page_buffer(current_buf, page.addr, page.data)
-
-            while page is not None:
+            for page in pipeline.program():
                 assert page.same is not None
-
-                # Kick off this page program.
-                current_addr = page.addr
-                current_weight = page.get_program_weight()
-
-                self.flash.start_program_page_with_buffer(current_buf, current_addr)
-                
                 actual_sector_erase_count += 1
                 actual_sector_erase_weight += page.get_program_weight()
 
-                # Get next page and load it.
-                page, i = self._next_nonsame_page(i)
-                if page is not None:
-                    self.flash.load_page_buffer(next_buf, page.addr, page.data)
-
-                # Wait for the program to complete.
-                result = self.flash.wait_for_completion()
-                if result != 0:
-                    raise FlashProgramFailure('program_page(0x%x) error: %i'
-                            % (current_addr, result), current_addr, result)
-                
-                # Swap buffers.
-                current_buf, next_buf = next_buf, current_buf
-
                 # Update progress
-                progress += current_weight
+                progress += page.get_program_weight()
                 if self.sector_erase_weight > 0:
                     progress_cb(float(progress) / float(self.sector_erase_weight))
-
             self.flash.uninit()
 
         progress_cb(1.0)
@@ -0,0 +1,170 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import errno
+import json
+import logging
+import os
+import re
+from binascii import crc32
+
+from ..utility.compatibility import PY3
+
+LOG = logging.getLogger(__name__)
+
+def page_hash(data):
+    """! @brief Compute the hash recorded for a page of flash data.
+
+    This is the same CRC32 computed by the flash analyzer, so recorded hashes can be checked on
+    the target without reading back page contents.
+    """
+    return crc32(bytearray(data)) & 0xFFFFFFFF
+
+class FlashContentCache(object):
+    """! @brief Persistent record of the page hashes last programmed to a device.
+
+    One cache file exists per debug probe and target type. It holds a hash for every flash page
+    that was programmed by pyOCD while the cache was enabled, grouped by flash region. The
+    contents of a region are forgotten before the region is modified, and recorded again once
+    programming completes successfully, so an interrupted programming operation never leaves
+    stale hashes behind.
+
+    The cache can only be trusted if the device is not modified by other means. The
+    FlashBuilder checks a few sentinel pages on the target before relying on it; the number of
+    sentinel pages is set by the 'flash_cache_sentinels' option.
+    """
+
+    ## Format version written to cache files. Files with a different version are ignored.
+    VERSION = 1
+
+    def __init__(self, path, key, sentinel_count=4):
+        self._path = path
+        self._key = key
+        self.sentinel_count = sentinel_count
+        self._regions = {}
+        self._pending = {}
+        self._load()
+
+    @classmethod
+    def for_session(cls, session):
+        """! @brief Create the cache for a session's probe and target.
+        @return FlashContentCache instance, or None if caching is disabled by the 'flash_cache_dir'
+            option or the session has no probe.
+        """
+        cache_dir = session.options.get('flash_cache_dir')
+        if not cache_dir or session.probe is None:
+            return None
+        cache_dir = os.path.expanduser(cache_dir)
+        if not os.path.isabs(cache_dir):
+            cache_dir = os.path.join(session.project_dir, cache_dir)
+        key = "%s-%s" % (session.probe.unique_id, session.board.target_type)
+        filename = re.sub(r'[^A-Za-z0-9_.-]', '_', key) + ".json"
+        return cls(os.path.join(cache_dir, filename), key,
+                    session.options.get('flash_cache_sentinels'))
+
+    @property
+    def path(self):
+        return self._path
+
+    @staticmethod
+    def _region_key(region):
+        return "%08x" % region.start
+
+    def _load(self):
+        try:
+            with open(self._path, 'r') as f:
+                contents = json.load(f)
+        except IOError as err:
+            if err.errno != errno.ENOENT:
+                LOG.warning("Unable to read flash cache %s: %s", self._path, err)
+            return
+        except ValueError as err:
+            LOG.warning("Ignoring invalid flash cache %s: %s", self._path, err)
+            return
+
+        if contents.get('version') != self.VERSION or contents.get('key') != self._key:
+            LOG.debug("Ignoring flash cache %s with mismatched version or key", self._path)
+            return
+        for region_key, region_info in contents.get('regions', {}).items():
+            self._regions[region_key] = {int(addr, 16): value
+                                            for addr, value in region_info['pages'].items()}
+
+    def save(self):
+        """! @brief Write the cache file.
+
+        The file is written under a temporary name and then renamed, so a concurrent reader never
+        sees a partially written file.
+        """
+        contents = {
+            'version': self.VERSION,
+            'key': self._key,
+            'regions': {region_key: {'pages': {"%08x" % addr: value for addr, value in pages.items()}}
+                        for region_key, pages in self._regions.items()},
+            }
+        temp_path = self._path + ".tmp"
+        try:
+            cache_dir = os.path.dirname(self._path)
+            if cache_dir and not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            with open(temp_path, 'w') as f:
+                json.dump(contents, f, sort_keys=True)
+            if PY3:
+                os.replace(temp_path, self._path)
+            else:
+                if os.path.exists(self._path):
+                    os.remove(self._path)
+                os.rename(temp_path, self._path)
+        except (IOError, OSError) as err:
+            LOG.warning("Unable to write flash cache %s: %s", self._path, err)
+
+    def get_page_hashes(self, region):
+        """! @brief Return a dict of page address to recorded hash for a flash region."""
+        return self._regions.get(self._region_key(region), {})
+
+    def invalidate(self, region=None):
+        """! @brief Forget recorded hashes for one region, or for all regions if None."""
+        if region is None:
+            self._regions = {}
+        else:
+            self._regions.pop(self._region_key(region), None)
+
+    def begin_update(self, region):
+        """! @brief Forget a region's hashes before it is modified.
+
+        The cache file is saved immediately. The previous hashes are kept in memory so that
+        end_update() can restore those for pages that were not touched.
+        """
+        key = self._region_key(region)
+        self._pending[key] = self._regions.pop(key, {})
+        self.save()
+
+    def end_update(self, region, hashes, erased_ranges=()):
+        """! @brief Record the pages of a region after it was successfully modified.
+        @param self
+        @param region The flash region that was programmed.
+        @param hashes Dict of page address to hash for all pages now known to be on the target.
+        @param erased_ranges Sequence of (start, end) address ranges, with end exclusive, that were
+            erased. Previously recorded pages in these ranges that are not in @a hashes are
+            forgotten.
+        """
+        key = self._region_key(region)
+        pages = self._pending.pop(key, {})
+        for start, end in erased_ranges:
+            for addr in [a for a in pages if start <= a < end]:
+                del pages[addr]
+        pages.update(hashes)
+        self._regions[key] = pages
+        self.save()
@@ -16,29 +16,92 @@
 
 import os
 import logging
-import itertools
-from intelhex import IntelHex
+import mmap
+from binascii import unhexlify
+from bisect import bisect_right
+from elftools.elf.elffile import ELFFile
 import six
 import errno
 
 from .loader import FlashLoader
 from ..core import exceptions
 from ..debug.elf.elf import (ELFBinaryFile, SH_FLAGS)
-from ..utility.compatibility import FileNotFoundError_
+from ..utility.compatibility import (FileNotFoundError_, PY3)
 
 LOG = logging.getLogger(__name__)
 
-def ranges(i):
-    """!
-    Accepts a sorted list of byte addresses. Breaks the addresses into contiguous ranges.
-    Yields 2-tuples of the start and end address for each contiguous range.
+def read_hex_chunks(file_obj):
+    """! @brief Parse an Intel hex file a line at a time.
     
-    For instance, the input [0, 1, 2, 3, 32, 33, 34, 35] will yield the following 2-tuples:
-    (0, 3) and (32, 35).
+    Data records are joined with the preceding data record when their addresses are contiguous.
+    Only the chunk currently being accumulated is held in memory, so the file is never held in
+    memory in decoded form as a whole, nor as a sparse per-byte address map. The address range of
+    each chunk is kept to detect records that overlap data earlier in the file.
+    
+    @param file_obj File object opened in either text or binary mode.
+    @return Generator yielding (address, bytearray) tuples for each contiguous run of data.
+    @exception ValueError The file contains an invalid record, or records with overlapping data.
     """
-    for a, b in itertools.groupby(enumerate(i), lambda x: x[1] - x[0]):
-        b = list(b)
-        yield b[0][1], b[-1][1]
+    base = 0
+    chunk_addr = None
+    chunk = bytearray()
+    # Sorted start addresses and matching end addresses of the chunks yielded so far.
+    chunk_starts = []
+    chunk_ends = []
+    for line_number, line in enumerate(file_obj, 1):
+        if isinstance(line, bytes) and PY3:
+            line = line.decode('ascii', 'replace')
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            if not line.startswith(':'):
+                raise ValueError("missing start code")
+            record = bytearray(unhexlify(line[1:]))
+        except (TypeError, ValueError) as err:
+            raise ValueError("invalid hex record on line %d: %s" % (line_number, err))
+        if len(record) < 5 or len(record) != record[0] + 5:
+            raise ValueError("invalid hex record length on line %d" % line_number)
+        if sum(record) & 0xff:
+            raise ValueError("invalid hex record checksum on line %d" % line_number)
+        
+        record_type = record[3]
+        payload = record[4:-1]
+        if record_type == 0x00:
+            addr = base + ((record[1] << 8) | record[2])
+            index = bisect_right(chunk_starts, addr)
+            if ((index > 0 and chunk_ends[index - 1] > addr)
+                    or (index < len(chunk_starts) and chunk_starts[index] < addr + len(payload))
+                    or (chunk and chunk_addr < addr + len(payload) and addr < chunk_addr + len(chunk))):
+                raise ValueError("hex record on line %d overlaps data at 0x%08x" % (line_number, addr))
+            if chunk_addr is not None and chunk_addr + len(chunk) == addr:
+                chunk.extend(payload)
+                continue
+            if chunk:
+                index = bisect_right(chunk_starts, chunk_addr)
+                chunk_starts.insert(index, chunk_addr)
+                chunk_ends.insert(index, chunk_addr + len(chunk))
+                yield chunk_addr, chunk
+            chunk_addr = addr
+            chunk = bytearray(payload)
+        elif record_type == 0x01:
+            break
+        elif record_type in (0x02, 0x04):
+            if len(payload) != 2:
+                raise ValueError("invalid extended address record on line %d" % line_number)
+            shift = 4 if record_type == 0x02 else 16
+            base = ((payload[0] << 8) | payload[1]) << shift
+        # Start address records (types 3 and 5) are ignored.
+    if chunk:
+        yield chunk_addr, chunk
+
+class _BaselineLoader(object):
+    """! @brief Adapter passing data parsed from a baseline image file to a FlashLoader."""
+    def __init__(self, loader):
+        self._loader = loader
+    
+    def add_data(self, address, data):
+        self._loader.add_baseline_data(address, data)
 
 class FileProgrammer(object):
     """! @brief Class to manage programming a file in any supported format with many options.
@@ -54,7 +117,7 @@ class FileProgrammer(object):
     - ELF (.elf or .axf)
     """
     def __init__(self, session, progress=None, chip_erase=None, smart_flash=None,
-        trust_crc=None, keep_unwritten=None):
+        trust_crc=None, keep_unwritten=None, verify=None, profiler=None):
         """! @brief Constructor.
         
         @param self
@@ -74,12 +137,18 @@ class FileProgrammer(object):
             written, there may be ranges of flash that would be erased but not written with new
             data. This parameter sets whether the existing contents of those unwritten ranges will
             be read from memory and restored while programming.
+        @param verify Boolean indicating whether to verify flash contents after programming. See
+            FlashLoader.
+        @param profiler Optional FlashProfiler instance used to record the duration of flash algo
+            operations. See FlashLoader.
         """
         self._session = session
         self._chip_erase = chip_erase
         self._smart_flash = smart_flash
         self._trust_crc = trust_crc
         self._keep_unwritten = keep_unwritten
+        self._verify = verify
+        self._profiler = profiler
         self._progress = progress
         
         self._format_handlers = {
@@ -89,7 +158,7 @@ class FileProgrammer(object):
             'hex': self._program_hex,
             }
     
-    def program(self, file_or_path, file_format=None, **kwargs):
+    def program(self, file_or_path, file_format=None, baseline=None, baseline_format=None, **kwargs):
         """! @brief Program a file into flash.
         
         @param self
@@ -97,6 +166,13 @@ class FileProgrammer(object):
         @param file_format Optional file format name, one of "bin", "hex", "elf", "axf". If not provided,
             the file's extension will be used. If a file object is passed for _file_or_path_ then
             this parameter must be used to set the format.
+        @param baseline Optional path or file-like object for an image that is known to already be
+            programmed on the target, such as the previous release. Pages are compared against
+            the baseline on the host, so only changed sectors are erased and programmed, after a
+            sample of baseline pages is verified on the target. Format-specific keyword
+            parameters apply to the baseline as well.
+        @param baseline_format Optional file format name for the baseline, with the same meaning
+            as _file_format_.
         @param kwargs Optional keyword arguments for format-specific parameters.
         
         The only current format-specific keyword parameters are for the binary format:
@@ -105,10 +181,41 @@ class FileProgrammer(object):
         - `skip`: Number of bytes to skip at the start of the binary file. Does not affect the
             base address.
         
+        @return List of ProgrammingInfo objects, one for each flash region that was programmed.
+        
         @exception FileNotFoundError Provided file_or_path string does not reference a file.
         @exception ValueError Invalid argument value, for instance providing a file object but
             not setting file_format.
         """
+        loader = FlashLoader(self._session,
+                                    progress=self._progress,
+                                    chip_erase=self._chip_erase,
+                                    smart_flash=self._smart_flash,
+                                    trust_crc=self._trust_crc,
+                                    keep_unwritten=self._keep_unwritten,
+                                    verify=self._verify,
+                                    profiler=self._profiler)
+        if baseline is not None:
+            self.load(baseline, _BaselineLoader(loader), baseline_format, **kwargs)
+        self.load(file_or_path, loader, file_format, **kwargs)
+        return loader.commit()
+
+    def load(self, file_or_path, loader, file_format=None, **kwargs):
+        """! @brief Extract the data from a file without programming it.
+        
+        The file is parsed exactly as by program(), but each chunk of data is passed to the
+        add_data() method of _loader_ instead of being programmed. The loader may be a FlashLoader,
+        or any object with a compatible add_data() method.
+        
+        @param self
+        @param file_or_path Either a string that is a path to a file, or a file-like object.
+        @param loader Object whose add_data(address, data) method is called for each chunk.
+        @param file_format Optional file format name. See program().
+        @param kwargs Optional keyword arguments for format-specific parameters. See program().
+        
+        @exception FileNotFoundError Provided file_or_path string does not reference a file.
+        @exception ValueError Invalid argument value.
+        """
         isPath = isinstance(file_or_path, six.string_types)
         
         # Check for valid path first.
@@ -132,12 +239,7 @@ class FileProgrammer(object):
         if file_format not in self._format_handlers:
             raise ValueError("unknown file format '%s'" % file_format)
             
-        self._loader = FlashLoader(self._session,
-                                    progress=self._progress,
-                                    chip_erase=self._chip_erase,
-                                    smart_flash=self._smart_flash,
-                                    trust_crc=self._trust_crc,
-                                    keep_unwritten=self._keep_unwritten)
+        self._loader = loader
         
         file_obj = None
         try:
@@ -153,7 +255,6 @@ class FileProgrammer(object):
 
             # Pass to the format-specific programmer.
             self._format_handlers[file_format](file_obj, **kwargs)
-            self._loader.commit()
         finally:
             if isPath and file_obj is not None:
                 file_obj.close()
@@ -168,21 +269,33 @@ class FileProgrammer(object):
                 raise exceptions.TargetSupportError("No boot memory is defined for this device")
             address = boot_memory.start
         
-        file_obj.seek(kwargs.get('skip', 0), os.SEEK_SET)
-        data = list(bytearray(file_obj.read()))
+        skip = kwargs.get('skip', 0)
+        self._loader.add_data(address, self._map_file(file_obj, skip))
+    
+    @staticmethod
+    def _map_file(file_obj, offset):
+        """! @brief Return a memoryview of a file's contents from the given offset to the end.
         
-        self._loader.add_data(address, data)
+        Real files are memory mapped so that pages of the file are only read as they are
+        copied into flash pages. Other file objects, or an empty file which cannot be mapped, are
+        read into memory.
+        """
+        try:
+            fileno = file_obj.fileno()
+        except (AttributeError, IOError, OSError):
+            fileno = None
+        if PY3 and fileno is not None and os.fstat(fileno).st_size > 0:
+            try:
+                # The memoryview keeps the mapping open for as long as the data is referenced.
+                return memoryview(mmap.mmap(fileno, 0, access=mmap.ACCESS_READ))[offset:]
+            except (mmap.error, ValueError) as err:
+                LOG.debug("unable to memory map file: %s", err)
+        file_obj.seek(offset, os.SEEK_SET)
+        return memoryview(bytearray(file_obj.read()))
 
     def _program_hex(self, file_obj, **kwargs):
         """! Intel hex file format loader"""
-        hexfile = IntelHex(file_obj)
-        addresses = hexfile.addresses()
-        addresses.sort()
-
-        data_list = list(ranges(addresses))
-        for start, end in data_list:
-            size = end - start + 1
-            data = list(hexfile.tobinarray(start=start, size=size))
+        for start, data in read_hex_chunks(file_obj):
             # Ignore invalid addresses for HEX files only
             # Binary files (obviously) don't contain addresses
             # For ELF files, any metadata that's not part of the application code 
@@ -197,7 +310,7 @@ class FileProgrammer(object):
         for segment in elf.iter_segments():
             addr = segment['p_paddr']
             if segment.header.p_type == 'PT_LOAD' and segment.header.p_filesz != 0:
-                data = bytearray(segment.data())
+                data = segment.data()
                 LOG.debug("Writing segment LMA:0x%08x, VMA:0x%08x, size %d", addr, 
                           segment['p_vaddr'], segment.header.p_filesz)
                 try:
@@ -19,9 +19,11 @@ from ..core.exceptions import (FlashFailure, FlashEraseFailure, FlashProgramFail
 from ..utility.mask import msb
 import logging
 from struct import unpack
-from time import time
+from time import sleep
+from timeit import default_timer as timer
 from enum import Enum
 from .builder import FlashBuilder
+from .profiler import (FlashProfiler, profiled)
 
 LOG = logging.getLogger(__name__)
 
@@ -117,7 +119,20 @@ class Flash(object):
         least 0x600 free bytes after this address.
     
     All of the "pc_" entry point key values must have bit 0 set to indicate a Thumb function.
+    
+    Flash algo functions can be run asynchronously. The start_erase_all(), start_erase_sector(),
+    and start_program_page_with_buffer() methods return as soon as the function is running, leaving
+    the host free to transfer data to other page buffers. Call wait_for_completion() to get the
+    result.
     """
+    
+    ## Fraction of the expected duration of an algo function that wait_for_completion() sleeps
+    # before it begins polling.
+    EXPECTED_DURATION_FRACTION = 0.8
+    
+    ## Shortest and longest time in seconds between polls of the target state.
+    MIN_POLL_INTERVAL = 0.0001
+    MAX_POLL_INTERVAL = 0.005
     class Operation(Enum):
         """! @brief Operations passed to init(). """
         ## Erase all or sector erase.
@@ -134,6 +149,11 @@ class Flash(object):
         self._region = None
         self._did_prepare_target = False
         self._active_operation = None
+        self._call_pc = None
+        self._call_start = 0
+        self._duration_estimates = {}
+        ## Optional FlashProfiler that records the duration of algo operations.
+        self.profiler = None
         if flash_algo is not None:
             self.is_valid = True
             self.use_analyzer = flash_algo['analyzer_supported']
@@ -196,6 +216,7 @@ class Flash(object):
         assert flashRegion.is_flash
         self._region = flashRegion
 
+    @profiled('init')
     def init(self, operation, address=None, clock=0, reset=True):
         """!
         @brief Prepare the flash algorithm for performing operations.
@@ -262,6 +283,31 @@ class Flash(object):
         self.restore_target()
         self._did_prepare_target = False
 
+    def shares_algo_with(self, other):
+        """! @brief Whether another Flash instance runs the same algo, loaded at the same place.
+        
+        This is the case for the flash regions created for each sector size of a single flash
+        algo, or for the banks of a multi-bank flash controller supported by one algo.
+        """
+        return (self.flash_algo is not None) and (type(self) is type(other)) \
+                and (self.flash_algo is other.flash_algo)
+
+    def take_over_target(self, other):
+        """! @brief Continue using the algo loaded into target RAM by another Flash instance.
+        
+        The other instance must share this instance's algo, see shares_algo_with(), and must be
+        uninited. It is left as if cleanup() had been called, except that the target is not
+        restored. This instance is then prepared, so the next init() only calls the algo's Init()
+        function, instead of resetting the target and loading the algo again. The learned
+        durations of algo functions are shared as well.
+        """
+        assert self.shares_algo_with(other)
+        assert other._active_operation is None
+        self._did_prepare_target = other._did_prepare_target
+        self._duration_estimates = other._duration_estimates
+        other._did_prepare_target = False
+
+    @profiled('uninit')
     def uninit(self):
         """! @brief Uninitialize the flash algo.
         
@@ -292,6 +338,7 @@ class Flash(object):
         """! @brief Subclasses can override this method to undo any target configuration changes."""
         pass
 
+    @profiled('compute_crcs')
     def compute_crcs(self, sectors):
         assert self.use_analyzer
         
@@ -321,37 +368,60 @@ class Flash(object):
         data = self.target.read_memory_block32(self.begin_data, len(data))
         return data
 
+    @profiled('erase_all')
     def erase_all(self):
         """!
         @brief Erase all the flash.
         
         @exception FlashEraseFailure
         """
-        assert self._active_operation == self.Operation.ERASE
-        assert self.is_erase_all_supported
-
-        # update core register to execute the erase_all subroutine
-        result = self._call_function_and_wait(self.flash_algo['pc_eraseAll'])
+        self.start_erase_all()
+        result = self.wait_for_completion()
 
         # check the return code
         if result != 0:
             raise FlashEraseFailure('erase_all error: %i' % result, result_code=result)
 
+    @profiled('erase_sector')
     def erase_sector(self, address):
         """!
         @brief Erase one sector.
         
         @exception FlashEraseFailure
         """
-        assert self._active_operation == self.Operation.ERASE
-
-        # update core register to execute the erase_sector subroutine
-        result = self._call_function_and_wait(self.flash_algo['pc_erase_sector'], address)
+        self.start_erase_sector(address)
+        result = self.wait_for_completion()
 
         # check the return code
         if result != 0:
             raise FlashEraseFailure('erase_sector(0x%x) error: %i' % (address, result), address, result)
 
+    @profiled('start_erase_all')
+    def start_erase_all(self):
+        """!
+        @brief Start erasing all the flash.
+        
+        Call wait_for_completion() to wait for the erase to finish and get the result code.
+        """
+        assert self._active_operation == self.Operation.ERASE
+        assert self.is_erase_all_supported
+
+        # update core register to execute the erase_all subroutine
+        self._call_function(self.flash_algo['pc_eraseAll'])
+
+    @profiled('start_erase_sector')
+    def start_erase_sector(self, address):
+        """!
+        @brief Start erasing one sector.
+        
+        Call wait_for_completion() to wait for the erase to finish and get the result code.
+        """
+        assert self._active_operation == self.Operation.ERASE
+
+        # update core register to execute the erase_sector subroutine
+        self._call_function(self.flash_algo['pc_erase_sector'], address)
+
+    @profiled('program_page')
     def program_page(self, address, bytes):
         """!
         @brief Flash one or more pages.
@@ -373,6 +443,7 @@ class Flash(object):
         if result != 0:
             raise FlashProgramFailure('program_page(0x%x) error: %i' % (address, result), address, result)
 
+    @profiled('start_program_page_with_buffer')
     def start_program_page_with_buffer(self, buffer_number, address):
         """!
         @brief Start flashing one or more pages.
@@ -383,6 +454,7 @@ class Flash(object):
         # update core register to execute the program_page subroutine
         result = self._call_function(self.flash_algo['pc_program_page'], address, self.region.page_size, self.page_buffers[buffer_number])
 
+    @profiled('load_page_buffer')
     def load_page_buffer(self, buffer_number, address, bytes):
         """!
         @brief Load data to a numbered page buffer.
@@ -398,6 +470,7 @@ class Flash(object):
         # transfer the buffer to device RAM
         self.target.write_memory_block8(self.page_buffers[buffer_number], bytes)
 
+    @profiled('program_phrase')
     def program_phrase(self, address, bytes):
         """!
         @brief Flash a portion of a page.
@@ -525,13 +598,41 @@ class Flash(object):
 
         # resume target
         self.target.resume()
+        self._call_pc = pc
+        self._call_start = timer()
 
+    @profiled(FlashProfiler.WAIT)
     def wait_for_completion(self):
         """!
         @brief Wait until the breakpoint is hit.
+        
+        Rather than polling the target state continuously, which occupies the debug probe and host
+        for the entire duration of the algo function, the expected duration of each algo entry
+        point is learned from previous calls. Most of the expected duration is spent sleeping, then
+        the target is polled at intervals that increase exponentially up to a limit proportional
+        to the expected duration.
+        
+        @return The algo function's result code from r0.
         """
+        estimate = self._duration_estimates.get(self._call_pc, 0)
+        delay = estimate * self.EXPECTED_DURATION_FRACTION - (timer() - self._call_start)
+        if delay > 0:
+            sleep(delay)
+        
+        max_interval = min(self.MAX_POLL_INTERVAL, max(self.MIN_POLL_INTERVAL, estimate / 8)) \
+                        if estimate else self.MAX_POLL_INTERVAL
+        interval = self.MIN_POLL_INTERVAL
         while self.target.get_state() == Target.State.RUNNING:
-            pass
+            sleep(interval)
+            interval = min(interval * 2, max_interval)
+        
+        # Update the expected duration with a moving average.
+        elapsed = timer() - self._call_start
+        if self.profiler is not None:
+            self.profiler.record(FlashProfiler.EXECUTE, elapsed)
+        if estimate:
+            elapsed = estimate + (elapsed - estimate) / 4
+        self._duration_estimates[self._call_pc] = elapsed
 
         if self.flash_algo_debug:
             regs = self.target.read_core_registers_raw(list(range(19)) + [20])
@@ -17,6 +17,7 @@
 import logging
 
 from .builder import (FlashBuilder, get_page_count, get_sector_count)
+from .cache import FlashContentCache
 from ..core import exceptions
 from ..utility.progress import print_progress
 
@@ -41,7 +42,7 @@ class FlashLoader(object):
     Internally, FlashBuilder is used to optimise programming within each memory region.
     """
     def __init__(self, session, progress=None, chip_erase=None, smart_flash=None,
-        trust_crc=None, keep_unwritten=None):
+        trust_crc=None, keep_unwritten=None, verify=None, profiler=None):
         """! @brief Constructor.
         
         @param self
@@ -61,6 +62,12 @@ class FlashLoader(object):
             written, there may be ranges of flash that would be erased but not written with new
             data. This parameter sets whether the existing contents of those unwritten ranges will
             be read from memory and restored while programming.
+        @param verify Boolean indicating whether to verify the pages that were erased or programmed
+            after programming each region. The CRC32 analyzer is used when supported, so only pages
+            that fail the CRC check are read back.
+        @param profiler Optional FlashProfiler instance. It is attached to the flash algo of each
+            region while the region is programmed, so the duration of every algo operation is
+            recorded.
         """
         self._session = session
         self._map = session.board.target.memory_map
@@ -81,12 +88,17 @@ class FlashLoader(object):
                             else self._session.options.get('fast_program')
         self._keep_unwritten = keep_unwritten if (keep_unwritten is not None) \
                             else self._session.options.get('keep_unwritten')
+        self._verify = verify if (verify is not None) \
+                            else self._session.options.get('flash_verify')
+        self._content_cache = FlashContentCache.for_session(session)
+        self._profiler = profiler
         
         self._reset_state()
     
     def _reset_state(self):
         """! @brief Clear all state variables. """
         self._builders = {}
+        self._region_chip_erase = {}
         self._total_data_size = 0
         self._progress_offset = 0
         self._current_progress_fraction = 0
@@ -98,7 +110,8 @@ class FlashLoader(object):
         
         @param self
         @param address Integer address for where the first byte of _data_ should be written.
-        @param data A list of byte values to be programmed at the given address.
+        @param data A sequence of byte values to be programmed at the given address, such as a list,
+            bytearray, or memoryview.
         
         @return The FlashLoader instance is returned, to allow chaining further add_data()
             calls or a call to commit().
@@ -108,6 +121,94 @@ class FlashLoader(object):
             instance associated with it, which indicates that the target connect sequence did
             not run successfully.
         """
+        for region, address, data in self._split_by_region(address, data):
+            self._get_builder(region).add_data(address, data)
+            self._total_data_size += len(data)
+        
+        return self
+    
+    def add_baseline_data(self, address, data):
+        """! @brief Add a chunk of data that is already programmed on the target.
+        
+        Baseline data enables delta programming. When the data added with add_data() is
+        committed, pages covered by the baseline are compared against the new data on the host,
+        so only changed sectors are erased and programmed. A sample of the baseline pages is
+        verified on the target before the baseline is trusted. Baseline data is discarded after
+        commit().
+        
+        Baseline data outside of flash regions is ignored.
+        
+        @param self
+        @param address Integer address of the first byte of _data_.
+        @param data A list of byte values.
+        
+        @return The FlashLoader instance is returned, to allow chaining further calls.
+        """
+        try:
+            for region, address, data in self._split_by_region(address, data):
+                self._get_builder(region).add_baseline_data(address, data)
+        except ValueError as err:
+            LOG.debug("Ignoring baseline data: %s", err)
+        
+        return self
+    
+    def add_page_hashes(self, address, hashes):
+        """! @brief Provide precomputed hashes of pages of data that was added with add_data().
+        
+        The hashes are used instead of computing them from the page data when flash contents are
+        analyzed. They must have been computed with page_hash() from data identical to that added
+        with add_data(). See FlashPlan.
+        
+        @param self
+        @param address Address within the flash region the pages belong to.
+        @param hashes Dict of page address to hash.
+        
+        @exception ValueError Raised when the address is not within a flash memory region.
+        """
+        self._get_builder(self._get_flash_region(address)).add_page_hashes(hashes)
+        return self
+    
+    def add_page_layout(self, address, sector_infos, page_infos):
+        """! @brief Provide precomputed info about the sectors and pages of data added with add_data().
+        
+        See FlashBuilder.add_page_layout() and FlashPlan.
+        
+        @param self
+        @param address Address within the flash region the sectors and pages belong to.
+        @param sector_infos List of SectorInfo objects.
+        @param page_infos List of PageInfo objects.
+        
+        @exception ValueError Raised when the address is not within a flash memory region.
+        """
+        self._get_builder(self._get_flash_region(address)).add_page_layout(sector_infos, page_infos)
+        return self
+    
+    def set_region_chip_erase(self, address, chip_erase):
+        """! @brief Override the erase method for one flash region.
+        
+        As with the erase method passed to the constructor, only the first region programmed by
+        commit() may use chip erase.
+        
+        @param self
+        @param address Address within the flash region.
+        @param chip_erase One of "auto", "sector", or "chip".
+        
+        @exception ValueError Raised when the address is not within a flash memory region.
+        """
+        self._region_chip_erase[self._get_flash_region(address)] = chip_erase
+        return self
+    
+    def _get_flash_region(self, address):
+        region = self._map.get_region_for_address(address)
+        if region is None or not region.is_flash:
+            raise ValueError("no flash memory region defined for address 0x%08x" % address)
+        return region
+    
+    def _split_by_region(self, address, data):
+        """! @brief Generator yielding (region, address, data) for each region the data covers.
+        
+        @exception ValueError Raised when the address is not within a flash memory region.
+        """
         while len(data):
             # Look up flash region.
             region = self._map.get_region_for_address(address)
@@ -116,27 +217,25 @@ class FlashLoader(object):
             if not region.is_flash:
                 raise ValueError("memory region at address 0x%08x is not flash" % address)
         
-            # Get our builder instance.
-            if region in self._builders:
-                builder = self._builders[region]
-            else:
-                if region.flash is None:
-                    raise exceptions.TargetSupportError("flash memory region at address 0x%08x has no flash instance" % address)
-                builder = region.flash.get_flash_builder()
-                builder.log_performance = False
-                self._builders[region] = builder
-        
-            # Add as much data to the builder as is contained by this region.
+            # Yield as much data as is contained by this region.
             programLength = min(len(data), region.end - address + 1)
             assert programLength != 0
-            builder.add_data(address, data[:programLength])
+            yield region, address, data[:programLength]
             
             # Advance.
             data = data[programLength:]
             address += programLength
-            self._total_data_size += programLength
-        
-        return self
+    
+    def _get_builder(self, region):
+        """! @brief Get or create the builder instance for a flash region."""
+        if region in self._builders:
+            return self._builders[region]
+        if region.flash is None:
+            raise exceptions.TargetSupportError("flash memory region at address 0x%08x has no flash instance" % region.start)
+        builder = region.flash.get_flash_builder()
+        builder.log_performance = False
+        self._builders[region] = builder
+        return builder
     
     def commit(self):
         """! @brief Write all collected data to flash.
@@ -149,23 +248,47 @@ class FlashLoader(object):
         the sectors are already erased. This will, of course, also work correctly if the flash
         algorithm for the first region doesn't actually erase the entire chip (all regions).
         
+        Regions are programmed in address order. When consecutive regions use the same flash algo,
+        such as the regions created for each sector size of one algo or the banks of a dual-bank
+        controller, the algo is left loaded and handed over to the next region rather than
+        resetting the target and reloading it. The target is only reset after the last region.
+        
         After calling this method, the loader instance can be reused to program more data.
+        
+        @return List of ProgrammingInfo objects, one for each flash region that was programmed.
         """
         didChipErase = False
         perfList = []
         
-        # Iterate over builders we've created and program the data.
-        for builder in sorted(self._builders.values(), key=lambda v: v.flash_start):
+        # Iterate over builders we've created and program the data. Builders that were created
+        # only for baseline data have nothing to program.
+        builders = [builder for builder in self._builders.values() if builder.buffered_data_size]
+        builders.sort(key=lambda v: v.flash_start)
+        for index, builder in enumerate(builders):
+            next_builder = builders[index + 1] if (index + 1 < len(builders)) else None
+            keep_algo = (next_builder is not None) and next_builder.flash.shares_algo_with(builder.flash)
+            
             # Determine this builder's portion of total progress.
             self._current_progress_fraction = builder.buffered_data_size / self._total_data_size
             
             # Program the data.
-            chipErase = self._chip_erase if not didChipErase else "sector"
-            perf = builder.program(chip_erase=chipErase,
-                                    progress_cb=self._progress_cb,
-                                    smart_flash=self._smart_flash,
-                                    fast_verify=self._trust_crc,
-                                    keep_unwritten=self._keep_unwritten)
+            chipErase = self._region_chip_erase.get(builder.flash.region, self._chip_erase) \
+                            if not didChipErase else "sector"
+            builder.flash.profiler = self._profiler
+            try:
+                perf = builder.program(chip_erase=chipErase,
+                                        progress_cb=self._progress_cb,
+                                        smart_flash=self._smart_flash,
+                                        fast_verify=self._trust_crc,
+                                        keep_unwritten=self._keep_unwritten,
+                                        content_cache=self._content_cache,
+                                        verify=self._verify,
+                                        cleanup=not keep_algo,
+                                        reset=next_builder is None)
+            finally:
+                builder.flash.profiler = None
+            if keep_algo:
+                next_builder.flash.take_over_target(builder.flash)
             perfList.append(perf)
             didChipErase = True
             
@@ -176,6 +299,8 @@ class FlashLoader(object):
         
         # Clear state to allow reuse.
         self._reset_state()
+
+        return perfList
     
     def _log_performance(self, perf_list):
         """! @brief Log a report of programming performance numbers."""
@@ -186,6 +311,12 @@ class FlashLoader(object):
         actual_program_page_count = sum(perf.program_page_count for perf in perf_list)
         skipped_byte_count = sum(perf.skipped_byte_count for perf in perf_list)
         skipped_page_count = sum(perf.skipped_page_count for perf in perf_list)
+        cached_page_count = sum(perf.cached_page_count for perf in perf_list)
+        if cached_page_count:
+            LOG.debug("%s unchanged according to the flash cache", get_page_count(cached_page_count))
+        baseline_page_count = sum(perf.baseline_page_count for perf in perf_list)
+        if baseline_page_count:
+            LOG.debug("%s compared against the baseline image", get_page_count(baseline_page_count))
         
         # Compute kbps while avoiding a potential zero-div error.
         if totalProgramTime == 0:
@@ -208,6 +339,13 @@ class FlashLoader(object):
                 skipped_byte_count, get_page_count(skipped_page_count),
                 kbps)
         
+        verified_perfs = [perf for perf in perf_list if perf.verify_time is not None]
+        if verified_perfs:
+            LOG.info("Verified %d bytes in %.03f s, read back %s",
+                sum(perf.verify_byte_count for perf in verified_perfs),
+                sum(perf.verify_time for perf in verified_perfs),
+                get_page_count(sum(perf.verify_read_page_count for perf in verified_perfs)))
+        
     def _progress_cb(self, amount):
         if self._progress is not None:
             self._progress((amount * self._current_progress_fraction) + self._progress_offset)
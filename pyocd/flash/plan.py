@@ -0,0 +1,345 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import logging
+import mmap
+import os
+import struct
+
+from .cache import page_hash
+from .file_programmer import FileProgrammer
+from .flash import (PageInfo, SectorInfo)
+from .loader import FlashLoader
+from ..core import exceptions
+from ..utility.compatibility import PY3
+from ..utility.mask import align_up
+
+LOG = logging.getLogger(__name__)
+
+class FlashPlanRegion(object):
+    """! @brief The data to program to one flash region, as recorded in a flash plan."""
+
+    ## Region attributes that must match the target for a plan to be executed.
+    GEOMETRY_ATTRIBUTES = ('start', 'length', 'sector_size', 'page_size')
+
+    def __init__(self, name, start, length, sector_size, page_size, chunks=None, page_hashes=None,
+            chip_erase="auto", sectors=None, pages=None):
+        self.name = name
+        self.start = start
+        self.length = length
+        self.sector_size = sector_size
+        self.page_size = page_size
+        ## List of (address, data offset, length) tuples, sorted by address.
+        self.chunks = chunks or []
+        ## Dict of page address to hash for every page that is entirely covered by data.
+        self.page_hashes = page_hashes or {}
+        ## Erase method for the region, one of "chip", "sector", or "auto".
+        self.chip_erase = chip_erase
+        ## List of (address, size, erase weight) tuples for every sector the chunks cover.
+        self.sectors = sectors or []
+        ## List of (address, size, program weight) tuples for every page of those sectors.
+        self.pages = pages or []
+
+    @classmethod
+    def from_flash_region(cls, region):
+        return cls(region.name, region.start, region.length, region.sector_size, region.page_size)
+
+    @classmethod
+    def from_dict(cls, info):
+        return cls(info['name'], info['start'], info['length'], info['sector_size'], info['page_size'],
+                    [tuple(chunk) for chunk in info['chunks']],
+                    {int(addr, 16): value for addr, value in info['page_hashes'].items()},
+                    info['chip_erase'],
+                    [tuple(sector) for sector in info['sectors']],
+                    [tuple(page) for page in info['pages']])
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'start': self.start,
+            'length': self.length,
+            'sector_size': self.sector_size,
+            'page_size': self.page_size,
+            'chunks': [list(chunk) for chunk in self.chunks],
+            'page_hashes': {"%08x" % addr: value for addr, value in self.page_hashes.items()},
+            'chip_erase': self.chip_erase,
+            'sectors': [list(sector) for sector in self.sectors],
+            'pages': [list(page) for page in self.pages],
+            }
+
+    def set_page_layout(self, sector_infos, page_infos):
+        """! @brief Record the layout returned by FlashBuilder.get_page_layout()."""
+        self.sectors = [(info.base_addr, info.size, info.erase_weight) for info in sector_infos]
+        self.pages = [(info.base_addr, info.size, info.program_weight) for info in page_infos]
+
+    def get_page_layout(self):
+        """! @brief Return the recorded layout as lists of SectorInfo and PageInfo objects."""
+        sector_infos = []
+        for address, size, weight in self.sectors:
+            info = SectorInfo()
+            info.base_addr, info.size, info.erase_weight = address, size, weight
+            sector_infos.append(info)
+        page_infos = []
+        for address, size, weight in self.pages:
+            info = PageInfo()
+            info.base_addr, info.size, info.program_weight = address, size, weight
+            page_infos.append(info)
+        return sector_infos, page_infos
+
+    def matches(self, region):
+        """! @brief Whether a flash region of the target has the geometry recorded in the plan."""
+        return all(getattr(region, name) == getattr(self, name) for name in self.GEOMETRY_ATTRIBUTES)
+
+class _PlanCompiler(object):
+    """! @brief Collects image data passed by FileProgrammer.load() and splits it by flash region."""
+
+    def __init__(self, memory_map):
+        self._map = memory_map
+        self.regions = {}
+
+    def add_data(self, address, data):
+        # Validate the whole chunk first, so a chunk is either accepted or rejected as a unit like
+        # with FlashLoader.
+        pieces = []
+        while len(data):
+            region = self._map.get_region_for_address(address)
+            if region is None:
+                raise ValueError("no memory region defined for address 0x%08x" % address)
+            if not region.is_flash:
+                raise ValueError("memory region at address 0x%08x is not flash" % address)
+            length = min(len(data), region.end - address + 1)
+            pieces.append((region, address, data[:length]))
+            data = data[length:]
+            address += length
+        for region, address, data in pieces:
+            self.regions.setdefault(region, []).append((address, data))
+
+class FlashPlan(object):
+    """! @brief Precompiled image data and page hashes for programming one image to one target type.
+
+    Compiling a plan parses the image, splits it by flash region, and computes the hash of every
+    page that the image completely covers. For each region, the layout and weights of the sectors
+    and pages the image covers are recorded, as is the erase method. An "auto" erase method is
+    resolved to sector erase when the flash algo rules out chip erase for the image. Otherwise the
+    choice depends on the flash contents and is still made while programming. The plan is saved as
+    a single file: a small JSON header followed by the image data of every region, laid out in
+    address order.
+
+    Loading a plan reads only the header. The data is memory mapped and passed to the flash loader
+    without parsing or copying, and the recorded page hashes and layout are used instead of being
+    recomputed. The recorded erase methods are used unless overridden.
+
+    A plan can only be executed on a target whose type and flash region geometry match those
+    recorded in the plan.
+    """
+
+    MAGIC = b"PYOCDPLN"
+    VERSION = 2
+
+    ## Alignment of the start of the image data within the file.
+    DATA_ALIGNMENT = 4096
+
+    _HEADER = struct.Struct("<8sII")
+
+    def __init__(self, target_type, regions, data):
+        """! @brief Constructor.
+        @param self
+        @param target_type Name of the target type the plan was compiled for.
+        @param regions List of FlashPlanRegion objects.
+        @param data Buffer holding the data of all regions, referenced by region chunk offsets.
+        """
+        self.target_type = target_type
+        self.regions = regions
+        self._data = memoryview(data)
+
+    @classmethod
+    def compile(cls, session, file_or_path, file_format=None, chip_erase=None, **kwargs):
+        """! @brief Compile a plan for programming an image file to the session's target.
+
+        @param cls
+        @param session Session whose target type and memory map the plan is compiled for.
+        @param file_or_path Either a string that is a path to a file, or a file-like object.
+        @param file_format Optional file format name. See FileProgrammer.program().
+        @param chip_erase Erase method to resolve and record for each region. See FlashLoader. If
+            not provided, the 'chip_erase' session option is used.
+        @param kwargs Optional keyword arguments for format-specific parameters. See
+            FileProgrammer.program().
+        """
+        compiler = _PlanCompiler(session.target.memory_map)
+        FileProgrammer(session).load(file_or_path, compiler, file_format, **kwargs)
+        if chip_erase is None:
+            chip_erase = session.options.get('chip_erase')
+
+        data = bytearray()
+        regions = []
+        for flash_region in sorted(compiler.regions, key=lambda r: r.start):
+            region = FlashPlanRegion.from_flash_region(flash_region)
+            for address, chunk in sorted(compiler.regions[flash_region], key=lambda c: c[0]):
+                region.chunks.append((address, len(data), len(chunk)))
+                data += bytearray(chunk)
+            region.page_hashes = cls._compute_page_hashes(region, data)
+            cls._compute_page_layout(flash_region, region, data, chip_erase)
+            regions.append(region)
+        LOG.debug("Compiled flash plan with %d bytes in %d flash regions", len(data), len(regions))
+        return cls(session.board.target_type, regions, data)
+
+    @staticmethod
+    def _compute_page_layout(flash_region, region, data, chip_erase):
+        """! @brief Record the sector and page layout and the erase method of a region.
+
+        The rules are those of FlashBuilder, applied to a builder that is never programmed.
+
+        @exception TargetSupportError The flash region has no flash instance.
+        """
+        if flash_region.flash is None:
+            raise exceptions.TargetSupportError("flash memory region at address 0x%08x has no "
+                    "flash instance" % flash_region.start)
+        builder = flash_region.flash.get_flash_builder()
+        data = memoryview(data)
+        for address, offset, length in region.chunks:
+            builder.add_data(address, data[offset:offset + length])
+        region.set_page_layout(*builder.get_page_layout())
+        region.chip_erase = builder.get_erase_method(chip_erase)
+
+    @staticmethod
+    def _compute_page_hashes(region, data):
+        """! @brief Return hashes for the pages of a region that are entirely covered by chunks."""
+        # Join contiguous chunks. They are also contiguous in the data, since chunks are stored in
+        # address order.
+        runs = []
+        for address, offset, length in region.chunks:
+            if runs and (runs[-1][0] + runs[-1][2] == address):
+                runs[-1][2] += length
+            else:
+                runs.append([address, offset, length])
+        
+        hashes = {}
+        page_size = region.page_size
+        for address, offset, length in runs:
+            page_addr = region.start + align_up(address - region.start, page_size)
+            while page_addr + page_size <= address + length:
+                page_offset = offset + page_addr - address
+                hashes[page_addr] = page_hash(data[page_offset:page_offset + page_size])
+                page_addr += page_size
+        return hashes
+
+    @classmethod
+    def load(cls, path):
+        """! @brief Load a plan file.
+        @exception ValueError The file is not a valid flash plan.
+        """
+        with open(path, 'rb') as f:
+            prefix = f.read(cls._HEADER.size)
+            if len(prefix) != cls._HEADER.size:
+                raise ValueError("'%s' is not a flash plan" % path)
+            magic, version, header_length = cls._HEADER.unpack(prefix)
+            if magic != cls.MAGIC:
+                raise ValueError("'%s' is not a flash plan" % path)
+            if version != cls.VERSION:
+                raise ValueError("flash plan '%s' has unsupported version %d" % (path, version))
+            try:
+                header = json.loads(f.read(header_length).decode('utf-8'))
+            except ValueError as err:
+                raise ValueError("flash plan '%s' has an invalid header: %s" % (path, err))
+
+            data_offset = align_up(cls._HEADER.size + header_length, cls.DATA_ALIGNMENT)
+            if PY3 and header['data_length']:
+                data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))[data_offset:]
+            else:
+                f.seek(data_offset)
+                data = bytearray(f.read())
+        if len(data) < header['data_length']:
+            raise ValueError("flash plan '%s' is truncated" % path)
+
+        regions = [FlashPlanRegion.from_dict(info) for info in header['regions']]
+        return cls(header['target_type'], regions, data)
+
+    def save(self, path):
+        """! @brief Write the plan to a file.
+
+        The file is written under a temporary name and then renamed, so a partially written plan is
+        never left behind.
+        """
+        header = json.dumps({
+            'target_type': self.target_type,
+            'data_length': len(self._data),
+            'regions': [region.to_dict() for region in self.regions],
+            }, sort_keys=True).encode('utf-8')
+        data_offset = align_up(self._HEADER.size + len(header), self.DATA_ALIGNMENT)
+
+        temp_path = path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(self._HEADER.pack(self.MAGIC, self.VERSION, len(header)))
+            f.write(header)
+            f.write(b"\0" * (data_offset - self._HEADER.size - len(header)))
+            f.write(self._data)
+        if PY3:
+            os.replace(temp_path, path)
+        else:
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(temp_path, path)
+
+    @property
+    def byte_count(self):
+        return sum(length for region in self.regions for _, _, length in region.chunks)
+
+    def get_region_data(self, region):
+        """! @brief Generator yielding (address, data) for each chunk of a region."""
+        for address, offset, length in region.chunks:
+            yield address, self._data[offset:offset + length]
+
+    def check_target(self, target):
+        """! @brief Verify that the plan was compiled for a target.
+
+        @exception TargetSupportError The target type or flash geometry doesn't match the plan.
+        """
+        target_type = target.session.board.target_type
+        if target_type != self.target_type:
+            raise exceptions.TargetSupportError("flash plan was compiled for target type '%s', not '%s'"
+                    % (self.target_type, target_type))
+        for region in self.regions:
+            flash_region = target.memory_map.get_region_for_address(region.start)
+            if flash_region is None or not flash_region.is_flash or not region.matches(flash_region):
+                raise exceptions.TargetSupportError("flash region '%s' at 0x%08x does not match the "
+                        "flash plan" % (region.name, region.start))
+
+    def add_to_loader(self, loader):
+        """! @brief Add the data, page hashes, and page layout of all regions to a FlashLoader."""
+        for region in self.regions:
+            for address, data in self.get_region_data(region):
+                loader.add_data(address, data)
+            loader.add_page_hashes(region.start, region.page_hashes)
+            loader.add_page_layout(region.start, *region.get_page_layout())
+
+    def program(self, session, chip_erase=None, **kwargs):
+        """! @brief Program the plan to the session's target.
+
+        @param self
+        @param session The session object.
+        @param chip_erase Erase method for all regions. If not provided, the method recorded for
+            each region is used.
+        @param kwargs Other keyword arguments passed to the FlashLoader constructor.
+        @return List of ProgrammingInfo objects, one for each flash region that was programmed.
+        """
+        self.check_target(session.target)
+        loader = FlashLoader(session, chip_erase=chip_erase, **kwargs)
+        self.add_to_loader(loader)
+        if chip_erase is None:
+            for region in self.regions:
+                loader.set_region_chip_erase(region.start, region.chip_erase)
+        return loader.commit()
@@ -0,0 +1,253 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+import threading
+from timeit import default_timer as timer
+
+class OperationStats(object):
+    """! @brief Duration statistics and histogram for one type of flash operation.
+
+    Histogram buckets are logarithmic. The first bucket holds durations up to FIRST_BUCKET_LIMIT
+    seconds, the upper limit of each following bucket is double that of the previous bucket, and
+    the last bucket is unbounded.
+    """
+
+    FIRST_BUCKET_LIMIT = 0.0001
+    BUCKET_COUNT = 16
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total_time = 0.0
+        self.min_time = None
+        self.max_time = 0.0
+        self.buckets = [0] * self.BUCKET_COUNT
+
+    def add(self, duration):
+        self.count += 1
+        self.total_time += duration
+        self.min_time = duration if self.min_time is None else min(self.min_time, duration)
+        self.max_time = max(self.max_time, duration)
+
+        limit = self.FIRST_BUCKET_LIMIT
+        index = 0
+        while duration > limit and index < self.BUCKET_COUNT - 1:
+            limit *= 2
+            index += 1
+        self.buckets[index] += 1
+
+    @property
+    def mean_time(self):
+        return (self.total_time / self.count) if self.count else 0.0
+
+    @property
+    def histogram(self):
+        """! @brief List of (upper limit, count) tuples for non-empty buckets.
+
+        The upper limit is in seconds, or None for the last, unbounded bucket.
+        """
+        result = []
+        for index, count in enumerate(self.buckets):
+            if count:
+                limit = self.FIRST_BUCKET_LIMIT * (1 << index) if index < self.BUCKET_COUNT - 1 else None
+                result.append((limit, count))
+        return result
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_time': self.total_time,
+            'mean_time': self.mean_time,
+            'min_time': self.min_time,
+            'max_time': self.max_time,
+            'histogram': [[limit, count] for limit, count in self.histogram],
+            }
+
+class _Measurement(object):
+    """! @brief Context manager that records the duration of one operation."""
+
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._top_level = self._profiler._enter()
+        self._start = timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._profiler._exit(self._name, timer() - self._start, self._top_level)
+        return False
+
+class FlashProfiler(object):
+    """! @brief Records the duration of each flash algo operation.
+
+    A profiler is attached to Flash instances by setting their `profiler` attribute, as
+    FlashLoader does when passed a profiler. Every algo operation is then timed, including
+    init and uninit, erases, page programming, page buffer loads, and analyzer runs.
+
+    The time spent with the flash algo running on the target is recorded separately under the
+    'execute' operation. It is measured from resuming the target until the host observes that
+    the algo has returned. The host waits for the algo in the 'wait_for_completion' operation.
+    When page buffer loads are pipelined, the wait is an operation of its own and the algo runs
+    while other operations transfer data, so execute time can exceed wait time. Time within
+    operations other than waiting is spent transferring data and controlling the core over the
+    debug probe. Time outside of operations, compared with the total programming time, is
+    overhead within pyOCD itself.
+
+    Operations may be nested, for instance erase_sector() calls start_erase_sector(). Nested
+    operations have their own statistics, but only the outermost operation contributes to the
+    total time within operations. A profiler may be shared by flash instances that are used
+    from different threads.
+    """
+
+    ## Name of the pseudo-operation recording time spent running the algo on the target.
+    EXECUTE = 'execute'
+
+    ## Name of the operation recording time spent waiting for the algo to return.
+    WAIT = 'wait_for_completion'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {}
+        self._operation_time = 0.0
+
+    def measure(self, name):
+        """! @brief Return a context manager that records the duration of its body."""
+        return _Measurement(self, name)
+
+    def record(self, name, duration):
+        """! @brief Record the duration of an operation measured by the caller."""
+        with self._lock:
+            self._get_stats(name).add(duration)
+
+    def _enter(self):
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        return depth == 0
+
+    def _exit(self, name, duration, top_level):
+        self._local.depth -= 1
+        with self._lock:
+            self._get_stats(name).add(duration)
+            if top_level:
+                self._operation_time += duration
+
+    def _get_stats(self, name):
+        try:
+            return self._stats[name]
+        except KeyError:
+            stats = self._stats[name] = OperationStats(name)
+            return stats
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self._operation_time = 0.0
+
+    @property
+    def operations(self):
+        """! @brief List of OperationStats objects, sorted by name."""
+        return [self._stats[name] for name in sorted(self._stats)]
+
+    def get_stats(self, name):
+        """! @brief Return the OperationStats for an operation, or None if it was never recorded."""
+        return self._stats.get(name)
+
+    @property
+    def operation_time(self):
+        """! @brief Total time spent within outermost operations."""
+        return self._operation_time
+
+    @property
+    def execute_time(self):
+        """! @brief Total time spent running the flash algo on the target."""
+        stats = self._stats.get(self.EXECUTE)
+        return stats.total_time if stats is not None else 0.0
+
+    @property
+    def wait_time(self):
+        """! @brief Total time the host spent waiting for the flash algo to return."""
+        stats = self._stats.get(self.WAIT)
+        return stats.total_time if stats is not None else 0.0
+
+    def get_summary(self, total_time=None):
+        """! @brief Split time between algo execution, probe transfers, and host overhead.
+
+        The wait, transfer, and overhead times add up to the total time. Algo execution may
+        overlap transfers, so it is reported in addition to the time spent waiting for the algo.
+
+        @param self
+        @param total_time Optional total programming time. If not provided, the host overhead
+            is not included.
+        @return Dict of category name to time in seconds.
+        """
+        summary = {
+            'execute_time': self.execute_time,
+            'wait_time': self.wait_time,
+            'transfer_time': max(0.0, self.operation_time - self.wait_time),
+            }
+        if total_time is not None:
+            summary['total_time'] = total_time
+            summary['overhead_time'] = max(0.0, total_time - self.operation_time)
+        return summary
+
+    def to_dict(self, total_time=None):
+        result = self.get_summary(total_time)
+        result['operations'] = {stats.name: stats.to_dict() for stats in self.operations}
+        return result
+
+    def format_report(self, total_time=None):
+        """! @brief Return a multi-line text report of the recorded statistics."""
+        lines = ["%-28s %7s %10s %10s %10s %10s" % ("Operation", "Count", "Total (s)", "Mean (ms)",
+                    "Min (ms)", "Max (ms)")]
+        for stats in self.operations:
+            lines.append("%-28s %7d %10.3f %10.3f %10.3f %10.3f" % (stats.name, stats.count,
+                        stats.total_time, stats.mean_time * 1000, (stats.min_time or 0) * 1000,
+                        stats.max_time * 1000))
+
+        for stats in self.operations:
+            lines.append("")
+            lines.append("%s histogram:" % stats.name)
+            for limit, count in stats.histogram:
+                label = ("<= %g ms" % (limit * 1000)) if limit is not None else "longer"
+                lines.append("  %-16s %7d" % (label, count))
+
+        summary = self.get_summary(total_time)
+        lines.append("")
+        lines.append("Algo execution: %.3f s" % summary['execute_time'])
+        lines.append("Waiting for algo: %.3f s" % summary['wait_time'])
+        lines.append("Probe transfers: %.3f s" % summary['transfer_time'])
+        if total_time is not None:
+            lines.append("Host overhead: %.3f s" % summary['overhead_time'])
+        return "\n".join(lines)
+
+def profiled(name):
+    """! @brief Decorator for Flash methods that records their duration.
+
+    The duration is recorded under _name_ if the instance's `profiler` attribute is set.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            if self.profiler is None:
+                return fn(self, *args, **kwargs)
+            with self.profiler.measure(name):
+                return fn(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -52,6 +52,9 @@ class GDBDebugContextFacade(object):
     def __init__(self, context):
         self._context = context
         self._register_list = self._context.core.register_list
+        self._memory_map_xml = None
+        self._memory_map_xml_map = None
+        self._memory_map_xml_generation = None
 
     @property
     def context(self):
@@ -173,10 +176,23 @@ class GDBDebugContextFacade(object):
         return str
 
     def get_memory_map_xml(self):
+        """! @brief Return GDB memory map XML.
+        
+        The XML is generated once and reused until the core's memory map is replaced or modified.
+        """
+        memory_map = self._context.core.memory_map
+        if (memory_map is not self._memory_map_xml_map) \
+                or (memory_map.generation != self._memory_map_xml_generation):
+            self._memory_map_xml = self._build_memory_map_xml(memory_map)
+            self._memory_map_xml_map = memory_map
+            self._memory_map_xml_generation = memory_map.generation
+        return self._memory_map_xml
+
+    def _build_memory_map_xml(self, memory_map):
         """! @brief Generate GDB memory map XML.
         """
         root = ElementTree.Element('memory-map')
-        for r in  self._context.core.memory_map:
+        for r in memory_map:
             # Look up the region type name. Regions default to ram if gdb doesn't
             # have a concept of the region type.
             gdbType = GDB_TYPE_MAP.get(r.type, 'ram')
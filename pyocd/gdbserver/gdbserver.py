@@ -15,6 +15,7 @@
 # limitations under the License.
 
 import logging
+import re
 import threading
 from struct import unpack
 from time import (sleep, time)
@@ -29,7 +30,7 @@ from ..flash.eraser import FlashEraser
 from ..utility.cmdline import convert_vector_catch
 from ..utility.conversion import (hex_to_byte_list, hex_encode, hex_decode, hex8_to_u32le)
 from ..utility.progress import print_progress
-from ..utility.compatibility import (iter_single_bytes, to_bytes_safe, to_str_safe)
+from ..utility.compatibility import (PY3, to_bytes_safe, to_str_safe)
 from ..utility.server import StreamServer
 from ..trace.swv import SWVReader
 from ..utility.sockets import ListenerSocket
@@ -46,6 +47,7 @@ from .packet_io import (
     ConnectionClosedException,
     GDBServerPacketIOThread,
     )
+from .transcript import TranscriptWriter
 
 LOG = logging.getLogger(__name__)
 
@@ -74,19 +76,21 @@ def unescape(data):
 
     return data
 
+## Characters that must be escaped in binary data sent to gdb.
+_ESCAPE_PATTERN = re.compile(b'[#$}*]')
+
+def _escape_char(match):
+    return b'}' + six.int2byte(six.byte2int(match.group()) ^ 0x20)
+
 def escape(data):
     """! @brief Escape binary data to be sent to Gdb.
     
     @param data Bytes-like object containing raw binary.
     @return Bytes object with the characters in '#$}*' escaped as required by Gdb.
     """
-    result = b''
-    for c in iter_single_bytes(data):
-        if c in b'#$}*':
-            result += b'}' + six.int2byte(six.byte2int(c) ^ 0x20)
-        else:
-            result += c
-    return result
+    if isinstance(data, memoryview) and not PY3:
+        data = data.tobytes()
+    return _ESCAPE_PATTERN.sub(_escape_char, data)
 
 class GDBError(exceptions.Error):
     """! @brief Error communicating with GDB."""
@@ -144,6 +148,17 @@ class GDBServer(threading.Thread):
         self.did_init_thread_providers = False
         self.current_thread_id = 0
         self.first_run_after_reset_or_flash = True
+        self._threads_xml = None
+        self._threads_xml_key = None
+
+        # Open the packet transcript, if enabled. The transcript is shared by all connections.
+        transcript_path = session.options.get('gdbserver_transcript')
+        if transcript_path:
+            if self.core != 0:
+                transcript_path += ".%d" % self.core
+            self.transcript = TranscriptWriter(transcript_path)
+        else:
+            self.transcript = None
 
         self.abstract_socket = ListenerSocket(self.port, self.packet_size)
         if self.serve_local_only:
@@ -256,6 +271,9 @@ class GDBServer(threading.Thread):
         if self._swv_reader:
             self._swv_reader.stop()
             self._swv_reader = None
+        if self.transcript:
+            self.transcript.close()
+            self.transcript = None
         self.abstract_socket.cleanup()
 
     def _cleanup_for_next_connection(self):
@@ -263,6 +281,8 @@ class GDBServer(threading.Thread):
         self.thread_provider = None
         self.did_init_thread_providers = False
         self.current_thread_id = 0
+        self._threads_xml = None
+        self._threads_xml_key = None
 
     def run(self):
         LOG.info('GDB server started on port %d', self.port)
@@ -278,7 +298,7 @@ class GDBServer(threading.Thread):
                 while not self.shutdown_event.isSet() and not self.detach_event.isSet():
                     connected = self.abstract_socket.connect()
                     if connected != None:
-                        self.packet_io = GDBServerPacketIOThread(self.abstract_socket)
+                        self.packet_io = GDBServerPacketIOThread(self.abstract_socket, self.transcript)
                         break
 
                 if self.shutdown_event.isSet():
@@ -800,7 +820,8 @@ class GDBServer(threading.Thread):
         return self.create_rsp_packet(resp)
 
     def read_register(self, which):
-        return self.create_rsp_packet(self.target_facade.gdb_get_register(which))
+        reg = int(which.split(b'#')[0], 16)
+        return self.create_rsp_packet(self.target_facade.gdb_get_register(reg))
 
     def write_register(self, data):
         reg = int(data.split(b'=')[0], 16)
@@ -1037,7 +1058,11 @@ class GDBServer(threading.Thread):
         elif query == b'read_feature':
             xml = self.target.get_target_xml()
         elif query == b'threads':
-            xml = self.get_threads_xml()
+            # gdb reads the document in sequential chunks starting at offset 0, so only check
+            # whether the thread list changed for the first chunk.
+            if offset == 0 or self._threads_xml is None:
+                self._threads_xml = self.get_threads_xml()
+            xml = self._threads_xml
         else:
             raise GDBError("Invalid XML query (%s)" % query)
 
@@ -1057,7 +1082,8 @@ class GDBServer(threading.Thread):
             prefix = b'l'
             size = nbBytesAvailable
 
-        resp = prefix + escape(xml[offset:offset + size])
+        # Slice via memoryview to avoid copying the document for each chunk.
+        resp = prefix + escape(memoryview(xml)[offset:offset + size])
 
         return resp
 
@@ -1125,6 +1151,21 @@ class GDBServer(threading.Thread):
         return response
 
     def get_threads_xml(self):
+        """! @brief Return the threads XML document.
+        
+        The document is regenerated only if the thread provider's thread list generation changed
+        or, without a thread provider, if the target has run.
+        """
+        if self.is_threading_enabled():
+            key = (True, self.thread_provider.threads_generation)
+        else:
+            key = (False, self.target.run_token)
+        if key != self._threads_xml_key:
+            self._threads_xml = self._build_threads_xml()
+            self._threads_xml_key = key
+        return self._threads_xml
+
+    def _build_threads_xml(self):
         root = Element('threads')
 
         if not self.is_threading_enabled():
@@ -45,12 +45,16 @@ class GDBServerPacketIOThread(threading.Thread):
     handles verifying checksums, acking, and receiving Ctrl-C interrupts. There is a queue
     for received packets. The interface to this queue is the receive() method. The send()
     method writes outgoing packets to the socket immediately.
+
+    If a TranscriptWriter is provided, every valid packet received from gdb, every received
+    Ctrl-C, and every packet sent to gdb is recorded to it.
     """
     
-    def __init__(self, abstract_socket):
+    def __init__(self, abstract_socket, transcript=None):
         super(GDBServerPacketIOThread, self).__init__()
         self.name = "gdb-packet-thread-port%d" % abstract_socket.port
         self._abstract_socket = abstract_socket
+        self._transcript = transcript
         self._receive_queue = queue.Queue()
         self._shutdown_event = threading.Event()
         self.interrupt_event = threading.Event()
@@ -78,6 +82,8 @@ class GDBServerPacketIOThread(threading.Thread):
             return
         if not self.drop_reply:
             self._last_packet = packet
+            if self._transcript is not None:
+                self._transcript.sent(packet)
             self._write_packet(packet)
         else:
             self.drop_reply = False
@@ -168,6 +174,8 @@ class GDBServerPacketIOThread(threading.Thread):
 
             # Check for a ctrl-c.
             if len(self._buffer) and self._buffer[0:1] == CTRL_C:
+                if self._transcript is not None:
+                    self._transcript.received(CTRL_C)
                 self.interrupt_event.set()
                 self._buffer = self._buffer[1:]
 
@@ -197,5 +205,7 @@ class GDBServerPacketIOThread(threading.Thread):
             TRACE_ACK.debug(ack)
 
         if goodPacket:
+            if self._transcript is not None:
+                self._transcript.received(packet)
             self._receive_queue.put(packet)
 
@@ -0,0 +1,127 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import re
+import threading
+from collections import namedtuple
+from timeit import default_timer as timer
+
+LOG = logging.getLogger(__name__)
+
+## First line of every transcript file.
+TRANSCRIPT_HEADER = "# pyOCD gdbserver transcript v1"
+
+## Direction of packets received from gdb.
+RECEIVED = 'R'
+## Direction of packets sent to gdb.
+SENT = 'S'
+
+## @brief One packet from a transcript.
+#
+# The timestamp is in seconds relative to when the transcript was started.
+TranscriptEntry = namedtuple('TranscriptEntry', 'timestamp direction packet')
+
+_UNESCAPE_PATTERN = re.compile(r'\\x([0-9a-fA-F]{2})')
+
+def _encode_packet(packet):
+    """! @brief Convert packet bytes to a printable string.
+
+    Printable ASCII characters other than backslash are passed through. All other bytes,
+    including backslash, are written as a "\\xNN" escape.
+    """
+    return "".join((chr(c) if (0x20 <= c < 0x7f and c != 0x5c) else ("\\x%02x" % c))
+                    for c in bytearray(packet))
+
+def _decode_packet(text):
+    """! @brief Inverse of _encode_packet()."""
+    result = bytearray()
+    pos = 0
+    for match in _UNESCAPE_PATTERN.finditer(text):
+        result += text[pos:match.start()].encode('ascii')
+        result.append(int(match.group(1), base=16))
+        pos = match.end()
+    result += text[pos:].encode('ascii')
+    return bytes(result)
+
+class TranscriptWriter(object):
+    """! @brief Records gdb packets with timestamps to a text file.
+
+    The file starts with a header line. Each following line holds one packet in the form
+    "<seconds> <R|S> <packet>", where R marks packets received from gdb and S marks packets sent
+    to gdb. Acks are not recorded. A received Ctrl-C interrupt is recorded as a single 0x03 byte.
+
+    The writer may be shared by the packet I/O threads of successive gdb connections, so
+    recording is thread safe.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'w')
+        self._file.write(TRANSCRIPT_HEADER + "\n")
+        self._start = timer()
+        LOG.info("Recording gdb packet transcript to %s", path)
+
+    @property
+    def path(self):
+        return self._path
+
+    def record(self, direction, packet):
+        """! @brief Write one packet to the transcript.
+        @param self
+        @param direction Either RECEIVED or SENT.
+        @param packet Bytes of the complete packet, including framing and checksum.
+        """
+        line = "%.6f %s %s\n" % (timer() - self._start, direction, _encode_packet(packet))
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+
+    def received(self, packet):
+        self.record(RECEIVED, packet)
+
+    def sent(self, packet):
+        self.record(SENT, packet)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+def read_transcript(path):
+    """! @brief Load a transcript file written by TranscriptWriter.
+    @return List of TranscriptEntry objects in the order they were recorded.
+    @exception ValueError The file is not a valid transcript.
+    """
+    entries = []
+    with open(path, 'r') as f:
+        header = f.readline().rstrip("\r\n")
+        if header != TRANSCRIPT_HEADER:
+            raise ValueError("%s is not a gdbserver transcript" % path)
+        for lineno, line in enumerate(f, start=2):
+            line = line.rstrip("\r\n")
+            if not line:
+                continue
+            try:
+                timestamp, direction, packet = line.split(" ", 2)
+                if direction not in (RECEIVED, SENT):
+                    raise ValueError()
+                entries.append(TranscriptEntry(float(timestamp), direction, _decode_packet(packet)))
+            except ValueError:
+                raise ValueError("invalid transcript entry at %s:%d" % (path, lineno))
+    return entries
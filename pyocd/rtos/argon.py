@@ -15,7 +15,9 @@
 # limitations under the License.
 
 from .provider import (TargetThread, ThreadProvider)
-from .common import (read_c_string, HandlerModeThread, EXC_RETURN_EXT_FRAME_MASK)
+from .common import (read_c_string, HandlerModeThread, StackFrameCache, StructLayout,
+    EXC_RETURN_EXT_FRAME_MASK, u32)
+from .scanner import MemoryScanner
 from ..core import exceptions
 from ..core.target import Target
 from ..debug.context import DebugContext
@@ -37,35 +39,25 @@ THREAD_PRIORITY_OFFSET = 16
 THREAD_STATE_OFFSET = 17
 THREAD_CREATED_NODE_OFFSET = 36
 
+# Size of the part of the thread struct read by the provider.
+THREAD_READ_SIZE = 20
+
+# Fields of the thread struct used by ArgonThread.
+THREAD_LAYOUT = StructLayout([
+    ('stack_pointer', THREAD_STACK_POINTER_OFFSET, "I"),
+    ('extended_frame', THREAD_EXTENDED_FRAME_OFFSET, "B"),
+    ('name', THREAD_NAME_OFFSET, "I"),
+    ('priority', THREAD_PRIORITY_OFFSET, "B"),
+    ('state', THREAD_STATE_OFFSET, "B"),
+    ], THREAD_READ_SIZE)
+
 LIST_NODE_NEXT_OFFSET = 0
 LIST_NODE_OBJ_OFFSET= 8
+LIST_NODE_SIZE = 12
 
 # Create a logger for this module.
 LOG = logging.getLogger(__name__)
 
-class TargetList(object):
-    def __init__(self, context, ptr):
-        self._context = context
-        self._list = ptr
-
-    def __iter__(self):
-        next = 0
-        head = self._context.read32(self._list)
-        node = head
-        is_valid = head != 0
-
-        while is_valid and next != head:
-            try:
-                # Read the object from the node.
-                obj = self._context.read32(node + LIST_NODE_OBJ_OFFSET)
-                yield obj
-
-                next = self._context.read32(node + LIST_NODE_NEXT_OFFSET)
-                node = next
-            except exceptions.TransferError:
-                LOG.warning("TransferError while reading list elements (list=0x%08x, node=0x%08x), terminating list", self._list, node)
-                is_valid = False
-
 class ArgonThreadContext(DebugContext):
     """! @brief Thread context for Argon."""
     
@@ -151,6 +143,7 @@ class ArgonThreadContext(DebugContext):
         super(ArgonThreadContext, self).__init__(parent)
         self._thread = thread
         self._has_fpu = self.core.has_fpu
+        self._frame_cache = StackFrameCache(parent, self.core)
 
     def read_core_registers_raw(self, reg_list):
         reg_list = [register_name_to_index(reg) for reg in reg_list]
@@ -195,6 +188,13 @@ class ArgonThreadContext(DebugContext):
                 hwStacked = 0x68
                 swStacked = 0x60
 
+        # Read the whole saved frame once for all registers.
+        try:
+            frame = self._frame_cache.get_frame(sp, hwStacked if inException else (swStacked + hwStacked))
+        except exceptions.TransferError:
+            LOG.debug("Transfer error while reading thread's saved registers")
+            frame = None
+
         for reg in reg_list:
             # Must handle stack pointer specially.
             if reg == 13:
@@ -212,14 +212,11 @@ class ArgonThreadContext(DebugContext):
             if inException:
                 spOffset -= swStacked
 
-            try:
-                if spOffset >= 0:
-                    reg_vals.append(self._parent.read32(sp + spOffset))
-                else:
-                    # Not available - try live one
-                    reg_vals.append(self._parent.read_core_register_raw(reg))
-            except exceptions.TransferError:
-                reg_vals.append(0)
+            if spOffset >= 0:
+                reg_vals.append(u32(frame, spOffset) if (frame is not None) else 0)
+            else:
+                # Not available - try live one
+                reg_vals.append(self._parent.read_core_register_raw(reg))
 
         return reg_vals
 
@@ -244,7 +241,7 @@ class ArgonThread(TargetThread):
             DONE : "Done",
         }
 
-    def __init__(self, targetContext, provider, base):
+    def __init__(self, targetContext, provider, base, data=None, name=None):
         super(ArgonThread, self).__init__()
         self._target_context = targetContext
         self._provider = provider
@@ -254,17 +251,26 @@ class ArgonThread(TargetThread):
         self._priority = 0
         self._state = self.UNKNOWN
         self._name = "?"
+        self._stack_pointer = 0
+        self._extended_frame = 0
+        self._scan_generation = None
 
         try:
-            self.update_info()
+            self.update_info(data)
 
-            ptr = self._target_context.read32(self._base + THREAD_NAME_OFFSET)
-            self._name = read_c_string(self._target_context, ptr)
-            LOG.debug("Thread@%x name=%x '%s'", self._base, ptr, self._name)
+            if name is None:
+                ptr = THREAD_LAYOUT.read(self._target_context, self._base, ('name',))['name']
+                name = read_c_string(self._target_context, ptr)
+            self._name = name
+            LOG.debug("Thread@%x name='%s'", self._base, self._name)
         except exceptions.TransferError:
             LOG.debug("Transfer error while reading thread info")
 
     def get_stack_pointer(self):
+        # Use the stack pointer read while building the thread list if the target hasn't run since.
+        if self._provider.is_scan_current(self._scan_generation):
+            return self._stack_pointer
+
         # Get stack pointer saved in thread struct.
         try:
             return self._target_context.read32(self._base + THREAD_STACK_POINTER_OFFSET)
@@ -272,11 +278,25 @@ class ArgonThread(TargetThread):
             LOG.debug("Transfer error while reading thread's stack pointer @ 0x%08x", self._base + THREAD_STACK_POINTER_OFFSET)
             return 0
 
-    def update_info(self):
+    def update_info(self, data=None):
+        """! @brief Update the thread's priority and state.
+        @param self
+        @param data Optional data of the first THREAD_READ_SIZE bytes of the thread struct. If
+            provided, the stack pointer and extended frame flag are also updated and used until the
+            target runs again. Otherwise the priority and state are read from the target.
+        """
         try:
-            self._priority = self._target_context.read8(self._base + THREAD_PRIORITY_OFFSET)
-
-            self._state = self._target_context.read8(self._base + THREAD_STATE_OFFSET)
+            if data is not None:
+                fields = THREAD_LAYOUT.unpack(data)
+                self._priority = fields['priority']
+                self._state = fields['state']
+                self._stack_pointer = fields['stack_pointer']
+                self._extended_frame = fields['extended_frame']
+                self._scan_generation = self._provider.scan_generation
+            else:
+                fields = THREAD_LAYOUT.read(self._target_context, self._base, ('priority', 'state'))
+                self._priority = fields['priority']
+                self._state = fields['state']
             if self._state > self.DONE:
                 self._state = self.UNKNOWN
         except exceptions.TransferError:
@@ -314,6 +334,8 @@ class ArgonThread(TargetThread):
     def has_extended_frame(self):
         if not self._has_fpu:
             return False
+        if self._provider.is_scan_current(self._scan_generation):
+            return self._extended_frame != 0
         try:
             flag = self._target_context.read8(self._base + THREAD_EXTENDED_FRAME_OFFSET)
             return flag != 0
@@ -364,18 +386,40 @@ class ArgonThreadProvider(ThreadProvider):
         self.invalidate();
 
     def _build_thread_list(self):
-        allThreads = TargetList(self._target_context, self._all_threads)
+        scanner = MemoryScanner.create(self._target, self._target_context, self.g_ar_objects)
+
+        # Walk the circular list of all threads.
+        head, = scanner.read_words([self._all_threads])
+        if head is None:
+            raise exceptions.TransferError("failed to read Argon thread list")
+        nodes, = scanner.walk_lists([(head, LIST_NODE_NEXT_OFFSET, None)], LIST_NODE_SIZE)
+        threadBases = [u32(data, LIST_NODE_OBJ_OFFSET) for _, data in nodes]
+
+        # Read all thread structs in one wave, then the names of new threads in another.
+        threadData = scanner.read_blocks([(base, THREAD_READ_SIZE) for base in threadBases])
+        newThreadData = [(base, data) for base, data in zip(threadBases, threadData)
+                        if base not in self._threads and data is not None]
+        names = scanner.read_strings([THREAD_LAYOUT.unpack(data, ('name',))['name']
+                    for _, data in newThreadData])
+        names = {base: name for (base, _), name in zip(newThreadData, names)}
+
         newThreads = {}
-        for threadBase in allThreads:
+
+        for threadBase, data in zip(threadBases, threadData):
             try:
                 # Reuse existing thread objects if possible.
                 if threadBase in self._threads:
                     t = self._threads[threadBase]
 
-                    # Ask the thread object to update its state and priority.
-                    t.update_info()
+                    # Ask the thread object to update its state and priority. Its name is not
+                    # read again.
+                    t.update_info(data)
+                    scanner.stats.threads_updated += 1
+                    scanner.stats.reads_saved += 1
+                    scanner.stats.bytes_saved += MemoryScanner.STRING_READ_SIZE
                 else:
-                    t = ArgonThread(self._target_context, self, threadBase)
+                    t = ArgonThread(self._target_context, self, threadBase, data, names.get(threadBase))
+                    scanner.stats.threads_created += 1
                 LOG.debug("Thread 0x%08x (%s)", threadBase, t.name)
                 newThreads[t.unique_id] = t
             except exceptions.TransferError:
@@ -388,6 +432,7 @@ class ArgonThreadProvider(ThreadProvider):
             newThreads[t.unique_id] = t
 
         self._threads = newThreads
+        self._record_scan_stats(scanner.stats)
 
     def get_threads(self):
         if not self.is_enabled:
@@ -436,6 +481,10 @@ class ArgonThreadProvider(ThreadProvider):
             return None
         return self._target_context.read32(self.g_ar)
 
+    @property
+    def current_thread_address(self):
+        return self.g_ar
+
     def get_is_running(self):
         if self.g_ar is None:
             return False
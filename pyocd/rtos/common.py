@@ -17,8 +17,9 @@
 from .provider import (TargetThread, ThreadProvider)
 from ..debug.context import DebugContext
 from ..coresight.cortex_m import (CORE_REGISTER, register_name_to_index)
-from ..core import exceptions
+from ..utility.target_memory import (decode_c_string, read_c_string)
 import logging
+import struct
 
 LOG = logging.getLogger(__name__)
 
@@ -26,40 +27,121 @@ LOG = logging.getLogger(__name__)
 # on the frame. The bit is 0 if the frame is extended.
 EXC_RETURN_EXT_FRAME_MASK = (1 << 4)
 
-def read_c_string(context, ptr):
-    """! @brief Reads a null-terminated C string from the target."""
-    if ptr == 0:
-        return ""
-
-    s = ""
-    done = False
-    count = 0
-    badCount = 0
-    try:
-        while not done and count < 256:
-            data = context.read_memory_block8(ptr, 16)
-            ptr += 16
-            count += 16
-
-            for c in data:
-                if c == 0:
-                    done = True
-                    break
-                elif c > 127:
-                    # Replace non-ASCII characters. If there is a run of invalid characters longer
-                    # than 4, then terminate the string early.
-                    badCount += 1
-                    if badCount > 4:
-                        done = True
-                        break
-                    s += '?'
-                else:
-                    s += chr(c)
-                    badCount = 0
-    except exceptions.TransferError:
-        LOG.debug("TransferError while trying to read 16 bytes at 0x%08x", ptr)
-
-    return s
+def u32(data, offset):
+    """! @brief Return the little endian word at an offset in data read from the target."""
+    return struct.unpack_from("<I", data, offset)[0]
+
+class StructLayout(object):
+    """! @brief Describes the fields of a data structure in target memory.
+
+    A layout unpacks the fields of a structure from data read from the target with a single
+    precompiled little endian struct. It can also read a structure, or only the span of it that
+    covers a set of fields, with one block read.
+    """
+
+    def __init__(self, fields, size=None):
+        """! @brief Constructor.
+        @param self
+        @param fields Sequence of (name, offset, format) tuples. _format_ is a struct format for
+            the field, such as "I" for a word, "B" for a byte, or "16s" for a character array.
+        @param size Optional size of the structure. Defaults to the end of the last field.
+        """
+        self._fields = {name: (offset, struct.calcsize("<" + fmt), fmt) for name, offset, fmt in fields}
+        self._size = size if (size is not None) else max(
+                (offset + length) for offset, length, _ in self._fields.values())
+        self._compiled = {}
+
+    @property
+    def size(self):
+        return self._size
+
+    def offset_of(self, name):
+        """! @brief Return the offset of a field within the structure."""
+        return self._fields[name][0]
+
+    def _compile(self, names):
+        """! @brief Return the (start, size, struct, names) of the span covering some fields."""
+        key = tuple(names) if (names is not None) else None
+        try:
+            return self._compiled[key]
+        except KeyError:
+            pass
+
+        fields = sorted((self._fields[name][0], name) for name in (names or self._fields))
+        start = fields[0][0]
+        fmt = "<"
+        position = start
+        for offset, name in fields:
+            _, length, fieldFormat = self._fields[name]
+            if offset < position:
+                raise ValueError("field '%s' overlaps another field" % name)
+            if offset > position:
+                fmt += "%dx" % (offset - position)
+            fmt += fieldFormat
+            position = offset + length
+        compiled = (start, position - start, struct.Struct(fmt), [name for _, name in fields])
+        self._compiled[key] = compiled
+        return compiled
+
+    def unpack(self, data, names=None):
+        """! @brief Unpack fields from data read from the start of the structure.
+        @param self
+        @param data Data of the structure. Must be long enough to hold the unpacked fields.
+        @param names Optional sequence of the names of the fields to unpack. Defaults to all fields.
+        @return Dict of field values keyed by field name.
+        """
+        start, _, compiled, fieldNames = self._compile(names)
+        if not isinstance(data, bytearray):
+            data = bytearray(data)
+        return dict(zip(fieldNames, compiled.unpack_from(data, start)))
+
+    def read(self, context, addr, names=None):
+        """! @brief Read fields of a structure from the target with a single block read.
+        @param self
+        @param context Context to read through.
+        @param addr Address of the structure.
+        @param names Optional sequence of the names of the fields to read. Only the span of the
+            structure that covers these fields is read. Defaults to all fields.
+        @return Dict of field values keyed by field name.
+        @exception TransferError The structure could not be read.
+        """
+        start, length, compiled, fieldNames = self._compile(names)
+        data = bytearray(context.read_memory_block8(addr + start, length))
+        return dict(zip(fieldNames, compiled.unpack_from(data)))
+
+class StackFrameCache(object):
+    """! @brief Caches the registers a thread saved on its stack.
+
+    Thread contexts use a cache to read the whole saved frame of a thread with one block read on
+    first access, instead of reading each register separately. The frame is reused for all
+    register reads of the thread until the target runs again or the frame address changes.
+    """
+
+    def __init__(self, context, core):
+        """! @brief Constructor.
+        @param self
+        @param context The context to read the frame through, normally the thread context's parent.
+        @param core The core whose run token tells whether the target has run.
+        """
+        self._context = context
+        self._core = core
+        self._key = None
+        self._data = None
+
+    def get_frame(self, addr, size):
+        """! @brief Return the data of a frame, reading it from the target on a cache miss.
+
+        A cached frame at the same address is reused if it is at least _size_ bytes long.
+
+        @return A bytearray with at least _size_ bytes.
+        @exception TransferError The frame could not be read.
+        """
+        key = (self._core.run_token, addr)
+        if key != self._key or len(self._data) < size:
+            self._key = None
+            self._data = bytearray(self._context.read_memory_block8(addr, size))
+            self._key = key
+        return self._data
 
 class HandlerModeThread(TargetThread):
     """! @brief Class representing the handler mode."""
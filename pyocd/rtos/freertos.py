@@ -15,7 +15,9 @@
 # limitations under the License.
 
 from .provider import (TargetThread, ThreadProvider)
-from .common import (read_c_string, HandlerModeThread, EXC_RETURN_EXT_FRAME_MASK)
+from .common import (read_c_string, decode_c_string, HandlerModeThread, StackFrameCache,
+    StructLayout, EXC_RETURN_EXT_FRAME_MASK, u32)
+from .scanner import MemoryScanner
 from ..core import exceptions
 from ..core.target import Target
 from ..debug.context import DebugContext
@@ -25,7 +27,9 @@ import logging
 FREERTOS_MAX_PRIORITIES	= 63
 
 LIST_SIZE = 20
+LIST_COUNT_OFFSET = 0
 LIST_INDEX_OFFSET = 16
+LIST_NODE_SIZE = 16
 LIST_NODE_NEXT_OFFSET = 8 # 4?
 LIST_NODE_OBJECT_OFFSET = 12
 
@@ -33,36 +37,21 @@ THREAD_STACK_POINTER_OFFSET = 0
 THREAD_PRIORITY_OFFSET = 44
 THREAD_NAME_OFFSET = 52
 
-# Create a logger for this module.
-LOG = logging.getLogger(__name__)
+# Size of the TCB read when creating a thread. Includes the default configMAX_TASK_NAME_LEN of 16.
+THREAD_READ_SIZE = THREAD_NAME_OFFSET + 16
 
-class TargetList(object):
-    def __init__(self, context, ptr):
-        self._context = context
-        self._list = ptr
-
-    def __iter__(self):
-        prev = -1
-        found = 0
-        count = self._context.read32(self._list)
-        if count == 0:
-            return
+# Size of the TCB read when updating a known thread, covering the fields that can change.
+THREAD_UPDATE_SIZE = THREAD_PRIORITY_OFFSET + 4
 
-        node = self._context.read32(self._list + LIST_INDEX_OFFSET)
+# Fields of the TCB used by FreeRTOSThread.
+THREAD_LAYOUT = StructLayout([
+    ('stack_pointer', THREAD_STACK_POINTER_OFFSET, "I"),
+    ('priority', THREAD_PRIORITY_OFFSET, "I"),
+    ('name', THREAD_NAME_OFFSET, "%ds" % (THREAD_READ_SIZE - THREAD_NAME_OFFSET)),
+    ])
 
-        while (node != 0) and (node != prev) and (found < count):
-            try:
-                # Read the object from the node.
-                obj = self._context.read32(node + LIST_NODE_OBJECT_OFFSET)
-                yield obj
-                found += 1
-
-                # Read next list node pointer.
-                prev = node
-                node = self._context.read32(node + LIST_NODE_NEXT_OFFSET)
-            except exceptions.TransferError:
-                LOG.warning("TransferError while reading list elements (list=0x%08x, node=0x%08x), terminating list", self._list, node)
-                node = 0
+# Create a logger for this module.
+LOG = logging.getLogger(__name__)
 
 class FreeRTOSThreadContext(DebugContext):
     """! @brief Thread context for FreeRTOS."""
@@ -156,6 +145,7 @@ class FreeRTOSThreadContext(DebugContext):
         super(FreeRTOSThreadContext, self).__init__(parent)
         self._thread = thread
         self._has_fpu = self.core.has_fpu
+        self._frame_cache = StackFrameCache(parent, self.core)
 
     def read_core_registers_raw(self, reg_list):
         reg_list = [register_name_to_index(reg) for reg in reg_list]
@@ -188,9 +178,11 @@ class FreeRTOSThreadContext(DebugContext):
                     # Vector catch has just occurred, take live LR
                     exceptionLR = self._parent.read_core_register('lr')
                 else:
-                    # Read stacked exception return LR.
+                    # Read stacked exception return LR. The whole basic frame is read, since it
+                    # is needed anyway if FPU registers were not stacked.
                     offset = self.FPU_BASIC_REGISTER_OFFSETS[-1]
-                    exceptionLR = self._parent.read32(sp + offset)
+                    frame = self._frame_cache.get_frame(sp, 0x24 + hwStacked)
+                    exceptionLR = u32(frame, offset)
 
                 # Check bit 4 of the saved exception LR to determine if FPU registers were stacked.
                 if (exceptionLR & EXC_RETURN_EXT_FRAME_MASK) != 0:
@@ -203,6 +195,13 @@ class FreeRTOSThreadContext(DebugContext):
             except exceptions.TransferError:
                 LOG.debug("Transfer error while reading thread's saved LR")
 
+        # Read the whole saved frame once for all registers.
+        try:
+            frame = self._frame_cache.get_frame(sp, hwStacked if inException else (swStacked + hwStacked))
+        except exceptions.TransferError:
+            LOG.debug("Transfer error while reading thread's saved registers")
+            frame = None
+
         for reg in reg_list:
             # Must handle stack pointer specially.
             if reg == 13:
@@ -220,14 +219,11 @@ class FreeRTOSThreadContext(DebugContext):
             if inException:
                 spOffset -= swStacked
 
-            try:
-                if spOffset >= 0:
-                    reg_vals.append(self._parent.read32(sp + spOffset))
-                else:
-                    # Not available - try live one
-                    reg_vals.append(self._parent.read_core_register_raw(reg))
-            except exceptions.TransferError:
-                reg_vals.append(0)
+            if spOffset >= 0:
+                reg_vals.append(u32(frame, spOffset) if (frame is not None) else 0)
+            else:
+                # Not available - try live one
+                reg_vals.append(self._parent.read_core_register_raw(reg))
 
         return reg_vals
 
@@ -248,21 +244,49 @@ class FreeRTOSThread(TargetThread):
             DELETED : "Deleted",
         }
 
-    def __init__(self, targetContext, provider, base):
+    def __init__(self, targetContext, provider, base, tcb=None):
+        """! @brief Constructor.
+        @param self
+        @param targetContext The target context.
+        @param provider The thread provider.
+        @param base Address of the thread's TCB.
+        @param tcb Optional data of the first THREAD_READ_SIZE bytes of the TCB. If not provided,
+            the TCB fields are read from the target.
+        """
         super(FreeRTOSThread, self).__init__()
         self._target_context = targetContext
         self._provider = provider
         self._base = base
         self._state = FreeRTOSThread.READY
         self._thread_context = FreeRTOSThreadContext(self._target_context, self)
+        self._stack_pointer = 0
+        self._scan_generation = None
 
-        self._priority = self._target_context.read32(self._base + THREAD_PRIORITY_OFFSET)
-
-        self._name = read_c_string(self._target_context, self._base + THREAD_NAME_OFFSET)
+        if tcb is not None:
+            self.update(tcb)
+            name = THREAD_LAYOUT.unpack(tcb, ('name',))['name']
+        else:
+            fields = THREAD_LAYOUT.read(self._target_context, self._base, ('priority', 'name'))
+            self._priority = fields['priority']
+            name = fields['name']
+        self._name, done = decode_c_string(name)
+        if not done:
+            self._name = read_c_string(self._target_context, self._base + THREAD_NAME_OFFSET)
         if len(self._name) == 0:
             self._name = "Unnamed"
 
+    def update(self, tcb):
+        """! @brief Update the fields that can change from the first THREAD_UPDATE_SIZE bytes of the TCB."""
+        fields = THREAD_LAYOUT.unpack(tcb, ('stack_pointer', 'priority'))
+        self._priority = fields['priority']
+        self._stack_pointer = fields['stack_pointer']
+        self._scan_generation = self._provider.scan_generation
+
     def get_stack_pointer(self):
+        # Use the stack pointer read while building the thread list if the target hasn't run since.
+        if self._provider.is_scan_current(self._scan_generation):
+            return self._stack_pointer
+
         # Get stack pointer saved in thread struct.
         try:
             return self._target_context.read32(self._base + THREAD_STACK_POINTER_OFFSET)
@@ -384,12 +408,14 @@ class FreeRTOSThreadProvider(ThreadProvider):
 
     def _build_thread_list(self):
         newThreads = {}
+        scanner = MemoryScanner.create(self._target, self._target_context, self._symbols['pxCurrentTCB'])
 
-        # Read the number of threads.
-        threadCount = self._target_context.read32(self._symbols['uxCurrentNumberOfTasks'])
-
-        # Read the current thread.
-        currentThread = self._target_context.read32(self._symbols['pxCurrentTCB'])
+        # Read the number of threads, the current thread, and the top ready priority.
+        values = scanner.read_words([self._symbols['uxCurrentNumberOfTasks'],
+                    self._symbols['pxCurrentTCB'], self._symbols['uxTopReadyPriority']])
+        if None in values:
+            raise exceptions.TransferError("failed to read FreeRTOS kernel variables")
+        threadCount, currentThread, topPriority = values
 
         # We should only be building the thread list if the scheduler is running, so a zero thread
         # count or a null current thread means something is bizarrely wrong.
@@ -397,9 +423,6 @@ class FreeRTOSThreadProvider(ThreadProvider):
             LOG.warning("FreeRTOS: no threads even though the scheduler is running")
             return
 
-        # Read the top ready priority.
-        topPriority = self._target_context.read32(self._symbols['uxTopReadyPriority'])
-
         # Handle an uxTopReadyPriority value larger than the number of lists. This is most likely
         # caused by the configUSE_PORT_OPTIMISED_TASK_SELECTION option being enabled, which treats
         # uxTopReadyPriority as a bitmap instead of integer. This is ok because uxTopReadyPriority
@@ -420,32 +443,65 @@ class FreeRTOSThreadProvider(ThreadProvider):
         if 'xTasksWaitingTermination' in self._symbols:
             listsToRead.append((self._symbols['xTasksWaitingTermination'], FreeRTOSThread.DELETED))
 
-        for listPtr, state in listsToRead:
-            for threadBase in TargetList(self._target_context, listPtr):
-                try:
-                    # Don't try adding more threads than the number of threads that FreeRTOS says there are.
-                    if len(newThreads) >= threadCount:
-                        break
-
-                    # Reuse existing thread objects.
-                    if threadBase in self._threads:
-                        t = self._threads[threadBase]
-                    else:
-                        t = FreeRTOSThread(self._target_context, self, threadBase)
-
-                    # Set thread state.
-                    if threadBase == currentThread:
-                        t.state = FreeRTOSThread.RUNNING
-                    else:
-                        t.state = state
-
-                    LOG.debug("Thread 0x%08x (%s)", threadBase, t.name)
-                    newThreads[t.unique_id] = t
-                except exceptions.TransferError:
-                    LOG.debug("TransferError while examining thread 0x%08x", threadBase)
+        # Read all list headers, then walk the lists in parallel.
+        headers = scanner.read_blocks([(listPtr, LIST_SIZE) for listPtr, _ in listsToRead])
+        walks = []
+        for (listPtr, _), header in zip(listsToRead, headers):
+            if header is None:
+                LOG.warning("TransferError while reading list header (list=0x%08x)", listPtr)
+                walks.append((0, None, None))
+                continue
+            count = u32(header, LIST_COUNT_OFFSET)
+            walks.append((u32(header, LIST_INDEX_OFFSET) if count else 0, LIST_NODE_NEXT_OFFSET, count))
+        nodeLists = scanner.walk_lists(walks, LIST_NODE_SIZE)
+
+        # Collect thread objects, without adding more threads than the number of threads that
+        # FreeRTOS says there are.
+        threadStates = []
+        found = set()
+        for (_, state), nodes in zip(listsToRead, nodeLists):
+            for _, node in nodes:
+                if len(found) >= threadCount:
+                    break
+                threadBase = u32(node, LIST_NODE_OBJECT_OFFSET)
+                found.add(threadBase)
+                threadStates.append((threadBase, state))
+
+        # Read the TCBs in one wave. Only the fields that can change are read for known threads.
+        bases = list(found)
+        tcbs = dict(zip(bases, scanner.read_blocks([(base,
+                    THREAD_UPDATE_SIZE if (base in self._threads) else THREAD_READ_SIZE)
+                    for base in bases])))
+
+        for threadBase, state in threadStates:
+            try:
+                # Reuse existing thread objects.
+                if threadBase in newThreads:
+                    t = newThreads[threadBase]
+                elif threadBase in self._threads:
+                    t = self._threads[threadBase]
+                    if tcbs[threadBase] is not None:
+                        t.update(tcbs[threadBase])
+                        scanner.stats.threads_updated += 1
+                        scanner.stats.bytes_saved += THREAD_READ_SIZE - THREAD_UPDATE_SIZE
+                else:
+                    t = FreeRTOSThread(self._target_context, self, threadBase, tcbs[threadBase])
+                    scanner.stats.threads_created += 1
+
+                # Set thread state.
+                if threadBase == currentThread:
+                    t.state = FreeRTOSThread.RUNNING
+                else:
+                    t.state = state
+
+                LOG.debug("Thread 0x%08x (%s)", threadBase, t.name)
+                newThreads[t.unique_id] = t
+            except exceptions.TransferError:
+                LOG.debug("TransferError while examining thread 0x%08x", threadBase)
 
         if len(newThreads) != threadCount:
             LOG.warning("FreeRTOS: thread count mismatch")
+        self._record_scan_stats(scanner.stats)
 
         # Create fake handler mode thread.
         if self._target_context.read_core_register('ipsr') > 0:
@@ -500,6 +556,12 @@ class FreeRTOSThreadProvider(ThreadProvider):
             return None
         return self._target_context.read32(self._symbols['pxCurrentTCB'])
 
+    @property
+    def current_thread_address(self):
+        if self._symbols is None:
+            return None
+        return self._symbols['pxCurrentTCB']
+
     def get_is_running(self):
         if self._symbols is None:
             return False
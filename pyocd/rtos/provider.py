@@ -18,6 +18,31 @@ import logging
 
 LOG = logging.getLogger(__name__)
 
+class ScanStats(object):
+    """! @brief Counters for a thread list build.
+
+    Reads are the memory read requests made by the scanner, excluding those served from a
+    snapshot. Saved reads and bytes are those a full rebuild would have made to re-read static
+    thread data, such as names, that were skipped because the thread was already known.
+    """
+
+    COUNTERS = ('threads_created', 'threads_updated', 'reads', 'bytes_read', 'reads_saved',
+                'bytes_saved')
+
+    def __init__(self):
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+
+    def add(self, other):
+        for name in self.COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.COUNTERS}
+
+    def __str__(self):
+        return ", ".join("%s=%d" % (name, getattr(self, name)) for name in self.COUNTERS)
+
 class TargetThread(object):
     """! @brief Base class representing a thread on the target."""
 
@@ -52,6 +77,13 @@ class ThreadProvider(object):
         self._target_context = self._target.get_target_context()
         self._last_run_token = -1
         self._read_from_target = False
+        self._threads = {}
+        self._threads_generation = 0
+        self._threads_signature = None
+        self._generation_threads = None
+        self._scan_generation = 0
+        self._last_scan_stats = None
+        self._total_scan_stats = ScanStats()
 
     def _lookup_symbols(self, symbolList, symbolProvider):
         syms = {}
@@ -82,8 +114,75 @@ class ThreadProvider(object):
         return True
 
     def update_threads(self):
+        """! @brief Rebuild the thread list if the target has run since it was last built.
+        @return Boolean indicating whether the thread list changed.
+        """
         if self._is_thread_list_dirty() and self._read_from_target:
+            self._scan_generation += 1
             self._build_thread_list()
+        return self._update_threads_generation()
+
+    @property
+    def scan_generation(self):
+        """! @brief Number of the most recent thread list build.
+
+        Thread objects are kept across builds, and tag the data they read from the target during a
+        build with its scan generation.
+        """
+        return self._scan_generation
+
+    def is_scan_current(self, generation):
+        """! @brief Whether data read during a thread list build is still valid.
+
+        Data is valid if it was read during the most recent build and the target has not run
+        since then.
+        """
+        return generation == self._scan_generation and self._target.run_token == self._last_run_token
+
+    def _record_scan_stats(self, stats):
+        """! @brief Record the statistics of a thread list build."""
+        self._last_scan_stats = stats
+        self._total_scan_stats.add(stats)
+        LOG.debug("thread list scan %d: %s", self._scan_generation, stats)
+
+    @property
+    def last_scan_stats(self):
+        """! @brief ScanStats of the most recent thread list build, or None."""
+        return self._last_scan_stats
+
+    @property
+    def total_scan_stats(self):
+        """! @brief ScanStats accumulated over all thread list builds."""
+        return self._total_scan_stats
+
+    def _update_threads_generation(self):
+        """! @brief Increment the thread list generation if the thread list changed.
+        
+        Subclasses replace the _threads dict whenever the list is rebuilt or invalidated, so the
+        threads only need to be compared when the dict object is different.
+        
+        @return Boolean indicating whether the generation was incremented.
+        """
+        if self._threads is self._generation_threads:
+            return False
+        self._generation_threads = self._threads
+        signature = [(t.unique_id, t.name, t.description) for t in self._threads.values()]
+        if signature == self._threads_signature:
+            return False
+        self._threads_signature = signature
+        self._threads_generation += 1
+        LOG.debug("thread list changed; generation %d", self._threads_generation)
+        return True
+
+    @property
+    def threads_generation(self):
+        """! @brief Generation number of the thread list.
+        
+        The generation is incremented each time the set of threads, or the name or description of
+        any thread, changes. It can be used as a key for data derived from the thread list.
+        """
+        self.update_threads()
+        return self._threads_generation
 
     def get_threads(self):
         raise NotImplementedError()
@@ -122,3 +221,15 @@ class ThreadProvider(object):
     def get_actual_current_thread_id(self):
         """! From OS's point of view, so the current OS thread even in Handler Mode"""
         raise NotImplementedError()
+
+    @property
+    def current_thread_address(self):
+        """! @brief Address of the kernel variable that holds the ID of the current thread.
+
+        Reading this word gives the same value as get_actual_current_thread_id(), but can be
+        batched with other reads and doesn't touch the thread list, so it is suitable for sampling
+        the current thread while the target is running.
+
+        @return The address, or None if the provider is not initialized.
+        """
+        return None
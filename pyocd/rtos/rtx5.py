@@ -14,7 +14,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from .provider import (TargetThread, ThreadProvider)
-from .common import (read_c_string, HandlerModeThread, EXC_RETURN_EXT_FRAME_MASK)
+from .common import (read_c_string, HandlerModeThread, StackFrameCache, StructLayout,
+    EXC_RETURN_EXT_FRAME_MASK, u32)
+from .scanner import MemoryScanner
 from ..core import exceptions
 from ..core.target import Target
 from ..debug.context import DebugContext
@@ -24,27 +26,6 @@ import logging
 # Create a logger for this module.
 LOG = logging.getLogger(__name__)
 
-class TargetList(object):
-    def __init__(self, context, ptr, nextOffset):
-        self._context = context
-        self._list = ptr
-        self._offset = nextOffset
-
-    def __iter__(self):
-        # Read first item on list.
-        node = self._context.read32(self._list)
-
-        while node != 0:
-            # Return previously read item.
-            yield node
-
-            try:
-                # Read the next item in the list.
-                node = self._context.read32(node + self._offset)
-            except exceptions.TransferError as exc:
-                LOG.warning("TransferError while reading list elements (list=0x%08x, node=0x%08x), terminating list: %s", self._list, node, exc)
-                break
-
 class RTXThreadContext(DebugContext):
     """! @brief Thread context for RTX5."""
     
@@ -134,6 +115,7 @@ class RTXThreadContext(DebugContext):
         super(RTXThreadContext, self).__init__(parent)
         self._thread = thread
         self._has_fpu = self.core.has_fpu
+        self._frame_cache = StackFrameCache(parent, self.core)
 
     def read_core_registers_raw(self, reg_list):
         reg_list = [register_name_to_index(reg) for reg in reg_list]
@@ -179,6 +161,13 @@ class RTXThreadContext(DebugContext):
             except exceptions.TransferError:
                 LOG.debug("Transfer error while reading thread's saved LR")
 
+        # Read the whole saved frame once for all registers.
+        try:
+            frame = self._frame_cache.get_frame(sp, hwStacked if inException else (swStacked + hwStacked))
+        except exceptions.TransferError:
+            LOG.debug("Transfer error while reading thread's saved registers")
+            frame = None
+
         for reg in reg_list:
 
             # Must handle stack pointer specially.
@@ -197,14 +186,11 @@ class RTXThreadContext(DebugContext):
             if inException:
                 spOffset -= swStacked
 
-            try:
-                if spOffset >= 0:
-                    reg_vals.append(self._parent.read32(sp + spOffset))
-                else:
-                    # Not available - try live one
-                    reg_vals.append(self._parent.read_core_register_raw(reg))
-            except exceptions.TransferError:
-                reg_vals.append(0)
+            if spOffset >= 0:
+                reg_vals.append(u32(frame, spOffset) if (frame is not None) else 0)
+            else:
+                # Not available - try live one
+                reg_vals.append(self._parent.read_core_register_raw(reg))
 
         return reg_vals
 
@@ -217,6 +203,18 @@ class RTXTargetThread(TargetThread):
     STACKFRAME_OFFSET = 34
     SP_OFFSET = 56
 
+    ## Size of the part of osRtxThread_t read by the provider, through the stack pointer.
+    READ_SIZE = SP_OFFSET + 4
+
+    ## Fields of osRtxThread_t used by the thread.
+    LAYOUT = StructLayout([
+            ('state', STATE_OFFSET, "B"),
+            ('name', NAME_OFFSET, "I"),
+            ('priority', PRIORITY_OFFSET, "B"),
+            ('stack_frame', STACKFRAME_OFFSET, "B"),
+            ('sp', SP_OFFSET, "I"),
+            ], READ_SIZE)
+
     STATES = {
          0x00: "Inactive",
          0x01: "Ready",
@@ -234,34 +232,62 @@ class RTXTargetThread(TargetThread):
          0x93: "Waiting[MsgPut]",
     }
     
-    def __init__(self, targetContext, provider, base):
+    def __init__(self, targetContext, provider, base, data=None, name=None):
+        """! @brief Constructor.
+        @param self
+        @param targetContext The target context.
+        @param provider The thread provider.
+        @param base Address of the thread's osRtxThread_t.
+        @param data Optional data of the first READ_SIZE bytes of osRtxThread_t. If not provided,
+            the thread's fields are read from the target.
+        @param name Optional thread name. If not provided, the name is read from the target.
+        """
         super(RTXTargetThread, self).__init__()
         self._target_context = targetContext
         self._provider = provider
         self._base = base
         self._state = 0
         self._priority = 0
+        self._stack_pointer = 0
+        self._stack_frame = 0
+        self._scan_generation = None
         self._thread_context = RTXThreadContext(self._target_context, self)
         self._has_fpu = self._thread_context.core.has_fpu
         try:
-            name_ptr = self._target_context.read32(self._base + RTXTargetThread.NAME_OFFSET)
-            self._name = read_c_string(self._target_context, name_ptr)
+            if name is None:
+                name_ptr = self.LAYOUT.read(self._target_context, self._base, ('name',))['name']
+                name = read_c_string(self._target_context, name_ptr)
+            self._name = name
             
-            self.update_state()
+            self.update_state(data)
         except exceptions.TransferError as exc:
             LOG.debug("Transfer error while reading thread %x name: %s", self._base, exc)
             self._name = "?"
         LOG.debug('RTXTargetThread 0x%x' % base)
     
-    def update_state(self):
+    def update_state(self, data=None):
+        """! @brief Update the thread's state and priority.
+        @param self
+        @param data Optional data of the first READ_SIZE bytes of osRtxThread_t. If provided, the
+            stack pointer and stack frame are also updated and used until the target runs again.
+            Otherwise the state and priority are read from the target.
+        """
+        if data is not None:
+            fields = self.LAYOUT.unpack(data)
+            self._state = fields['state']
+            self._priority = fields['priority']
+            self._stack_pointer = fields['sp']
+            self._stack_frame = fields['stack_frame'] | 0xFFFFFF00
+            self._scan_generation = self._provider.scan_generation
+            return
         try:
-            state = self._target_context.read8(self._base + RTXTargetThread.STATE_OFFSET)
-            priority = self._target_context.read8(self._base + RTXTargetThread.PRIORITY_OFFSET)
+            # The state and priority are read together with the bytes between them.
+            fields = self.LAYOUT.read(self._target_context, self._base, ('state', 'priority'))
         except exceptions.TransferError as exc:
             LOG.debug("Transfer error while reading thread %x state: %s", self._base, exc)
         else:
-            self._state = state
-            self._priority = priority
+            self._state = fields['state']
+            self._priority = fields['priority']
 
     @property
     def priority(self):
@@ -289,6 +315,10 @@ class RTXTargetThread(TargetThread):
         return self._provider.get_actual_current_thread_id() == self._base
 
     def get_stack_pointer(self):
+        # Use the stack pointer read while building the thread list if the target hasn't run since.
+        if self._provider.is_scan_current(self._scan_generation):
+            return self._stack_pointer
+
         # Get stack pointer saved in thread struct.
         try:
             return self._target_context.read32(self._base + RTXTargetThread.SP_OFFSET)
@@ -299,6 +329,8 @@ class RTXTargetThread(TargetThread):
     def get_stack_frame(self):
         # Get "stack frame" (EXC_RETURN value from LR) saved in thread struct.
         # Note that RTX5 only stores bottom byte - hide that by extending.
+        if self._provider.is_scan_current(self._scan_generation):
+            return self._stack_frame
         try:
             return self._target_context.read8(self._base + RTXTargetThread.STACKFRAME_OFFSET) | 0xFFFFFF00
         except exceptions.TransferError:
@@ -314,6 +346,15 @@ class RTX5ThreadProvider(ThreadProvider):
     THREADLIST_OFFSET = 36
     DELAYLIST_OFFSET = 44
     WAITLIST_OFFSET = 48
+    INFO_READ_SIZE = WAITLIST_OFFSET + 4
+
+    ## Fields of osRtxInfo_t read while building the thread list.
+    INFO_LAYOUT = StructLayout([
+            ('current', CURRENT_OFFSET, "I"),
+            ('thread_list', THREADLIST_OFFSET, "I"),
+            ('delay_list', DELAYLIST_OFFSET, "I"),
+            ('wait_list', WAITLIST_OFFSET, "I"),
+            ], INFO_READ_SIZE)
 
     # Offset in osRtxThread_t
     THREADNEXT_OFFSET = 8
@@ -321,6 +362,7 @@ class RTX5ThreadProvider(ThreadProvider):
 
     def __init__(self, target):
         super(RTX5ThreadProvider, self).__init__(target)
+        self._os_rtx_info = None
 
     def init(self, symbolProvider):
         # Lookup required symbols.
@@ -328,9 +370,6 @@ class RTX5ThreadProvider(ThreadProvider):
         if self._os_rtx_info is None:
             return False
         LOG.debug('osRtxInfo = 0x%08x', self._os_rtx_info)
-        self._readylist = self._os_rtx_info + RTX5ThreadProvider.THREADLIST_OFFSET
-        self._delaylist = self._os_rtx_info + RTX5ThreadProvider.DELAYLIST_OFFSET
-        self._waitlist = self._os_rtx_info + RTX5ThreadProvider.WAITLIST_OFFSET
         self._threads = {}
         self._current = None
         self._current_id = None
@@ -341,6 +380,7 @@ class RTX5ThreadProvider(ThreadProvider):
     def get_threads(self):
         if not self.is_enabled:
             return []
+        self.update_threads()
         return list(self._threads.values())
 
     def invalidate(self):
@@ -352,45 +392,63 @@ class RTX5ThreadProvider(ThreadProvider):
 
     def _build_thread_list(self):
         newThreads = {}
-        
-        def create_or_update(thread):
+        scanner = MemoryScanner.create(self._target, self._target_context, self._os_rtx_info)
+
+        # Read the current thread and the heads of the thread lists.
+        info = scanner.read_blocks([(self._os_rtx_info, RTX5ThreadProvider.INFO_READ_SIZE)])[0]
+        if info is None:
+            raise exceptions.TransferError("failed to read osRtxInfo")
+        info = RTX5ThreadProvider.INFO_LAYOUT.unpack(info)
+        current = info['current']
+
+        # Read the currently running thread and walk the thread lists in parallel.
+        nodeLists = scanner.walk_lists([
+                (current, None, None),
+                (info['thread_list'], RTX5ThreadProvider.THREADNEXT_OFFSET, None),
+                (info['delay_list'], RTX5ThreadProvider.DELAYNEXT_OFFSET, None),
+                (info['wait_list'], RTX5ThreadProvider.DELAYNEXT_OFFSET, None),
+                ], RTXTargetThread.READ_SIZE)
+        threadData = [node for nodes in nodeLists for node in nodes]
+
+        # Read the names of all new threads in one wave.
+        newThreadData = [(thread, data) for thread, data in threadData if thread not in self._threads]
+        names = scanner.read_strings([RTXTargetThread.LAYOUT.unpack(data, ('name',))['name']
+                    for _, data in newThreadData])
+        names = {thread: name for (thread, _), name in zip(newThreadData, names)}
+
+        for thread, data in threadData:
             # Check for and reuse existing thread.
-            if thread in self._threads:
-                # Thread already exists, update its state.
+            if thread in newThreads:
+                continue
+            elif thread in self._threads:
+                # Thread already exists, update its state. Its name is not read again.
                 t = self._threads[thread]
-                t.update_state()
+                t.update_state(data)
+                scanner.stats.threads_updated += 1
+                scanner.stats.reads_saved += 1
+                scanner.stats.bytes_saved += MemoryScanner.STRING_READ_SIZE
             else:
                 # Create a new thread.
-                t = RTXTargetThread(self._target_context, self, thread)
+                t = RTXTargetThread(self._target_context, self, thread, data, names[thread])
+                scanner.stats.threads_created += 1
             newThreads[t.unique_id] = t
 
         # Currently running Thread
-        thread = self._target_context.read32(self._os_rtx_info + RTX5ThreadProvider.CURRENT_OFFSET)
-        if thread:
-            create_or_update(thread)
-            self._current_id = thread
-            self._current = newThreads[thread]
+        if current and current not in newThreads:
+            newThreads[current] = RTXTargetThread(self._target_context, self, current)
+        if current:
+            self._current_id = current
+            self._current = newThreads[current]
         else:
             self._current_id = None
             self._current = None
 
-        # List of target thread lists to examine.
-        threadLists = [
-            TargetList(self._target_context, self._readylist, RTX5ThreadProvider.THREADNEXT_OFFSET),
-            TargetList(self._target_context, self._delaylist, RTX5ThreadProvider.DELAYNEXT_OFFSET),
-            TargetList(self._target_context, self._waitlist, RTX5ThreadProvider.DELAYNEXT_OFFSET),
-            ]
-
-        # Scan thread lists.
-        for theList in threadLists:
-            for thread in theList:
-                create_or_update(thread)
-
         # Create fake handler mode thread.
         if self._target_context.read_core_register('ipsr') > 0:
             newThreads[HandlerModeThread.UNIQUE_ID] = HandlerModeThread(self._target_context, self)
         
         self._threads = newThreads
+        self._record_scan_stats(scanner.stats)
 
     def get_thread(self, threadId):
         if not self.is_enabled:
@@ -442,5 +500,11 @@ class RTX5ThreadProvider(ThreadProvider):
         self.update_threads()
         return self._current_id
 
+    @property
+    def current_thread_address(self):
+        if self._os_rtx_info is None:
+            return None
+        return self._os_rtx_info + RTX5ThreadProvider.CURRENT_OFFSET
+
     def get_kernel_state(self):
         return self._target_context.read8(self._os_rtx_info + RTX5ThreadProvider.KERNEL_STATE_OFFSET)
@@ -0,0 +1,211 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import struct
+
+from .common import u32
+from .provider import ScanStats
+from ..core import exceptions
+from ..utility.mask import align_up
+from ..utility.target_memory import (decode_c_string, read_c_string, read_words)
+
+LOG = logging.getLogger(__name__)
+
+class MemoryScanner(object):
+    """! @brief Batches the target memory reads made while building an RTOS thread list.
+
+    Thread list builders read in waves. All reads of a wave are independent of each other, so they
+    are queued as deferred transfers and complete in a single round trip to the probe. Reading
+    whole kernel objects in one request instead of one field at a time also lets a builder parse
+    the fields it needs on the host.
+
+    Optionally, a snapshot of a memory range can be taken with a single block read. Requests that
+    lie within the snapshot are then served from it without accessing the target.
+
+    Small requests are read as words with read_words(), which queues the reads directly on the
+    context's core. Larger blocks are read through the context.
+
+    A scanner should only be used while the target is halted, and for building a single thread
+    list, since it never refreshes the snapshot. Reads are counted in the scanner's ScanStats,
+    which the provider completes with its thread counters.
+    """
+
+    ## Requests larger than this are performed as a block transfer instead of deferred word reads.
+    MAX_DEFERRED_READ_SIZE = 128
+
+    ## Number of bytes read for each string by read_strings().
+    STRING_READ_SIZE = 32
+
+    def __init__(self, context):
+        self._context = context
+        self._snapshot_start = 0
+        self._snapshot = None
+        self.stats = ScanStats()
+
+    @classmethod
+    def create(cls, target, context, address):
+        """! @brief Create a scanner for a thread provider.
+
+        If the `rtos_snapshot_size` session option is non-zero and the RAM region that contains
+        _address_ is no larger, a snapshot of the whole region is taken.
+
+        @param cls
+        @param target The target the thread provider belongs to.
+        @param context Debug context to read through.
+        @param address Address of a kernel data structure, normally a kernel variable.
+        """
+        scanner = cls(context)
+        size = target.session.options.get('rtos_snapshot_size')
+        if size:
+            region = target.memory_map.get_region_for_address(address)
+            if region is not None and region.is_ram and region.length <= size:
+                scanner.take_snapshot(region.start, region.length)
+        return scanner
+
+    @property
+    def has_snapshot(self):
+        return self._snapshot is not None
+
+    def take_snapshot(self, start, length):
+        """! @brief Read a memory range in one transfer to serve later requests from."""
+        self._count(length)
+        try:
+            self._snapshot = bytearray(self._context.read_memory_block8(start, length))
+            self._snapshot_start = start
+            LOG.debug("Took snapshot of %d bytes at 0x%08x", length, start)
+        except exceptions.TransferError as exc:
+            LOG.debug("TransferError while taking snapshot of 0x%08x-0x%08x: %s", start,
+                start + length - 1, exc)
+            self._snapshot = None
+
+    def _read_snapshot(self, addr, size):
+        if self._snapshot is None:
+            return None
+        offset = addr - self._snapshot_start
+        if offset < 0 or offset + size > len(self._snapshot):
+            return None
+        return self._snapshot[offset:offset + size]
+
+    def _count(self, size):
+        self.stats.reads += 1
+        self.stats.bytes_read += size
+
+    def _read_block(self, addr, size):
+        try:
+            return bytearray(self._context.read_memory_block8(addr, size))
+        except exceptions.TransferError as exc:
+            LOG.debug("TransferError while reading %d bytes at 0x%08x: %s", size, addr, exc)
+            return None
+
+    def read_blocks(self, requests):
+        """! @brief Read a wave of independent memory blocks.
+
+        @param self
+        @param requests Sequence of (address, size) tuples.
+        @return List with a bytearray holding the data of each request, in the same order as the
+            requests. The entry is None if reading the block failed.
+        """
+        results = [None] * len(requests)
+        deferred = []
+        for index, (addr, size) in enumerate(requests):
+            data = self._read_snapshot(addr, size)
+            if data is not None:
+                results[index] = data
+            elif size > self.MAX_DEFERRED_READ_SIZE:
+                self._count(size)
+                results[index] = self._read_block(addr, size)
+            else:
+                self._count(size)
+                start = addr & ~3
+                deferred.append((index, addr, size, start, range(start, align_up(addr + size, 4), 4)))
+
+        words = iter(read_words(self._context,
+                    [wordAddr for _, _, _, _, wordAddrs in deferred for wordAddr in wordAddrs]))
+        for index, addr, size, start, wordAddrs in deferred:
+            requestWords = [next(words) for _ in wordAddrs]
+            if None in requestWords:
+                LOG.debug("TransferError while reading %d bytes at 0x%08x", size, addr)
+                continue
+            data = bytearray(struct.pack("<%dI" % len(requestWords), *requestWords))
+            results[index] = data[addr - start:addr - start + size]
+        return results
+
+    def read_words(self, addresses):
+        """! @brief Read a wave of 32-bit words.
+        @return List of word values. The entry is None if reading the word failed.
+        """
+        blocks = self.read_blocks([(addr, 4) for addr in addresses])
+        return [u32(data, 0) if data is not None else None for data in blocks]
+
+    def walk_lists(self, lists, size):
+        """! @brief Follow several linked lists in parallel.
+
+        Each wave reads the current node of every list that has not ended, so the number of waves
+        is the length of the longest list rather than the total number of nodes. A list ends at a
+        null pointer, when a node is visited a second time, or when a node can't be read.
+
+        @param self
+        @param lists Sequence of (head, next_offset, max_count) tuples. _head_ is the address of
+            the first node, or 0 for an empty list. _next_offset_ is the offset of the next node
+            pointer within a node, or None if only the head node should be read. _max_count_ is
+            the maximum number of nodes to read from the list, or None for no limit.
+        @param size Number of bytes to read from each node. Must include the next node pointer.
+        @return List with a list of (node address, node data) tuples for each list.
+        """
+        results = [[] for _ in lists]
+        visited = [set() for _ in lists]
+        active = [(index, head) for index, (head, _, _) in enumerate(lists) if head != 0]
+        while active:
+            blocks = self.read_blocks([(node, size) for _, node in active])
+            nextActive = []
+            for (index, node), data in zip(active, blocks):
+                if data is None:
+                    LOG.warning("TransferError while reading list elements (node=0x%08x), "
+                        "terminating list", node)
+                    continue
+                results[index].append((node, data))
+                visited[index].add(node)
+
+                _, nextOffset, maxCount = lists[index]
+                if nextOffset is None or (maxCount is not None and len(results[index]) >= maxCount):
+                    continue
+                nextNode = u32(data, nextOffset)
+                if nextNode != 0 and nextNode not in visited[index]:
+                    nextActive.append((index, nextNode))
+            active = nextActive
+        return results
+
+    def read_strings(self, addresses):
+        """! @brief Read a wave of null-terminated C strings.
+
+        Strings longer than STRING_READ_SIZE are finished with read_c_string().
+
+        @return List of strings. Null addresses produce empty strings.
+        """
+        blocks = self.read_blocks([(addr, self.STRING_READ_SIZE) for addr in addresses if addr])
+        blocks.reverse()
+        results = []
+        for addr in addresses:
+            if not addr:
+                results.append("")
+                continue
+            data = blocks.pop()
+            s, done = decode_c_string(data) if data is not None else ("", False)
+            if not done:
+                s = read_c_string(self._context, addr)
+            results.append(s)
+        return results
@@ -15,7 +15,8 @@
 # limitations under the License.
 
 from .provider import (TargetThread, ThreadProvider)
-from .common import (read_c_string, HandlerModeThread)
+from .common import (read_c_string, HandlerModeThread, StackFrameCache, StructLayout, u32)
+from .scanner import MemoryScanner
 from ..core import exceptions
 from ..core.target import Target
 from ..debug.context import DebugContext
@@ -25,25 +26,6 @@ import logging
 # Create a logger for this module.
 LOG = logging.getLogger(__name__)
 
-class TargetList(object):
-    def __init__(self, context, ptr, next_offset):
-        self._context = context
-        self._list = ptr
-        self._list_node_next_offset = next_offset
-
-    def __iter__(self):
-        node = self._context.read32(self._list)
-
-        while (node != 0):
-            try:
-                yield node
-
-                # Read next list node pointer.
-                node = self._context.read32(node + self._list_node_next_offset)
-            except exceptions.TransferError:
-                LOG.warning("TransferError while reading list elements (list=0x%08x, node=0x%08x), terminating list", self._list, node)
-                node = 0
-
 class ZephyrThreadContext(DebugContext):
     """! @brief Thread context for Zephyr."""
     
@@ -74,6 +56,8 @@ class ZephyrThreadContext(DebugContext):
         super(ZephyrThreadContext, self).__init__(parent)
         self._thread = thread
         self._has_fpu = self.core.has_fpu
+        self._frame_cache = StackFrameCache(parent, self.core)
+        self._callee_saved_cache = StackFrameCache(parent, self.core)
 
     def read_core_registers_raw(self, reg_list):
         reg_list = [register_name_to_index(reg) for reg in reg_list]
@@ -98,6 +82,21 @@ class ZephyrThreadContext(DebugContext):
             sp = self._thread.get_stack_pointer()
         exceptionFrame = 0x20
 
+        # Read the exception stack frame and the callee-saved registers in the thread structure
+        # once for all registers.
+        try:
+            frame = self._frame_cache.get_frame(sp, exceptionFrame)
+        except exceptions.TransferError:
+            LOG.debug("Transfer error while reading thread's exception stack frame")
+            frame = None
+        calleeSavedSize = -min(self.CALLEE_SAVED_OFFSETS.values())
+        calleeSavedAddr = self._thread._base + self._thread._offsets["t_stack_ptr"] - calleeSavedSize
+        try:
+            calleeSaved = self._callee_saved_cache.get_frame(calleeSavedAddr, calleeSavedSize)
+        except exceptions.TransferError:
+            LOG.debug("Transfer error while reading thread's callee-saved registers")
+            calleeSaved = None
+
         for reg in reg_list:
 
             # If this is a stack pointer register, add an offset to account for the exception stack frame
@@ -110,25 +109,17 @@ class ZephyrThreadContext(DebugContext):
             # If this is a callee-saved register, read it from the thread structure
             calleeOffset = self.CALLEE_SAVED_OFFSETS.get(reg, None)
             if calleeOffset is not None:
-                try:
-                    addr = self._thread._base + self._thread._offsets["t_stack_ptr"] + calleeOffset
-                    val = self._parent.read32(addr)
-                    reg_vals.append(val)
-                    LOG.debug("Reading callee-saved register %d at 0x%08x = 0x%x", reg, addr, val)
-                except exceptions.TransferError:
-                    reg_vals.append(0)
+                val = u32(calleeSaved, calleeSavedSize + calleeOffset) if (calleeSaved is not None) else 0
+                reg_vals.append(val)
+                LOG.debug("Reading callee-saved register %d = 0x%x", reg, val)
                 continue
 
             # If this is a exception stack frame register, read it from the stack
             stackFrameOffset = self.STACK_FRAME_OFFSETS.get(reg, None)
             if stackFrameOffset is not None:
-                try:
-                    addr = sp + stackFrameOffset
-                    val = self._parent.read32(addr)
-                    reg_vals.append(val)
-                    LOG.debug("Reading stack frame register %d at 0x%08x = 0x%x", reg, addr, val)
-                except exceptions.TransferError:
-                    reg_vals.append(0)
+                val = u32(frame, stackFrameOffset) if (frame is not None) else 0
+                reg_vals.append(val)
+                LOG.debug("Reading stack frame register %d = 0x%x", reg, val)
                 continue
 
             # If we get here, this is a register not in any of the dictionaries
@@ -160,7 +151,7 @@ class ZephyrThread(TargetThread):
             RUNNING : "Running",
         }
 
-    def __init__(self, targetContext, provider, base, offsets):
+    def __init__(self, targetContext, provider, base, offsets, data=None, name=None):
         super(ZephyrThread, self).__init__()
         self._target_context = targetContext
         self._provider = provider
@@ -170,13 +161,19 @@ class ZephyrThread(TargetThread):
         self._state = ZephyrThread.READY
         self._priority = 0
         self._name = "Unnamed"
+        self._stack_pointer = 0
+        self._scan_generation = None
 
         try:
-            self.update_info()
+            self.update_info(data, name)
         except exceptions.TransferError:
             LOG.debug("Transfer error while reading thread info")
 
     def get_stack_pointer(self):
+        # Use the stack pointer read while building the thread list if the target hasn't run since.
+        if self._provider.is_scan_current(self._scan_generation):
+            return self._stack_pointer
+
         # Get stack pointer saved in thread struct.
         addr = self._base + self._offsets["t_stack_ptr"]
         try:
@@ -185,18 +182,30 @@ class ZephyrThread(TargetThread):
             LOG.debug("Transfer error while reading thread's stack pointer @ 0x%08x", addr)
             return 0
 
-    def update_info(self):
+    def update_info(self, data=None, name=None):
+        """! @brief Update the thread's priority, state, and name.
+        @param self
+        @param data Optional data of the thread struct as read by the provider. If provided, the
+            stack pointer is also updated and used until the target runs again. Otherwise the
+            priority and state are read from the target.
+        @param name Optional thread name. If not provided, the name is read from the target.
+        """
+        layout = self._provider.thread_layout
         try:
-            self._priority = self._target_context.read8(self._base + self._offsets["t_prio"])
-            self._state = self._target_context.read8(self._base + self._offsets["t_state"])
+            if data is not None:
+                fields = layout.unpack(data, ("t_prio", "t_state", "t_stack_ptr"))
+                self._stack_pointer = fields["t_stack_ptr"]
+                self._scan_generation = self._provider.scan_generation
+            else:
+                fields = layout.read(self._target_context, self._base, ("t_prio", "t_state"))
+            self._priority = fields["t_prio"]
+            self._state = fields["t_state"]
 
             if self._provider.version > 0:
-                addr = self._target_context.read32(self._base + self._offsets["t_name"])
-                if addr != 0:
-                    self._name = read_c_string(self._target_context, addr)
-                else:
-                    self._name = "Unnamed"
-
+                if name is None:
+                    addr = layout.read(self._target_context, self._base, ("t_name",))["t_name"]
+                    name = read_c_string(self._target_context, addr)
+                self._name = name or "Unnamed"
 
         except exceptions.TransferError:
             LOG.debug("Transfer error while reading thread info")
@@ -266,6 +275,7 @@ class ZephyrThreadProvider(ThreadProvider):
         super(ZephyrThreadProvider, self).__init__(target)
         self._symbols = None
         self._offsets = None
+        self._thread_layout = None
         self._version = None
         self._all_threads = None
         self._curr_thread = None
@@ -291,10 +301,10 @@ class ZephyrThreadProvider(ThreadProvider):
             LOG.error("Unsupported _kernel_openocd_size_t_size")
             return None
 
-        offsets = {}
-        for index, name in enumerate(self.ZEPHYR_OFFSETS):
-            offset = self._symbols["_kernel_openocd_offsets"] + index * size
-            offsets[name] = self._target_context.read32(offset)
+        # Read the whole table of offsets at once.
+        table = StructLayout([(name, index * size, "I") for index, name in enumerate(self.ZEPHYR_OFFSETS)])
+        offsets = table.read(self._target_context, self._symbols["_kernel_openocd_offsets"])
+        for name in self.ZEPHYR_OFFSETS:
             LOG.debug("%s = 0x%04x", name, offsets[name])
 
         return offsets
@@ -303,12 +313,14 @@ class ZephyrThreadProvider(ThreadProvider):
         self._offsets = self._get_offsets()
 
         if self._offsets is None:
+            self._thread_layout = None
             self._version = None
             self._all_threads = None
             self._curr_thread = None
             LOG.debug("_offsets, _all_threads, and _curr_thread are invalid")
         else:
             self._version = self._offsets["version"]
+            self._thread_layout = self._make_thread_layout()
             self._all_threads = self._symbols["_kernel"] + self._offsets["k_threads"]
             self._curr_thread = self._symbols["_kernel"] + self._offsets["k_curr_thread"]
             LOG.debug("version = %d, _all_threads = 0x%08x, _curr_thread = 0x%08x", self._version, self._all_threads, self._curr_thread)
@@ -324,23 +336,60 @@ class ZephyrThreadProvider(ThreadProvider):
         elif notification.event == Target.Event.POST_FLASH_PROGRAM:
             self._update()
 
+    def _make_thread_layout(self):
+        """! @brief Build the layout of the thread struct fields used by the provider.
+
+        The layout covers the part of the thread struct holding all of the fields, which is read
+        for each thread while building the thread list.
+        """
+        fields = [("t_next_thread", "I"), ("t_state", "B"), ("t_prio", "B"), ("t_stack_ptr", "I")]
+        if self.version > 0:
+            fields.append(("t_name", "I"))
+        return StructLayout([(name, self._offsets[name], fmt) for name, fmt in fields],
+                    max(self._offsets[name] for name, _ in fields) + 4)
+
+    @property
+    def thread_layout(self):
+        return self._thread_layout
+
     def _build_thread_list(self):
-        allThreads = TargetList(self._target_context, self._all_threads, self._offsets["t_next_thread"])
         newThreads = {}
+        scanner = MemoryScanner.create(self._target, self._target_context, self._symbols["_kernel"])
 
-        currentThread = self._target_context.read32(self._curr_thread)
+        values = scanner.read_words([self._all_threads, self._curr_thread])
+        if None in values:
+            raise exceptions.TransferError("failed to read Zephyr kernel thread pointers")
+        firstThread, currentThread = values
         LOG.debug("currentThread = 0x%08x", currentThread)
 
-        for threadBase in allThreads:
+        # Read the thread structs while walking the list of all threads.
+        threadData, = scanner.walk_lists([(firstThread, self._offsets["t_next_thread"], None)],
+                            self._thread_layout.size)
+
+        # Read the names of all new threads in one wave. Names of known threads are not read again.
+        names = {}
+        if self.version > 0:
+            newThreadData = [(base, data) for base, data in threadData if base not in self._threads]
+            names = scanner.read_strings([self._thread_layout.unpack(data, ("t_name",))["t_name"]
+                        for _, data in newThreadData])
+            names = {base: name for (base, _), name in zip(newThreadData, names)}
+
+        for threadBase, data in threadData:
             try:
                 # Reuse existing thread objects.
                 if threadBase in self._threads:
                     t = self._threads[threadBase]
 
-                    # Ask the thread object to update its state and priority.
-                    t.update_info()
+                    # Ask the thread object to update its state, priority, and stack pointer.
+                    t.update_info(data, t.name)
+                    scanner.stats.threads_updated += 1
+                    if self.version > 0:
+                        scanner.stats.reads_saved += 1
+                        scanner.stats.bytes_saved += MemoryScanner.STRING_READ_SIZE
                 else:
-                    t = ZephyrThread(self._target_context, self, threadBase, self._offsets)
+                    t = ZephyrThread(self._target_context, self, threadBase, self._offsets, data,
+                            names.get(threadBase))
+                    scanner.stats.threads_created += 1
 
                 # Set thread state.
                 if threadBase == currentThread:
@@ -358,6 +407,7 @@ class ZephyrThreadProvider(ThreadProvider):
             newThreads[t.unique_id] = t
 
         self._threads = newThreads
+        self._record_scan_stats(scanner.stats)
 
     def get_threads(self):
         if not self.is_enabled:
@@ -404,6 +454,10 @@ class ZephyrThreadProvider(ThreadProvider):
             return None
         return self._target_context.read32(self._curr_thread)
 
+    @property
+    def current_thread_address(self):
+        return self._curr_thread
+
     def get_is_running(self):
         if self._symbols is None or self._offsets is None:
             return False
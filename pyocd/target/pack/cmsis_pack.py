@@ -390,14 +390,12 @@ class CmsisPackDevice(object):
             if current_session and current_session.options.get("debug.log_flm_info"):
                 LOG.debug("Flash algo info: %s", packAlgo.flash_info)
             
-            # Choose the page size. The check for <=32 is to handle some flash algos with incorrect
-            # page sizes that are too small and probably represent the phrase size.
-            page_size = packAlgo.page_size
-            if page_size <= 32:
-                page_size = min(s[1] for s in packAlgo.sector_sizes)
+            # Choose the page size and number of page buffers that best fit the default RAM. The
+            # largest page size the algo accepts is preferred.
+            layout = packAlgo.get_page_buffer_layout(self._default_ram)
+            page_size = layout.page_size if (layout is not None) else packAlgo.preferred_page_size
             
-            # Construct the pyOCD algo using the largest sector size. We can share the same
-            # algo for all sector sizes.
+            # Construct the pyOCD algo. We can share the same algo for all sector sizes.
             algo = packAlgo.get_pyocd_flash_algo(page_size, self._default_ram)
 
             # Create a separate flash region for each sector size range.
@@ -19,17 +19,29 @@ import os
 import struct
 import logging
 import itertools
+from collections import namedtuple
 
 from ...debug.elf.elf import ELFBinaryFile
 from ...utility.compatibility import to_str_safe
 from ...core.memory_map import MemoryRange
 from ...core import exceptions
 from ...utility.conversion import byte_list_to_u32le_list
+from ...utility.mask import align_up
 
 LOG = logging.getLogger(__name__)
 
 FLASH_ALGO_STACK_SIZE = 512
 
+## Maximum number of page buffers allocated for a flash algo.
+MAX_PAGE_BUFFERS = 4
+
+## Smallest page size pyOCD will use for a flash algo. Some algos report page sizes that are too
+# small and probably represent the phrase size.
+MIN_PAGE_SIZE = 32
+
+## @brief Page buffer size and count chosen for a flash algo.
+PageBufferLayout = namedtuple('PageBufferLayout', 'page_size buffer_count')
+
 class FlashAlgoException(exceptions.TargetSupportError):
     """! @brief Exception class for errors parsing an FLM file."""
     pass
@@ -104,6 +116,54 @@ class PackFlashAlgo(object):
 
         self.algo_data = self._create_algo_bin(ro_rw_zi)
 
+    @property
+    def preferred_page_size(self):
+        """! @brief The largest program unit that the algo's ProgramPage() is expected to accept.
+        
+        This is normally the page size reported by the algo. If that is too small, it is assumed
+        to be the phrase size, and the smallest sector size is used instead.
+        """
+        if self.page_size <= MIN_PAGE_SIZE:
+            return min(s[1] for s in self.sector_sizes)
+        return self.page_size
+
+    @property
+    def _code_size(self):
+        return self._FLASH_BLOB_HEADER_SIZE + align_up(len(self.algo_data), 4)
+
+    def get_page_buffer_layout(self, ram_region, blocksize=None):
+        """! @brief Choose the page buffer size and count that best use a RAM region.
+        
+        The RAM remaining after the stack and algo code is divided into as many page buffers as
+        fit, up to MAX_PAGE_BUFFERS. If _blocksize_ is not provided, page sizes are tried starting
+        with preferred_page_size, halving each time while the size is at least the algo's page
+        size. Larger pages are preferred as long as at least two buffers fit, so programming can
+        be double buffered. Otherwise the largest page size for which one buffer fits is used.
+        
+        @param self
+        @param ram_region A RamRegion object where the flash algo will be allocated.
+        @param blocksize Optional fixed page buffer size.
+        @return A PageBufferLayout, or None if no page buffer fits in the RAM region.
+        """
+        free = ram_region.length - FLASH_ALGO_STACK_SIZE - self._code_size
+        if blocksize is not None:
+            sizes = [blocksize]
+        else:
+            size = self.preferred_page_size
+            sizes = [size]
+            while (size % 2 == 0) and (size // 2 > MIN_PAGE_SIZE) and (size // 2 >= self.page_size):
+                size //= 2
+                sizes.append(size)
+        
+        single_buffer_layout = None
+        for size in sizes:
+            count = min(MAX_PAGE_BUFFERS, max(0, free) // size)
+            if count >= 2:
+                return PageBufferLayout(size, count)
+            if count == 1 and single_buffer_layout is None:
+                single_buffer_layout = PageBufferLayout(size, count)
+        return single_buffer_layout
+
     def get_pyocd_flash_algo(self, blocksize, ram_region):
         """! @brief Return a dictionary representing a pyOCD flash algorithm, or None.
         
@@ -111,19 +171,29 @@ class PackFlashAlgo(object):
         for the flash algo from a given RAM region. Note that the .data and .bss sections are
         concatenated with .text. That's why there isn't a specific allocation for those sections.
         
-        Double buffering is supported as long as there is enough RAM.
+        As many page buffers as fit in the RAM region are allocated, up to MAX_PAGE_BUFFERS.
+        Double buffering is supported if there are at least two.
         
         Memory layout:
         ```
-        [stack] [code] [buf1] [buf2]
+        [stack] [code] [buf1] [buf2] ... [bufN]
         ```
         
         @param self
-        @param blocksize The size to use for page buffers, normally the erase block size.
+        @param blocksize The size to use for page buffers, normally the page size of the flash
+            region. If None, the size is chosen by get_page_buffer_layout().
         @param ram_region A RamRegion object where the flash algo will be allocated.
         @return A pyOCD-style flash algo dictionary. If None is returned, the flash algo did
             not fit into the provided ram_region.
         """
+        layout = self.get_page_buffer_layout(ram_region, blocksize)
+        if layout is None:
+            # Not enough space for flash algorithm
+            LOG.warning("Not enough space for flash algorithm")
+            return None
+        LOG.debug("Flash algo layout: %d page buffer%s of %d bytes", layout.buffer_count,
+                    "" if layout.buffer_count == 1 else "s", layout.page_size)
+
         instructions = self._FLASH_BLOB_HEADER + byte_list_to_u32le_list(self.algo_data)
 
         offset = 0
@@ -136,23 +206,9 @@ class PackFlashAlgo(object):
         addr_load = ram_region.start + offset
         offset += len(instructions) * 4
 
-        # Data buffer 1
-        addr_data = ram_region.start + offset
-        offset += blocksize
-
-        if offset > ram_region.length:
-            # Not enough space for flash algorithm
-            LOG.warning("Not enough space for flash algorithm")
-            return None
-
-        # Data buffer 2
-        addr_data2 = ram_region.start + offset
-        offset += blocksize
-
-        if offset > ram_region.length:
-            page_buffers = [addr_data]
-        else:
-            page_buffers = [addr_data, addr_data2]
+        # Data buffers
+        page_buffers = [ram_region.start + offset + i * layout.page_size
+                        for i in range(layout.buffer_count)]
 
         # TODO - analyzer support
 
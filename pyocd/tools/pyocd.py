@@ -25,6 +25,7 @@ from optparse import make_option
 import six
 import prettytable
 import traceback
+from time import sleep
 
 # Attempt to import readline.
 try:
@@ -49,6 +50,10 @@ from ..utility import (mask, conversion)
 from ..utility.cmdline import convert_session_options
 from ..utility.hex import (format_hex_width, dump_hex_data)
 from ..utility.progress import print_progress
+from ..debug.svd.reader import read_peripheral_registers
+from ..debug.elf.symbols import ELFSymbolProvider
+from ..rtos import RTOS
+from ..trace.profiler import (ThreadProfile, ThreadSampler)
 
 # Make disasm optional.
 try:
@@ -150,6 +155,12 @@ COMMAND_INFO = {
             'args' : "ADDR LEN FILENAME",
             "help" : "Save a range of memory to a binary file"
             },
+        'saveperipherals' : {
+            'aliases' : [],
+            'args' : "[-f] FILENAME [PERIPHERAL...]",
+            "help" : "Save the registers of all or some peripherals to a text file",
+            'extra_help' : "Registers flagged in the SVD as having read side effects are not read."
+            },
         'loadmem' : {
             'aliases' : [],
             'args' : "ADDR FILENAME",
@@ -331,6 +342,12 @@ COMMAND_INFO = {
             'help' : "Show a symbol's value.",
             'extra_help' : "An ELF file must have been specified with the --elf option.",
             },
+        'profile' : {
+            'aliases' : [],
+            'args' : "[SECONDS]",
+            'help' : "Sample the PC and current RTOS thread while the target runs, then show the load of each thread and function.",
+            'extra_help' : "Samples are taken for 1 second by default. The PC is sampled from the DWT without halting the core. If an ELF file was specified with the --elf option and it contains a supported RTOS, samples are attributed to threads and PCs are resolved to functions.",
+            },
         'gdbserver' : {
             'aliases' : [],
             'args' : "ACTION",
@@ -550,6 +567,7 @@ class PyOCDCommander(object):
         self._peripherals = {}
         self._loaded_peripherals = False
         self._gdbserver = None
+        self._thread_provider = None
         
         self.command_list = {
                 'list' :    self.handle_list,
@@ -561,6 +579,7 @@ class PyOCDCommander(object):
                 'wreg' :    self.handle_write_reg,
                 'reset' :   self.handle_reset,
                 'savemem' : self.handle_savemem,
+                'saveperipherals' : self.handle_saveperipherals,
                 'loadmem' : self.handle_loadmem,
                 'load' :    self.handle_load,
                 'read' :    self.handle_read8,
@@ -620,6 +639,7 @@ class PyOCDCommander(object):
                 'makeap' :  self.handle_makeap,
                 'symbol' :  self.handle_symbol,
                 'gdbserver':self.handle_gdbserver,
+                'profile' : self.handle_profile,
                 'fill' :    self.handle_fill,
                 'find' :    self.handle_find,
             }
@@ -864,8 +884,7 @@ class PyOCDCommander(object):
                     else:
                         raise ToolError("invalid register '%s' for %s" % (subargs[1], p.name))
                 else:
-                    for r in p.registers:
-                        self._dump_peripheral_register(p, r, show_fields)
+                    self._dump_peripheral_registers(p, show_fields)
             else:
                 raise ToolError("invalid peripheral '%s'" % (subargs[0]))
 
@@ -997,6 +1016,28 @@ class PyOCDCommander(object):
             f.write(data)
             print("Saved %d bytes to %s" % (count, filename))
 
+    def handle_saveperipherals(self, args):
+        show_fields = len(args) > 0 and args[0].lower() == '-f'
+        if show_fields:
+            del args[0]
+        if len(args) < 1:
+            print("Error: missing argument")
+            return 1
+        filename = args[0]
+
+        if len(args) > 1:
+            try:
+                periphs = [self.peripherals[name.lower()] for name in args[1:]]
+            except KeyError as err:
+                raise ToolError("invalid peripheral '%s'" % err.args[0])
+        else:
+            periphs = sorted(self.peripherals.values(), key=lambda x:x.base_address)
+
+        with open(filename, 'w') as f:
+            for p in periphs:
+                self._dump_peripheral_registers(p, show_fields, file=f)
+        print("Saved %d peripherals to %s" % (len(periphs), filename))
+
     def handle_loadmem(self, args):
         if len(args) < 2:
             print("Error: missing argument")
@@ -1526,6 +1567,45 @@ class PyOCDCommander(object):
         else:
             print("No symbol named '{}' was found".format(name))
 
+    def _get_thread_provider(self):
+        if self._thread_provider is None and self.elf is not None:
+            symbol_provider = ELFSymbolProvider(self.elf)
+            for rtosName, rtosClass in RTOS.items():
+                rtos = rtosClass(self.target)
+                if rtos.init(symbol_provider):
+                    LOG.info("%s loaded successfully", rtosName)
+                    rtos.read_from_target = True
+                    self._thread_provider = rtos
+                    break
+        return self._thread_provider
+
+    def handle_profile(self, args):
+        duration = float(args[0]) if len(args) > 0 else 1.0
+        if self.target.is_halted():
+            raise ToolError("the target must be running to be profiled")
+
+        provider = self._get_thread_provider()
+        profile = ThreadProfile()
+        sampler = ThreadSampler(self.target.selected_core, profile,
+                    provider.current_thread_address if (provider is not None) else None)
+        sampler.start()
+        try:
+            sleep(duration)
+        finally:
+            sampler.stop()
+
+        # The thread list is read while the target keeps running, so it is only used for names.
+        thread_names = {}
+        if provider is not None:
+            try:
+                thread_names = {t.unique_id: t.name for t in provider.get_threads()}
+            except exceptions.TransferError:
+                LOG.debug("Transfer error while reading thread names")
+        symbol_decoder = self.elf.symbol_decoder if (self.elf is not None) else None
+        print(profile.format_report(thread_names, symbol_decoder))
+        if sampler.missed:
+            print("%d of %d polls had no PC sample" % (sampler.missed, sampler.polls))
+
     def handle_gdbserver(self, args):
         if len(args) < 1:
             raise ToolError("missing action argument")
@@ -1906,11 +1986,22 @@ Prefix line with ! to execute a shell command.""")
                 print()
 
     def _dump_peripheral_register(self, periph, reg, show_fields):
-        size = reg.size or 32
-        addr = periph.base_address + reg.address_offset
-        value = self.target.read_memory(addr, size)
-        value_str = format_hex_width(value, size)
-        print("%s.%s @ %08x = %s" % (periph.name, reg.name, addr, value_str))
+        # A single register is only read when asked for, so read it even if that has side effects.
+        reg_value, = read_peripheral_registers(self.target, periph, [reg], read_side_effects=True)
+        self._print_peripheral_register(periph, reg_value, show_fields)
+
+    def _dump_peripheral_registers(self, periph, show_fields, file=None):
+        for reg_value in read_peripheral_registers(self.target, periph):
+            self._print_peripheral_register(periph, reg_value, show_fields, file)
+
+    def _print_peripheral_register(self, periph, reg_value, show_fields, file=None):
+        reg = reg_value.register
+        value = reg_value.value
+        if value is None:
+            print("%s.%s @ %08x <%s>" % (periph.name, reg.name, reg_value.address, reg_value.note), file=file)
+            return
+        value_str = format_hex_width(value, reg.size or 32)
+        print("%s.%s @ %08x = %s" % (periph.name, reg.name, reg_value.address, value_str), file=file)
 
         if show_fields:
             for f in reg.fields:
@@ -1938,7 +2029,7 @@ Prefix line with ! to execute a shell command.""")
                     f_value_enum_str = " %s: %s" % (v.name, v_enum.description)
                 else:
                     f_value_enum_str = ""
-                print("  %s[%s] = %s (%s)%s" % (f.name, bits_str, f_value_str, f_value_bin_str, f_value_enum_str))
+                print("  %s[%s] = %s (%s)%s" % (f.name, bits_str, f_value_str, f_value_bin_str, f_value_enum_str), file=file)
 
     def print_disasm(self, code, startAddr, maxInstructions=None):
         if not isCapstoneAvailable:
@@ -0,0 +1,227 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import logging
+import threading
+
+from .events import TracePeriodicPC
+from .sink import TraceEventSink
+from ..coresight.dwt import DWT
+from ..utility.target_memory import read_words
+
+LOG = logging.getLogger(__name__)
+
+## Address of the DWT PC Sample Register of ARMv7-M and ARMv8-M Mainline cores.
+DWT_PCSR = 0xE0001000 + DWT.DWT_PCSR
+
+## Value of DWT_PCSR when no sample is available, for instance because the core is halted.
+PCSR_NO_SAMPLE = 0xFFFFFFFF
+
+## Function name reported for samples taken while the core was sleeping.
+SLEEPING = "<sleeping>"
+
+## Function name reported for samples whose PC is not within a function symbol.
+UNKNOWN_FUNCTION = "<unknown>"
+
+class ThreadProfile(object):
+    """! @brief Histogram of PC samples by thread.
+
+    Samples are counted by (thread ID, PC) pair. Since a program spends most of its time in a small
+    number of places, this keeps the histogram small no matter how many samples are added, and PCs
+    are only resolved to functions once each, when a report is made.
+
+    Samples may be added from a sampling thread while another thread makes a report.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = collections.defaultdict(int)
+        self._total = 0
+
+    @property
+    def total(self):
+        """! @brief Number of samples in the profile."""
+        return self._total
+
+    def add_sample(self, pc, thread_id=None):
+        """! @brief Count one sample.
+        @param self
+        @param pc The sampled PC, or None if the core was sleeping.
+        @param thread_id ID of the thread running when the sample was taken, or None if unknown.
+        """
+        with self._lock:
+            self._counts[(thread_id, pc)] += 1
+            self._total += 1
+
+    def clear(self):
+        with self._lock:
+            self._counts = collections.defaultdict(int)
+            self._total = 0
+
+    def _get_counts(self):
+        with self._lock:
+            return list(self._counts.items())
+
+    def get_thread_loads(self):
+        """! @brief Return the number of samples of each thread.
+        @return List of (thread ID, sample count) tuples, with the busiest thread first.
+        """
+        loads = collections.defaultdict(int)
+        for (thread_id, _), count in self._get_counts():
+            loads[thread_id] += count
+        return sorted(loads.items(), key=lambda x: x[1], reverse=True)
+
+    def get_function_loads(self, symbol_decoder=None):
+        """! @brief Return the number of samples of each function, per thread.
+
+        @param self
+        @param symbol_decoder Optional ElfSymbolDecoder used to find the function containing each
+            PC. If not provided, or for PCs outside of all symbols, samples are reported under
+            UNKNOWN_FUNCTION.
+        @return Dict mapping each thread ID to a list of (function name, sample count) tuples, with
+            the busiest function first.
+        """
+        names = {None: SLEEPING}
+        loads = collections.defaultdict(lambda: collections.defaultdict(int))
+        for (thread_id, pc), count in self._get_counts():
+            try:
+                name = names[pc]
+            except KeyError:
+                name = UNKNOWN_FUNCTION
+                if symbol_decoder is not None:
+                    # Symbols of Thumb functions have bit 0 set.
+                    symbol = symbol_decoder.get_symbol_for_address(pc | 1)
+                    if symbol is not None:
+                        name = symbol.name
+                names[pc] = name
+            loads[thread_id][name] += count
+        return {thread_id: sorted(functions.items(), key=lambda x: x[1], reverse=True)
+                    for thread_id, functions in loads.items()}
+
+    def format_report(self, thread_names=None, symbol_decoder=None, max_functions=5):
+        """! @brief Return a text report of the load of each thread and its busiest functions.
+        @param self
+        @param thread_names Optional dict mapping thread IDs to names.
+        @param symbol_decoder Optional ElfSymbolDecoder used to find functions.
+        @param max_functions Maximum number of functions listed for each thread.
+        """
+        total = self._total
+        if total == 0:
+            return "No samples"
+        thread_names = thread_names or {}
+        functions = self.get_function_loads(symbol_decoder)
+        lines = ["%d samples" % total]
+        for thread_id, count in self.get_thread_loads():
+            if thread_id is None:
+                name = "<no thread>"
+            else:
+                name = "%s (0x%08x)" % (thread_names.get(thread_id, "?"), thread_id)
+            lines.append("%6.2f%% %s" % (100.0 * count / total, name))
+            for function, function_count in functions[thread_id][:max_functions]:
+                lines.append("    %6.2f%% %s" % (100.0 * function_count / total, function))
+        return "\n".join(lines)
+
+class ThreadSampler(TraceEventSink):
+    """! @brief Samples the running thread and PC of a core without halting it.
+
+    The sampler polls the kernel variable that points to the current thread, normally given by the
+    thread provider's current_thread_address property, from a background thread. In the same
+    round trip it can read the PC from DWT_PCSR. Both reads are memory accesses through the
+    debug port, which Cortex-M cores allow while running.
+
+    As an alternative to reading DWT_PCSR, the sampler is a trace event sink that counts the PCs of
+    TracePeriodicPC events, for instance by connecting it to an SWOParser. These samples are
+    attributed to the thread seen by the most recent poll.
+    """
+
+    def __init__(self, context, profile, current_thread_address=None, interval=0.001, read_pc=True):
+        """! @brief Constructor.
+        @param self
+        @param context The context, normally a core, to read memory through.
+        @param profile ThreadProfile the samples are added to.
+        @param current_thread_address Address of the pointer to the current thread, or None to not
+            attribute samples to threads.
+        @param interval Time in seconds between polls.
+        @param read_pc Whether to read the PC from DWT_PCSR on each poll. Pass False when PCs come
+            from trace events.
+        """
+        self._context = context
+        self._profile = profile
+        self._current_thread_address = current_thread_address
+        self._interval = interval
+        self._read_pc = read_pc
+        self._current_thread = None
+        self._thread = None
+        self._shutdown_event = threading.Event()
+        ## Number of polls.
+        self.polls = 0
+        ## Number of polls that failed or found no PC sample.
+        self.missed = 0
+
+    @property
+    def current_thread(self):
+        """! @brief ID of the current thread as of the last poll, or None."""
+        return self._current_thread
+
+    def sample(self):
+        """! @brief Poll the current thread and PC once, and count the sample."""
+        addresses = []
+        if self._current_thread_address is not None:
+            addresses.append(self._current_thread_address)
+        if self._read_pc:
+            addresses.append(DWT_PCSR)
+        values = read_words(self._context, addresses)
+        self.polls += 1
+
+        if self._current_thread_address is not None:
+            self._current_thread = values.pop(0)
+        if self._read_pc:
+            pc = values.pop(0)
+            if pc is None or pc == PCSR_NO_SAMPLE:
+                self.missed += 1
+            else:
+                self._profile.add_sample(pc, self._current_thread)
+
+    def receive(self, event):
+        """! @brief Count the PC of a TracePeriodicPC event. Other events are ignored."""
+        if isinstance(event, TracePeriodicPC):
+            # A PC of 0 marks a sample taken while the core was sleeping.
+            self._profile.add_sample(event.pc or None, self._current_thread)
+
+    def start(self):
+        """! @brief Start polling from a background thread."""
+        self._shutdown_event.clear()
+        self._thread = threading.Thread(target=self._run, name="ThreadSampler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """! @brief Stop polling and wait for the background thread to exit."""
+        if self._thread is None:
+            return
+        self._shutdown_event.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._shutdown_event.is_set():
+            try:
+                self.sample()
+            except Exception as err:
+                LOG.error("Stopping thread sampler after error: %s", err, exc_info=True)
+                return
+            self._shutdown_event.wait(self._interval)
@@ -17,6 +17,9 @@
 import operator
 from functools import reduce
 
+## Sequence types that same() compares natively.
+_BYTES_TYPES = (bytearray, bytes, memoryview)
+
 def bitmask(*args):
     """! @brief Returns a mask with specified bit ranges set.
     
@@ -84,9 +87,17 @@ def same(d1, d2):
     Unlike a simple equality comparison, this function works as expected when the two sequences
     are of different types, such as a list and bytearray. The sequences must return
     compatible types from indexing.
+    
+    If either sequence is a bytearray, bytes, or memoryview, the other is converted and the
+    comparison is performed natively instead of element by element.
     """
     if len(d1) != len(d2):
         return False
+    if isinstance(d1, _BYTES_TYPES) or isinstance(d2, _BYTES_TYPES):
+        try:
+            return bytearray(d1) == bytearray(d2)
+        except (TypeError, ValueError):
+            pass
     for i in range(len(d1)):
         if d1[i] != d2[i]:
             return False
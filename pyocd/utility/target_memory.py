@@ -0,0 +1,150 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+
+from ..core import exceptions
+from ..debug.context import DebugContext
+
+LOG = logging.getLogger(__name__)
+
+## Maximum length of a string read by read_c_string().
+MAX_C_STRING_LENGTH = 256
+
+## Size of the first chunk read by read_c_string(). Each following chunk is twice as large.
+C_STRING_CHUNK_SIZE = 32
+
+def decode_c_string(data):
+    """! @brief Decodes a null-terminated C string from data read from the target.
+
+    Non-ASCII characters are replaced with '?'. If there is a run of invalid characters longer than
+    4, then the string is terminated early.
+
+    @return Tuple of the string and a boolean indicating whether the end of the string was found.
+    """
+    data = bytearray(data)
+    end = data.find(0)
+    chars = data if (end == -1) else data[:end]
+
+    # Plain ASCII strings are by far the most common, so decode them in one step.
+    if not chars or max(chars) < 128:
+        return str(chars.decode('ascii')), (end != -1)
+
+    s = ""
+    badCount = 0
+    for c in chars:
+        if c > 127:
+            badCount += 1
+            if badCount > 4:
+                return s, True
+            s += '?'
+        else:
+            s += chr(c)
+            badCount = 0
+    return s, (end != -1)
+
+def get_core(context):
+    """! @brief Return the core a context reads through, or the context itself if it is a core."""
+    return context.core if isinstance(context, DebugContext) else context
+
+def _get_memory_map(context):
+    return getattr(get_core(context), 'memory_map', None)
+
+def _iter_string_chunks(context, ptr, max_length):
+    """! @brief Read consecutive chunks of memory that may hold a string.
+
+    The first chunk is C_STRING_CHUNK_SIZE bytes and each following chunk doubles in size, so short
+    strings take a single small read and long strings only a few reads. If the memory map of the
+    context's core has a region containing _ptr_, chunks never extend past the end of that region.
+    Iteration stops after _max_length_ bytes or when a read fails.
+    """
+    memory_map = _get_memory_map(context)
+    if memory_map is not None:
+        region = memory_map.get_region_for_address(ptr)
+        if region is not None:
+            max_length = min(max_length, region.end + 1 - ptr)
+
+    offset = 0
+    chunkSize = C_STRING_CHUNK_SIZE
+    while offset < max_length:
+        size = min(chunkSize, max_length - offset)
+        try:
+            yield bytearray(context.read_memory_block8(ptr + offset, size))
+        except exceptions.TransferError:
+            LOG.debug("TransferError while trying to read %d bytes at 0x%08x", size, ptr + offset)
+            return
+        offset += size
+        chunkSize *= 2
+
+def read_c_string(context, ptr, max_length=MAX_C_STRING_LENGTH):
+    """! @brief Reads a null-terminated C string from the target.
+
+    The string is decoded with decode_c_string(). Reading stops at the end of the string, after
+    _max_length_ bytes, or at the end of the memory region containing the string.
+    """
+    if ptr == 0:
+        return ""
+
+    data = bytearray()
+    for chunk in _iter_string_chunks(context, ptr, max_length):
+        data += chunk
+        s, done = decode_c_string(data)
+        if done:
+            return s
+    return decode_c_string(data)[0]
+
+def read_c_string_data(context, ptr, max_length=MAX_C_STRING_LENGTH):
+    """! @brief Reads the raw bytes of a null-terminated C string from the target.
+
+    Reading stops the same way as for read_c_string().
+
+    @return A bytearray with the string's characters, not including the null terminator.
+    """
+    data = bytearray()
+    if ptr == 0:
+        return data
+
+    for chunk in _iter_string_chunks(context, ptr, max_length):
+        end = chunk.find(0)
+        if end != -1:
+            data += chunk[:end]
+            break
+        data += chunk
+    return data
+
+def read_words(context, addresses):
+    """! @brief Read several 32-bit words with deferred reads that complete in one round trip.
+
+    The reads are queued directly on the context's core. A CachingDebugContext, the normal target
+    context, performs each deferred read as its own synchronous block read, so it would turn the
+    batch into one round trip per word.
+
+    @return List of word values in the same order as _addresses_. The entry is None if reading the
+        word failed.
+    """
+    core = get_core(context)
+    try:
+        callbacks = [core.read_memory(addr, 32, now=False) for addr in addresses]
+        return [cb() for cb in callbacks]
+    except exceptions.TransferError:
+        # A fault aborts all queued transfers, so read the words again one at a time.
+        results = []
+        for addr in addresses:
+            try:
+                results.append(context.read32(addr))
+            except exceptions.TransferError:
+                results.append(None)
+        return results
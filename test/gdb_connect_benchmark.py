@@ -0,0 +1,125 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import print_function
+
+import argparse
+import logging
+from timeit import default_timer as timer
+
+from pyocd.core.session import Session
+from pyocd.core.memory_map import (MemoryMap, FlashRegion, RamRegion)
+from pyocd.coresight.cortex_m import CortexM
+from pyocd.debug.context import DebugContext
+from pyocd.gdbserver.gdbserver import GDBServer
+from pyocd.gdbserver.context_facade import GDBDebugContextFacade
+
+# Benchmark of the qXfer document queries that gdb sends when connecting.
+#
+# No hardware is required. A core object is created without a probe, with a memory map shaped like
+# that of a CMSIS-Pack based target with many flash regions (one per flash algorithm or memory
+# element). The queries are handled by a GDBServer object that is not connected to a socket.
+
+def create_memory_map(region_count):
+    regions = []
+    addr = 0
+    for i in range(region_count):
+        regions.append(FlashRegion(start=addr, length=0x10000, blocksize=0x400,
+            is_boot_memory=(i == 0), name="flash%d" % i))
+        addr += 0x10000
+    regions.append(RamRegion(start=0x20000000, length=0x40000, name="sram"))
+    return MemoryMap(regions)
+
+def create_server(region_count):
+    session = Session(None)
+    core = CortexM(session, None, create_memory_map(region_count))
+    core.arch = CortexM.ARMv7M
+    core.has_fpu = True
+    core.build_target_xml()
+
+    # The server is not started; only the attributes used by query handling are set up.
+    server = GDBServer.__new__(GDBServer)
+    server.session = session
+    server.target = core
+    server.target_facade = GDBDebugContextFacade(DebugContext(core))
+    server.packet_size = 2048
+    server.gdb_features = []
+    return server
+
+def read_document(server, annex):
+    """! @brief Read an XML document using chunked qXfer requests, like gdb does."""
+    offset = 0
+    chunk = server.packet_size - 4
+    while True:
+        request = annex + (b":%x,%x" % (offset, chunk))
+        resp = server.handle_query(request)
+        offset += chunk
+        # Response is $<m|l><data>#cs
+        if resp[1:2] == b'l':
+            return
+
+def connect_sequence(server):
+    server.handle_query(b"Supported:multiprocess+;swbreak+;hwbreak+;qRelocInsn+")
+    read_document(server, b"Xfer:features:read:target.xml")
+    read_document(server, b"Xfer:memory-map:read:")
+
+def run(region_count, iterations):
+    server = create_server(region_count)
+    facade = server.target_facade
+
+    start = timer()
+    connect_sequence(server)
+    first = timer() - start
+
+    start = timer()
+    for _ in range(iterations):
+        connect_sequence(server)
+    cached = (timer() - start) / iterations
+
+    # Force regeneration of the memory map XML for every request to compare with generating the
+    # document on demand.
+    start = timer()
+    for _ in range(iterations):
+        facade._memory_map_xml_map = None
+        server.handle_query(b"Supported:multiprocess+")
+        facade._memory_map_xml_map = None
+        read_document(server, b"Xfer:features:read:target.xml")
+        offset = 0
+        while True:
+            facade._memory_map_xml_map = None
+            resp = server.handle_query(b"Xfer:memory-map:read::%x,%x" % (offset, server.packet_size - 4))
+            offset += server.packet_size - 4
+            if resp[1:2] == b'l':
+                break
+    uncached = (timer() - start) / iterations
+
+    print("Regions:                 %d" % (region_count + 1))
+    print("Memory map XML size:     %d bytes" % len(facade.get_memory_map_xml()))
+    print("Target XML size:         %d bytes" % len(server.target.get_target_xml()))
+    print("First connect:           %.3f ms" % (first * 1000))
+    print("Connect (cached):        %.3f ms" % (cached * 1000))
+    print("Connect (regenerated):   %.3f ms" % (uncached * 1000))
+
+def main():
+    parser = argparse.ArgumentParser(description='gdb connect latency benchmark')
+    parser.add_argument('-r', '--regions', type=int, default=256, help="Number of flash regions.")
+    parser.add_argument('-n', '--iterations', type=int, default=100, help="Number of connects.")
+    parser.add_argument('-d', '--debug', action="store_true", help="Enable debug logging.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.WARNING)
+    run(args.regions, args.iterations)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import print_function
+
+# Replay of gdbserver packet transcripts against a mock core.
+#
+# A transcript is recorded by setting the 'gdbserver_transcript' session option. Replaying it
+# passes every packet received from gdb to GDBServer.handle_message() and measures how long each
+# one takes to handle. No hardware, gdb, or socket connection is required.
+#
+# The mock core halts immediately whenever it is resumed, and memory and register contents differ
+# from the recording target, so responses are only expected to match the transcript when it was
+# recorded against the mock core. Ctrl-C interrupts in the transcript are skipped.
+#
+# To run from the test/ directory:
+#
+#     python -m unit.gdb_replay TRANSCRIPT [--baseline FILE] [--save-baseline FILE]
+#
+# With --baseline, the exit status is nonzero if any command type is slower than the baseline by
+# more than the tolerance factor, which makes this usable as a CI regression check.
+
+import argparse
+import json
+import logging
+import re
+import sys
+import threading
+from collections import OrderedDict
+from timeit import default_timer as timer
+
+from pyocd.core.session import Session
+from pyocd.core.target import Target
+from pyocd.coresight.cortex_m import CortexM
+from pyocd.debug.context import DebugContext
+from pyocd.gdbserver.gdbserver import GDBServer
+from pyocd.gdbserver.packet_io import (CTRL_C, ConnectionClosedException)
+from pyocd.gdbserver.transcript import (SENT, read_transcript)
+
+from .mockcore import MockCore
+
+LOG = logging.getLogger(__name__)
+
+class ReplayCore(MockCore):
+    """! @brief Mock core with the parts of the target API used by GDBServer."""
+
+    def __init__(self, session):
+        super(ReplayCore, self).__init__()
+        self.session = session
+        self.state = Target.State.HALTED
+        self.breakpoints = {}
+        self.watchpoints = {}
+        self.vector_catch = 0
+        self._context = DebugContext(self)
+
+        # Use a probe-less CortexM to generate the register list and target XML.
+        template = CortexM(session, None, self.memory_map)
+        template.arch = CortexM.ARMv7M
+        template.has_fpu = self.has_fpu
+        template.build_target_xml()
+        self.register_list = template.register_list
+        self.target_xml = template.target_xml
+
+    @property
+    def cores(self):
+        return {0: self}
+
+    def get_target_context(self, core=None):
+        return self._context
+
+    def get_target_xml(self):
+        return self.target_xml
+
+    def get_state(self):
+        return self.state
+
+    def halt(self):
+        self.state = Target.State.HALTED
+
+    def resume(self):
+        # The simulated program reaches a breakpoint immediately.
+        self.run_token += 1
+        self.state = Target.State.HALTED
+
+    def step(self, disable_interrupts=True, start=0, end=0):
+        self.run_token += 1
+        self.regs[15] += 2
+
+    def reset_and_halt(self, reset_type=None):
+        self.run_token += 1
+        self.clear_all_regs()
+        self.state = Target.State.HALTED
+
+    def set_breakpoint(self, addr, type=Target.BreakpointType.AUTO):
+        self.breakpoints[addr] = type
+        return True
+
+    def remove_breakpoint(self, addr):
+        self.breakpoints.pop(addr, None)
+
+    def find_breakpoint(self, addr):
+        return self.breakpoints.get(addr)
+
+    def set_watchpoint(self, addr, size, type):
+        self.watchpoints[(addr, size, type)] = True
+        return True
+
+    def remove_watchpoint(self, addr, size, type):
+        self.watchpoints.pop((addr, size, type), None)
+
+    def set_vector_catch(self, enable_mask):
+        self.vector_catch = enable_mask
+
+    def get_vector_catch(self):
+        return self.vector_catch
+
+    def is_debug_trap(self):
+        return True
+
+    def is_vector_catch(self):
+        return False
+
+    def exception_number_to_name(self, exc_num, name_thread=False):
+        if exc_num == 0 and not name_thread:
+            return None
+        if exc_num < len(CortexM.CORE_EXCEPTION):
+            return CortexM.CORE_EXCEPTION[exc_num]
+        return "Interrupt[%d]" % (exc_num - len(CortexM.CORE_EXCEPTION))
+
+    def flush(self):
+        pass
+
+class ReplayBoard(object):
+    def __init__(self, target):
+        self.target = target
+
+class ReplaySession(Session):
+    """! @brief Session without a probe whose board holds a ReplayCore."""
+
+    def __init__(self):
+        super(ReplaySession, self).__init__(None, no_config=True, gdbserver_port=0,
+            semihost_console_type='console', serve_local_only=True)
+        self._replay_board = ReplayBoard(ReplayCore(self))
+
+    @property
+    def board(self):
+        return self._replay_board
+
+class ReplayGDBServer(GDBServer):
+    """! @brief GDBServer that is never started, so packets can be fed to it directly."""
+
+    def start(self):
+        pass
+
+class ReplayPacketIO(object):
+    """! @brief Stand-in for GDBServerPacketIOThread that reads packets from a transcript.
+
+    Received packets are returned in transcript order, including to handlers that read packets
+    themselves such as symbol lookups. Recorded responses are collected as they are passed over,
+    and responses from the server are collected as they are sent.
+    """
+
+    def __init__(self, entries):
+        self._entries = entries
+        self._index = 0
+        self.interrupt_event = threading.Event()
+        self.drop_reply = False
+        self.send_acks = True
+        self.expected = []
+        self.actual = []
+
+    def set_send_acks(self, ack):
+        self.send_acks = ack
+
+    def send(self, packet):
+        if not packet:
+            return
+        if self.drop_reply:
+            self.drop_reply = False
+        else:
+            self.actual.append(packet)
+
+    def receive(self, block=True):
+        while self._index < len(self._entries):
+            entry = self._entries[self._index]
+            self._index += 1
+            if entry.direction == SENT:
+                self.expected.append(entry.packet)
+            elif entry.packet != CTRL_C:
+                return entry.packet
+        raise ConnectionClosedException()
+
+    def stop(self):
+        pass
+
+_COMMAND_PATTERN = re.compile(br'[:,;?#]')
+
+def command_name(packet):
+    """! @brief Return a short name for the type of a packet, used to group latency statistics.
+
+    Queries, sets, and v commands are named up to the first separator, for instance "qXfer" or
+    "vCont". All other commands are named by their first character.
+    """
+    data = packet[1:]
+    if data[0:1] in (b'q', b'Q', b'v'):
+        data = _COMMAND_PATTERN.split(data, 1)[0]
+    else:
+        data = data[0:1]
+    return data.decode('latin-1')
+
+class CommandStats(object):
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+class ReplayResult(object):
+    def __init__(self):
+        ## Dict of command name to CommandStats.
+        self.stats = OrderedDict()
+        ## List of (index, expected, actual) for responses that do not match the transcript.
+        self.mismatches = []
+        self.packet_count = 0
+        self.total_time = 0.0
+
+def replay(entries, server=None):
+    """! @brief Replay received packets from a transcript through a GDBServer.
+    @param entries List of TranscriptEntry objects, as returned by read_transcript().
+    @param server Optional ReplayGDBServer. A new server with a ReplayCore is created if not
+        provided.
+    @return ReplayResult object.
+    """
+    if server is None:
+        server = ReplayGDBServer(ReplaySession())
+    io = ReplayPacketIO(entries)
+    server.packet_io = io
+    result = ReplayResult()
+
+    try:
+        while True:
+            try:
+                packet = io.receive()
+            except ConnectionClosedException:
+                break
+
+            start = timer()
+            resp, detach = server.handle_message(packet)
+            elapsed = timer() - start
+
+            if resp is not None:
+                io.send(resp)
+            result.stats.setdefault(command_name(packet), CommandStats()).add(elapsed)
+            result.packet_count += 1
+            result.total_time += elapsed
+
+            # The transcript continues with the next connection if the server was persistent.
+            if detach:
+                server._cleanup_for_next_connection()
+                server.packet_io = io
+    finally:
+        server.abstract_socket.cleanup()
+
+    # Collect trailing responses.
+    try:
+        io.receive()
+    except ConnectionClosedException:
+        pass
+
+    for i in range(max(len(io.expected), len(io.actual))):
+        expected = io.expected[i] if i < len(io.expected) else None
+        actual = io.actual[i] if i < len(io.actual) else None
+        if expected != actual:
+            result.mismatches.append((i, expected, actual))
+    return result
+
+def find_regressions(result, baseline, tolerance, min_time=50e-6):
+    """! @brief Compare mean handling times against a baseline.
+    @param result ReplayResult object.
+    @param baseline Dict of command name to mean handling time in seconds.
+    @param tolerance Factor by which a mean may exceed its baseline.
+    @param min_time Means below this many seconds are never reported, to avoid timing noise.
+    @return List of (command name, mean, baseline mean) tuples.
+    """
+    regressions = []
+    for name, stats in result.stats.items():
+        base = baseline.get(name)
+        if base is not None and stats.mean > max(base * tolerance, min_time):
+            regressions.append((name, stats.mean, base))
+    return regressions
+
+def print_result(result):
+    print("%-24s %8s %12s %12s" % ("Command", "Count", "Mean (us)", "Max (us)"))
+    for name, stats in sorted(result.stats.items()):
+        print("%-24s %8d %12.1f %12.1f" % (name, stats.count, stats.mean * 1e6, stats.max * 1e6))
+    print("Packets:     %d" % result.packet_count)
+    print("Total time:  %.3f ms" % (result.total_time * 1000))
+    print("Mismatches:  %d" % len(result.mismatches))
+
+def main():
+    parser = argparse.ArgumentParser(description='gdbserver transcript replay')
+    parser.add_argument('transcript', help="Transcript file recorded with the gdbserver_transcript option.")
+    parser.add_argument('-n', '--iterations', type=int, default=10,
+        help="Number of replays. The fastest mean of each command is reported.")
+    parser.add_argument('-b', '--baseline', help="JSON file of baseline mean times to check against.")
+    parser.add_argument('-s', '--save-baseline', help="Write mean times to a JSON baseline file.")
+    parser.add_argument('-t', '--tolerance', type=float, default=2.0,
+        help="Allowed slowdown factor relative to the baseline (default 2.0).")
+    parser.add_argument('-m', '--match', action="store_true",
+        help="Fail if responses differ from the transcript.")
+    parser.add_argument('-d', '--debug', action="store_true", help="Enable debug logging.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.WARNING)
+
+    entries = read_transcript(args.transcript)
+    result = None
+    for _ in range(max(1, args.iterations)):
+        this_result = replay(entries)
+        if result is None:
+            result = this_result
+        else:
+            for name, stats in this_result.stats.items():
+                if stats.mean < result.stats[name].mean:
+                    result.stats[name] = stats
+    print_result(result)
+
+    status = 0
+    if args.match and result.mismatches:
+        index, expected, actual = result.mismatches[0]
+        print("First mismatched response #%d: expected %r, got %r" % (index, expected, actual))
+        status = 1
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({name: stats.mean for name, stats in result.stats.items()}, f,
+                indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        for name, mean, base in find_regressions(result, baseline, args.tolerance):
+            print("Regression: %s mean %.1f us, baseline %.1f us" % (name, mean * 1e6, base * 1e6))
+            status = 1
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from binascii import crc32
+
+from pyocd.core.session import Session
+from pyocd.core import memory_map
+from pyocd.flash.flash import Flash
+
+FLASH_START = 0
+FLASH_SIZE = 0x4000
+SECTOR_SIZE = 0x400
+PAGE_SIZE = 0x100
+
+def make_image(size, seed=0):
+    """! @brief Return _size_ bytes of image data that differs for each seed."""
+    return bytearray((i + seed) & 0xff for i in range(size))
+
+def program_image(target, data, baseline=None, **kwargs):
+    """! @brief Program data to the start of flash with a new flash builder.
+
+    The target's recorded flash operations and read count are cleared first, so they only reflect
+    this programming operation. Sector erase is used and verify follows the 'flash_verify' session
+    option, as with FlashLoader, unless other values are passed in _kwargs_.
+
+    @return The ProgrammingInfo returned by FlashBuilder.program().
+    """
+    builder = target.flash.get_flash_builder()
+    if baseline is not None:
+        builder.add_baseline_data(FLASH_START, baseline)
+    builder.add_data(FLASH_START, data)
+    target.flash.operations = []
+    target.read_count = 0
+    kwargs.setdefault('chip_erase', "sector")
+    kwargs.setdefault('verify', target.session.options.get('flash_verify'))
+    return builder.program(**kwargs)
+
+class MockFlashTarget(object):
+    """! @brief Target with only the flash memory and the API used by the flash builder.
+
+    Reads of flash are counted so tests can check how much data is read back.
+    """
+
+    def __init__(self, session=None, page_buffer_count=0, **options):
+        self.session = session or Session(None, **options)
+        self.flash_region = memory_map.FlashRegion(start=FLASH_START, length=FLASH_SIZE,
+            blocksize=SECTOR_SIZE, page_size=PAGE_SIZE, name='flash', flash_class=MockFlash)
+        self.memory_map = memory_map.MemoryMap(self.flash_region)
+        self.memory = bytearray([0xff]) * FLASH_SIZE
+        self.read_count = 0
+        self.reset_count = 0
+        self.flash = MockFlash(self, page_buffer_count=page_buffer_count)
+        self.flash.region = self.flash_region
+        self.flash_region.flash = self.flash
+
+    def read_memory_block8(self, addr, size):
+        self.read_count += 1
+        offset = addr - FLASH_START
+        return list(self.memory[offset:offset + size])
+
+    def reset_and_halt(self, reset_type=None):
+        self.reset_count += 1
+
+class MockFlashBoard(object):
+    def __init__(self, session):
+        self.session = session
+        self.target = MockFlashTarget(session)
+        self.target_type = 'mock'
+
+    def init(self):
+        pass
+
+    def uninit(self):
+        pass
+
+class MockFlashSession(Session):
+    """! @brief Session without a probe whose board holds a MockFlashTarget."""
+
+    def __init__(self, **options):
+        super(MockFlashSession, self).__init__(None, no_config=True, **options)
+        self._mock_board = MockFlashBoard(self)
+
+    @property
+    def board(self):
+        return self._mock_board
+
+class MockFlash(Flash):
+    """! @brief Flash algorithm operating directly on the memory of a MockFlashTarget.
+
+    Every erase, program, and page buffer operation is recorded in the operations list as an
+    (operation name, address) tuple. Asynchronous operations complete immediately, and a call to
+    wait_for_completion() is recorded as ('wait', None).
+    """
+
+    def __init__(self, target, flash_algo=None, page_buffer_count=0):
+        super(MockFlash, self).__init__(target, flash_algo)
+        self.use_analyzer = True
+        self.operations = []
+        self.page_buffers = list(range(page_buffer_count))
+        self.double_buffer_supported = page_buffer_count > 1
+        self._buffer_data = {}
+
+    @property
+    def is_erase_all_supported(self):
+        return True
+
+    def init(self, operation, address=None, clock=0, reset=True):
+        self._active_operation = operation
+
+    def uninit(self):
+        self._active_operation = None
+
+    def cleanup(self):
+        pass
+
+    def _offset(self, addr):
+        return addr - self.region.start
+
+    def compute_crcs(self, sectors):
+        self.operations.append(('crc', sectors[0][0] if sectors else None))
+        return [crc32(self.target.memory[self._offset(addr):self._offset(addr) + size]) & 0xFFFFFFFF
+                for addr, size in sectors]
+
+    def erase_all(self):
+        self.operations.append(('erase_all', self.region.start))
+        self.target.memory[:] = bytearray([0xff]) * len(self.target.memory)
+
+    def erase_sector(self, address):
+        self.operations.append(('erase_sector', address))
+        offset = self._offset(address)
+        self.target.memory[offset:offset + self.region.sector_size] = \
+            bytearray([0xff]) * self.region.sector_size
+
+    def program_page(self, address, bytes):
+        self.operations.append(('program_page', address))
+        offset = self._offset(address)
+        self.target.memory[offset:offset + len(bytes)] = bytearray(bytes)
+
+    def start_erase_all(self):
+        self.erase_all()
+
+    def start_erase_sector(self, address):
+        self.erase_sector(address)
+
+    def load_page_buffer(self, buffer_number, address, bytes):
+        self.operations.append(('load', address))
+        self._buffer_data[buffer_number] = bytearray(bytes)
+
+    def start_program_page_with_buffer(self, buffer_number, address):
+        self.program_page(address, self._buffer_data.pop(buffer_number))
+
+    def wait_for_completion(self):
+        self.operations.append(('wait', None))
+        return 0
+
+    def operation_count(self, name):
+        return sum(1 for op, _ in self.operations if op == name)
@@ -0,0 +1,132 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import struct
+
+from pyocd.core import exceptions
+from pyocd.core.memory_interface import MemoryInterface
+from pyocd.core.memory_map import (MemoryMap, RamRegion)
+from pyocd.core.session import Session
+from pyocd.coresight.component import CoreSightCoreComponent
+from pyocd.coresight.cortex_m import register_name_to_index
+
+RAM_START = 0x20000000
+RAM_SIZE = 0x4000
+
+class MockRTOSCore(CoreSightCoreComponent, MemoryInterface):
+    """! @brief Core with RAM that counts the round trips made to access it.
+
+    Deferred reads are queued until the first of their callbacks is invoked, which completes all
+    queued reads in one round trip like a probe flushing its transfer queue. Every immediate read
+    or block read is one round trip.
+    """
+
+    _FORMATS = {1: "B", 2: "H", 4: "I"}
+
+    def __init__(self):
+        self.ram = bytearray(RAM_SIZE)
+        self.has_fpu = False
+        self.regs = {}
+        self.run_token = 0
+        self.round_trips = 0
+        ## List of (address, size) tuples for each block read.
+        self.block_reads = []
+        ## Set of addresses that fault when read.
+        self.faults = set()
+        self._pending = 0
+
+    def write_memory(self, addr, value, transfer_size=32):
+        size = transfer_size // 8
+        struct.pack_into("<" + self._FORMATS[size], self.ram, addr - RAM_START, value)
+
+    def write_string(self, addr, value):
+        data = value.encode('utf-8') + b"\0"
+        self.ram[addr - RAM_START:addr - RAM_START + len(data)] = data
+
+    def _read(self, addr, size):
+        offset = addr - RAM_START
+        if (offset < 0 or offset + size > RAM_SIZE
+                or any(addr <= fault < addr + size for fault in self.faults)):
+            raise exceptions.TransferFaultError(addr)
+        return self.ram[offset:offset + size]
+
+    def _read_value(self, addr, size):
+        return struct.unpack("<" + self._FORMATS[size], self._read(addr, size))[0]
+
+    def _flush(self):
+        if self._pending:
+            self.round_trips += 1
+            self._pending = 0
+
+    def read_memory(self, addr, transfer_size=32, now=True):
+        size = transfer_size // 8
+        def read_cb():
+            self._flush()
+            return self._read_value(addr, size)
+        if now:
+            self._flush()
+            self.round_trips += 1
+            return self._read_value(addr, size)
+        self._pending += 1
+        return read_cb
+
+    def read_memory_block8(self, addr, size):
+        self._flush()
+        self.round_trips += 1
+        self.block_reads.append((addr, size))
+        return list(self._read(addr, size))
+
+    def read_core_register(self, reg):
+        return self.regs.get(register_name_to_index(reg), 0)
+
+    def read_core_registers_raw(self, reg_list):
+        return [self.regs.get(register_name_to_index(reg), 0) for reg in reg_list]
+
+    def is_running(self):
+        return False
+
+class MockRTOSTarget(object):
+    """! @brief Target with a MockRTOSCore for exercising thread providers."""
+
+    def __init__(self, **options):
+        self.session = Session(None, no_config=True, **options)
+        self.core = MockRTOSCore()
+        self.memory_map = MemoryMap(RamRegion(start=RAM_START, length=RAM_SIZE))
+        self.core.memory_map = self.memory_map
+        ## Context returned by get_target_context(). Set to a CachingDebugContext to read through
+        # the memory cache like a real target.
+        self.context = self.core
+
+    @property
+    def run_token(self):
+        return self.core.run_token
+
+    @run_token.setter
+    def run_token(self, value):
+        self.core.run_token = value
+
+    def get_target_context(self):
+        return self.context
+
+    def in_thread_mode_on_main_stack(self):
+        return False
+
+class MockSymbolProvider(object):
+    def __init__(self, symbols):
+        self.symbols = symbols
+
+    def get_symbol_value(self, name):
+        return self.symbols.get(name)
@@ -0,0 +1,168 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.core.session import Session
+from pyocd.core.target import Target
+from pyocd.debug.breakpoints.manager import BreakpointManager
+from pyocd.debug.breakpoints.software import SoftwareBreakpointProvider
+from pyocd.utility import conversion
+
+from .mockcore import MockCore
+
+RAM = 0x20000000
+
+class BreakpointMockCore(MockCore):
+    """! @brief Mock core that filters reads through a breakpoint manager and counts transfers."""
+
+    def __init__(self):
+        super(BreakpointMockCore, self).__init__()
+        self.session = Session(None)
+        self.bp_manager = BreakpointManager(self)
+        self.sw_bp = SoftwareBreakpointProvider(self)
+        self.bp_manager.add_provider(self.sw_bp)
+        self.reads = 0
+        self.writes = 0
+
+        # Fill RAM with a pattern.
+        self.ram[:] = bytearray(i & 0xff for i in range(len(self.ram)))
+
+    def raw_read16(self, addr):
+        data = MockCore.read_memory_block8(self, addr, 2)
+        return data[0] | (data[1] << 8)
+
+    def read_memory_block8(self, addr, size):
+        self.reads += 1
+        data = MockCore.read_memory_block8(self, addr, size)
+        return self.bp_manager.filter_memory_unaligned_8(addr, size, data)
+
+    def read_memory_block32(self, addr, size):
+        self.reads += 1
+        data = conversion.byte_list_to_u32le_list(MockCore.read_memory_block8(self, addr, size * 4))
+        return self.bp_manager.filter_memory_aligned_32(addr, size, data)
+
+    def write_memory_block8(self, addr, value):
+        self.writes += 1
+        return MockCore.write_memory_block8(self, addr, value)
+
+@pytest.fixture(scope='function')
+def core():
+    return BreakpointMockCore()
+
+def original16(addr):
+    offset = addr - RAM
+    return (offset & 0xff) | (((offset + 1) & 0xff) << 8)
+
+class TestSoftwareBreakpoints(object):
+    def test_batched_set(self, core):
+        addrs = [RAM + 0x10, RAM + 0x14, RAM + 0x40]
+        for addr in addrs:
+            assert core.bp_manager.set_breakpoint(addr)
+        core.bp_manager.flush()
+
+        assert (core.reads, core.writes) == (1, 1)
+        for addr in addrs:
+            assert core.raw_read16(addr) == SoftwareBreakpointProvider.BKPT_INSTR
+            assert core.bp_manager.find_breakpoint(addr).type == Target.BreakpointType.SW
+            assert core.sw_bp.find_breakpoint(addr).original_instr == original16(addr)
+
+        # Memory between breakpoints is unchanged.
+        assert core.raw_read16(RAM + 0x12) == original16(RAM + 0x12)
+
+    def test_separate_spans(self, core):
+        core.bp_manager.set_breakpoint(RAM + 0x10)
+        core.bp_manager.set_breakpoint(RAM + 0x10 + SoftwareBreakpointProvider.MAX_GAP + 0x10)
+        core.bp_manager.set_breakpoint(RAM + 0x400)
+        core.bp_manager.flush()
+        assert (core.reads, core.writes) == (3, 3)
+
+    def test_remove_keeps_neighbours(self, core):
+        core.bp_manager.set_breakpoint(RAM + 0x10)
+        core.bp_manager.set_breakpoint(RAM + 0x12)
+        core.bp_manager.set_breakpoint(RAM + 0x18)
+        core.bp_manager.flush()
+
+        core.bp_manager.remove_breakpoint(RAM + 0x10)
+        core.bp_manager.remove_breakpoint(RAM + 0x18)
+        core.bp_manager.flush()
+        assert core.raw_read16(RAM + 0x10) == original16(RAM + 0x10)
+        assert core.raw_read16(RAM + 0x12) == SoftwareBreakpointProvider.BKPT_INSTR
+        assert core.raw_read16(RAM + 0x18) == original16(RAM + 0x18)
+        assert core.bp_manager.find_breakpoint(RAM + 0x10) is None
+        assert core.bp_manager.find_breakpoint(RAM + 0x12) is not None
+
+    def test_flush_without_changes(self, core):
+        core.bp_manager.set_breakpoint(RAM + 0x10)
+        core.bp_manager.flush()
+        transfers = (core.reads, core.writes)
+        core.bp_manager.flush()
+        assert (core.reads, core.writes) == transfers
+
+    def test_set_and_remove_before_flush(self, core):
+        core.bp_manager.set_breakpoint(RAM + 0x10)
+        core.bp_manager.remove_breakpoint(RAM + 0x10)
+        core.bp_manager.flush()
+        assert (core.reads, core.writes) == (0, 0)
+        assert core.raw_read16(RAM + 0x10) == original16(RAM + 0x10)
+
+    def test_remove_and_readd_before_flush(self, core):
+        core.bp_manager.set_breakpoint(RAM + 0x10)
+        core.bp_manager.flush()
+        core.bp_manager.remove_breakpoint(RAM + 0x10)
+        core.bp_manager.set_breakpoint(RAM + 0x10)
+        core.bp_manager.flush()
+        assert (core.reads, core.writes) == (1, 1)
+        assert core.raw_read16(RAM + 0x10) == SoftwareBreakpointProvider.BKPT_INSTR
+
+    def test_remove_all(self, core):
+        core.bp_manager.set_breakpoint(RAM + 0x10)
+        core.bp_manager.set_breakpoint(RAM + 0x20)
+        core.bp_manager.flush()
+        core.bp_manager.remove_all_breakpoints()
+        assert core.raw_read16(RAM + 0x10) == original16(RAM + 0x10)
+        assert core.raw_read16(RAM + 0x20) == original16(RAM + 0x20)
+
+class TestFilterMemory(object):
+    @pytest.fixture(scope='function')
+    def bp_core(self, core):
+        for addr in (RAM + 0x6, RAM + 0x8, RAM + 0x20):
+            core.bp_manager.set_breakpoint(addr)
+        core.bp_manager.flush()
+        return core
+
+    def test_block8(self, bp_core):
+        assert bp_core.read_memory_block8(RAM, 0x30) == list(range(0x30))
+        # Read starting in the middle of a breakpoint.
+        assert bp_core.read_memory_block8(RAM + 0x7, 4) == [7, 8, 9, 10]
+        # Read ending in the middle of a breakpoint.
+        assert bp_core.read_memory_block8(RAM + 0x1e, 3) == [0x1e, 0x1f, 0x20]
+
+    def test_block32(self, bp_core):
+        expected = conversion.byte_list_to_u32le_list(list(range(0x30)))
+        assert bp_core.read_memory_block32(RAM, 12) == expected
+        assert bp_core.read_memory_block32(RAM + 0x4, 2) == expected[1:3]
+
+    @pytest.mark.parametrize(("addr", "size", "raw", "expected"), [
+            (RAM + 0x6, 8, 0x00, 0x06),
+            (RAM + 0x7, 8, 0xbe, 0x07),
+            (RAM + 0x6, 16, 0xbe00, 0x0706),
+            (RAM + 0x4, 32, 0xbe000504, 0x07060504),
+            (RAM + 0x8, 32, 0x0b0abe00, 0x0b0a0908),
+            (RAM + 0xc, 32, 0x0f0e0d0c, 0x0f0e0d0c),
+        ])
+    def test_single(self, bp_core, addr, size, raw, expected):
+        assert bp_core.bp_manager.filter_memory(addr, size, raw) == expected
@@ -169,6 +169,9 @@ class TestGdbEscape(object):
     
     def test_escape_2(self):
         assert escape(b'1234#09*xyz') == b'1234}\x0309}\x0axyz'
+
+    def test_escape_memoryview(self):
+        assert escape(memoryview(b'1234#09*xyz')[2:8]) == b'34}\x0309}\x0a'
     
     # Verify all chars that shouldn't be escaped pass through unmodified.
     @pytest.mark.parametrize("data",
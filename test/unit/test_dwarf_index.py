@@ -0,0 +1,99 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import pytest
+from elftools.elf.elffile import ELFFile
+
+from pyocd.debug.elf.decoder import DwarfAddressDecoder
+from pyocd.debug.elf.dwarf_index import (DwarfIndex, DwarfIndexBuilder)
+
+TEST_ELF = os.path.join(os.path.dirname(__file__), "..", "..", "src", "gdb_test_program", "gdb_test.elf")
+
+@pytest.fixture
+def elf_file():
+    with open(TEST_ELF, 'rb') as f:
+        yield ELFFile(f)
+
+def get_function_address(decoder):
+    """! @brief Return the address of the first function in the ELF that was linked."""
+    for prog in decoder.subprograms:
+        low_pc = prog.attributes.get('DW_AT_low_pc')
+        if low_pc is not None and low_pc.value != 0:
+            return low_pc.value
+
+class TestDwarfIndex(object):
+    def test_lookup(self):
+        builder = DwarfIndexBuilder()
+        builder.add_function(b"outer", 0x100, 0x200, 1, 0)
+        builder.add_function(b"inner", 0x140, 0x150, 2, 0)
+        builder.add_function(b"other", 0x300, 0x310, 3, 0)
+        builder.add_function(b"empty", 0x400, 0x400, 4, 0)
+        builder.add_line(b"a.c", b"src", 10, 0x100, 0x104, 0)
+        index = builder.build("key")
+
+        assert index.key == "key"
+        assert index.function_count == 3
+        # The range with the lowest start address wins, even if a later one is smaller.
+        assert index.get_function_for_address(0x148) == (b"outer", 0x100, 0x200, 1, 0)
+        assert index.get_function_for_address(0x1ff)[0] == b"outer"
+        assert index.get_function_for_address(0x200) is None
+        assert index.get_function_for_address(0x30f)[0] == b"other"
+        assert index.get_function_for_address(0xff) is None
+        assert index.get_function_for_address(0x400) is None
+        assert index.get_line_for_address(0x102) == (b"a.c", b"src", 10, 0)
+
+    def test_save_load(self, tmpdir):
+        builder = DwarfIndexBuilder()
+        builder.add_function(u"main", 0x100, 0x200, 1, 0)
+        path = str(tmpdir.join("test.dwi"))
+        builder.build("key").save(path)
+        index = DwarfIndex.load(path)
+        assert index.key == "key"
+        assert index.get_function_for_address(0x100)[0] == b"main"
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            DwarfIndex(bytearray(b"not an index at all"))
+
+class TestDwarfAddressDecoder(object):
+    def test_lookup(self, elf_file):
+        decoder = DwarfAddressDecoder(elf_file)
+        fn = decoder.get_function_for_address(get_function_address(decoder))
+        assert fn.subprogram.tag == 'DW_TAG_subprogram'
+        assert fn.name == fn.subprogram.attributes['DW_AT_name'].value
+        line = decoder.get_line_for_address(fn.low_pc)
+        assert line.filename == b"main.c"
+        # Only the compile unit containing the address was indexed.
+        assert decoder._index is None and len(decoder._cu_indexes) == 1
+
+        # An address outside of all compile units requires indexing the whole file.
+        assert decoder.get_function_for_address(0xfffffff0) is None
+        assert decoder._index is not None
+
+    def test_saved_index(self, elf_file, tmpdir):
+        decoder = DwarfAddressDecoder(elf_file, str(tmpdir))
+        fn = decoder.get_function_for_address(get_function_address(decoder))
+        assert len(tmpdir.listdir()) == 1
+
+        with open(TEST_ELF, 'rb') as f:
+            loaded = DwarfAddressDecoder(ELFFile(f), str(tmpdir))
+            # The index must be loaded rather than built.
+            loaded._build_index = None
+            loaded_fn = loaded.get_function_for_address(fn.low_pc)
+            assert (loaded_fn.name, loaded_fn.high_pc) == (fn.name, fn.high_pc)
+            assert loaded_fn.subprogram.offset == fn.subprogram.offset
+            assert loaded.get_line_for_address(fn.low_pc).line == decoder.get_line_for_address(fn.low_pc).line
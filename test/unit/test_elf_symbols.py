@@ -0,0 +1,48 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+from elftools.elf.elffile import ELFFile
+
+from pyocd.debug.elf.decoder import (ElfSymbolDecoder, SymbolInfo)
+
+from .test_dwarf_index import TEST_ELF
+
+@pytest.fixture
+def decoder():
+    with open(TEST_ELF, 'rb') as f:
+        yield ElfSymbolDecoder(ELFFile(f))
+
+class TestElfSymbolDecoder(object):
+    def test_lazy(self, decoder):
+        assert decoder._symbol_dict is None
+        assert decoder.get_symbol_for_name("main") == SymbolInfo("main", 0x1, 156, 'STT_FUNC')
+        # Looking up a name doesn't build the address index.
+        assert decoder._starts is None
+
+    def test_name(self, decoder):
+        assert decoder.get_symbol_for_name("watchpoint_write_buffer").type == 'STT_OBJECT'
+        # Only functions and objects are included.
+        assert decoder.get_symbol_for_name("main.c") is None
+        assert decoder.get_symbol_for_name("$t") is None
+
+    def test_address(self, decoder):
+        assert decoder.get_symbol_for_address(0x1).name == "main"
+        assert decoder.get_symbol_for_address(0x9c).name == "main"
+        assert decoder.get_symbol_for_address(0x9d).name == "function_1"
+        assert decoder.get_symbol_for_address(0x1b8 + 11).name == "watchpoint_write_buffer"
+        assert decoder.get_symbol_for_address(0x1b8 + 12) is None
+        assert decoder.get_symbol_for_address(0) is None
@@ -0,0 +1,127 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import pytest
+import six
+
+from pyocd.flash.file_programmer import (FileProgrammer, read_hex_chunks)
+from pyocd.utility.mask import same
+
+from .mockflash import MockFlashSession
+
+IMAGE = bytearray((i * 13) & 0xff for i in range(0x1100))
+
+def hex_record(record_type, address, data=b""):
+    record = bytearray([len(data), (address >> 8) & 0xff, address & 0xff, record_type])
+    record += bytearray(data)
+    record.append((-sum(record)) & 0xff)
+    return ":" + "".join("%02X" % b for b in record) + "\n"
+
+class ChunkCollector(object):
+    def __init__(self):
+        self.chunks = []
+
+    def add_data(self, address, data):
+        self.chunks.append((address, data))
+
+class TestHexParser(object):
+    def test_contiguous_records(self):
+        hex_text = (hex_record(0, 0x10, b"\x01\x02") + hex_record(0, 0x12, b"\x03")
+                    + hex_record(0, 0x20, b"\x04") + hex_record(1, 0))
+        assert list(read_hex_chunks(six.StringIO(hex_text))) == [
+            (0x10, bytearray([1, 2, 3])),
+            (0x20, bytearray([4])),
+            ]
+
+    def test_extended_address(self):
+        hex_text = (hex_record(4, 0, b"\x00\x01") + hex_record(0, 0xfffe, b"\x01\x02")
+                    + hex_record(2, 0, b"\x10\x00") + hex_record(0, 0, b"\x03")
+                    + hex_record(5, 0, b"\x00\x00\x00\x00") + hex_record(1, 0)
+                    + hex_record(0, 0, b"\x04"))
+        assert list(read_hex_chunks(io.BytesIO(hex_text.encode('ascii')))) == [
+            (0x1fffe, bytearray([1, 2])),
+            (0x10000, bytearray([3])),
+            ]
+
+    @pytest.mark.parametrize("records", [
+        [(0x10, b"\x01\x02"), (0x11, b"\x03")],                     # overlaps the current chunk
+        [(0x10, b"\x01\x02"), (0x20, b"\x03"), (0x11, b"\x04")],   # inside an earlier chunk
+        [(0x10, b"\x01\x02"), (0x20, b"\x03"), (0x0e, b"\x04\x05\x06")], # runs into an earlier chunk
+        [(0x10, b"\x01\x02"), (0x20, b"\x03"), (0x0e, b"\x04\x05"), (0x10, b"\x06")],
+        ])
+    def test_overlapping_records(self, records):
+        hex_text = "".join(hex_record(0, address, data) for address, data in records)
+        with pytest.raises(ValueError):
+            list(read_hex_chunks(six.StringIO(hex_text)))
+
+    def test_unordered_records(self):
+        hex_text = (hex_record(0, 0x20, b"\x01") + hex_record(0, 0x10, b"\x02")
+                    + hex_record(0, 0x11, b"\x03") + hex_record(0, 0x21, b"\x04"))
+        assert list(read_hex_chunks(six.StringIO(hex_text))) == [
+            (0x20, bytearray([1])),
+            (0x10, bytearray([2, 3])),
+            (0x21, bytearray([4])),
+            ]
+
+    @pytest.mark.parametrize("line", [
+        ":0100000001FF\n",  # bad checksum
+        ":02000000010\n",   # odd digit count
+        "0100000001FE\n",   # no start code
+        ":0200000001FD\n",  # length mismatch
+        ])
+    def test_invalid_record(self, line):
+        with pytest.raises(ValueError):
+            list(read_hex_chunks(six.StringIO(line)))
+
+class TestFileProgrammer(object):
+    def test_bin_file_mapped(self, tmpdir):
+        path = tmpdir.join("image.bin")
+        path.write_binary(bytes(IMAGE))
+        loader = ChunkCollector()
+        FileProgrammer(MockFlashSession()).load(str(path), loader, base_address=0x100, skip=0x10)
+        assert len(loader.chunks) == 1
+        address, data = loader.chunks[0]
+        assert address == 0x100
+        assert isinstance(data, memoryview)
+        assert same(data, IMAGE[0x10:])
+
+    def test_program_bin(self):
+        session = MockFlashSession()
+        FileProgrammer(session).program(io.BytesIO(IMAGE), file_format='bin', base_address=0)
+        assert session.board.target.memory[:len(IMAGE)] == IMAGE
+
+    def test_builder_memoryview(self):
+        target = MockFlashSession().board.target
+        builder = target.flash.get_flash_builder()
+        builder.add_data(0, memoryview(IMAGE))
+        builder.program()
+        assert all(isinstance(page.data, bytearray) for page in builder.page_list)
+        assert target.memory[:len(IMAGE)] == IMAGE
+
+    def test_program_hex(self):
+        session = MockFlashSession()
+        hex_text = "".join(hex_record(0, addr, IMAGE[addr:addr + 0x20])
+                        for addr in range(0, 0x400, 0x20)) + hex_record(1, 0)
+        FileProgrammer(session).program(six.StringIO(hex_text), file_format='hex')
+        assert session.board.target.memory[:0x400] == IMAGE[:0x400]
+
+def test_same_mixed_types():
+    assert same([1, 2, 3], bytearray([1, 2, 3]))
+    assert same(memoryview(b"\x01\x02"), [1, 2])
+    assert not same(bytearray([1, 2]), [1, 3])
+    assert not same(bytearray([1, 2]), [1, 2, 3])
+    assert not same(bytearray([1, 2]), [1, 0x102])
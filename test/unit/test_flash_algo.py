@@ -0,0 +1,62 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pyocd.target.pack import flash_algo
+from pyocd.core import memory_map
+
+def make_algo(page_size, sector_size, code_size=0x400):
+    algo = flash_algo.PackFlashAlgo.__new__(flash_algo.PackFlashAlgo)
+    algo.page_size = page_size
+    algo.sector_sizes = [(0, sector_size)]
+    algo.algo_data = bytearray(code_size)
+    algo.symbols = {name: 0 for name in ("Init", "UnInit", "EraseChip", "EraseSector", "ProgramPage")}
+    algo.rw_start = 0
+    return algo
+
+def make_ram(length):
+    return memory_map.RamRegion(start=0x20000000, length=length)
+
+class TestPageBufferLayout(object):
+    def test_max_buffers(self):
+        layout = make_algo(0x400, 0x1000).get_page_buffer_layout(make_ram(0x10000))
+        assert layout == flash_algo.PageBufferLayout(0x400, flash_algo.MAX_PAGE_BUFFERS)
+
+    def test_small_page_size_uses_sector(self):
+        algo = make_algo(8, 0x800)
+        assert algo.preferred_page_size == 0x800
+        assert algo.get_page_buffer_layout(make_ram(0x4000)).page_size == 0x800
+
+    def test_reduce_page_size_for_double_buffering(self):
+        # Code and stack use 0x628 bytes, leaving room for one 0x800 byte buffer or three
+        # 0x400 byte buffers.
+        algo = make_algo(8, 0x800)
+        assert algo.get_page_buffer_layout(make_ram(0x1600)) == flash_algo.PageBufferLayout(0x400, 3)
+
+    def test_single_buffer(self):
+        algo = make_algo(0x800, 0x800)
+        assert algo.get_page_buffer_layout(make_ram(0x1200)) == flash_algo.PageBufferLayout(0x800, 1)
+        assert algo.get_page_buffer_layout(make_ram(0x800)) is None
+
+    def test_fixed_blocksize(self):
+        algo = make_algo(8, 0x800)
+        ram = make_ram(0x1600)
+        assert algo.get_page_buffer_layout(ram, 0x800) == flash_algo.PageBufferLayout(0x800, 1)
+
+        pyocd_algo = algo.get_pyocd_flash_algo(0x200, ram)
+        buffers = pyocd_algo['page_buffers']
+        assert len(buffers) == flash_algo.MAX_PAGE_BUFFERS
+        assert buffers[0] == pyocd_algo['load_address'] + 0x420
+        assert all(b - a == 0x200 for a, b in zip(buffers, buffers[1:]))
@@ -0,0 +1,112 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import json
+import six
+
+from pyocd.core import exceptions
+from pyocd.flash.batch import (
+    BatchFlashProgrammer,
+    BatchProgressReport,
+    FlashImage,
+    )
+
+from .mockflash import MockFlashBoard
+
+IMAGE = bytearray((i * 7) & 0xff for i in range(0x900))
+
+class MockProbe(object):
+    """! @brief Probe that creates a MockFlashBoard, or fails to open."""
+
+    def __init__(self, unique_id, fail=False):
+        self.unique_id = unique_id
+        self.description = "Mock probe"
+        self.session = None
+        self.is_open = False
+        self.board = None
+        self._fail = fail
+
+    def create_associated_board(self):
+        self.board = MockFlashBoard(self.session)
+        return self.board
+
+    def open(self):
+        if self._fail:
+            raise exceptions.ProbeError("unable to open probe")
+        self.is_open = True
+
+    def set_clock(self, frequency):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+def batch_program(probes, **kwargs):
+    programmer = BatchFlashProgrammer(probes, no_config=True, **kwargs)
+    return programmer.program(io.BytesIO(IMAGE), file_format='bin', base_address=0)
+
+class TestFlashImage(object):
+    def test_bin(self):
+        image = FlashImage.from_file(None, io.BytesIO(IMAGE), 'bin', base_address=0x100, skip=0x10)
+        assert image.chunks == [(0x100, IMAGE[0x10:])]
+        assert image.byte_count == len(IMAGE) - 0x10
+
+    def test_hex(self):
+        hex_file = six.StringIO(":0400100001020304E2\n:00000001FF\n")
+        image = FlashImage.from_file(None, hex_file, 'hex')
+        assert image.chunks == [(0x10, bytearray([1, 2, 3, 4]))]
+
+class TestBatchFlashProgrammer(object):
+    def test_program_all(self):
+        probes = [MockProbe("probe%d" % i) for i in range(4)]
+        progress = []
+        result = batch_program(probes, jobs=2, progress=lambda uid, fraction: progress.append(uid))
+
+        assert result.success
+        assert result.image_byte_count == len(IMAGE)
+        assert [board.unique_id for board in result.boards] == [p.unique_id for p in probes]
+        for probe, board in zip(probes, result.boards):
+            assert probe.board.target.memory[:len(IMAGE)] == IMAGE
+            assert board.byte_count == len(IMAGE)
+            assert board.target_type == 'mock'
+            assert probe.unique_id in progress
+            assert not probe.is_open
+
+    def test_failed_board(self):
+        probes = [MockProbe("good"), MockProbe("bad", fail=True)]
+        result = batch_program(probes)
+
+        assert not result.success
+        assert [board.unique_id for board in result.failed_boards] == ["bad"]
+        assert "unable to open probe" in result.failed_boards[0].error
+        assert probes[0].board.target.memory[:len(IMAGE)] == IMAGE
+
+        report = json.loads(json.dumps(result.to_dict()))
+        assert report['board_count'] == 2
+        assert report['failed_count'] == 1
+        assert [b['success'] for b in report['boards']] == [True, False]
+
+def test_progress_report():
+    output = six.StringIO()
+    report = BatchProgressReport(output, step=50)
+    for fraction in (0.0, 0.1, 0.5, 0.6, 1.0):
+        report("a", fraction)
+    report("b", 0.0)
+    assert output.getvalue().splitlines() == ["[a]   0%", "[a]  50%", "[a] 100%", "[b]   0%"]
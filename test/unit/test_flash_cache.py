@@ -0,0 +1,113 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.core.session import Session
+from pyocd.flash.cache import (FlashContentCache, page_hash)
+
+from .mockflash import (MockFlashTarget, PAGE_SIZE, SECTOR_SIZE, make_image, program_image)
+
+IMAGE_SIZE = 0x1000
+PAGE_COUNT = IMAGE_SIZE // PAGE_SIZE
+
+@pytest.fixture(scope='function')
+def target():
+    return MockFlashTarget()
+
+@pytest.fixture(scope='function')
+def cache_path(tmpdir):
+    return str(tmpdir.join("cache", "probe-target.json"))
+
+@pytest.fixture(scope='function')
+def cache(cache_path):
+    return FlashContentCache(cache_path, "probe-target")
+
+class TestFlashContentCache(object):
+    def test_round_trip(self, target, cache, cache_path):
+        region = target.flash_region
+        cache.begin_update(region)
+        cache.end_update(region, {0: 1, 0x100: 2})
+        assert FlashContentCache(cache_path, "probe-target").get_page_hashes(region) == {0: 1, 0x100: 2}
+
+    def test_mismatched_key(self, target, cache, cache_path):
+        cache.begin_update(target.flash_region)
+        cache.end_update(target.flash_region, {0: 1})
+        assert FlashContentCache(cache_path, "other").get_page_hashes(target.flash_region) == {}
+
+    def test_invalid_file(self, target, tmpdir):
+        path = tmpdir.join("bad.json")
+        path.write("{not json")
+        assert FlashContentCache(str(path), "probe-target").get_page_hashes(target.flash_region) == {}
+
+    def test_update(self, target, cache, cache_path):
+        region = target.flash_region
+        cache.begin_update(region)
+        cache.end_update(region, {0: 1, 0x100: 2, 0x400: 3})
+
+        # Hashes are not on disk while the region is being modified.
+        cache.begin_update(region)
+        assert FlashContentCache(cache_path, "probe-target").get_page_hashes(region) == {}
+
+        # Untouched pages are kept, erased pages are dropped.
+        cache.end_update(region, {0x100: 4}, [(0, SECTOR_SIZE)])
+        assert cache.get_page_hashes(region) == {0x100: 4, 0x400: 3}
+
+    def test_for_session(self, tmpdir):
+        assert FlashContentCache.for_session(Session(None)) is None
+        assert FlashContentCache.for_session(Session(None, flash_cache_dir=str(tmpdir))) is None
+
+class TestBuilderCache(object):
+    def test_records_hashes(self, target, cache):
+        data = make_image(IMAGE_SIZE)
+        program_image(target, data, content_cache=cache)
+        hashes = cache.get_page_hashes(target.flash_region)
+        assert len(hashes) == PAGE_COUNT
+        assert hashes[PAGE_SIZE] == page_hash(data[PAGE_SIZE:PAGE_SIZE * 2])
+
+    def test_skip_unchanged(self, target, cache):
+        data = make_image(IMAGE_SIZE)
+        program_image(target, data, content_cache=cache)
+        read_count = target.read_count
+        info = program_image(target, data, content_cache=cache)
+
+        assert info.cached_page_count == PAGE_COUNT
+        # Only the sentinel check was performed on the target.
+        assert target.flash.operations == [('crc', 0)]
+        assert target.read_count == read_count
+
+    def test_changed_page(self, target, cache):
+        data = make_image(IMAGE_SIZE)
+        program_image(target, data, content_cache=cache)
+        data[0x500] ^= 0xff
+        info = program_image(target, data, content_cache=cache)
+
+        assert info.cached_page_count == PAGE_COUNT - 1
+        assert target.flash.operation_count('erase_sector') == 1
+        assert target.memory[:IMAGE_SIZE] == bytearray(data)
+        assert cache.get_page_hashes(target.flash_region)[0x500] == page_hash(data[0x500:0x600])
+
+    def test_sentinel_mismatch(self, target, cache):
+        data = make_image(IMAGE_SIZE)
+        program_image(target, data, content_cache=cache)
+
+        # Modify the device behind the cache's back.
+        target.memory[0] ^= 0xff
+        info = program_image(target, data, content_cache=cache)
+
+        assert info.cached_page_count == 0
+        assert target.memory[:IMAGE_SIZE] == bytearray(data)
+        assert target.flash.operation_count('erase_sector') == 1
@@ -0,0 +1,83 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.flash.file_programmer import FileProgrammer
+
+from .mockflash import (MockFlashSession, PAGE_SIZE, SECTOR_SIZE, make_image, program_image)
+
+IMAGE_SIZE = 0x1000
+PAGE_COUNT = IMAGE_SIZE // PAGE_SIZE
+
+@pytest.fixture(scope='function')
+def session():
+    return MockFlashSession(hide_programming_progress=True)
+
+class TestDeltaProgramming(object):
+    def test_changed_sector(self, session):
+        baseline = make_image(IMAGE_SIZE)
+        program_image(session.target, baseline)
+
+        image = bytearray(baseline)
+        image[SECTOR_SIZE + 0x10] ^= 0xff
+        info = program_image(session.target, image, baseline)
+
+        flash = session.target.flash
+        assert info.baseline_page_count == PAGE_COUNT
+        assert flash.operations[0][0] == 'crc'
+        assert flash.operation_count('crc') == 1
+        assert flash.operation_count('erase_sector') == 1
+        assert ('erase_sector', SECTOR_SIZE) in flash.operations
+        assert flash.operation_count('program_page') == SECTOR_SIZE // PAGE_SIZE
+        assert session.target.read_count == 0
+        assert session.target.memory[:IMAGE_SIZE] == image
+
+    def test_baseline_mismatch(self, session):
+        baseline = make_image(IMAGE_SIZE)
+        program_image(session.target, make_image(IMAGE_SIZE, 1))
+
+        image = bytearray(baseline)
+        image[0x10] ^= 0xff
+        info = program_image(session.target, image, baseline)
+
+        # The baseline was rejected, so all pages were analyzed on the target.
+        assert info.baseline_page_count == 0
+        assert session.target.memory[:IMAGE_SIZE] == image
+
+    def test_partial_baseline(self, session):
+        # Only pages fully covered by the baseline are compared on the host.
+        baseline = make_image(IMAGE_SIZE)
+        program_image(session.target, baseline)
+        info = program_image(session.target, baseline, baseline[:PAGE_SIZE * 2 + 0x10])
+        assert info.baseline_page_count == 2
+        assert session.target.flash.operation_count('erase_sector') == 0
+
+    def test_file_programmer(self, session, tmpdir):
+        baseline = make_image(IMAGE_SIZE)
+        image = bytearray(baseline)
+        image[-1] ^= 0xff
+        baseline_path = tmpdir.join("baseline.bin")
+        baseline_path.write_binary(bytes(baseline))
+        image_path = tmpdir.join("image.bin")
+        image_path.write_binary(bytes(image))
+
+        FileProgrammer(session).program(str(baseline_path), base_address=0)
+        session.target.flash.operations = []
+        FileProgrammer(session).program(str(image_path), base_address=0, baseline=str(baseline_path))
+
+        assert session.target.flash.operation_count('erase_sector') == 1
+        assert session.target.memory[:IMAGE_SIZE] == image
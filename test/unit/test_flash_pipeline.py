@@ -0,0 +1,139 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+from timeit import default_timer as timer
+
+from pyocd.core.target import Target
+from pyocd.flash.flash import Flash
+
+from .mockflash import (MockFlashTarget, PAGE_SIZE, SECTOR_SIZE)
+
+IMAGE = [(i * 3) & 0xff for i in range(SECTOR_SIZE * 2)]
+WAIT = ('wait', None)
+
+@pytest.fixture(scope='function')
+def target():
+    return MockFlashTarget(page_buffer_count=3)
+
+def program(target, chip_erase):
+    builder = target.flash.get_flash_builder()
+    builder.add_data(0, IMAGE)
+    return builder.program(chip_erase=chip_erase)
+
+class TestPageBufferPipeline(object):
+    def test_sector_erase(self, target):
+        program(target, "sector")
+        ops = [op for op in target.flash.operations if op[0] != 'crc']
+
+        # A page buffer is loaded during each sector erase.
+        assert ops[:6] == [('erase_sector', 0), ('load', 0), WAIT,
+                            ('erase_sector', SECTOR_SIZE), ('load', PAGE_SIZE), WAIT]
+        # The free buffer is loaded while the first page is programmed.
+        assert ops[6:9] == [('program_page', 0), ('load', PAGE_SIZE * 2), WAIT]
+        assert target.flash.operation_count('program_page') == len(IMAGE) // PAGE_SIZE
+        assert target.flash.operation_count('load') == len(IMAGE) // PAGE_SIZE
+        assert target.memory[:len(IMAGE)] == bytearray(IMAGE)
+
+    def test_chip_erase(self, target):
+        program(target, "chip")
+        ops = target.flash.operations
+
+        # All page buffers are loaded during the chip erase.
+        assert ops[:5] == [('erase_all', 0), ('load', 0), ('load', PAGE_SIZE),
+                            ('load', PAGE_SIZE * 2), WAIT]
+        assert target.memory[:len(IMAGE)] == bytearray(IMAGE)
+
+    def test_unchanged(self, target):
+        program(target, "sector")
+        target.flash.operations = []
+        program(target, "sector")
+        assert target.flash.operation_count('program_page') == 0
+        assert target.flash.operation_count('load') == 0
+
+class AlgoTarget(object):
+    """! @brief Target on which every algo function runs for a fixed time."""
+
+    def __init__(self, duration):
+        self.duration = duration
+        self.poll_count = 0
+        self._end = 0
+
+    def write_core_registers_raw(self, reg_list, data_list):
+        pass
+
+    def resume(self):
+        self._end = timer() + self.duration
+
+    def get_state(self):
+        self.poll_count += 1
+        return Target.State.RUNNING if timer() < self._end else Target.State.HALTED
+
+    def read_core_register(self, reg):
+        return 0
+
+ALGO = {
+    'load_address': 0x20000000,
+    'instructions': [0xbe00be00] * 4,
+    'pc_erase_sector': 0x20000005,
+    'pc_program_page': 0x20000009,
+    'begin_stack': 0x20001000,
+    'begin_data': 0x20002000,
+    'static_base': 0x20000400,
+    'analyzer_supported': False,
+    }
+
+def test_adaptive_polling():
+    target = AlgoTarget(0.02)
+    flash = Flash(target, ALGO)
+    flash._active_operation = Flash.Operation.ERASE
+
+    flash.start_erase_sector(0)
+    assert flash.wait_for_completion() == 0
+    first_poll_count = target.poll_count
+
+    # The expected duration has been learned, so most of it is spent sleeping.
+    target.poll_count = 0
+    flash.start_erase_sector(0)
+    assert flash.wait_for_completion() == 0
+    assert target.poll_count < first_poll_count
+
+class TestAlgoHandover(object):
+    def test_take_over_target(self):
+        target = AlgoTarget(0)
+        first = Flash(target, ALGO)
+        second = Flash(target, ALGO)
+        assert second.shares_algo_with(first)
+        assert not second.shares_algo_with(Flash(target, dict(ALGO)))
+
+        first._did_prepare_target = True
+        first._duration_estimates[ALGO['pc_erase_sector']] = 0.01
+        second.take_over_target(first)
+        assert second._did_prepare_target
+        assert not first._did_prepare_target
+        assert second._duration_estimates[ALGO['pc_erase_sector']] == 0.01
+
+    @pytest.mark.parametrize(("cleanup", "reset", "reset_count"), [
+            (True, True, 1),
+            (True, False, 0),
+            (False, True, 0),
+            ])
+    def test_program_cleanup(self, target, cleanup, reset, reset_count):
+        builder = target.flash.get_flash_builder()
+        builder.add_data(0, IMAGE)
+        builder.program(chip_erase="sector", cleanup=cleanup, reset=reset)
+        assert target.reset_count == reset_count
+        assert target.memory[:len(IMAGE)] == bytearray(IMAGE)
@@ -0,0 +1,135 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import pytest
+
+from pyocd.core import exceptions
+from pyocd.flash.cache import page_hash
+from pyocd.flash.plan import FlashPlan
+
+from .mockflash import (MockFlashSession, PAGE_SIZE, SECTOR_SIZE)
+
+IMAGE = bytearray((i * 5) & 0xff for i in range(0x500))
+BASE = 0x80
+
+@pytest.fixture(scope='function')
+def session():
+    return MockFlashSession(hide_programming_progress=True)
+
+@pytest.fixture(scope='function')
+def plan(session):
+    return FlashPlan.compile(session, io.BytesIO(IMAGE), 'bin', chip_erase='sector', base_address=BASE)
+
+def program(session, plan, **kwargs):
+    session.target.flash.operations = []
+    return plan.program(session, **kwargs)[0]
+
+class TestFlashPlan(object):
+    def test_compile(self, plan):
+        assert plan.target_type == 'mock'
+        assert plan.byte_count == len(IMAGE)
+        region, = plan.regions
+        assert region.chunks == [(BASE, 0, len(IMAGE))]
+        # Only pages entirely covered by the image have hashes.
+        assert sorted(region.page_hashes) == [0x100, 0x200, 0x300, 0x400]
+        assert region.page_hashes[0x100] == page_hash(IMAGE[0x100 - BASE:0x200 - BASE])
+        assert region.chip_erase == 'sector'
+
+    def test_compile_layout(self, session, plan):
+        region, = plan.regions
+        flash = session.target.flash
+        # Both sectors touched by the image are recorded, with all of their pages.
+        assert [sector[0] for sector in region.sectors] == [0, SECTOR_SIZE]
+        assert [page[0] for page in region.pages] == list(range(0, 2 * SECTOR_SIZE, PAGE_SIZE))
+        assert region.sectors[1] == (SECTOR_SIZE, SECTOR_SIZE, flash.get_sector_info(SECTOR_SIZE).erase_weight)
+        assert region.pages[1] == (PAGE_SIZE, PAGE_SIZE, flash.get_page_info(PAGE_SIZE).program_weight)
+
+    def test_compile_erase_method(self, session):
+        def compile(base_address, chip_erase=None):
+            plan = FlashPlan.compile(session, io.BytesIO(IMAGE), 'bin', chip_erase=chip_erase,
+                        base_address=base_address)
+            return plan.regions[0].chip_erase
+
+        # Whether chip erase is faster depends on the flash contents when programming.
+        assert compile(BASE, 'auto') == 'auto'
+        # Chip erase is never chosen automatically for an image after the start of flash.
+        assert compile(SECTOR_SIZE, 'auto') == 'sector'
+        assert compile(SECTOR_SIZE, 'chip') == 'chip'
+        # The session option is used by default.
+        assert compile(BASE) == 'sector'
+
+    def test_save_load(self, plan, tmpdir):
+        path = str(tmpdir.join("image.plan"))
+        plan.save(path)
+        loaded = FlashPlan.load(path)
+
+        assert loaded.target_type == plan.target_type
+        region, = loaded.regions
+        assert region.to_dict() == plan.regions[0].to_dict()
+        (address, data), = loaded.get_region_data(region)
+        assert address == BASE
+        assert isinstance(data, memoryview)
+        assert bytearray(data) == IMAGE
+
+    def test_invalid_file(self, tmpdir):
+        path = tmpdir.join("bad.plan")
+        path.write_binary(b"not a plan at all")
+        with pytest.raises(ValueError):
+            FlashPlan.load(str(path))
+
+    def test_program(self, session, plan, tmpdir):
+        path = str(tmpdir.join("image.plan"))
+        plan.save(path)
+        program(session, FlashPlan.load(path))
+        assert session.target.memory[BASE:BASE + len(IMAGE)] == IMAGE
+
+    def test_recorded_hashes_used(self, session, plan):
+        program(session, plan)
+        info = program(session, plan, trust_crc=True)
+        assert info.program_page_count == 0
+
+        # A wrong recorded hash makes the page look changed, so the hash is not recomputed.
+        plan.regions[0].page_hashes[0x200] ^= 1
+        info = program(session, plan, trust_crc=True)
+        assert info.program_page_count > 0
+
+    def test_recorded_layout_used(self, session, plan, monkeypatch):
+        def fail(addr):
+            raise AssertionError("layout not recorded for 0x%08x" % addr)
+        monkeypatch.setattr(session.target.flash, 'get_sector_info', fail)
+        monkeypatch.setattr(session.target.flash, 'get_page_info', fail)
+        program(session, plan)
+        assert session.target.memory[BASE:BASE + len(IMAGE)] == IMAGE
+
+    def test_recorded_erase_method_used(self, session, plan):
+        plan.regions[0].chip_erase = 'chip'
+        program(session, plan)
+        assert session.target.flash.operation_count('erase_all') == 1
+
+        # An explicit erase method overrides the recorded one.
+        program(session, plan, chip_erase='sector')
+        assert session.target.flash.operation_count('erase_all') == 0
+
+    def test_target_mismatch(self, session, plan):
+        plan.target_type = 'other'
+        with pytest.raises(exceptions.TargetSupportError):
+            plan.program(session)
+
+        plan.target_type = 'mock'
+        plan.regions[0].page_size = PAGE_SIZE * 2
+        with pytest.raises(exceptions.TargetSupportError):
+            plan.program(session)
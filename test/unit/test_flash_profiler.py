@@ -0,0 +1,164 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import pytest
+from time import sleep
+from timeit import default_timer as timer
+
+from pyocd.core.target import Target
+from pyocd.flash.flash import Flash
+from pyocd.flash.loader import FlashLoader
+from pyocd.flash.profiler import (FlashProfiler, OperationStats, profiled)
+
+from .mockflash import (MockFlash, MockFlashSession, MockFlashTarget, SECTOR_SIZE)
+from .test_flash_pipeline import (AlgoTarget, ALGO)
+
+class TimedFlashTarget(MockFlashTarget):
+    """! @brief Flash target on which each asynchronous algo operation runs for a fixed time."""
+
+    ALGO_DURATION = 0.004
+
+    def __init__(self):
+        super(TimedFlashTarget, self).__init__(page_buffer_count=3)
+        self._end = 0
+        self.flash = TimedFlash(self)
+        self.flash.region = self.flash_region
+        self.flash_region.flash = self.flash
+
+    def resume(self):
+        self._end = timer() + self.ALGO_DURATION
+
+    def get_state(self):
+        return Target.State.RUNNING if timer() < self._end else Target.State.HALTED
+
+    def read_core_register(self, reg):
+        return 0
+
+class TimedFlash(MockFlash):
+    """! @brief Mock flash whose asynchronous operations run an algo that takes time.
+
+    Page buffer loads take LOAD_DURATION, and the real wait_for_completion() waits for the algo.
+    """
+
+    LOAD_DURATION = 0.002
+
+    def __init__(self, target):
+        super(TimedFlash, self).__init__(target, page_buffer_count=3)
+
+    def _start_algo(self):
+        self.target.resume()
+        self._call_pc = 0
+        self._call_start = timer()
+
+    def start_erase_sector(self, address):
+        self.erase_sector(address)
+        self._start_algo()
+
+    def start_erase_all(self):
+        self.erase_all()
+        self._start_algo()
+
+    @profiled('load_page_buffer')
+    def load_page_buffer(self, buffer_number, address, bytes):
+        super(TimedFlash, self).load_page_buffer(buffer_number, address, bytes)
+        sleep(self.LOAD_DURATION)
+
+    def start_program_page_with_buffer(self, buffer_number, address):
+        super(TimedFlash, self).start_program_page_with_buffer(buffer_number, address)
+        self._start_algo()
+
+    wait_for_completion = Flash.wait_for_completion
+
+class TestOperationStats(object):
+    def test_histogram(self):
+        stats = OperationStats('op')
+        for duration in (0.00005, 0.0001, 0.00015, 0.0003, 1000.0):
+            stats.add(duration)
+        assert stats.count == 5
+        assert stats.min_time == 0.00005
+        assert stats.max_time == 1000.0
+        assert stats.histogram == [(0.0001, 2), (0.0002, 1), (0.0004, 1), (None, 1)]
+
+class TestFlashProfiler(object):
+    def test_nesting(self):
+        profiler = FlashProfiler()
+        with profiler.measure('outer'):
+            with profiler.measure('inner'):
+                pass
+            profiler.record(FlashProfiler.EXECUTE, 0.0)
+        assert [stats.name for stats in profiler.operations] == ['execute', 'inner', 'outer']
+        assert profiler.operation_time == profiler.get_stats('outer').total_time
+
+    def test_algo_operations(self):
+        profiler = FlashProfiler()
+        flash = Flash(AlgoTarget(0.002), ALGO)
+        flash.profiler = profiler
+        flash._active_operation = Flash.Operation.ERASE
+        flash.erase_sector(0)
+        flash.erase_sector(0)
+
+        assert profiler.get_stats('erase_sector').count == 2
+        assert profiler.get_stats('start_erase_sector').count == 2
+        assert profiler.get_stats(FlashProfiler.EXECUTE).count == 2
+        assert profiler.execute_time >= 0.004
+        assert profiler.operation_time == pytest.approx(profiler.get_stats('erase_sector').total_time)
+
+        summary = profiler.get_summary(total_time=profiler.operation_time + 1.0)
+        assert summary['overhead_time'] == pytest.approx(1.0)
+        assert summary['wait_time'] == profiler.get_stats(FlashProfiler.WAIT).total_time
+        assert summary['transfer_time'] == pytest.approx(profiler.operation_time - profiler.wait_time)
+        json.dumps(profiler.to_dict())
+        assert "erase_sector" in profiler.format_report()
+
+    def test_loader_detaches(self):
+        session = MockFlashSession(hide_programming_progress=True)
+        profiler = FlashProfiler()
+        flash = session.target.flash
+        attached = []
+        program_page = flash.program_page
+        def recording_program_page(address, bytes):
+            attached.append(flash.profiler)
+            program_page(address, bytes)
+        flash.program_page = recording_program_page
+
+        FlashLoader(session, chip_erase="sector", profiler=profiler).add_data(0, [1] * 0x100).commit()
+        assert attached and all(p is profiler for p in attached)
+        assert flash.profiler is None
+
+    @pytest.mark.parametrize("chip_erase", ["sector", "chip"])
+    def test_double_buffered_summary(self, chip_erase):
+        target = TimedFlashTarget()
+        profiler = FlashProfiler()
+        target.flash.profiler = profiler
+        builder = target.flash.get_flash_builder()
+        builder.add_data(0, [0x5a] * (SECTOR_SIZE * 2))
+        start = timer()
+        builder.program(chip_erase=chip_erase)
+        total_time = timer() - start
+
+        # The pipelined waits for the algo are operations of their own.
+        waits = profiler.get_stats(FlashProfiler.WAIT)
+        assert waits.count == profiler.get_stats(FlashProfiler.EXECUTE).count
+        loads = profiler.get_stats('load_page_buffer')
+        assert loads.count == 8
+
+        summary = profiler.get_summary(total_time)
+        assert summary['transfer_time'] >= loads.total_time
+        # Algo time is not counted again as host overhead.
+        assert summary['overhead_time'] < summary['wait_time']
+        assert (summary['wait_time'] + summary['transfer_time'] + summary['overhead_time']
+                == pytest.approx(total_time))
@@ -0,0 +1,98 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.core.exceptions import FlashProgramFailure
+from pyocd.flash.builder import FlashBuilder
+
+from .mockflash import (MockFlashSession, PAGE_SIZE, SECTOR_SIZE, make_image, program_image)
+
+IMAGE_SIZE = 0x1800
+PAGE_COUNT = IMAGE_SIZE // PAGE_SIZE
+
+@pytest.fixture(scope='function')
+def session():
+    return MockFlashSession(hide_programming_progress=True, flash_verify=True,
+                            flash_verify_chunk_size=0x1000)
+
+class FakePage(object):
+    def __init__(self, addr, size=PAGE_SIZE):
+        self.addr = addr
+        self.size = size
+
+def block_ranges(blocks):
+    return [(block[0].addr, sum(page.size for page in block)) for block in blocks]
+
+class TestVerifyBlocks(object):
+    def test_aligned(self):
+        pages = [FakePage(addr) for addr in range(0, 0x1800, PAGE_SIZE)]
+        assert block_ranges(FlashBuilder._get_verify_blocks(pages, 0x1000)) == [(0, 0x1000), (0x1000, 0x800)]
+
+    def test_unaligned_and_gaps(self):
+        addrs = [0x100, 0x200, 0x300, 0x400, 0x500, 0x700]
+        pages = [FakePage(addr) for addr in addrs]
+        assert block_ranges(FlashBuilder._get_verify_blocks(pages, 0x3000)) == [
+            (0x100, 0x100), (0x200, 0x200), (0x400, 0x200), (0x700, 0x100)]
+
+class TestVerify(object):
+    def test_crc_verify(self, session):
+        info = program_image(session.target, make_image(IMAGE_SIZE))
+        flash = session.target.flash
+
+        assert info.verify_type == FlashBuilder.FLASH_ANALYSIS_CRC32
+        assert info.verify_byte_count == IMAGE_SIZE
+        assert info.verify_read_page_count == 0
+        assert info.verify_time is not None
+        # One CRC call for analysis, one for the two verify blocks.
+        assert flash.operation_count('crc') == 2
+        assert session.target.read_count == 0
+
+    def test_unchanged_pages_not_verified(self, session):
+        image = make_image(IMAGE_SIZE)
+        program_image(session.target, image)
+        image[SECTOR_SIZE] ^= 0xff
+        info = program_image(session.target, image)
+        assert info.verify_byte_count == SECTOR_SIZE
+
+    def test_mismatch(self, session):
+        flash = session.target.flash
+        bad_addr = 0x1230
+        program_page = flash.program_page
+        def faulty_program_page(address, bytes):
+            program_page(address, bytes)
+            if address <= bad_addr < address + PAGE_SIZE:
+                session.target.memory[bad_addr] ^= 0x01
+        flash.program_page = faulty_program_page
+
+        with pytest.raises(FlashProgramFailure) as excinfo:
+            program_image(session.target, make_image(IMAGE_SIZE))
+        assert excinfo.value.address == bad_addr
+        # Only the failing page was read back.
+        assert session.target.read_count == 1
+
+    def test_read_verify(self, session):
+        flash = session.target.flash
+        flash.use_analyzer = False
+        info = program_image(session.target, make_image(IMAGE_SIZE))
+        assert info.verify_type == FlashBuilder.FLASH_VERIFY_READ
+        assert info.verify_read_page_count == PAGE_COUNT
+
+    def test_disabled(self):
+        session = MockFlashSession(hide_programming_progress=True)
+        info = program_image(session.target, make_image(IMAGE_SIZE))
+        assert info.verify_time is None
+        assert session.target.flash.operation_count('crc') == 1
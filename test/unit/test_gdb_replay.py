@@ -0,0 +1,87 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import pytest
+
+from pyocd.gdbserver.transcript import (
+    RECEIVED,
+    SENT,
+    TranscriptWriter,
+    read_transcript,
+)
+from .gdb_replay import (
+    command_name,
+    find_regressions,
+    replay,
+)
+
+SESSION_TRANSCRIPT = os.path.join(os.path.dirname(__file__), "data", "gdb_session.transcript")
+
+class TestTranscript(object):
+    def test_round_trip(self, tmpdir):
+        path = str(tmpdir.join("test.transcript"))
+        packets = [b'$qSupported#37', b'\x03', b'$X0,4:\x00}\x5c\xff#00', b'$OK#9a']
+        writer = TranscriptWriter(path)
+        writer.received(packets[0])
+        writer.received(packets[1])
+        writer.received(packets[2])
+        writer.sent(packets[3])
+        writer.close()
+
+        entries = read_transcript(path)
+        assert [e.packet for e in entries] == packets
+        assert [e.direction for e in entries] == [RECEIVED, RECEIVED, RECEIVED, SENT]
+        assert all(a.timestamp <= b.timestamp for a, b in zip(entries, entries[1:]))
+
+    def test_invalid(self, tmpdir):
+        path = tmpdir.join("bad.transcript")
+        path.write("not a transcript\n")
+        with pytest.raises(ValueError):
+            read_transcript(str(path))
+
+class TestReplay(object):
+    def test_session(self):
+        result = replay(read_transcript(SESSION_TRANSCRIPT))
+        assert result.mismatches == []
+        assert result.packet_count == 32
+        assert result.stats['qXfer'].count == 2
+        assert result.stats['vCont'].count == 3
+
+    def test_mismatch(self):
+        entries = read_transcript(SESSION_TRANSCRIPT)
+        # Response to vMustReplyEmpty.
+        assert entries[3].packet == b'$#00'
+        entries[3] = entries[3]._replace(packet=b'$E01#a6')
+        result = replay(entries)
+        assert len(result.mismatches) == 1
+        assert result.mismatches[0][1:] == (b'$E01#a6', b'$#00')
+
+    @pytest.mark.parametrize(("packet", "name"), [
+            (b'$qXfer:features:read:target.xml:0,ffb#79', 'qXfer'),
+            (b'$qC#b4', 'qC'),
+            (b'$vCont?#49', 'vCont'),
+            (b'$m0,4#fd', 'm'),
+        ])
+    def test_command_name(self, packet, name):
+        assert command_name(packet) == name
+
+    def test_find_regressions(self):
+        result = replay(read_transcript(SESSION_TRANSCRIPT))
+        baseline = {name: 1.0 for name in result.stats}
+        assert find_regressions(result, baseline, 2.0) == []
+        baseline = {'qXfer': 1e-9}
+        assert [r[0] for r in find_regressions(result, baseline, 2.0, min_time=0)] == ['qXfer']
@@ -427,3 +427,12 @@ class TestMemoryMap:
         
 
 
+
+    def test_generation(self, memmap, ram_alias):
+        gen = memmap.generation
+        memmap.add_region(ram_alias)
+        assert memmap.generation == gen + 1
+        memmap.remove_region(ram_alias)
+        assert memmap.generation == gen + 2
+        memmap.remove_region(ram_alias)
+        assert memmap.generation == gen + 2
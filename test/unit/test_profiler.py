@@ -0,0 +1,122 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+import time
+from elftools.elf.elffile import ELFFile
+
+from pyocd.debug.elf.decoder import ElfSymbolDecoder
+from pyocd.rtos.freertos import FreeRTOSThreadProvider
+from pyocd.trace.events import TracePeriodicPC
+from pyocd.trace.profiler import (ThreadProfile, ThreadSampler, DWT_PCSR, PCSR_NO_SAMPLE,
+    SLEEPING, UNKNOWN_FUNCTION)
+
+from .mockrtos import (MockRTOSCore, MockRTOSTarget, MockSymbolProvider, RAM_START)
+from .test_dwarf_index import TEST_ELF
+from .test_rtos_scanner import SYMBOLS
+
+CURRENT_TCB = RAM_START + 0x10
+THREAD_1 = RAM_START + 0x100
+THREAD_2 = RAM_START + 0x200
+
+class PCSampleCore(MockRTOSCore):
+    """! @brief Mock core that returns the next of a sequence of PCs when DWT_PCSR is read."""
+
+    def __init__(self, pcs):
+        super(PCSampleCore, self).__init__()
+        self.pcs = list(pcs)
+
+    def _read_value(self, addr, size):
+        if addr == DWT_PCSR:
+            return self.pcs.pop(0)
+        return super(PCSampleCore, self)._read_value(addr, size)
+
+@pytest.fixture
+def symbol_decoder():
+    with open(TEST_ELF, 'rb') as f:
+        yield ElfSymbolDecoder(ELFFile(f))
+
+class TestThreadProfile(object):
+    def test_loads(self, symbol_decoder):
+        profile = ThreadProfile()
+        # main is at 0x0-0x9b and function_1 at 0x9c-0xa5.
+        for pc, thread in [(0x10, THREAD_1), (0x20, THREAD_1), (0x9c, THREAD_1), (0x10, THREAD_2),
+                    (None, THREAD_2), (0xfff0, None)]:
+            profile.add_sample(pc, thread)
+
+        assert profile.total == 6
+        assert profile.get_thread_loads() == [(THREAD_1, 3), (THREAD_2, 2), (None, 1)]
+        functions = profile.get_function_loads(symbol_decoder)
+        assert functions[THREAD_1] == [("main", 2), ("function_1", 1)]
+        assert sorted(functions[THREAD_2]) == sorted([("main", 1), (SLEEPING, 1)])
+        assert functions[None] == [(UNKNOWN_FUNCTION, 1)]
+        assert profile.get_function_loads()[THREAD_1] == [(UNKNOWN_FUNCTION, 3)]
+
+    def test_report(self, symbol_decoder):
+        profile = ThreadProfile()
+        assert profile.format_report() == "No samples"
+        profile.add_sample(0x10, THREAD_1)
+        profile.add_sample(0x9c, THREAD_1)
+        report = profile.format_report({THREAD_1: "idle"}, symbol_decoder).splitlines()
+        assert report == [
+                "2 samples",
+                "100.00% idle (0x20000100)",
+                "     50.00% main",
+                "     50.00% function_1",
+                ]
+
+class TestThreadSampler(object):
+    def test_sample(self):
+        core = PCSampleCore([0x10, PCSR_NO_SAMPLE, 0x20])
+        core.write32(CURRENT_TCB, THREAD_1)
+        profile = ThreadProfile()
+        sampler = ThreadSampler(core, profile, CURRENT_TCB)
+        sampler.sample()
+        # The current thread and PC are read in one round trip.
+        assert core.round_trips == 1
+        sampler.sample()
+        core.write32(CURRENT_TCB, THREAD_2)
+        sampler.sample()
+        assert (sampler.polls, sampler.missed) == (3, 1)
+        assert sorted(profile.get_thread_loads()) == [(THREAD_1, 1), (THREAD_2, 1)]
+
+    def test_trace_events(self):
+        core = PCSampleCore([])
+        core.write32(CURRENT_TCB, THREAD_2)
+        profile = ThreadProfile()
+        sampler = ThreadSampler(core, profile, CURRENT_TCB, read_pc=False)
+        sampler.sample()
+        assert sampler.current_thread == THREAD_2
+        sampler.receive(TracePeriodicPC(0x10))
+        sampler.receive(TracePeriodicPC(0))
+        assert sorted(profile.get_function_loads()[THREAD_2]) == sorted([(UNKNOWN_FUNCTION, 1), (SLEEPING, 1)])
+
+    def test_background(self):
+        core = PCSampleCore([0x10] * 10000)
+        profile = ThreadProfile()
+        sampler = ThreadSampler(core, profile, interval=0.001)
+        sampler.start()
+        time.sleep(0.05)
+        sampler.stop()
+        assert sampler.polls > 0
+        assert profile.total == sampler.polls
+
+def test_provider_address():
+    target = MockRTOSTarget()
+    provider = FreeRTOSThreadProvider(target)
+    assert provider.current_thread_address is None
+    provider.init(MockSymbolProvider(SYMBOLS))
+    assert provider.current_thread_address == SYMBOLS['pxCurrentTCB']
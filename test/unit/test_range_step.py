@@ -0,0 +1,366 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.core import exceptions
+from pyocd.core.memory_map import (MemoryMap, RamRegion)
+from pyocd.core.session import Session
+from pyocd.coresight.cortex_m import CortexM
+from pyocd.coresight.range_step import (
+    ThumbInstruction,
+    decode_thumb_instruction,
+    get_it_count,
+    RangeStepAnalyzer,
+)
+from pyocd.debug.breakpoints.software import SoftwareBreakpointProvider
+from pyocd.utility.conversion import u16le_list_to_byte_list
+
+def make_analyzer(start, halfwords):
+    return RangeStepAnalyzer(start, start + len(halfwords) * 2,
+        bytearray(u16le_list_to_byte_list(halfwords)))
+
+class TestDecode(object):
+    @pytest.mark.parametrize(("hw1", "hw2", "kind", "target"), [
+            (0x2000, None, ThumbInstruction.NORMAL, None),              # movs r0, #0
+            (0xd1fc, None, ThumbInstruction.CONDITIONAL_BRANCH, 0x0ffc), # bne .-4
+            (0xe7fe, None, ThumbInstruction.BRANCH, 0x1000),            # b .
+            (0xb110, None, ThumbInstruction.CONDITIONAL_BRANCH, 0x1008), # cbz r0, .+8
+            (0x4770, None, ThumbInstruction.UNKNOWN, None),             # bx lr
+            (0xbd10, None, ThumbInstruction.UNKNOWN, None),             # pop {r4, pc}
+            (0x4687, None, ThumbInstruction.UNKNOWN, None),             # mov pc, r0
+            (0x4601, None, ThumbInstruction.NORMAL, None),              # mov r1, r0
+            (0xdf00, None, ThumbInstruction.UNKNOWN, None),             # svc #0
+            (0xbe00, None, ThumbInstruction.UNKNOWN, None),             # bkpt #0
+            (0xf000, 0xfffe, ThumbInstruction.CALL, 0x2000),            # bl 0x2000
+            (0xf7ff, 0xbffe, ThumbInstruction.BRANCH, 0x1000),          # b.w .
+            (0xf000, 0x8080, ThumbInstruction.CONDITIONAL_BRANCH, 0x1104), # beq.w .+0x104
+            (0xf3bf, 0x8f4f, ThumbInstruction.NORMAL, None),            # dsb sy
+            (0xe8df, 0xf000, ThumbInstruction.UNKNOWN, None),           # tbb [pc, r0]
+            (0xe8bd, 0x8010, ThumbInstruction.UNKNOWN, None),           # pop.w {r4, pc}
+            (0xf85d, 0xfb04, ThumbInstruction.UNKNOWN, None),           # ldr.w pc, [sp], #4
+            (0xf8d0, 0x1004, ThumbInstruction.NORMAL, None),            # ldr.w r1, [r0, #4]
+        ])
+    def test_decode(self, hw1, hw2, kind, target):
+        instr = decode_thumb_instruction(0x1000, hw1, hw2)
+        assert instr.kind == kind
+        assert instr.size == (2 if hw2 is None else 4)
+        assert instr.target == target
+
+    @pytest.mark.parametrize(("hw1", "it_count"), [
+            (0xbf08, 1),    # it eq
+            (0xbf0c, 2),    # ite eq
+            (0xbf1e, 3),    # ittt ne
+            (0xbf01, 4),    # itttt eq
+            (0xbf00, 0),    # nop
+            (0xbf30, 0),    # wfi
+        ])
+    def test_decode_it(self, hw1, it_count):
+        instr = decode_thumb_instruction(0x1000, hw1)
+        assert instr.kind == ThumbInstruction.NORMAL
+        assert instr.it_count == it_count
+
+    @pytest.mark.parametrize(("xpsr", "it_count"), [
+            (0x01000000, 0),    # Thumb bit only
+            (0x01000800, 1),    # IT[3:0] = 0b1000
+            (0x01000400, 2),    # IT[3:0] = 0b0100
+            (0x05000000, 3),    # IT[3:0] = 0b0010
+            (0x07000c00, 4),    # IT[3:0] = 0b1111
+        ])
+    def test_it_count(self, xpsr, it_count):
+        assert get_it_count(xpsr) == it_count
+
+class TestRangeStepAnalyzer(object):
+    def test_fall_through(self):
+        a = make_analyzer(0x1000, [0x2000, 0x3001, 0x280a])
+        plan = a.get_plan(0x1000)
+        assert plan.exits == {0x1006}
+        assert plan.stops == set()
+
+    def test_loop_call_return(self):
+        a = make_analyzer(0x1000, [
+                0x2000,         # 1000: movs r0, #0
+                0x3001,         # 1002: adds r0, #1
+                0x280a,         # 1004: cmp r0, #10
+                0xd1fc,         # 1006: bne 0x1002
+                0xf000, 0xfffa, # 1008: bl 0x2000
+                0x4770,         # 100c: bx lr
+                0xf000,         # 100e: literal data
+                ])
+        # The return after the call is not reached without leaving the range.
+        plan = a.get_plan(0x1000)
+        assert plan.exits == {0x2000}
+        assert plan.stops == set()
+
+        plan = a.get_plan(0x1006)
+        assert plan.addresses == {0x2000}
+
+        plan = a.get_plan(0x100c)
+        assert plan.exits == set()
+        assert plan.stops == {0x100c}
+
+    def test_plan_cached(self):
+        a = make_analyzer(0x1000, [0x2000, 0x3001])
+        assert a.get_plan(0x1000) is a.get_plan(0x1000)
+        assert a.get_plan(0x1002).exits == {0x1004}
+
+    def test_it_block_branch(self):
+        a = make_analyzer(0x1000, [
+                0x2800,         # 1000: cmp r0, #0
+                0xbf08,         # 1002: it eq
+                0xe7fa,         # 1004: beq 0x0ffc
+                0x3001,         # 1006: adds r0, #1
+                0xbf18,         # 1008: it ne
+                0xf000, 0xfffa, # 100a: blne 0x2002
+                0x2000,         # 100e: movs r0, #0
+                ])
+        # The branch and call that end IT blocks may fall through.
+        plan = a.get_plan(0x1000)
+        assert plan.exits == {0x0ffc, 0x1010, 0x2002}
+        assert plan.stops == set()
+
+        # Without the IT state, the branch is unconditional.
+        assert a.get_plan(0x1004).exits == {0x0ffc}
+        assert a.get_plan(0x1004, 1).exits == {0x0ffc, 0x1010, 0x2002}
+
+    def test_truncated_instruction(self):
+        a = make_analyzer(0x1000, [0x2000, 0xf000])
+        plan = a.get_plan(0x1000)
+        assert plan.exits == set()
+        assert plan.stops == {0x1002}
+
+class MockAP(object):
+    def __init__(self):
+        self.memory = bytearray(0x100)
+
+    def write_memory(self, addr, value, transfer_size=32):
+        pass
+
+    def write_memory_block8(self, addr, data):
+        pass
+
+    def read_memory_block8(self, addr, size):
+        return list(self.memory[addr:addr + size])
+
+class TestRangeStepCache(object):
+    @pytest.mark.parametrize(("addr", "transfer_size", "invalidated"), [
+            (0x1c, 32, True),
+            (0x0c, 32, False),
+            (0x0f, 8, False),
+            (0x0e, 16, False),
+            (0x0f, 16, True),
+        ])
+    def test_write_invalidates(self, addr, transfer_size, invalidated):
+        core = CortexM(Session(None, no_config=True), MockAP())
+        cache = core._range_step_cache
+        analyzer = cache.get_analyzer(0x10, 0x20)
+        core.write_memory(addr, 0, transfer_size)
+        assert (cache.get_analyzer(0x10, 0x20) is not analyzer) == invalidated
+
+    def test_block_write_invalidates(self):
+        core = CortexM(Session(None, no_config=True), MockAP())
+        cache = core._range_step_cache
+        analyzer = cache.get_analyzer(0x10, 0x20)
+        core.write_memory_block8(0x08, [0] * 8)
+        assert cache.get_analyzer(0x10, 0x20) is analyzer
+        # Writing the code that is already there keeps the range.
+        core.write_memory_block8(0x08, [0] * 16)
+        assert cache.get_analyzer(0x10, 0x20) is analyzer
+        core.write_memory_block8(0x08, [1] * 9)
+        assert cache.get_analyzer(0x10, 0x20) is not analyzer
+
+RAM_BASE = 0x20000000
+
+## Loop in RAM: [RAM_BASE, RAM_BASE + 8) counts to 3, and the bx lr at RAM_BASE + 8 can't be analyzed.
+LOOP_CODE = [
+        0x2000,         # 0: movs r0, #0
+        0x3001,         # 2: adds r0, #1
+        0x2803,         # 4: cmp r0, #3
+        0xd1fc,         # 6: bne 2
+        0x4770,         # 8: bx lr
+        ]
+
+## PCs the loop executes, followed by the return address.
+LOOP_PATH = [0, 2, 4, 6, 2, 4, 6, 2, 4, 6, 8, 0x40]
+
+class SimulatedAP(object):
+    """! @brief AP with RAM and enough of the debug registers to step and run a core.
+
+    The core follows a fixed path of PCs, one per instruction. When run, it halts on a BKPT
+    instruction in RAM, or with vector catch at a PC listed in _faults_.
+    """
+
+    def __init__(self, path, faults=None):
+        self.ram = bytearray(0x100)
+        self.ram[:len(LOOP_CODE) * 2] = bytearray(u16le_list_to_byte_list(LOOP_CODE))
+        self.set_path(path)
+        self.faults = faults or {}
+        self.halted = True
+        self.dfsr = 0
+        self.demcr = 0x01000000
+        self.run_demcrs = []
+        self.steps = 0
+        self.fail_dhcsr_read = False
+        self._reg = 0
+
+    def set_path(self, path):
+        self._path = iter(RAM_BASE + offset for offset in path)
+        self.pc = next(self._path)
+
+    def _halfword(self, addr):
+        offset = addr - RAM_BASE
+        return self.ram[offset] | (self.ram[offset + 1] << 8)
+
+    def _run(self):
+        self.run_demcrs.append(self.demcr)
+        while True:
+            if self._halfword(self.pc) == SoftwareBreakpointProvider.BKPT_INSTR:
+                self.dfsr |= CortexM.DFSR_BKPT
+                break
+            if self.pc in self.faults and self.demcr & CortexM.DEMCR_VC_HARDERR:
+                self.pc = self.faults[self.pc]
+                self.dfsr |= CortexM.DFSR_VCATCH
+                break
+            self.pc = next(self._path)
+
+    def write_memory(self, addr, value, transfer_size=32):
+        if addr == CortexM.DHCSR:
+            if value & CortexM.C_HALT:
+                self.halted = True
+            elif value & CortexM.C_STEP:
+                self.pc = next(self._path)
+                self.steps += 1
+                self.dfsr |= CortexM.DFSR_HALTED
+            else:
+                self._run()
+        elif addr == CortexM.DFSR:
+            self.dfsr &= ~value
+        elif addr == CortexM.DEMCR:
+            self.demcr = value
+        elif addr == CortexM.DCRSR:
+            self._reg = value
+
+    def read_memory(self, addr, transfer_size=32, now=True):
+        if addr == CortexM.DHCSR:
+            if self.fail_dhcsr_read:
+                self.fail_dhcsr_read = False
+                raise exceptions.TransferError()
+            value = CortexM.C_DEBUGEN | CortexM.C_HALT | CortexM.S_HALT | CortexM.S_REGRDY
+        elif addr == CortexM.DFSR:
+            value = self.dfsr
+        elif addr == CortexM.DEMCR:
+            value = self.demcr
+        elif addr == CortexM.DCRDR:
+            value = {15: self.pc, 16: 0x01000000}.get(self._reg, 0)
+        else:
+            value = 0
+        return value if now else (lambda: value)
+
+    def write_memory_block8(self, addr, data):
+        offset = addr - RAM_BASE
+        self.ram[offset:offset + len(data)] = bytearray(data)
+
+    def read_memory_block8(self, addr, size):
+        offset = addr - RAM_BASE
+        return list(self.ram[offset:offset + size])
+
+class SimulatedCortexM(CortexM):
+    def flush(self):
+        pass
+
+def make_core(path=LOOP_PATH, faults=None):
+    ap = SimulatedAP(path, faults)
+    memory_map = MemoryMap(RamRegion(start=RAM_BASE, length=len(ap.ram)))
+    return SimulatedCortexM(Session(None, no_config=True), ap, memory_map), ap
+
+class TestRangeStep(object):
+    def check_restored(self, core, ap):
+        assert list(core.bp_manager.get_breakpoints()) == []
+        assert ap.ram[:len(LOOP_CODE) * 2] == bytearray(u16le_list_to_byte_list(LOOP_CODE))
+        assert ap.demcr == 0x01000000
+
+    def test_exit(self):
+        core, ap = make_core()
+        core.step(start=RAM_BASE, end=RAM_BASE + 8)
+        assert ap.pc == RAM_BASE + 8
+        # One step to leave the entry, then a single run to the exit.
+        assert ap.steps == 1
+        assert len(ap.run_demcrs) == 1
+        # Faults are caught with vector catch while running.
+        assert ap.run_demcrs[0] & CortexM.DEMCR_VC_HARDERR
+        self.check_restored(core, ap)
+
+    def test_stop(self):
+        core, ap = make_core()
+        core.step(start=RAM_BASE, end=RAM_BASE + 10)
+        # The run halts before the bx lr, which is then single stepped.
+        assert ap.pc == RAM_BASE + 0x40
+        assert ap.steps == 2
+        assert len(ap.run_demcrs) == 1
+        self.check_restored(core, ap)
+
+    def test_user_breakpoint(self):
+        core, ap = make_core()
+        core.set_breakpoint(RAM_BASE + 4)
+        core.step(start=RAM_BASE, end=RAM_BASE + 8)
+        assert ap.pc == RAM_BASE + 4
+        assert ap.dfsr & CortexM.DFSR_BKPT
+        # Only the user's breakpoint remains.
+        assert list(core.bp_manager.get_breakpoints()) == [RAM_BASE + 4]
+        assert ap._halfword(RAM_BASE + 4) == SoftwareBreakpointProvider.BKPT_INSTR
+        assert ap._halfword(RAM_BASE + 8) == LOOP_CODE[4]
+        assert ap.demcr == 0x01000000
+
+    def test_vector_catch(self):
+        core, ap = make_core(faults={RAM_BASE + 4: RAM_BASE + 0x80})
+        core.step(start=RAM_BASE, end=RAM_BASE + 8)
+        assert ap.pc == RAM_BASE + 0x80
+        assert ap.dfsr & CortexM.DFSR_VCATCH
+        self.check_restored(core, ap)
+
+    def test_breakpoint_failure(self, monkeypatch):
+        core, ap = make_core()
+        monkeypatch.setattr(core.bp_manager, 'set_breakpoint', lambda addr, type=None: False)
+        core.step(start=RAM_BASE, end=RAM_BASE + 8)
+        # The whole loop is single stepped.
+        assert ap.pc == RAM_BASE + 8
+        assert ap.steps == 10
+        assert ap.run_demcrs == []
+        self.check_restored(core, ap)
+
+    def test_breakpoints_keep_cache(self):
+        core, ap = make_core()
+        core.step(start=RAM_BASE, end=RAM_BASE + 10)
+        analyzer = core._range_step_cache.get_analyzer(RAM_BASE, RAM_BASE + 10)
+
+        # Inserting and removing software breakpoints doesn't discard the analyzed code.
+        ap.set_path(LOOP_PATH)
+        core.step(start=RAM_BASE, end=RAM_BASE + 10)
+        assert ap.pc == RAM_BASE + 0x40
+        assert core._range_step_cache.get_analyzer(RAM_BASE, RAM_BASE + 10) is analyzer
+
+        core.write_memory_block8(RAM_BASE + 2, [0x01, 0x31, 0x00, 0xbf])
+        assert core._range_step_cache.get_analyzer(RAM_BASE, RAM_BASE + 10) is not analyzer
+
+    def test_error_while_running(self):
+        core, ap = make_core()
+        core.step(start=RAM_BASE, end=RAM_BASE + 8)
+        ap.fail_dhcsr_read = True
+        with pytest.raises(exceptions.TransferError):
+            core._run_to_range_exit(core._range_step_cache.get_analyzer(RAM_BASE, RAM_BASE + 8)
+                        .get_plan(RAM_BASE), CortexM.DBGKEY | CortexM.C_DEBUGEN | CortexM.C_STEP)
+        # The temporary breakpoints and DEMCR are restored.
+        self.check_restored(core, ap)
@@ -0,0 +1,55 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.core import exceptions
+from pyocd.rtos.common import StructLayout
+
+from .mockrtos import (MockRTOSTarget, RAM_START, RAM_SIZE)
+
+@pytest.fixture
+def core():
+    return MockRTOSTarget().core
+
+class TestStructLayout(object):
+    LAYOUT = StructLayout([
+            ('sp', 0, "I"),
+            ('state', 5, "B"),
+            ('name', 8, "4s"),
+            ('priority', 12, "H"),
+            ])
+
+    def test_unpack(self):
+        data = bytearray(b"\x00\x10\x00\x20\x00\x03\x00\x00abcd\x07\x00")
+        assert self.LAYOUT.size == 14
+        assert self.LAYOUT.unpack(data) == {'sp': 0x20001000, 'state': 3, 'name': b"abcd", 'priority': 7}
+        assert self.LAYOUT.unpack(list(data), ('priority',)) == {'priority': 7}
+
+    def test_read(self, core):
+        core.ram[0x105] = 3
+        core.write_memory(RAM_START + 0x10c, 7, 16)
+        assert self.LAYOUT.read(core, RAM_START + 0x100, ('priority', 'state')) == {'state': 3, 'priority': 7}
+        # Only the span covering the fields is read.
+        assert core.block_reads == [(RAM_START + 0x105, 9)]
+
+        with pytest.raises(exceptions.TransferError):
+            self.LAYOUT.read(core, RAM_START + RAM_SIZE - 4)
+
+    def test_overlap(self):
+        layout = StructLayout([('a', 0, "I"), ('b', 2, "B")])
+        with pytest.raises(ValueError):
+            layout.unpack(bytearray(4))
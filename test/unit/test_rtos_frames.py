@@ -0,0 +1,76 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.core import exceptions
+from pyocd.rtos import freertos
+from pyocd.rtos.common import StackFrameCache
+from pyocd.rtos.freertos import FreeRTOSThreadProvider
+
+from .mockrtos import (MockRTOSTarget, MockSymbolProvider, RAM_START)
+from .test_rtos_scanner import (make_freertos, SYMBOLS)
+
+STACK = RAM_START + 0x2000
+
+@pytest.fixture
+def target():
+    return MockRTOSTarget()
+
+class TestStackFrameCache(object):
+    def test_reuse(self, target):
+        core = target.core
+        cache = StackFrameCache(core, core)
+        cache.get_frame(STACK, 0x40)
+        cache.get_frame(STACK, 0x20)
+        assert core.block_reads == [(STACK, 0x40)]
+
+        # A larger frame, a different address, or running the target cause a new read.
+        cache.get_frame(STACK, 0x80)
+        cache.get_frame(STACK + 4, 0x80)
+        core.run_token += 1
+        cache.get_frame(STACK + 4, 0x80)
+        assert len(core.block_reads) == 4
+
+    def test_fault(self, target):
+        target.core.faults.add(STACK + 0x10)
+        cache = StackFrameCache(target.core, target.core)
+        with pytest.raises(exceptions.TransferError):
+            cache.get_frame(STACK, 0x40)
+
+class TestFreeRTOSFrame(object):
+    def test_registers(self, target):
+        core = target.core
+        make_freertos(core, {'xDelayedTaskList1': [("main", 1), ("sleeper", 0)]}, "main")
+        provider = FreeRTOSThreadProvider(target)
+        assert provider.init(MockSymbolProvider(SYMBOLS))
+        provider.read_from_target = True
+        provider.update_threads()
+
+        sleeper = [t for t in provider.get_threads() if t.name == "sleeper"][0]
+        core.write32(sleeper.unique_id + freertos.THREAD_STACK_POINTER_OFFSET, STACK)
+        for offset in range(0, 0x40, 4):
+            core.write32(STACK + offset, 0x1000 + offset)
+        core.run_token += 1
+        provider.update_threads()
+
+        del core.block_reads[:]
+        context = sleeper.context
+        values = [context.read_core_registers_raw([reg])[0] for reg in ['r4', 'r11', 'r0', 'pc']]
+        assert values == [0x1000, 0x101c, 0x1020, 0x1038]
+        assert context.read_core_registers_raw(['sp']) == [STACK + 0x40]
+        # The frame was read once for all registers.
+        assert core.block_reads == [(STACK, 0x40)]
@@ -0,0 +1,285 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.debug.cache import CachingDebugContext
+from pyocd.rtos import argon
+from pyocd.rtos.argon import (ArgonThread, ArgonThreadProvider)
+from pyocd.rtos.rtx5 import (RTXTargetThread, RTX5ThreadProvider)
+from pyocd.rtos.zephyr import (ZephyrThread, ZephyrThreadProvider)
+
+from .mockrtos import (MockRTOSTarget, MockSymbolProvider, RAM_START)
+
+THREAD_BASE = RAM_START + 0x1000
+THREAD_SIZE = 0x100
+NAME_BASE = RAM_START + 0x3000
+
+@pytest.fixture
+def target():
+    return MockRTOSTarget()
+
+def thread_addr(index):
+    return THREAD_BASE + index * THREAD_SIZE
+
+def write_name(core, index, name):
+    """! @brief Write a thread name and return its address."""
+    addr = NAME_BASE + index * 0x20
+    core.write_string(addr, name)
+    return addr
+
+def link(core, nodes, next_offset, circular=False):
+    """! @brief Link nodes into a list and return the address of the first node."""
+    if not nodes:
+        return 0
+    for node, next_node in zip(nodes, nodes[1:] + [nodes[0] if circular else 0]):
+        core.write32(node + next_offset, next_node)
+    return nodes[0]
+
+def rebuild(target, provider):
+    """! @brief Let the target run and rebuild the thread list.
+    @return Dict of thread objects before the rebuild.
+    """
+    threads = dict(provider._threads)
+    target.run_token += 1
+    provider.update_threads()
+    return threads
+
+class TestRTX5(object):
+    INFO = RAM_START + 0x100
+
+    def build(self, target):
+        """! @brief Write an RTX5 kernel with running, ready, delayed and waiting threads."""
+        core = target.core
+        threads = []
+        for index, (name, state, priority) in enumerate([("main", 0x02, 24), ("idle", 0x01, 1),
+                    ("sleeper", 0x13, 8), ("waiter", 0x63, 8)]):
+            base = thread_addr(index)
+            core.write_memory(base + RTXTargetThread.STATE_OFFSET, state, 8)
+            core.write32(base + RTXTargetThread.NAME_OFFSET, write_name(core, index, name))
+            core.write_memory(base + RTXTargetThread.PRIORITY_OFFSET, priority, 8)
+            core.write_memory(base + RTXTargetThread.STACKFRAME_OFFSET, 0xfd, 8)
+            core.write32(base + RTXTargetThread.SP_OFFSET, 0x20002000 + index * 0x100)
+            threads.append(base)
+
+        core.write_memory(self.INFO + RTX5ThreadProvider.KERNEL_STATE_OFFSET, 2, 8)
+        core.write32(self.INFO + RTX5ThreadProvider.CURRENT_OFFSET, threads[0])
+        core.write32(self.INFO + RTX5ThreadProvider.THREADLIST_OFFSET,
+                link(core, threads[1:2], RTX5ThreadProvider.THREADNEXT_OFFSET))
+        core.write32(self.INFO + RTX5ThreadProvider.DELAYLIST_OFFSET,
+                link(core, threads[2:3], RTX5ThreadProvider.DELAYNEXT_OFFSET))
+        core.write32(self.INFO + RTX5ThreadProvider.WAITLIST_OFFSET,
+                link(core, threads[3:4], RTX5ThreadProvider.DELAYNEXT_OFFSET))
+
+        provider = RTX5ThreadProvider(target)
+        assert provider.init(MockSymbolProvider({'osRtxInfo': self.INFO}))
+        provider.read_from_target = True
+        core.round_trips = 0
+        provider.update_threads()
+        return provider
+
+    def test_threads(self, target):
+        provider = self.build(target)
+        threads = {t.name: t for t in provider._threads.values()}
+        assert sorted(threads) == ["idle", "main", "sleeper", "waiter"]
+        assert threads["main"].description == "Running; Priority 24"
+        assert threads["sleeper"].description == "Waiting[Delay]; Priority 8"
+        assert threads["waiter"].description == "Waiting[Sem]; Priority 8"
+        assert threads["idle"].get_stack_pointer() == 0x20002100
+        assert threads["idle"].get_stack_frame() == 0xfffffffd
+        # osRtxInfo, thread structs, and names.
+        assert target.core.round_trips == 3
+
+    def test_current_thread(self, target):
+        provider = self.build(target)
+        assert provider.get_actual_current_thread_id() == thread_addr(0)
+        assert provider.current_thread.name == "main"
+        assert provider.current_thread.is_current
+
+    def test_rebuild_reuses_threads(self, target):
+        provider = self.build(target)
+        core = target.core
+        core.write_memory(thread_addr(1) + RTXTargetThread.PRIORITY_OFFSET, 2, 8)
+        core.round_trips = 0
+        threads = rebuild(target, provider)
+
+        assert provider._threads == threads
+        assert provider._threads[thread_addr(1)].priority == 2
+        # Names of known threads are not read again.
+        assert core.round_trips == 2
+        stats = provider.last_scan_stats
+        assert (stats.threads_created, stats.threads_updated) == (0, 4)
+
+    def test_caching_context(self, target):
+        target.context = CachingDebugContext(target.core)
+        provider = self.build(target)
+        assert len(provider._threads) == 4
+        assert target.core.round_trips == 3
+
+class TestZephyr(object):
+    KERNEL = RAM_START + 0x100
+    OFFSETS_TABLE = RAM_START + 0x200
+    SIZE_T_SIZE = RAM_START + 0x300
+
+    OFFSETS = {
+        'version': 1,
+        'k_curr_thread': 0x8,
+        'k_threads': 0x10,
+        't_entry': 0x0,
+        't_next_thread': 0x20,
+        't_state': 0xd,
+        't_user_options': 0xc,
+        't_prio': 0xe,
+        't_stack_ptr': 0x28,
+        't_name': 0x30,
+        }
+
+    SYMBOLS = {
+        '_kernel': KERNEL,
+        '_kernel_openocd_offsets': OFFSETS_TABLE,
+        '_kernel_openocd_size_t_size': SIZE_T_SIZE,
+        }
+
+    def build(self, target, current=1):
+        """! @brief Write a Zephyr kernel with three threads."""
+        core = target.core
+        core.write_memory(self.SIZE_T_SIZE, 4, 8)
+        for index, name in enumerate(ZephyrThreadProvider.ZEPHYR_OFFSETS):
+            core.write32(self.OFFSETS_TABLE + index * 4, self.OFFSETS[name])
+
+        threads = []
+        for index, (name, state, priority) in enumerate([("main", ZephyrThread.READY, 0),
+                    ("worker", ZephyrThread.PENDING, 5), ("idle", ZephyrThread.READY, 15)]):
+            base = thread_addr(index)
+            core.write_memory(base + self.OFFSETS['t_state'], state, 8)
+            core.write_memory(base + self.OFFSETS['t_prio'], priority, 8)
+            core.write32(base + self.OFFSETS['t_stack_ptr'], 0x20002000 + index * 0x100)
+            core.write32(base + self.OFFSETS['t_name'], write_name(core, index, name))
+            threads.append(base)
+        core.write32(self.KERNEL + self.OFFSETS['k_threads'],
+                link(core, threads, self.OFFSETS['t_next_thread']))
+        core.write32(self.KERNEL + self.OFFSETS['k_curr_thread'], threads[current])
+
+        provider = ZephyrThreadProvider(target)
+        assert provider.init(MockSymbolProvider(self.SYMBOLS))
+        provider.read_from_target = True
+        core.round_trips = 0
+        provider.update_threads()
+        return provider
+
+    def test_threads(self, target):
+        provider = self.build(target)
+        threads = {t.name: t for t in provider._threads.values()}
+        assert sorted(threads) == ["idle", "main", "worker"]
+        assert threads["main"].state == ZephyrThread.READY
+        assert threads["worker"].state == ZephyrThread.RUNNING
+        assert threads["idle"].priority == 15
+        assert threads["idle"].get_stack_pointer() == 0x20002200
+        # Kernel pointers, one wave per thread, and names.
+        assert target.core.round_trips == 5
+
+    def test_current_thread(self, target):
+        provider = self.build(target, current=2)
+        assert provider.get_actual_current_thread_id() == thread_addr(2)
+        assert provider.current_thread.name == "idle"
+        assert provider.current_thread.is_current
+
+    def test_rebuild_reuses_threads(self, target):
+        provider = self.build(target)
+        core = target.core
+        core.write32(self.KERNEL + self.OFFSETS['k_curr_thread'], thread_addr(0))
+        core.write_string(NAME_BASE, "renamed")
+        core.round_trips = 0
+        threads = rebuild(target, provider)
+
+        assert provider._threads == threads
+        assert provider._threads[thread_addr(0)].state == ZephyrThread.RUNNING
+        assert provider._threads[thread_addr(1)].state == ZephyrThread.PENDING
+        # Names of known threads are not read again.
+        assert provider._threads[thread_addr(0)].name == "main"
+        assert core.round_trips == 4
+        stats = provider.last_scan_stats
+        assert (stats.threads_created, stats.threads_updated) == (0, 3)
+
+    def test_caching_context(self, target):
+        target.context = CachingDebugContext(target.core)
+        provider = self.build(target)
+        assert len(provider._threads) == 3
+        assert target.core.round_trips == 5
+
+class TestArgon(object):
+    G_AR = RAM_START + 0x100
+    G_AR_OBJECTS = RAM_START + 0x200
+    NODE_BASE = RAM_START + 0x800
+
+    def build(self, target):
+        """! @brief Write an Argon kernel with a circular list of three threads."""
+        core = target.core
+        nodes = []
+        for index, (name, state, priority) in enumerate([("main", ArgonThread.RUNNING, 10),
+                    ("blinky", ArgonThread.SLEEPING, 20), ("idle", ArgonThread.READY, 0)]):
+            base = thread_addr(index)
+            core.write32(base + argon.THREAD_STACK_POINTER_OFFSET, 0x20002000 + index * 0x100)
+            core.write32(base + argon.THREAD_NAME_OFFSET, write_name(core, index, name))
+            core.write_memory(base + argon.THREAD_PRIORITY_OFFSET, priority, 8)
+            core.write_memory(base + argon.THREAD_STATE_OFFSET, state, 8)
+            node = self.NODE_BASE + index * 0x10
+            core.write32(node + argon.LIST_NODE_OBJ_OFFSET, base)
+            nodes.append(node)
+        core.write32(self.G_AR_OBJECTS + argon.ALL_OBJECTS_THREADS_OFFSET,
+                link(core, nodes, argon.LIST_NODE_NEXT_OFFSET, circular=True))
+        core.write32(self.G_AR, thread_addr(0))
+        core.write32(self.G_AR + argon.KERNEL_FLAGS_OFFSET, argon.IS_RUNNING_MASK)
+
+        provider = ArgonThreadProvider(target)
+        assert provider.init(MockSymbolProvider({'g_ar': self.G_AR, 'g_ar_objects': self.G_AR_OBJECTS}))
+        provider.read_from_target = True
+        core.round_trips = 0
+        provider.update_threads()
+        return provider
+
+    def test_threads(self, target):
+        provider = self.build(target)
+        threads = {t.name: t for t in provider._threads.values()}
+        assert sorted(threads) == ["blinky", "idle", "main"]
+        assert threads["blinky"].description == "Sleeping; Priority 20"
+        assert threads["idle"].get_stack_pointer() == 0x20002200
+        # List head, one wave per node, thread structs, and names.
+        assert target.core.round_trips == 6
+
+    def test_current_thread(self, target):
+        provider = self.build(target)
+        assert provider.get_actual_current_thread_id() == thread_addr(0)
+        assert provider.current_thread.name == "main"
+
+    def test_rebuild_reuses_threads(self, target):
+        provider = self.build(target)
+        core = target.core
+        core.write_memory(thread_addr(1) + argon.THREAD_STATE_OFFSET, ArgonThread.READY, 8)
+        core.round_trips = 0
+        threads = rebuild(target, provider)
+
+        assert provider._threads == threads
+        assert provider._threads[thread_addr(1)].state == ArgonThread.READY
+        assert core.round_trips == 5
+        stats = provider.last_scan_stats
+        assert (stats.threads_created, stats.threads_updated) == (0, 3)
+
+    def test_caching_context(self, target):
+        target.context = CachingDebugContext(target.core)
+        provider = self.build(target)
+        assert len(provider._threads) == 3
+        assert target.core.round_trips == 6
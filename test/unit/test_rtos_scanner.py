@@ -0,0 +1,249 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import pytest
+
+from pyocd.debug.cache import CachingDebugContext
+from pyocd.rtos import freertos
+from pyocd.rtos.freertos import (FreeRTOSThread, FreeRTOSThreadProvider)
+from pyocd.rtos.scanner import MemoryScanner
+
+from .mockrtos import (MockRTOSTarget, MockSymbolProvider, RAM_START)
+
+@pytest.fixture
+def target():
+    return MockRTOSTarget()
+
+def make_list(core, nodes, size=16, next_offset=4):
+    """! @brief Write a linked list of nodes and return the address of the first node."""
+    for node, next_node in zip(nodes, nodes[1:] + [0]):
+        core.write32(node, node & 0xffff)
+        core.write32(node + next_offset, next_node)
+    return nodes[0] if nodes else 0
+
+class TestMemoryScanner(object):
+    def test_read_blocks(self, target):
+        core = target.core
+        core.write32(RAM_START + 0x100, 0x11223344)
+        core.write_string(RAM_START + 0x201, "abc")
+        scanner = MemoryScanner(core)
+        blocks = scanner.read_blocks([(RAM_START + 0x100, 4), (RAM_START + 0x201, 3),
+                    (RAM_START + 0x1000, 200)])
+        assert blocks[0] == bytearray([0x44, 0x33, 0x22, 0x11])
+        assert blocks[1] == bytearray(b"abc")
+        assert len(blocks[2]) == 200
+        # One round trip for the large block and one for the deferred reads.
+        assert core.round_trips == 2
+
+    def test_fault(self, target):
+        core = target.core
+        core.faults.add(RAM_START + 0x104)
+        scanner = MemoryScanner(core)
+        assert scanner.read_words([RAM_START + 0x100, RAM_START + 0x104]) == [0, None]
+
+    def test_caching_context(self, target):
+        core = target.core
+        core.write32(RAM_START + 0x100, 0x11223344)
+        scanner = MemoryScanner(CachingDebugContext(core))
+        assert scanner.read_words([RAM_START + 0x100, RAM_START + 0x104, RAM_START + 0x108]) == [
+                    0x11223344, 0, 0]
+        # Deferred reads bypass the cache, so they still complete in one round trip.
+        assert core.round_trips == 1
+
+    def test_walk_lists(self, target):
+        core = target.core
+        lists = [
+            [RAM_START + 0x100, RAM_START + 0x200, RAM_START + 0x300],
+            [RAM_START + 0x400],
+            [],
+            ]
+        heads = [make_list(core, nodes) for nodes in lists]
+        # Make the second list circular.
+        core.write32(RAM_START + 0x404, RAM_START + 0x400)
+        scanner = MemoryScanner(core)
+        results = scanner.walk_lists([(head, 4, None) for head in heads], 16)
+        assert [[node for node, _ in nodes] for nodes in results] == lists
+        # One wave per node of the longest list.
+        assert core.round_trips == 3
+
+    def test_walk_fault(self, target, caplog):
+        core = target.core
+        head = make_list(core, [RAM_START + 0x100, RAM_START + 0x200, RAM_START + 0x300])
+        other = make_list(core, [RAM_START + 0x400, RAM_START + 0x500])
+        core.faults.add(RAM_START + 0x200)
+        scanner = MemoryScanner(CachingDebugContext(core))
+        with caplog.at_level(logging.WARNING):
+            results = scanner.walk_lists([(head, 4, None), (other, 4, None)], 16)
+        # The broken list ends at the node that can't be read.
+        assert [[node for node, _ in nodes] for nodes in results] == [
+                    [RAM_START + 0x100], [RAM_START + 0x400, RAM_START + 0x500]]
+        assert "terminating list" in caplog.text
+
+    def test_walk_max_count(self, target):
+        core = target.core
+        head = make_list(core, [RAM_START + 0x100, RAM_START + 0x200])
+        scanner = MemoryScanner(core)
+        results = scanner.walk_lists([(head, 4, 1), (head, None, None)], 16)
+        assert [len(nodes) for nodes in results] == [1, 1]
+
+    def test_read_strings(self, target):
+        core = target.core
+        long_name = "x" * 100
+        core.write_string(RAM_START + 0x100, "idle")
+        core.write_string(RAM_START + 0x200, long_name)
+        scanner = MemoryScanner(core)
+        assert scanner.read_strings([RAM_START + 0x100, 0, RAM_START + 0x200]) == ["idle", "", long_name]
+
+    def test_snapshot(self):
+        target = MockRTOSTarget(rtos_snapshot_size=0x4000)
+        scanner = MemoryScanner.create(target, target.core, RAM_START)
+        assert scanner.has_snapshot
+        target.core.round_trips = 0
+        scanner.read_blocks([(RAM_START + 0x100, 64), (RAM_START + 0x200, 8)])
+        assert target.core.round_trips == 0
+
+    def test_snapshot_too_large(self):
+        target = MockRTOSTarget(rtos_snapshot_size=0x1000)
+        assert not MemoryScanner.create(target, target.core, RAM_START).has_snapshot
+
+# FreeRTOS kernel variables.
+SYMBOLS = {
+    'uxCurrentNumberOfTasks': RAM_START + 0x00,
+    'pxCurrentTCB': RAM_START + 0x04,
+    'uxTopReadyPriority': RAM_START + 0x08,
+    'xSchedulerRunning': RAM_START + 0x0c,
+    'pxReadyTasksLists': RAM_START + 0x100,
+    'xDelayedTaskList1': RAM_START + 0x100 + 2 * freertos.LIST_SIZE,
+    'xDelayedTaskList2': RAM_START + 0x100 + 3 * freertos.LIST_SIZE,
+    'xPendingReadyList': RAM_START + 0x100 + 4 * freertos.LIST_SIZE,
+    }
+
+TCB_BASE = RAM_START + 0x1000
+TCB_SIZE = 0x100
+
+def make_freertos(core, lists, current):
+    """! @brief Write the FreeRTOS thread lists.
+
+    @param core The MockRTOSCore.
+    @param lists Dict of list symbol or address to list of (name, priority) tuples.
+    @param current Name of the current thread.
+    """
+    index = 0
+    for listAddr, threads in lists.items():
+        listAddr = SYMBOLS.get(listAddr, listAddr)
+        core.write32(listAddr, len(threads))
+        prev = listAddr + freertos.LIST_INDEX_OFFSET - freertos.LIST_NODE_NEXT_OFFSET
+        for name, priority in threads:
+            tcb = TCB_BASE + index * TCB_SIZE
+            index += 1
+            node = tcb + 4
+            core.write32(prev + freertos.LIST_NODE_NEXT_OFFSET, node)
+            core.write32(node + freertos.LIST_NODE_OBJECT_OFFSET, tcb)
+            core.write32(tcb + freertos.THREAD_PRIORITY_OFFSET, priority)
+            core.write_string(tcb + freertos.THREAD_NAME_OFFSET, name)
+            if name == current:
+                core.write32(SYMBOLS['pxCurrentTCB'], tcb)
+            prev = node
+    core.write32(SYMBOLS['uxCurrentNumberOfTasks'], index)
+    core.write32(SYMBOLS['uxTopReadyPriority'], 1)
+    core.write32(SYMBOLS['xSchedulerRunning'], 1)
+
+class TestFreeRTOSScan(object):
+    LISTS = {
+        RAM_START + 0x100 + freertos.LIST_SIZE: [("main", 1), ("worker", 1)],
+        'xDelayedTaskList1': [("sleeper", 0)],
+        'xPendingReadyList': [],
+        }
+
+    def build(self, target):
+        make_freertos(target.core, self.LISTS, "main")
+        provider = FreeRTOSThreadProvider(target)
+        assert provider.init(MockSymbolProvider(SYMBOLS))
+        provider.read_from_target = True
+        target.core.round_trips = 0
+        provider.update_threads()
+        return provider
+
+    def test_threads(self, target):
+        provider = self.build(target)
+        threads = {t.name: t for t in provider._threads.values()}
+        assert sorted(threads) == ["main", "sleeper", "worker"]
+        assert threads["main"].state == FreeRTOSThread.RUNNING
+        assert threads["worker"].state == FreeRTOSThread.READY
+        assert threads["sleeper"].state == FreeRTOSThread.BLOCKED
+        assert threads["worker"].priority == 1
+        # Kernel variables, list headers, two list node waves, and TCBs.
+        assert target.core.round_trips == 5
+
+    def test_rebuild_reuses_threads(self, target):
+        provider = self.build(target)
+        assert provider.last_scan_stats.threads_created == 3
+
+        threads = dict(provider._threads)
+        worker = [t for t in threads.values() if t.name == "worker"][0]
+        target.core.write32(worker.unique_id + freertos.THREAD_PRIORITY_OFFSET, 2)
+        target.core.write_string(worker.unique_id + freertos.THREAD_NAME_OFFSET, "renamed")
+        target.core.round_trips = 0
+        target.run_token += 1
+        provider.update_threads()
+
+        assert provider._threads == threads
+        assert target.core.round_trips == 5
+        # Only the dynamic fields were read again.
+        assert worker.priority == 2
+        assert worker.name == "worker"
+        stats = provider.last_scan_stats
+        assert stats.threads_created == 0
+        assert stats.threads_updated == 3
+        assert stats.bytes_saved == 3 * (freertos.THREAD_READ_SIZE - freertos.THREAD_UPDATE_SIZE)
+        assert provider.total_scan_stats.threads_created == 3
+
+    def test_cached_stack_pointer(self, target):
+        provider = self.build(target)
+        thread = list(provider._threads.values())[0]
+        target.core.write32(thread.unique_id + freertos.THREAD_STACK_POINTER_OFFSET, 0x20002000)
+        target.core.round_trips = 0
+        assert thread.get_stack_pointer() == 0
+        assert target.core.round_trips == 0
+
+        # After the target runs, the stack pointer is read again.
+        target.run_token += 1
+        assert thread.get_stack_pointer() == 0x20002000
+
+    def test_snapshot(self):
+        target = MockRTOSTarget(rtos_snapshot_size=0x4000)
+        provider = self.build(target)
+        assert len(provider._threads) == 3
+        assert target.core.round_trips == 1
+
+    def test_caching_context(self, target):
+        target.context = CachingDebugContext(target.core)
+        provider = self.build(target)
+        assert len(provider._threads) == 3
+        # The same round trips as reading the core directly.
+        assert target.core.round_trips == 5
+
+    def test_caching_context_fault(self, target):
+        target.context = CachingDebugContext(target.core)
+        make_freertos(target.core, self.LISTS, "main")
+        # Break the link from the "main" node to the "worker" node.
+        target.core.faults.add(TCB_BASE + TCB_SIZE + 4 + freertos.LIST_NODE_OBJECT_OFFSET)
+        provider = FreeRTOSThreadProvider(target)
+        assert provider.init(MockSymbolProvider(SYMBOLS))
+        provider.read_from_target = True
+        provider.update_threads()
+        assert sorted(t.name for t in provider._threads.values()) == ["main", "sleeper"]
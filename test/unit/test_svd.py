@@ -0,0 +1,99 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import json
+import os
+
+from pyocd.debug.svd.cache import SVDCache
+from pyocd.debug.svd.loader import SVDFile
+from pyocd.debug.svd.parser import SVDParser
+
+TEST_SVD = os.path.join(os.path.dirname(__file__), "data", "test_device.svd")
+
+def load(cache_dir=None):
+    svd = SVDFile(TEST_SVD)
+    svd.load(cache_dir)
+    return svd.device
+
+def get_peripheral(device, name):
+    return [p for p in device.peripherals if p.name == name][0]
+
+class TestSVDParser(object):
+    def test_device(self):
+        device = load()
+        assert (device.name, device.cpu.name, device.width) == ("TESTDEV", "CM4", 32)
+        assert [p.name for p in device.peripherals] == ["UART0", "UART1", "TIMER"]
+        assert get_peripheral(device, "UART1").base_address == 0x40002000
+
+    def test_registers(self):
+        uart0 = get_peripheral(load(), "UART0")
+        regs = {r.name: r for r in uart0.registers}
+        assert sorted(regs) == ["BUF0", "BUF1", "BUF2", "BUF3", "CTRL", "DATA", "DMA_ADDR", "DMA_COUNT"]
+        assert regs["BUF3"].address_offset == 0x1c
+        assert regs["DMA_COUNT"].address_offset == 0x44
+        assert regs["DATA"].size == 8
+        # Reserved fields are removed.
+        assert [(f.name, f.bit_offset, f.bit_width) for f in regs["CTRL"].fields] == [("EN", 0, 1), ("MODE", 4, 2)]
+        assert [v.name for v in regs["CTRL"].fields[0].enumerated_values] == ["Disabled", "Enabled"]
+
+    def test_lazy_peripherals(self):
+        device = load()
+        assert all(p._contents_loader is not None for p in device.peripherals)
+
+        # The registers of a derived peripheral come from its base peripheral.
+        uart1 = get_peripheral(device, "UART1")
+        assert [r.name for r in uart1.registers][:3] == ["CTRL", "DATA", "BUF0"]
+        assert [i.name for i in uart1.interrupts] == ["UART1_IRQ"]
+        assert get_peripheral(device, "UART0")._contents_loader is None
+        assert get_peripheral(device, "TIMER")._contents_loader is not None
+
+    def test_encoding(self):
+        with open(TEST_SVD, 'rb') as f:
+            data = f.read()
+        data = data.replace(b'encoding="utf-8"', b'encoding="iso-8859-1"')
+        data = data.replace(b"<description>Reload value", b"<description>R\xe9load value")
+        device = SVDParser(io.BytesIO(data)).get_device()
+        assert get_peripheral(device, "TIMER").registers[0].description == u"R\xe9load value"
+
+class TestSVDCache(object):
+    def test_same_device(self, tmpdir):
+        parsed = load()
+        load(str(tmpdir))
+        cached = load(str(tmpdir))
+        assert json.dumps(cached.to_dict(), sort_keys=True) == json.dumps(parsed.to_dict(), sort_keys=True)
+
+    def test_lazy_peripherals(self, tmpdir):
+        load(str(tmpdir))
+        device = load(str(tmpdir))
+        assert [i.name for p in device.peripherals for i in p.interrupts] == ["UART0_IRQ", "UART1_IRQ"]
+        assert all(p._contents_loader is not None for p in device.peripherals)
+
+        # Accessing a derived peripheral's registers decodes it and its base peripheral only.
+        uart1 = get_peripheral(device, "UART1")
+        assert [r.name for r in uart1.registers][:2] == ["CTRL", "DATA"]
+        assert get_peripheral(device, "UART0")._contents_loader is None
+        assert get_peripheral(device, "TIMER")._contents_loader is not None
+
+    def test_invalid_cache(self, tmpdir):
+        cache = SVDCache(str(tmpdir))
+        with open(TEST_SVD, 'rb') as f:
+            data = f.read()
+        with open(cache.get_path(data), 'wb') as f:
+            f.write(b"PYOCDSVD garbage")
+        assert load(str(tmpdir)).name == "TESTDEV"
+        # The invalid file was replaced.
+        assert cache.load(data).name == "TESTDEV"
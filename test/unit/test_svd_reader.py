@@ -0,0 +1,95 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.core import exceptions
+from pyocd.debug.svd.reader import read_peripheral_registers
+
+from .test_svd import (load, get_peripheral)
+
+class RecordingTarget(object):
+    """! @brief Memory interface that returns each address as its value and records the reads."""
+
+    def __init__(self, fault_addresses=()):
+        self.reads = []
+        self.fault_addresses = fault_addresses
+
+    def _check(self, addr, count):
+        for fault_addr in self.fault_addresses:
+            if addr <= fault_addr < addr + count:
+                raise exceptions.TransferFaultError(fault_addr)
+
+    def read_memory(self, addr, transfer_size=32, now=True):
+        self.reads.append((addr, transfer_size))
+        def read_cb():
+            self._check(addr, transfer_size // 8)
+            return addr & ((1 << transfer_size) - 1)
+        return read_cb() if now else read_cb
+
+    def read_memory_block32(self, addr, size):
+        self.reads.append((addr, 32, size))
+        self._check(addr, size * 4)
+        return [addr + i * 4 for i in range(size)]
+
+@pytest.fixture
+def device():
+    return load()
+
+class TestReadPeripheralRegisters(object):
+    def test_coalesce(self, device):
+        target = RecordingTarget()
+        uart0 = get_peripheral(device, "UART0")
+        values = read_peripheral_registers(target, uart0)
+        assert [(v.register.name, v.address, v.value) for v in values][:3] == [
+                ("CTRL", 0x40001000, 0x40001000),
+                ("DATA", 0x40001004, 0x04),
+                ("BUF0", 0x40001010, 0x40001010),
+                ]
+        assert all(v.address == v.value or v.register.size == 8 for v in values)
+        # DATA is 8-bit, so CTRL is not contiguous with the BUFn registers.
+        assert sorted(target.reads) == [
+                (0x40001000, 32),
+                (0x40001004, 8),
+                (0x40001010, 32, 4),
+                (0x40001040, 32, 2),
+                ]
+
+    def test_side_effects(self, device):
+        target = RecordingTarget()
+        timer = get_peripheral(device, "TIMER")
+        values = read_peripheral_registers(target, timer)
+        assert [(v.value, v.note) for v in values] == [
+                (0x40003000, None),
+                (None, "not read: read has side effects"),
+                (None, "write-only"),
+                ]
+        assert target.reads == [(0x40003000, 32)]
+
+        # Registers with side effects are read if asked for, but never as part of a block.
+        target = RecordingTarget()
+        values = read_peripheral_registers(target, timer, read_side_effects=True)
+        assert values[1].value == 0x40003004
+        assert sorted(target.reads) == [(0x40003000, 32), (0x40003004, 32)]
+
+    def test_fault(self, device):
+        target = RecordingTarget(fault_addresses=[0x40001014])
+        uart0 = get_peripheral(device, "UART0")
+        values = {v.register.name: v for v in read_peripheral_registers(target, uart0)}
+        assert (values["BUF1"].value, values["BUF1"].note) == (None, "read failed")
+        assert values["BUF0"].value == 0x40001010
+        assert values["BUF2"].value == 0x40001018
+        assert values["DMA_COUNT"].value == 0x40001044
@@ -0,0 +1,92 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.debug.cache import CachingDebugContext
+from pyocd.utility.target_memory import (decode_c_string, read_c_string, read_c_string_data,
+    read_words)
+
+from .mockrtos import (MockRTOSTarget, RAM_START, RAM_SIZE)
+
+@pytest.fixture
+def core():
+    return MockRTOSTarget().core
+
+class TestCString(object):
+    def test_decode(self):
+        assert decode_c_string(b"abc\0def") == ("abc", True)
+        assert decode_c_string([0x61, 0x62]) == ("ab", False)
+        assert decode_c_string(b"a\xffb\0") == ("a?b", True)
+        # A long run of invalid characters ends the string.
+        assert decode_c_string(b"ab" + b"\xff" * 8) == ("ab????", True)
+
+    def test_read(self, core):
+        core.write_string(RAM_START + 0x100, "idle")
+        assert read_c_string(core, RAM_START + 0x100) == "idle"
+        assert core.block_reads == [(RAM_START + 0x100, 32)]
+        assert read_c_string(core, 0) == ""
+
+    def test_chunks(self, core):
+        core.write_string(RAM_START + 0x100, "x" * 100)
+        assert read_c_string(core, RAM_START + 0x100) == "x" * 100
+        # Each chunk is twice as large as the one before.
+        assert core.block_reads == [(RAM_START + 0x100, 32), (RAM_START + 0x120, 64),
+                    (RAM_START + 0x160, 128)]
+
+        # Strings are limited to the maximum length.
+        core.block_reads = []
+        core.write_string(RAM_START + 0x400, "y" * 1000)
+        assert read_c_string(core, RAM_START + 0x400, 100) == "y" * 100
+        assert sum(size for _, size in core.block_reads) == 100
+
+    def test_region_end(self):
+        target = MockRTOSTarget()
+        core = target.core
+        core.memory_map = target.memory_map
+        end = RAM_START + RAM_SIZE
+        core.ram[-10:] = b"z" * 10
+        assert read_c_string(core, end - 10) == "z" * 10
+        assert core.block_reads == [(end - 10, 10)]
+
+    def test_fault(self, core):
+        core.write_string(RAM_START + 0x100, "x" * 40)
+        core.faults.add(RAM_START + 0x130)
+        assert read_c_string(core, RAM_START + 0x100) == "x" * 32
+
+    def test_read_data(self, core):
+        core.ram[0x100:0x108] = b"a\xffb\0cdef"
+        assert read_c_string_data(core, RAM_START + 0x100) == bytearray(b"a\xffb")
+        assert read_c_string_data(core, 0) == bytearray()
+
+class TestReadWords(object):
+    def test_read(self, core):
+        core.write32(RAM_START + 0x100, 0x11223344)
+        core.write32(RAM_START + 0x104, 0x55667788)
+        assert read_words(core, [RAM_START + 0x100, RAM_START + 0x104]) == [0x11223344, 0x55667788]
+        assert core.round_trips == 1
+
+    def test_fault(self, core):
+        core.write32(RAM_START + 0x100, 0x11223344)
+        core.faults.add(RAM_START + 0x104)
+        assert read_words(core, [RAM_START + 0x100, RAM_START + 0x104]) == [0x11223344, None]
+
+    def test_caching_context(self, core):
+        core.write32(RAM_START + 0x100, 0x11223344)
+        assert read_words(CachingDebugContext(core), [RAM_START + 0x100, RAM_START + 0x104]) == [
+                    0x11223344, 0]
+        # The reads are queued on the core rather than made through the cache one at a time.
+        assert core.round_trips == 1
@@ -0,0 +1,98 @@
+# pyOCD debugger
+# Copyright (c) 2020 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.rtos.provider import (TargetThread, ThreadProvider)
+
+class MockTarget(object):
+    def __init__(self):
+        self.run_token = 0
+
+    def get_target_context(self):
+        return None
+
+class MockThread(TargetThread):
+    def __init__(self, unique_id, description):
+        super(MockThread, self).__init__()
+        self._unique_id = unique_id
+        self._description = description
+
+    @property
+    def unique_id(self):
+        return self._unique_id
+
+    @property
+    def name(self):
+        return "thread%d" % self._unique_id
+
+    @property
+    def description(self):
+        return self._description
+
+class MockThreadProvider(ThreadProvider):
+    def __init__(self, target):
+        super(MockThreadProvider, self).__init__(target)
+        self.thread_states = {1: "Running", 2: "Ready"}
+        self.build_count = 0
+
+    def _build_thread_list(self):
+        self.build_count += 1
+        self._threads = {i: MockThread(i, d) for i, d in self.thread_states.items()}
+
+    def invalidate(self):
+        self._threads = {}
+
+@pytest.fixture
+def target():
+    return MockTarget()
+
+@pytest.fixture
+def provider(target):
+    p = MockThreadProvider(target)
+    p.read_from_target = True
+    return p
+
+class TestThreadsGeneration(object):
+    def test_first_build(self, provider):
+        assert provider.update_threads()
+        assert provider.build_count == 1
+        assert provider.threads_generation == 1
+
+    def test_not_run(self, provider):
+        gen = provider.threads_generation
+        assert not provider.update_threads()
+        assert provider.threads_generation == gen
+        assert provider.build_count == 1
+
+    def test_run_without_change(self, provider, target):
+        gen = provider.threads_generation
+        target.run_token += 1
+        assert not provider.update_threads()
+        assert provider.build_count == 2
+        assert provider.threads_generation == gen
+
+    def test_state_change(self, provider, target):
+        gen = provider.threads_generation
+        target.run_token += 1
+        provider.thread_states = {1: "Ready", 2: "Running"}
+        assert provider.update_threads()
+        assert provider.threads_generation == gen + 1
+
+    def test_invalidate(self, provider):
+        gen = provider.threads_generation
+        provider.invalidate()
+        assert provider.threads_generation == gen + 1